@@ -6,10 +6,15 @@ class AbstractsConfig(AppConfig):
     """
     Конфигурация приложения abstracts.
 
-    Это приложение содержит абстрактные модели,
-    используемые другими приложениями проекта.
+    Это приложение содержит абстрактные модели и общие функции,
+    используемые другими приложениями проекта, а также шину сброса
+    кэшей в памяти процессов.
     """
 
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'abstracts'
     verbose_name = 'Абстрактные модели'
+
+    def ready(self) -> None:
+        """Подключает рассылку изменений кэшируемых моделей."""
+        from . import signals  # noqa: F401
@@ -0,0 +1,348 @@
+"""Кэш объектов в памяти процесса и шина его сброса между процессами."""
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Hashable,
+    Iterable,
+    List,
+    Optional,
+    Set,
+    Tuple
+)
+
+from django.conf import settings
+from django.db import DatabaseError, connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+# Модели, объекты которых кэшируются в памяти процессов. Изменения
+# через save() и delete() рассылаются по шине автоматически (см.
+# abstracts.signals). QuerySet.update() и bulk_create() сигналов
+# не вызывают: после них нужно вызвать publish()
+CACHED_MODELS = ('items.Item', 'orders.Discount', 'orders.Tax')
+
+# Канал PostgreSQL LISTEN/NOTIFY
+CHANNEL = 'cache_invalidation'
+
+# Значение LocalCache.get, если записи нет
+MISSING = object()
+
+_caches: List['LocalCache'] = []
+_subscribers: Dict[str, List[Callable[[Optional[str]], None]]] = {}
+_lock = threading.Lock()
+_listener: Any = None
+_listener_pid: Optional[int] = None
+_last_event_id: Optional[int] = None
+_last_poll = 0.0
+
+
+class LocalCache:
+    """
+    LRU кэш объектов одной модели в памяти процесса.
+
+    Чтение не обращается ни к базе, ни к общему кэшу. Перед чтением
+    процесс забирает события шины (receive) и удаляет записи
+    измененных объектов, поэтому изменение становится видно всем
+    процессам меньше чем за секунду. Отсутствие объекта тоже
+    кэшируется и сбрасывается любым изменением модели. Время жизни
+    записи ограничивает устаревание, если изменение прошло мимо
+    шины.
+
+    Кэшированный объект общий для всех запросов процесса, его нельзя
+    изменять.
+
+    Attributes:
+        model: Модель в формате 'app_label.modelname'
+        maxsize: Максимальное количество записей
+        timeout: Время жизни записи в секундах
+
+    Example:
+        >>> items = LocalCache('items.Item')
+        >>> item = items.get(item_id)
+        >>> if item is MISSING:
+        ...     item = Item.objects.filter(id=item_id).first()
+        ...     items.set(item_id, item)
+    """
+
+    def __init__(
+        self,
+        model: str,
+        maxsize: Optional[int] = None,
+        timeout: Optional[float] = None
+    ) -> None:
+        self.model = model.lower()
+        self.maxsize = maxsize or settings.LOCAL_CACHE_SIZE
+        self.timeout = timeout or settings.LOCAL_CACHE_TIMEOUT
+        self._entries: 'OrderedDict[Hashable, Tuple[Any, float, Any]]' = (
+            OrderedDict()
+        )
+        # Ключи записей по первичному ключу объекта (None - отсутствие)
+        self._keys: Dict[Optional[str], Set[Hashable]] = {}
+        self._lock = threading.Lock()
+        _caches.append(self)
+
+    def get(self, key: Hashable) -> Any:
+        """
+        Возвращает объект из кэша.
+
+        Args:
+            key: Ключ записи
+
+        Returns:
+            Объект, None (объекта нет в базе) или MISSING, если
+            записи нет или она устарела
+        """
+        receive()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return MISSING
+            if entry[1] < time.monotonic():
+                self._remove(key)
+                return MISSING
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def set(
+        self,
+        key: Hashable,
+        value: Any,
+        timeout: Optional[float] = None,
+        pk: Any = None
+    ) -> None:
+        """
+        Сохраняет объект в кэш.
+
+        Args:
+            key: Ключ записи
+            value: Объект модели или None, если объекта нет
+            timeout: Время жизни записи (по умолчанию self.timeout)
+            pk: Первичный ключ объекта, от которого зависит значение,
+                если value - не объект модели (например, список ID)
+        """
+        if pk is not None:
+            pk = str(pk)
+        elif value is not None:
+            pk = str(value.pk)
+        expires = time.monotonic() + (timeout or self.timeout)
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = (value, expires, pk)
+            self._keys.setdefault(pk, set()).add(key)
+            while len(self._entries) > self.maxsize:
+                self._remove(next(iter(self._entries)))
+
+    def evict(self, pk: str) -> None:
+        """Удаляет записи объекта и записи об отсутствии объектов."""
+        with self._lock:
+            for key in self._keys.get(pk, set()) | self._keys.get(None, set()):
+                self._remove(key)
+
+    def clear(self) -> None:
+        """Удаляет все записи."""
+        with self._lock:
+            self._entries.clear()
+            self._keys.clear()
+
+    def _remove(self, key: Hashable) -> None:
+        """Удаляет запись вместе с ее индексом."""
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            keys = self._keys[entry[2]]
+            keys.discard(key)
+            if not keys:
+                del self._keys[entry[2]]
+
+
+def subscribe(
+    model: str,
+    callback: Callable[[Optional[str]], None]
+) -> None:
+    """
+    Подписывает функцию на события шины об изменении объектов модели.
+
+    Функция вызывается с первичным ключом измененного объекта или
+    с None, если события могли быть пропущены (измениться мог любой
+    объект). Вызов происходит в потоке, забравшем события (receive
+    или фиксация транзакции publish), поэтому функция должна быть
+    быстрой и потокобезопасной.
+
+    Args:
+        model: Модель в формате 'app_label.ModelName'
+        callback: Функция, принимающая первичный ключ
+    """
+    _subscribers.setdefault(model.lower(), []).append(callback)
+
+
+def _dispatch(model: str, pk: str) -> None:
+    """Сбрасывает записи объекта в кэшах процесса."""
+    for cache in _caches:
+        if cache.model == model:
+            cache.evict(pk)
+    for callback in _subscribers.get(model, ()):
+        callback(pk)
+
+
+def _clear_all() -> None:
+    """Сбрасывает все кэши процесса (события могли быть пропущены)."""
+    for cache in _caches:
+        cache.clear()
+    for callbacks in _subscribers.values():
+        for callback in callbacks:
+            callback(None)
+
+
+def publish(model: str, pks: Iterable[Any]) -> None:
+    """
+    Рассылает всем процессам событие об изменении объектов.
+
+    События отправляются в текущей транзакции и доставляются только
+    после ее фиксации: в PostgreSQL через NOTIFY, в остальных базах
+    строками таблицы CacheInvalidation. В текущем процессе записи
+    сбрасываются сразу после фиксации.
+
+    Args:
+        model: Модель в формате 'app_label.ModelName'
+        pks: Первичные ключи измененных объектов
+    """
+    from .models import CacheInvalidation
+
+    model = model.lower()
+    pks = [str(pk) for pk in pks]
+    if not pks:
+        return
+
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT pg_notify(%s, payload) FROM unnest(%s) AS payload',
+                [CHANNEL, [f'{model}:{pk}' for pk in pks]]
+            )
+    else:
+        CacheInvalidation.objects.bulk_create([
+            CacheInvalidation(model=model, object_pk=pk) for pk in pks
+        ])
+        # Старые события удаляются попутно, без отдельного процесса
+        if random.random() < 0.01:
+            CacheInvalidation.objects.filter(
+                datetime_created__lt=timezone.now() - timedelta(
+                    seconds=settings.CACHE_BUS_RETENTION
+                )
+            ).delete()
+
+    def dispatch() -> None:
+        for pk in pks:
+            _dispatch(model, pk)
+
+    transaction.on_commit(dispatch)
+
+
+def receive() -> None:
+    """
+    Применяет события шины, полученные от других процессов.
+
+    Вызывается перед каждым чтением LocalCache. В PostgreSQL процесс
+    держит отдельное соединение с LISTEN, и проверка уведомлений
+    только читает уже пришедшие в сокет данные, без запроса к базе.
+    В остальных базах таблица событий опрашивается не чаще раза
+    в CACHE_BUS_POLL_INTERVAL секунд. Если события могли быть
+    пропущены (соединение потеряно, процесс долго не опрашивал
+    таблицу), кэши процесса сбрасываются целиком.
+    """
+    with _lock:
+        if connection.vendor == 'postgresql':
+            _receive_notifications()
+        else:
+            _poll_events()
+
+
+def _receive_notifications() -> None:
+    """Забирает уведомления PostgreSQL из соединения с LISTEN."""
+    global _listener, _listener_pid
+
+    try:
+        # После fork соединение родителя использовать нельзя
+        if _listener is None or _listener_pid != os.getpid():
+            _listener = connection.get_new_connection(
+                connection.get_connection_params()
+            )
+            _listener.autocommit = True
+            with _listener.cursor() as cursor:
+                cursor.execute(f'LISTEN {CHANNEL}')
+            _listener_pid = os.getpid()
+            _clear_all()
+            return
+
+        _listener.poll()
+        while _listener.notifies:
+            notify = _listener.notifies.pop(0)
+            model, _, pk = notify.payload.rpartition(':')
+            _dispatch(model, pk)
+    except connection.Database.Error:
+        if _listener is not None and _listener_pid == os.getpid():
+            try:
+                _listener.close()
+            except connection.Database.Error:
+                pass
+        _listener = None
+        _clear_all()
+
+
+def close_listener() -> None:
+    """
+    Закрывает соединение PostgreSQL с LISTEN.
+
+    Соединение открывается заново при следующем receive(). Нужно,
+    когда база процесса удаляется раньше завершения процесса
+    (тестовая база в конце тестов).
+    """
+    global _listener
+
+    with _lock:
+        if _listener is not None and _listener_pid == os.getpid():
+            try:
+                _listener.close()
+            except connection.Database.Error:
+                pass
+        _listener = None
+
+
+def _poll_events() -> None:
+    """Опрашивает таблицу событий CacheInvalidation."""
+    global _last_event_id, _last_poll
+
+    from .models import CacheInvalidation
+
+    now = time.monotonic()
+    if now - _last_poll < settings.CACHE_BUS_POLL_INTERVAL:
+        return
+
+    try:
+        if (
+            _last_event_id is None
+            or now - _last_poll > settings.CACHE_BUS_RETENTION
+        ):
+            _last_event_id = CacheInvalidation.objects.aggregate(
+                last=Max('id')
+            )['last'] or 0
+            _clear_all()
+        else:
+            for event_id, model, pk in (
+                CacheInvalidation.objects
+                .filter(id__gt=_last_event_id)
+                .order_by('id')
+                .values_list('id', 'model', 'object_pk')
+            ):
+                _dispatch(model, pk)
+                _last_event_id = event_id
+    except DatabaseError:
+        _clear_all()
+        return
+    _last_poll = now
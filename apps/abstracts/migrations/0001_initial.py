@@ -0,0 +1,27 @@
+# Generated by Django 6.0.1 on 2026-10-19 03:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CacheInvalidation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model', models.CharField(max_length=100, verbose_name='модель')),
+                ('object_pk', models.CharField(max_length=255, verbose_name='ID объекта')),
+                ('datetime_created', models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='дата и время создания')),
+            ],
+            options={
+                'verbose_name': 'событие сброса кэша',
+                'verbose_name_plural': 'события сброса кэша',
+            },
+        ),
+    ]
@@ -27,3 +27,42 @@ class TimeStampModel(models.Model):
         """Метаданные модели."""
 
         abstract = True
+
+
+class CacheInvalidation(models.Model):
+    """
+    Событие шины сброса кэшей процессов (см. abstracts.cache).
+
+    Используется, если база не поддерживает LISTEN/NOTIFY
+    (например, SQLite): процессы опрашивают таблицу и сбрасывают
+    записи измененных объектов. Старые события удаляются
+    автоматически через CACHE_BUS_RETENTION секунд.
+
+    Attributes:
+        model: Модель в формате 'app_label.modelname'
+        object_pk: Первичный ключ измененного объекта
+        datetime_created: Дата и время изменения
+    """
+
+    model = models.CharField(
+        verbose_name='модель',
+        max_length=100
+    )
+    object_pk = models.CharField(
+        verbose_name='ID объекта',
+        max_length=255
+    )
+    datetime_created = models.DateTimeField(
+        verbose_name='дата и время создания',
+        auto_now_add=True,
+        db_index=True
+    )
+
+    def __str__(self) -> str:
+        return f'{self.model}:{self.object_pk}'
+
+    class Meta:
+        """Метаданные модели."""
+
+        verbose_name = 'событие сброса кэша'
+        verbose_name_plural = 'события сброса кэша'
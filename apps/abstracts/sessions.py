@@ -0,0 +1,33 @@
+"""Общие функции для работы с сессией покупателя."""
+import secrets
+from typing import Optional
+
+from django.http import HttpRequest
+
+SESSION_ID_KEY = 'sid'
+
+
+def get_session_id(
+    request: HttpRequest,
+    create: bool = False
+) -> Optional[str]:
+    """
+    Возвращает постоянный идентификатор сессии покупателя.
+
+    session_key подходит не для всех движков сессий: при хранении
+    в подписанной cookie он меняется с каждым изменением данных.
+    Поэтому идентификатор хранится в самой сессии и записывается
+    только один раз, при создании.
+
+    Args:
+        request: HTTP запрос с сессией
+        create: Создать идентификатор, если его еще нет
+
+    Returns:
+        Идентификатор сессии или None, если его нет и create=False
+    """
+    session_id = request.session.get(SESSION_ID_KEY)
+    if session_id is None and create:
+        session_id = secrets.token_urlsafe(16)
+        request.session[SESSION_ID_KEY] = session_id
+    return session_id
@@ -0,0 +1,21 @@
+"""Обработчики сигналов приложения abstracts."""
+from typing import Any
+
+from django.db import models
+from django.db.models.signals import post_delete, post_save
+
+from .cache import CACHED_MODELS, publish
+
+
+def cached_model_changed(
+    sender: Any,
+    instance: models.Model,
+    **kwargs: Any
+) -> None:
+    """Рассылает процессам событие об изменении кэшируемого объекта."""
+    publish(sender._meta.label, [instance.pk])
+
+
+for model in CACHED_MODELS:
+    post_save.connect(cached_model_changed, sender=model)
+    post_delete.connect(cached_model_changed, sender=model)
@@ -0,0 +1,73 @@
+"""Пакетное увеличение счетчиков через INSERT ... ON CONFLICT."""
+from typing import Any, Iterable, List, Sequence, Type
+
+from django.db import connection, models
+
+# Строк в одном INSERT
+BATCH_SIZE = 500
+
+
+def bulk_increment(
+    model: Type[models.Model],
+    keys: Sequence[str],
+    counters: Sequence[str],
+    rows: Iterable[Sequence[Any]],
+    replace: Sequence[str] = ()
+) -> None:
+    """
+    Прибавляет значения к счетчикам строк, создавая недостающие строки.
+
+    Выполняет INSERT ... ON CONFLICT DO UPDATE (PostgreSQL, SQLite)
+    пакетами по BATCH_SIZE строк. Существующая строка не
+    перезаписывается, а увеличивается, поэтому параллельные
+    обновления одной строки не теряются.
+
+    Args:
+        model: Модель
+        keys: Поля уникального ограничения (ключ строки)
+        counters: Поля, к которым прибавляются значения
+        rows: Значения полей в порядке keys, replace, counters
+        replace: Поля, которые перезаписываются новым значением
+
+    Example:
+        >>> bulk_increment(
+        ...     DailySales, ('date', 'currency'), ('orders',),
+        ...     [(day, 'usd', 1)]
+        ... )
+    """
+    qn = connection.ops.quote_name
+    table = qn(model._meta.db_table)
+    fields = [
+        model._meta.get_field(name)
+        for name in (*keys, *replace, *counters)
+    ]
+    columns = [qn(field.column) for field in fields]
+    key_columns = columns[:len(keys)]
+    replace_columns = columns[len(keys):len(keys) + len(replace)]
+    counter_columns = columns[len(keys) + len(replace):]
+    updates = ', '.join(
+        [f'{column} = EXCLUDED.{column}' for column in replace_columns]
+        + [
+            f'{column} = {table}.{column} + EXCLUDED.{column}'
+            for column in counter_columns
+        ]
+    )
+    placeholder = '(' + ', '.join(['%s'] * len(fields)) + ')'
+
+    rows = list(rows)
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), BATCH_SIZE):
+            batch = rows[start:start + BATCH_SIZE]
+            params: List[Any] = []
+            for row in batch:
+                params.extend(
+                    field.get_db_prep_save(value, connection)
+                    for field, value in zip(fields, row)
+                )
+            cursor.execute(
+                f'INSERT INTO {table} ({", ".join(columns)}) '
+                f'VALUES {", ".join([placeholder] * len(batch))} '
+                f'ON CONFLICT ({", ".join(key_columns)}) '
+                f'DO UPDATE SET {updates}',
+                params
+            )
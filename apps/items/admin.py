@@ -1,32 +1,194 @@
-from typing import Any
+from typing import Any, Optional, Tuple
 
+from django import forms
 from django.contrib import admin
+from django.db.models import OuterRef, QuerySet, Subquery, Sum
 
-from .models import Item
+from .models import Item, ItemStock, StockReservation, StripePrice
+from .search import matching_ids
+from .stock import add_stock, get_available
+
+
+class ItemAdminForm(forms.ModelForm):
+    """
+    Форма товара с полем доступного остатка.
+
+    Остаток хранится в слотах ItemStock и меняется атомарными UPDATE
+    во время оплаты, поэтому из формы сохраняется не значение,
+    а его изменение относительно показанного в форме.
+    """
+
+    stock = forms.IntegerField(
+        label='остаток',
+        required=False,
+        min_value=0,
+        show_hidden_initial=True,
+        help_text='доступно для продажи; пусто - без учета остатка'
+    )
+
+    class Meta:
+        model = Item
+        fields = '__all__'
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        if self.instance.pk:
+            self.fields['stock'].initial = get_available(
+                [self.instance.pk]
+            ).get(self.instance.pk)
+
+
+class StripePriceInline(admin.TabularInline):
+    """
+    Inline админ для отображения синхронизированных Stripe Price.
+
+    Записи создаются командой sync_stripe_prices и доступны
+    только для чтения.
+    """
+
+    model = StripePrice
+    extra = 0
+    can_delete = False
+    fields = (
+        'account',
+        'currency',
+        'unit_amount',
+        'product_id',
+        'price_id',
+        'datetime_updated'
+    )
+    readonly_fields = fields
+
+    def has_add_permission(self, request: Any, obj: Any = None) -> bool:
+        return False
 
 
 @admin.register(Item)
 class ItemAdmin(admin.ModelAdmin):
     """
     Админ-класс для управления товарами.
+
+    Поиск идет по полнотекстовому индексу (точное совпадение артикула
+    или слова в названии и описании), а не сканированием таблицы.
     """
 
+    form = ItemAdminForm
     list_display = (
         'id',
+        'sku',
         'name',
         'price_display',
         'currency',
+        'stock_display',
         'datetime_created'
     )
     list_filter = ('currency', 'datetime_created')
-    search_fields = ('name', 'description')
+    search_fields = ('sku', 'name', 'description')
+    show_full_result_count = False
     readonly_fields = ('datetime_created', 'datetime_updated')
+    inlines = [StripePriceInline]
     fieldsets = (
         ('Основная информация', {
-            'fields': ('name', 'description', 'price', 'currency', 'image')
+            'fields': (
+                'sku', 'name', 'description', 'price', 'currency', 'image'
+            )
+        }),
+        ('Склад', {
+            'fields': ('stock',)
         }),
         ('Системная информация', {
             'fields': ('datetime_created', 'datetime_updated'),
             'classes': ('collapse',)
         }),
     )
+
+    def get_queryset(self, request: Any) -> QuerySet:
+        # Подзапрос считается только для строк текущей страницы
+        available = (
+            ItemStock.objects
+            .filter(item=OuterRef('pk'))
+            .values('item')
+            .annotate(total=Sum('quantity'))
+            .values('total')
+        )
+        return super().get_queryset(request).annotate(
+            available=Subquery(available)
+        )
+
+    @admin.display(description='остаток', ordering='available')
+    def stock_display(self, obj: Item) -> Optional[int]:
+        return obj.available
+
+    def save_model(
+        self,
+        request: Any,
+        obj: Item,
+        form: ItemAdminForm,
+        change: bool
+    ) -> None:
+        """Сохраняет товар и применяет изменение остатка из формы."""
+        super().save_model(request, obj, form, change)
+        if 'stock' not in form.changed_data:
+            return
+
+        stock = form.cleaned_data['stock']
+        shown = form.fields['stock'].to_python(
+            form.data.get(form['stock'].html_initial_name)
+        )
+        if stock is None:
+            ItemStock.objects.filter(item=obj).delete()
+        else:
+            add_stock(obj.id, stock - (shown or 0))
+
+    def get_search_results(
+        self,
+        request: Any,
+        queryset: QuerySet,
+        search_term: str
+    ) -> Tuple[QuerySet, bool]:
+        ids = matching_ids(search_term)
+        if ids is None:
+            return super().get_search_results(request, queryset, search_term)
+        return queryset.filter(id__in=ids), False
+
+
+@admin.register(StockReservation)
+class StockReservationAdmin(admin.ModelAdmin):
+    """
+    Админ-класс для просмотра резервов товаров.
+
+    Резервы создаются при оформлении оплаты и освобождаются командой
+    sweep_reservations, поэтому доступны только для чтения.
+    """
+
+    list_display = (
+        'id',
+        'item',
+        'quantity',
+        'key',
+        'reference',
+        'expires_at'
+    )
+    list_select_related = ('item',)
+    search_fields = ('key', 'reference')
+    readonly_fields = (
+        'item',
+        'slot',
+        'quantity',
+        'key',
+        'currency',
+        'reference',
+        'expires_at',
+        'datetime_created',
+        'datetime_updated'
+    )
+
+    def has_add_permission(self, request: Any) -> bool:
+        return False
+
+    def has_change_permission(self, request: Any, obj: Any = None) -> bool:
+        return False
+
+    def has_delete_permission(self, request: Any, obj: Any = None) -> bool:
+        # Удаление резерва не вернуло бы количество в остаток
+        return False
@@ -0,0 +1,310 @@
+"""JSON API каталога товаров (только чтение)."""
+import hashlib
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import (
+    HttpRequest,
+    HttpResponse,
+    HttpResponseNotModified,
+    JsonResponse
+)
+from django.utils.http import parse_etags, quote_etag
+from django.views.decorators.http import require_GET
+
+from .models import Item
+from .search import format_cursor, parse_cursor, search_items
+from .stripe_accounts import get_currencies
+
+API_FIELDS = (
+    'id',
+    'sku',
+    'name',
+    'description',
+    'price',
+    'currency',
+    'image',
+    'datetime_updated',
+)
+
+
+class ApiError(Exception):
+    """Ошибка в параметрах запроса (ответ 400)."""
+
+
+def parse_fields(request: HttpRequest) -> Tuple[str, ...]:
+    """
+    Возвращает поля товара, запрошенные параметром fields.
+
+    ID возвращается всегда: он нужен для пагинации и ссылок.
+
+    Args:
+        request: HTTP запрос (?fields=name,price)
+
+    Returns:
+        Кортеж полей в порядке API_FIELDS
+
+    Raises:
+        ApiError: Если запрошено неизвестное поле
+    """
+    raw = request.GET.get('fields')
+    if not raw:
+        return API_FIELDS
+
+    requested = {name.strip() for name in raw.split(',') if name.strip()}
+    unknown = requested - set(API_FIELDS)
+    if unknown:
+        raise ApiError(f"Unknown fields: {', '.join(sorted(unknown))}")
+
+    requested.add('id')
+    return tuple(name for name in API_FIELDS if name in requested)
+
+
+def parse_int(
+    request: HttpRequest,
+    name: str,
+    default: Optional[int] = None
+) -> Optional[int]:
+    """
+    Возвращает целочисленный query параметр.
+
+    Raises:
+        ApiError: Если значение не является целым числом
+    """
+    raw = request.GET.get(name)
+    if raw in (None, ''):
+        return default
+    try:
+        return int(raw)
+    except ValueError:
+        raise ApiError(f'Parameter {name} must be an integer') from None
+
+
+def serialize_rows(
+    request: HttpRequest,
+    rows: List[Dict[str, Any]]
+) -> List[Dict[str, Any]]:
+    """
+    Преобразует имя файла изображения в абсолютный URL.
+
+    Остальные значения .values() сериализуются как есть.
+    """
+    for row in rows:
+        if 'image' in row:
+            row['image'] = (
+                request.build_absolute_uri(default_storage.url(row['image']))
+                if row['image'] else None
+            )
+    return rows
+
+
+def etag_response(request: HttpRequest, payload: Any) -> HttpResponse:
+    """
+    Формирует JSON ответ со строгим ETag.
+
+    ETag вычисляется из байтов ответа, поэтому меняется при любом
+    изменении данных, включая удаление товаров и изменения через
+    QuerySet.update(). Если клиент прислал совпадающий If-None-Match,
+    возвращается 304 без тела.
+
+    Args:
+        request: HTTP запрос
+        payload: Данные ответа
+
+    Returns:
+        HTTP ответ 200 с JSON или 304
+    """
+    content = json.dumps(
+        payload,
+        cls=DjangoJSONEncoder,
+        ensure_ascii=False,
+        separators=(',', ':')
+    ).encode()
+    etag = quote_etag(hashlib.sha256(content).hexdigest()[:32])
+
+    if_none_match = request.headers.get('If-None-Match')
+    if if_none_match:
+        etags = parse_etags(if_none_match)
+        if '*' in etags or etag in etags:
+            response = HttpResponseNotModified()
+            response['ETag'] = etag
+            return response
+
+    response = HttpResponse(content, content_type='application/json')
+    response['ETag'] = etag
+    response['Cache-Control'] = 'no-cache'
+    return response
+
+
+@require_GET
+def item_list(request: HttpRequest) -> HttpResponse:
+    """
+    Возвращает страницу списка товаров.
+
+    Пагинация по ключу: товары упорядочены по ID, параметр after
+    задает ID последнего товара предыдущей страницы, поэтому
+    стоимость запроса не зависит от номера страницы.
+
+    Query параметры:
+        fields: Поля через запятую (по умолчанию все)
+        currency: Фильтр по валюте
+        after: ID, после которого начинается страница
+        limit: Размер страницы (не больше CATALOG_API_MAX_LIMIT)
+
+    Args:
+        request: HTTP запрос
+
+    Returns:
+        JSON {"results": [...], "next": URL следующей страницы или null}
+
+    Raises:
+        400: Если параметры запроса некорректны
+    """
+    try:
+        fields = parse_fields(request)
+        after = parse_int(request, 'after')
+        limit = parse_int(request, 'limit', settings.CATALOG_API_PAGE_SIZE)
+    except ApiError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    if not 1 <= limit <= settings.CATALOG_API_MAX_LIMIT:
+        return JsonResponse(
+            {
+                'error': (
+                    f'Parameter limit must be between 1 and '
+                    f'{settings.CATALOG_API_MAX_LIMIT}'
+                )
+            },
+            status=400
+        )
+
+    queryset = Item.objects.order_by('id')
+
+    currency = request.GET.get('currency', '').lower()
+    if currency:
+        if currency not in get_currencies():
+            return JsonResponse(
+                {'error': f'Unknown currency {currency!r}'},
+                status=400
+            )
+        queryset = queryset.filter(currency=currency)
+
+    if after is not None:
+        queryset = queryset.filter(id__gt=after)
+
+    rows = serialize_rows(request, list(queryset.values(*fields)[:limit]))
+
+    next_url = None
+    if len(rows) == limit:
+        params = request.GET.copy()
+        params['after'] = rows[-1]['id']
+        next_url = request.build_absolute_uri(
+            f'{request.path}?{params.urlencode()}'
+        )
+
+    return etag_response(request, {'results': rows, 'next': next_url})
+
+
+@require_GET
+def item_detail(request: HttpRequest, id: int) -> HttpResponse:
+    """
+    Возвращает один товар.
+
+    Query параметры:
+        fields: Поля через запятую (по умолчанию все)
+
+    Args:
+        request: HTTP запрос
+        id: ID товара
+
+    Returns:
+        JSON с полями товара
+
+    Raises:
+        400: Если запрошено неизвестное поле
+        404: Если товар с указанным ID не найден
+    """
+    try:
+        fields = parse_fields(request)
+    except ApiError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    rows = list(Item.objects.filter(id=id).values(*fields))
+    if not rows:
+        return JsonResponse({'error': 'Item not found'}, status=404)
+
+    return etag_response(request, serialize_rows(request, rows)[0])
+
+
+@require_GET
+def item_search(request: HttpRequest) -> HttpResponse:
+    """
+    Ищет товары по названию и описанию.
+
+    Результаты упорядочены по релевантности. Пагинация по ключу:
+    параметр cursor берется из ссылки next предыдущей страницы.
+
+    Query параметры:
+        q: Поисковый запрос (обязательный)
+        fields: Поля через запятую (по умолчанию все)
+        cursor: Курсор следующей страницы
+        limit: Размер страницы (не больше CATALOG_API_MAX_LIMIT)
+
+    Args:
+        request: HTTP запрос
+
+    Returns:
+        JSON {"results": [...], "next": URL следующей страницы или null}
+
+    Raises:
+        400: Если параметры запроса некорректны
+    """
+    query = request.GET.get('q', '').strip()
+    if not query:
+        return JsonResponse({'error': 'Parameter q is required'}, status=400)
+
+    try:
+        fields = parse_fields(request)
+        limit = parse_int(request, 'limit', settings.CATALOG_API_PAGE_SIZE)
+        cursor = request.GET.get('cursor')
+        after = parse_cursor(cursor) if cursor else None
+    except ApiError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    except ValueError:
+        return JsonResponse({'error': 'Invalid cursor'}, status=400)
+
+    if not 1 <= limit <= settings.CATALOG_API_MAX_LIMIT:
+        return JsonResponse(
+            {
+                'error': (
+                    f'Parameter limit must be between 1 and '
+                    f'{settings.CATALOG_API_MAX_LIMIT}'
+                )
+            },
+            status=400
+        )
+
+    found = search_items(query, limit, after)
+    rows = {
+        row['id']: row
+        for row in Item.objects.filter(
+            id__in=[item_id for _, item_id in found]
+        ).values(*fields)
+    }
+    results = serialize_rows(
+        request,
+        [rows[item_id] for _, item_id in found if item_id in rows]
+    )
+
+    next_url = None
+    if len(found) == limit:
+        params = request.GET.copy()
+        params['cursor'] = format_cursor(found[-1])
+        next_url = request.build_absolute_uri(
+            f'{request.path}?{params.urlencode()}'
+        )
+
+    return etag_response(request, {'results': results, 'next': next_url})
@@ -11,3 +11,15 @@ class ItemsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'items'
     verbose_name = 'Товары'
+
+    def ready(self) -> None:
+        """
+        Загружает реестр Stripe аккаунтов, настраивает Stripe SDK
+        и подключает обработчики сигналов.
+        """
+        from . import signals  # noqa: F401
+        from .stripe_accounts import load_stripe_accounts
+        from .stripe_utils import configure_stripe
+
+        load_stripe_accounts()
+        configure_stripe()
@@ -0,0 +1,521 @@
+"""Платежные шлюзы: интерфейс оплаты, Stripe и детерминированный фейк."""
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from itertools import count
+from typing import Any, Dict
+
+import stripe
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+from .stripe_accounts import get_account
+from .stripe_utils import call_stripe, ensure_stripe_available
+
+
+class PaymentGateway:
+    """
+    Интерфейс платежного шлюза.
+
+    Views и сервисы оплаты обращаются к платежной системе только
+    через шлюз (get_gateway), поэтому его можно заменить в настройке
+    PAYMENT_GATEWAY, например детерминированным FakeGateway для
+    тестов и нагрузочных проверок без сети.
+
+    Методы принимают валюту: она определяет аккаунт платежной
+    системы. Объекты возвращаются в виде объектов Stripe SDK,
+    ошибки - в виде исключений stripe.StripeError: отказ в запросе -
+    stripe.InvalidRequestError, недоступность - StripeUnavailable.
+    """
+
+    def ensure_available(self, currency: str) -> None:
+        """
+        Проверяет, что аккаунт валюты принимает запросы.
+
+        Raises:
+            StripeUnavailable: Если аккаунт временно недоступен
+        """
+
+    def create_checkout_session(
+        self,
+        currency: str,
+        **params: Any
+    ) -> stripe.checkout.Session:
+        """
+        Создает Checkout Session.
+
+        Args:
+            currency: Валюта (одна из STRIPE_ACCOUNTS)
+            **params: Параметры checkout.Session.create
+
+        Returns:
+            Созданная Checkout Session
+        """
+        raise NotImplementedError
+
+    def retrieve_checkout_session(
+        self,
+        currency: str,
+        session_id: str
+    ) -> stripe.checkout.Session:
+        """Возвращает Checkout Session по ID."""
+        raise NotImplementedError
+
+    def expire_checkout_session(
+        self,
+        currency: str,
+        session_id: str
+    ) -> stripe.checkout.Session:
+        """Завершает открытую Checkout Session без оплаты."""
+        raise NotImplementedError
+
+    def create_payment_intent(
+        self,
+        currency: str,
+        **params: Any
+    ) -> stripe.PaymentIntent:
+        """
+        Создает PaymentIntent в валюте currency.
+
+        Args:
+            currency: Валюта (одна из STRIPE_ACCOUNTS)
+            **params: Параметры PaymentIntent.create кроме currency
+
+        Returns:
+            Созданный PaymentIntent
+        """
+        raise NotImplementedError
+
+    def modify_payment_intent(
+        self,
+        currency: str,
+        intent_id: str,
+        **params: Any
+    ) -> stripe.PaymentIntent:
+        """
+        Изменяет PaymentIntent (например, сумму).
+
+        Raises:
+            stripe.InvalidRequestError: Если intent уже оплачен
+                или отменен
+        """
+        raise NotImplementedError
+
+    def retrieve_payment_intent(
+        self,
+        currency: str,
+        intent_id: str
+    ) -> stripe.PaymentIntent:
+        """Возвращает PaymentIntent по ID."""
+        raise NotImplementedError
+
+    def cancel_payment_intent(
+        self,
+        currency: str,
+        intent_id: str
+    ) -> stripe.PaymentIntent:
+        """
+        Отменяет PaymentIntent.
+
+        Raises:
+            stripe.InvalidRequestError: Если intent уже оплачен
+                или отменен
+        """
+        raise NotImplementedError
+
+    def verify_webhook(
+        self,
+        currency: str,
+        payload: bytes,
+        signature: str
+    ) -> stripe.Event:
+        """
+        Проверяет подпись webhook и возвращает событие.
+
+        Args:
+            currency: Валюта аккаунта, отправившего событие
+            payload: Тело запроса без изменений
+            signature: Заголовок Stripe-Signature
+
+        Returns:
+            Событие
+
+        Raises:
+            stripe.SignatureVerificationError: Если подпись неверна
+                или секрет webhook аккаунта не настроен
+            ValueError: Если тело не является JSON
+        """
+        raise NotImplementedError
+
+
+class StripeGateway(PaymentGateway):
+    """
+    Шлюз Stripe (по умолчанию).
+
+    Запросы выполняются в аккаунте валюты из реестра аккаунтов через
+    предохранитель (call_stripe). Параметры валюты из реестра
+    (checkout_options) дополняют параметры Checkout Session, явно
+    переданные параметры важнее.
+    """
+
+    def ensure_available(self, currency: str) -> None:
+        ensure_stripe_available(currency)
+
+    def create_checkout_session(
+        self,
+        currency: str,
+        **params: Any
+    ) -> stripe.checkout.Session:
+        options = get_account(currency).checkout_options
+        return call_stripe(
+            currency,
+            stripe.checkout.Session.create,
+            **{**options, **params}
+        )
+
+    def retrieve_checkout_session(
+        self,
+        currency: str,
+        session_id: str
+    ) -> stripe.checkout.Session:
+        return call_stripe(
+            currency, stripe.checkout.Session.retrieve, session_id
+        )
+
+    def expire_checkout_session(
+        self,
+        currency: str,
+        session_id: str
+    ) -> stripe.checkout.Session:
+        return call_stripe(
+            currency, stripe.checkout.Session.expire, session_id
+        )
+
+    def create_payment_intent(
+        self,
+        currency: str,
+        **params: Any
+    ) -> stripe.PaymentIntent:
+        return call_stripe(
+            currency, stripe.PaymentIntent.create, currency=currency, **params
+        )
+
+    def modify_payment_intent(
+        self,
+        currency: str,
+        intent_id: str,
+        **params: Any
+    ) -> stripe.PaymentIntent:
+        return call_stripe(
+            currency, stripe.PaymentIntent.modify, intent_id, **params
+        )
+
+    def retrieve_payment_intent(
+        self,
+        currency: str,
+        intent_id: str
+    ) -> stripe.PaymentIntent:
+        return call_stripe(currency, stripe.PaymentIntent.retrieve, intent_id)
+
+    def cancel_payment_intent(
+        self,
+        currency: str,
+        intent_id: str
+    ) -> stripe.PaymentIntent:
+        return call_stripe(currency, stripe.PaymentIntent.cancel, intent_id)
+
+    def verify_webhook(
+        self,
+        currency: str,
+        payload: bytes,
+        signature: str
+    ) -> stripe.Event:
+        webhook_secret = get_account(currency).webhook_secret
+        # С пустым секретом подпись HMAC может посчитать кто угодно
+        if not webhook_secret:
+            raise stripe.SignatureVerificationError(
+                f'Секрет webhook валюты {currency!r} не настроен',
+                signature
+            )
+        # Подпись проверяется локально, запроса к Stripe нет
+        return stripe.Webhook.construct_event(
+            payload, signature, webhook_secret
+        )
+
+
+class FakeGateway(PaymentGateway):
+    """
+    Детерминированный шлюз в памяти процесса.
+
+    Не обращается к сети: объекты хранятся в памяти процесса (не
+    больше MAX_OBJECTS, старые вытесняются), ID выдаются по порядку
+    (cs_fake_000001, pi_fake_000002, ...), поэтому одинаковая
+    последовательность запросов дает одинаковые ответы. Переходы
+    статусов повторяют Stripe: оплаченный или отмененный intent
+    нельзя изменить или отменить, завершенную сессию - завершить
+    повторно. Оплату покупателя имитирует complete(), подпись
+    webhook - sign_webhook().
+
+    Подходит для тестов и нагрузочных проверок оформления оплаты
+    (см. команду benchmark_checkout), но не для работы магазина:
+    другие процессы объектов шлюза не видят.
+
+    Example:
+        PAYMENT_GATEWAY=items.gateways.FakeGateway
+    """
+
+    MAX_OBJECTS = 100_000
+    WEBHOOK_SECRET = 'whsec_fake'
+
+    def __init__(self) -> None:
+        self._objects: 'OrderedDict[str, Dict[str, Any]]' = OrderedDict()
+        self._ids = count(1)
+        self._lock = threading.RLock()
+
+    def reset(self) -> None:
+        """Удаляет все объекты и начинает нумерацию ID заново."""
+        with self._lock:
+            self._objects.clear()
+            self._ids = count(1)
+
+    def _create(self, prefix: str, values: Dict[str, Any]) -> Dict[str, Any]:
+        """Сохраняет новый объект с очередным ID (под блокировкой)."""
+        object_id = f'{prefix}_fake_{next(self._ids):06d}'
+        values = {'id': object_id, **values}
+        self._objects[object_id] = values
+        while len(self._objects) > self.MAX_OBJECTS:
+            self._objects.popitem(last=False)
+        return values
+
+    def _get(self, object_id: str, kind: str) -> Dict[str, Any]:
+        """Возвращает сохраненный объект (вызывается под блокировкой)."""
+        values = self._objects.get(object_id)
+        if values is None or values['object'] != kind:
+            raise stripe.InvalidRequestError(
+                f'No such {kind}: {object_id!r}', 'id'
+            )
+        return values
+
+    @staticmethod
+    def _metadata(params: Dict[str, Any]) -> Dict[str, str]:
+        """Приводит значения metadata к строкам, как Stripe."""
+        return {
+            key: str(value)
+            for key, value in (params.get('metadata') or {}).items()
+        }
+
+    @staticmethod
+    def _session(values: Dict[str, Any]) -> stripe.checkout.Session:
+        return stripe.checkout.Session.construct_from(dict(values), None)
+
+    @staticmethod
+    def _intent(values: Dict[str, Any]) -> stripe.PaymentIntent:
+        return stripe.PaymentIntent.construct_from(dict(values), None)
+
+    def create_checkout_session(
+        self,
+        currency: str,
+        **params: Any
+    ) -> stripe.checkout.Session:
+        account = get_account(currency)
+        params = {**account.checkout_options, **params}
+        # Сумма известна только для line_items с price_data
+        amount_total = sum(
+            line.get('price_data', {}).get('unit_amount', 0)
+            * line.get('quantity', 1)
+            for line in params.get('line_items') or []
+        )
+        with self._lock:
+            values = self._create('cs', {
+                'object': 'checkout.session',
+                'currency': account.currency,
+                'mode': params.get('mode'),
+                'status': 'open',
+                'payment_status': 'unpaid',
+                'amount_total': amount_total,
+                'payment_intent': None,
+                'metadata': self._metadata(params),
+                'success_url': params.get('success_url'),
+                'cancel_url': params.get('cancel_url'),
+            })
+            values['url'] = f'https://checkout.fake/pay/{values["id"]}'
+            return self._session(values)
+
+    def retrieve_checkout_session(
+        self,
+        currency: str,
+        session_id: str
+    ) -> stripe.checkout.Session:
+        with self._lock:
+            return self._session(self._get(session_id, 'checkout.session'))
+
+    def expire_checkout_session(
+        self,
+        currency: str,
+        session_id: str
+    ) -> stripe.checkout.Session:
+        with self._lock:
+            values = self._get(session_id, 'checkout.session')
+            if values['status'] != 'open':
+                raise stripe.InvalidRequestError(
+                    f'Only open sessions can be expired: {session_id!r}',
+                    'id'
+                )
+            values['status'] = 'expired'
+            return self._session(values)
+
+    def create_payment_intent(
+        self,
+        currency: str,
+        **params: Any
+    ) -> stripe.PaymentIntent:
+        account = get_account(currency)
+        with self._lock:
+            values = self._create('pi', {
+                'object': 'payment_intent',
+                'amount': params.get('amount', 0),
+                'amount_received': 0,
+                'currency': account.currency,
+                'status': 'requires_payment_method',
+                'metadata': self._metadata(params),
+            })
+            values['client_secret'] = f'{values["id"]}_secret_fake'
+            return self._intent(values)
+
+    def _change_intent(
+        self,
+        intent_id: str,
+        changes: Dict[str, Any]
+    ) -> stripe.PaymentIntent:
+        """Изменяет intent, который еще можно изменить."""
+        with self._lock:
+            values = self._get(intent_id, 'payment_intent')
+            if values['status'] in ('succeeded', 'canceled'):
+                raise stripe.InvalidRequestError(
+                    f'PaymentIntent {intent_id!r} has status '
+                    f'{values["status"]}',
+                    'id'
+                )
+            values.update(changes)
+            return self._intent(values)
+
+    def modify_payment_intent(
+        self,
+        currency: str,
+        intent_id: str,
+        **params: Any
+    ) -> stripe.PaymentIntent:
+        if 'metadata' in params:
+            params['metadata'] = self._metadata(params)
+        return self._change_intent(intent_id, params)
+
+    def retrieve_payment_intent(
+        self,
+        currency: str,
+        intent_id: str
+    ) -> stripe.PaymentIntent:
+        with self._lock:
+            return self._intent(self._get(intent_id, 'payment_intent'))
+
+    def cancel_payment_intent(
+        self,
+        currency: str,
+        intent_id: str
+    ) -> stripe.PaymentIntent:
+        return self._change_intent(intent_id, {'status': 'canceled'})
+
+    def complete(self, object_id: str) -> Dict[str, Any]:
+        """
+        Имитирует успешную оплату Checkout Session или PaymentIntent.
+
+        Args:
+            object_id: ID Checkout Session или PaymentIntent
+
+        Returns:
+            Данные объекта после оплаты
+
+        Raises:
+            stripe.InvalidRequestError: Если объект не найден
+                или уже не ожидает оплаты
+        """
+        with self._lock:
+            if not object_id.startswith('cs_'):
+                intent = self._change_intent(
+                    object_id, {'status': 'succeeded'}
+                )
+                values = self._objects[object_id]
+                values['amount_received'] = intent.amount
+                return dict(values)
+
+            values = self._get(object_id, 'checkout.session')
+            if values['status'] != 'open':
+                raise stripe.InvalidRequestError(
+                    f'Session {object_id!r} is {values["status"]}', 'id'
+                )
+            intent = self._create('pi', {
+                'object': 'payment_intent',
+                'amount': values['amount_total'],
+                'amount_received': values['amount_total'],
+                'currency': values['currency'],
+                'status': 'succeeded',
+                'metadata': dict(values['metadata']),
+            })
+            values.update(
+                status='complete',
+                payment_status='paid',
+                payment_intent=intent['id']
+            )
+            return dict(values)
+
+    def sign_webhook(self, payload: bytes, timestamp: int) -> str:
+        """
+        Возвращает заголовок Stripe-Signature для тела webhook.
+
+        Args:
+            payload: Тело запроса
+            timestamp: Время подписи (Unix time)
+
+        Returns:
+            Значение заголовка Stripe-Signature
+        """
+        signed = f'{timestamp}.{payload.decode()}'
+        signature = stripe.WebhookSignature._compute_signature(
+            signed, self.WEBHOOK_SECRET
+        )
+        return f't={timestamp},v1={signature}'
+
+    def verify_webhook(
+        self,
+        currency: str,
+        payload: bytes,
+        signature: str
+    ) -> stripe.Event:
+        get_account(currency)
+        return stripe.Webhook.construct_event(
+            payload, signature, self.WEBHOOK_SECRET
+        )
+
+
+@lru_cache(maxsize=None)
+def get_gateway() -> PaymentGateway:
+    """
+    Возвращает платежный шлюз из настройки PAYMENT_GATEWAY.
+
+    Шлюз создается один раз на процесс и общий для всех потоков.
+
+    Returns:
+        Экземпляр класса PAYMENT_GATEWAY
+
+    Example:
+        >>> session = get_gateway().create_checkout_session('usd', ...)
+    """
+    return import_string(settings.PAYMENT_GATEWAY)()
+
+
+@receiver(setting_changed)
+def _reset_gateway(setting: str, **kwargs: Any) -> None:
+    """Пересоздает шлюз при изменении PAYMENT_GATEWAY (override_settings)."""
+    if setting == 'PAYMENT_GATEWAY':
+        get_gateway.cache_clear()
@@ -0,0 +1,147 @@
+"""Management-команда для нагрузочной проверки оформления оплаты."""
+import statistics
+import threading
+import time
+from collections import Counter
+from itertools import count
+from typing import Any, List, Set
+
+from django.conf import settings
+from django.core.management.base import (
+    BaseCommand,
+    CommandError,
+    CommandParser
+)
+from django.db import connection
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from items.gateways import FakeGateway, get_gateway
+from items.models import Item, StockReservation
+from items.stock import add_stock
+
+
+class Command(BaseCommand):
+    """
+    Нагружает покупку товара через Checkout Session без сети.
+
+    Подключает детерминированный шлюз FakeGateway (см. настройку
+    PAYMENT_GATEWAY), создает временный товар и выполняет --requests
+    запросов buy_item из --threads потоков через тестовый клиент
+    Django: middleware, сессия покупателя, кэш товара, резерв остатка
+    (с --stock) и создание сессии в шлюзе работают так же, как
+    в магазине. Выводит пропускную способность и задержки, затем
+    проверяет, что ID сессий не повторяются и каждый резерв связан
+    с сессией. Товар и его резервы удаляются после проверки.
+
+    Example:
+        python manage.py benchmark_checkout --threads 8
+        python manage.py benchmark_checkout --stock 100000
+    """
+
+    help = 'Нагрузочная проверка оформления оплаты с фейковым шлюзом'
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--requests', type=int, default=5000)
+        parser.add_argument(
+            '--stock',
+            type=int,
+            help='Учитывать остаток товара (по умолчанию без остатка)'
+        )
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        with override_settings(
+            PAYMENT_GATEWAY='items.gateways.FakeGateway',
+            ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']
+        ):
+            gateway = get_gateway()
+            assert isinstance(gateway, FakeGateway)
+            gateway.reset()
+
+            item = Item.objects.bulk_create([Item(
+                name='benchmark_checkout',
+                description='',
+                price=100
+            )])[0]
+            try:
+                if options['stock']:
+                    add_stock(item.id, options['stock'])
+                self._run(item, options)
+            finally:
+                item.delete()
+
+    def _run(self, item: Item, options: Any) -> None:
+        """Выполняет нагрузку и выводит результаты."""
+        url = reverse('items:buy_item', args=[item.id])
+        attempts = count()
+        latencies: List[float] = []
+        statuses: Counter = Counter()
+        session_ids: Set[str] = set()
+        lock = threading.Lock()
+
+        def worker() -> None:
+            client = Client()
+            try:
+                while next(attempts) < options['requests']:
+                    started = time.perf_counter()
+                    response = client.get(url)
+                    elapsed = time.perf_counter() - started
+                    with lock:
+                        statuses[response.status_code] += 1
+                        latencies.append(elapsed)
+                        if response.status_code == 200:
+                            session_ids.add(response.json()['id'])
+            finally:
+                connection.close()
+
+        threads = [
+            threading.Thread(target=worker)
+            for _ in range(options['threads'])
+        ]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        latencies.sort()
+
+        def percentile(share: float) -> float:
+            index = min(len(latencies) - 1, int(len(latencies) * share))
+            return latencies[index] * 1000
+
+        self.stdout.write(
+            f'{connection.vendor}: потоков {options["threads"]}, '
+            f'остаток {options["stock"] or "не учитывается"}\n'
+            f'Запросов: {len(latencies)} за {elapsed:.2f} с '
+            f'({len(latencies) / elapsed:.0f} в секунду)\n'
+            'Ответы: ' + ', '.join(
+                f'{status}: {number}'
+                for status, number in sorted(statuses.items())
+            ) + '\n'
+            f'Задержка, мс: p50 {percentile(0.5):.1f}, '
+            f'p95 {percentile(0.95):.1f}, p99 {percentile(0.99):.1f}, '
+            f'среднее {statistics.mean(latencies) * 1000:.1f}'
+        )
+
+        if len(session_ids) != statuses[200]:
+            raise CommandError(
+                f'ID сессий повторяются: {len(session_ids)} уникальных '
+                f'на {statuses[200]} ответов'
+            )
+        if options['stock']:
+            references = set(
+                StockReservation.objects
+                .filter(item=item)
+                .values_list('reference', flat=True)
+            )
+            if references != session_ids:
+                raise CommandError(
+                    f'Резервы не сошлись с сессиями: резервов '
+                    f'{len(references)}, сессий {len(session_ids)}'
+                )
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано сессий: {len(session_ids)}, ID не повторяются'
+        ))
@@ -0,0 +1,146 @@
+"""Management-команда для нагрузочной проверки резервирования товара."""
+import statistics
+import threading
+import time
+from itertools import count
+from typing import Any, List
+
+from django.core.management.base import (
+    BaseCommand,
+    CommandError,
+    CommandParser
+)
+from django.db import DatabaseError, connection
+from django.test import override_settings
+
+from items.models import Item, StockReservation
+from items.stock import OutOfStock, add_stock, get_available, reserve_stock
+
+
+class Command(BaseCommand):
+    """
+    Проверяет резервирование одного товара под конкурентной нагрузкой.
+
+    Создает временный товар с остатком --stock, разделенным на
+    --slots слотов, и резервирует его из --threads потоков (у каждого
+    свое соединение с БД), пока не будет сделано --requests попыток.
+    Выводит пропускную способность и задержки резервирования, затем
+    проверяет, что продано не больше остатка и остаток сошелся.
+    Товар и его резервы удаляются после проверки.
+
+    Сравнение с одной строкой остатка показывает, сколько дает
+    разделение на слоты:
+
+    Example:
+        python manage.py benchmark_stock --slots 1 --threads 64
+        python manage.py benchmark_stock --slots 16 --threads 64
+    """
+
+    help = 'Нагрузочная проверка резервирования товара'
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument('--stock', type=int, default=1000)
+        parser.add_argument('--slots', type=int, default=8)
+        parser.add_argument('--threads', type=int, default=32)
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=2000,
+            help='Общее количество попыток резервирования'
+        )
+        parser.add_argument(
+            '--quantity',
+            type=int,
+            default=1,
+            help='Количество товара в одном резерве'
+        )
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        item = Item.objects.bulk_create([Item(
+            name='benchmark_stock',
+            description='',
+            price=100
+        )])[0]
+        try:
+            with override_settings(STOCK_SLOTS=options['slots']):
+                add_stock(item.id, options['stock'])
+            self._run(item, options)
+        finally:
+            item.delete()
+
+    def _run(self, item: Item, options: Any) -> None:
+        """Выполняет нагрузку и выводит результаты."""
+        attempts = count()
+        latencies: List[float] = []
+        results = {'reserved': 0, 'out_of_stock': 0, 'errors': 0}
+        lock = threading.Lock()
+
+        def worker() -> None:
+            try:
+                while next(attempts) < options['requests']:
+                    started = time.perf_counter()
+                    try:
+                        reserve_stock(
+                            {item.id: options['quantity']},
+                            'benchmark'
+                        )
+                        result = 'reserved'
+                    except OutOfStock:
+                        result = 'out_of_stock'
+                    except DatabaseError:
+                        result = 'errors'
+                    elapsed = time.perf_counter() - started
+                    with lock:
+                        results[result] += 1
+                        latencies.append(elapsed)
+            finally:
+                connection.close()
+
+        threads = [
+            threading.Thread(target=worker)
+            for _ in range(options['threads'])
+        ]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        latencies.sort()
+
+        def percentile(share: float) -> float:
+            index = min(len(latencies) - 1, int(len(latencies) * share))
+            return latencies[index] * 1000
+
+        self.stdout.write(
+            f'{connection.vendor}: потоков {options["threads"]}, '
+            f'слотов {options["slots"]}, остаток {options["stock"]}\n'
+            f'Попыток: {len(latencies)} за {elapsed:.2f} с '
+            f'({len(latencies) / elapsed:.0f} в секунду)\n'
+            f'Зарезервировано: {results["reserved"]}, '
+            f'нет в наличии: {results["out_of_stock"]}, '
+            f'ошибок БД: {results["errors"]}\n'
+            f'Задержка, мс: p50 {percentile(0.5):.1f}, '
+            f'p95 {percentile(0.95):.1f}, p99 {percentile(0.99):.1f}, '
+            f'среднее {statistics.mean(latencies) * 1000:.1f}'
+        )
+
+        remaining = get_available([item.id])[item.id]
+        reserved = sum(
+            StockReservation.objects
+            .filter(item=item)
+            .values_list('quantity', flat=True)
+        )
+        if (
+            reserved != results['reserved'] * options['quantity']
+            or reserved + remaining != options['stock']
+        ):
+            raise CommandError(
+                f'Остаток не сошелся: зарезервировано {reserved}, '
+                f'осталось {remaining}'
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'Остаток сошелся: зарезервировано {reserved}, '
+            f'осталось {remaining}'
+        ))
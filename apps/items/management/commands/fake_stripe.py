@@ -0,0 +1,285 @@
+"""Management-команда с локальным имитатором Stripe API."""
+import json
+import re
+import secrets
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Tuple
+from urllib.parse import parse_qsl, urlparse
+
+from django.core.management.base import BaseCommand, CommandParser
+
+# Префикс ID и тип объекта для поддерживаемых ресурсов
+RESOURCES = {
+    'checkout/sessions': ('cs_test', 'checkout.session'),
+    'payment_intents': ('pi_test', 'payment_intent'),
+    'products': ('prod_test', 'product'),
+    'prices': ('price_test', 'price'),
+}
+PATH_RE = re.compile(
+    r'^/v1/(?P<resource>checkout/sessions|payment_intents|products|prices)'
+    r'(?:/(?P<id>[^/]+))?(?:/(?P<action>cancel|expire))?/?$'
+)
+
+
+def parse_form(body: str) -> Dict[str, Any]:
+    """
+    Разбирает form-encoded параметры Stripe SDK во вложенный словарь.
+
+    Ключи вида metadata[item_id] превращаются во вложенные словари,
+    индексы списков остаются строковыми ключами.
+    """
+    params: Dict[str, Any] = {}
+    for key, value in parse_qsl(body, keep_blank_values=True):
+        parts = re.findall(r'[^\[\]]+', key)
+        target = params
+        for part in parts[:-1]:
+            target = target.setdefault(part, {})
+        target[parts[-1]] = value
+    return params
+
+
+class FakeStripe:
+    """
+    Хранилище объектов и режим работы имитатора.
+
+    Объекты хранятся отдельно для каждого секретного ключа, как в
+    разных Stripe аккаунтах.
+    """
+
+    def __init__(self, stall: float, status: int) -> None:
+        self.stall = stall
+        self.status = status
+        self.accounts: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self.lock = threading.Lock()
+
+    def handle(
+        self,
+        method: str,
+        path: str,
+        params: Dict[str, Any],
+        api_key: str = ''
+    ) -> Tuple[int, Dict[str, Any]]:
+        """Выполняет запрос к API и возвращает (HTTP статус, тело)."""
+        match = PATH_RE.match(path)
+        if not match:
+            return 404, self.error('invalid_request_error', 'Unknown path')
+
+        resource, object_id, action = match.group('resource', 'id', 'action')
+        prefix, object_type = RESOURCES[resource]
+
+        with self.lock:
+            objects = self.accounts.setdefault(api_key, {})
+            if object_id is None and method == 'GET':
+                return 200, self.list(objects, resource, object_type, params)
+
+            if object_id is None:
+                object_id = f'{prefix}_{secrets.token_hex(12)}'
+                obj = {
+                    'id': object_id,
+                    'object': object_type,
+                    'created': int(time.time()),
+                    'livemode': False,
+                    'metadata': {},
+                    **params,
+                }
+                if object_type == 'payment_intent':
+                    obj['client_secret'] = (
+                        f'{object_id}_secret_{secrets.token_hex(8)}'
+                    )
+                    obj['status'] = 'requires_payment_method'
+                if object_type == 'checkout.session':
+                    obj['status'] = 'open'
+                    obj['payment_status'] = 'unpaid'
+                    obj['url'] = f'https://checkout.invalid/{object_id}'
+                objects[object_id] = obj
+                return 200, obj
+
+            obj = objects.get(object_id)
+            if obj is None or obj['object'] != object_type:
+                return 404, self.error(
+                    'invalid_request_error',
+                    f'No such {object_type}: {object_id}'
+                )
+
+            if action in ('cancel', 'expire'):
+                if obj.get('status') in ('succeeded', 'canceled', 'expired'):
+                    return 400, self.error(
+                        'invalid_request_error',
+                        f'{object_type} has status {obj["status"]}'
+                    )
+                obj['status'] = 'canceled' if action == 'cancel' else 'expired'
+            elif method == 'POST':
+                obj.update(params)
+            return 200, obj
+
+    @staticmethod
+    def list(
+        objects: Dict[str, Dict[str, Any]],
+        resource: str,
+        object_type: str,
+        params: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """
+        Возвращает страницу списка объектов, как Stripe.
+
+        Объекты упорядочены от новых к старым. Поддерживаются limit,
+        starting_after, ending_before и фильтр created[gt|gte|lt|lte].
+        """
+        data = [
+            obj for obj in reversed(list(objects.values()))
+            if obj['object'] == object_type
+        ]
+        created = params.get('created', {})
+        for op, check in (
+            ('gt', lambda a, b: a > b),
+            ('gte', lambda a, b: a >= b),
+            ('lt', lambda a, b: a < b),
+            ('lte', lambda a, b: a <= b),
+        ):
+            if op in created:
+                data = [
+                    obj for obj in data
+                    if check(int(obj['created']), int(created[op]))
+                ]
+
+        limit = min(int(params.get('limit', 10)), 100)
+        ids = [obj['id'] for obj in data]
+        has_more = len(data) > limit
+        if params.get('ending_before') in ids:
+            # Страница перед курсором: ближайшие к нему более новые объекты
+            data = data[:ids.index(params['ending_before'])]
+            has_more = len(data) > limit
+            data = data[-limit:]
+        else:
+            if params.get('starting_after') in ids:
+                data = data[ids.index(params['starting_after']) + 1:]
+                has_more = len(data) > limit
+            data = data[:limit]
+
+        return {
+            'object': 'list',
+            'url': f'/v1/{resource}',
+            'has_more': has_more,
+            'data': data,
+        }
+
+    @staticmethod
+    def error(error_type: str, message: str) -> Dict[str, Any]:
+        return {'error': {'type': error_type, 'message': message}}
+
+
+def make_handler(fake: FakeStripe) -> type:
+    """Создает класс обработчика HTTP запросов для имитатора."""
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def _read_params(self) -> Dict[str, Any]:
+            length = int(self.headers.get('Content-Length') or 0)
+            body = self.rfile.read(length).decode() if length else ''
+            query = urlparse(self.path).query
+            return parse_form('&'.join(part for part in (query, body) if part))
+
+        def _send(self, status: int, payload: Dict[str, Any]) -> None:
+            content = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(content)))
+            self.send_header('Request-Id', f'req_{secrets.token_hex(8)}')
+            self.end_headers()
+            self.wfile.write(content)
+
+        def _dispatch(self, method: str) -> None:
+            path = urlparse(self.path).path
+            params = self._read_params()
+
+            if path == '/_fake/config':
+                if method == 'POST':
+                    if 'stall' in params:
+                        fake.stall = float(params['stall'])
+                    if 'status' in params:
+                        fake.status = int(params['status'])
+                self._send(200, {'stall': fake.stall, 'status': fake.status})
+                return
+
+            if fake.stall:
+                time.sleep(fake.stall)
+
+            if fake.status >= 400:
+                self._send(fake.status, fake.error(
+                    'api_error', f'Fake outage (HTTP {fake.status})'
+                ))
+                return
+
+            api_key = self.headers.get('Authorization', '')
+            self._send(*fake.handle(
+                method, path, params, api_key.removeprefix('Bearer ')
+            ))
+
+        def do_GET(self) -> None:
+            self._dispatch('GET')
+
+        def do_POST(self) -> None:
+            self._dispatch('POST')
+
+        def do_DELETE(self) -> None:
+            self._dispatch('DELETE')
+
+        def log_message(self, format: str, *args: Any) -> None:
+            pass
+
+    return Handler
+
+
+class Command(BaseCommand):
+    """
+    Запускает локальный имитатор Stripe API для разработки и проверки.
+
+    Поддерживает Checkout Session, PaymentIntent, Product и Price
+    (создание, получение, изменение, отмена и списки с пагинацией).
+    Объекты разных секретных ключей не пересекаются. Имитатор можно
+    «сломать»: --stall задерживает каждый ответ, --status заставляет
+    отвечать ошибкой. Режим меняется и на ходу:
+    POST /_fake/config с параметрами stall и status.
+
+    Example:
+        python manage.py fake_stripe --port 12111 --stall 10
+        STRIPE_API_BASE=http://127.0.0.1:12111 python manage.py runserver
+    """
+
+    help = 'Локальный имитатор Stripe API'
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=12111)
+        parser.add_argument(
+            '--stall',
+            type=float,
+            default=0.0,
+            help='Задержка каждого ответа в секундах'
+        )
+        parser.add_argument(
+            '--status',
+            type=int,
+            default=200,
+            help='HTTP статус ошибки для всех запросов (например, 500)'
+        )
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        fake = FakeStripe(options['stall'], options['status'])
+        server = ThreadingHTTPServer(
+            (options['host'], options['port']),
+            make_handler(fake)
+        )
+        server.daemon_threads = True
+        self.stdout.write(
+            f'Имитатор Stripe: http://{options["host"]}:{options["port"]}'
+        )
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
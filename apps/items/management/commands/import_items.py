@@ -0,0 +1,345 @@
+"""Management-команда для массового импорта каталога товаров."""
+import csv
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from itertools import islice
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import urlparse
+
+import requests
+from django.core.files import File
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management.base import (
+    BaseCommand,
+    CommandError,
+    CommandParser
+)
+from django.db import transaction
+
+from abstracts.cache import publish
+from items.models import Item
+from items.stripe_accounts import get_currencies, get_default_currency
+
+UPDATE_FIELDS = (
+    'name',
+    'description',
+    'price',
+    'currency',
+    'datetime_updated'
+)
+
+
+def read_rows(path: Path, fmt: str) -> Iterator[Dict[str, Any]]:
+    """
+    Построчно читает файл каталога, не загружая его в память целиком.
+
+    Args:
+        path: Путь к файлу CSV или JSONL
+        fmt: Формат файла ('csv' или 'jsonl')
+
+    Yields:
+        Словарь с полями очередной строки
+    """
+    with open(path, newline='', encoding='utf-8') as f:
+        if fmt == 'csv':
+            yield from csv.DictReader(f)
+            return
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+def build_item(row: Dict[str, Any]) -> Item:
+    """
+    Создает несохраненный объект Item из строки каталога.
+
+    Args:
+        row: Строка каталога (sku, name, description, price, currency)
+
+    Returns:
+        Объект Item, готовый для bulk_create
+
+    Raises:
+        ValueError: Если строка не содержит обязательных полей
+    """
+    sku = str(row.get('sku') or '').strip()
+    if not sku:
+        raise ValueError('не указан sku')
+
+    currency = str(row.get('currency') or get_default_currency()).lower()
+    if currency not in get_currencies():
+        raise ValueError(f'неизвестная валюта {currency!r}')
+
+    return Item(
+        sku=sku,
+        name=str(row.get('name') or '').strip(),
+        description=str(row.get('description') or ''),
+        price=int(row['price']),
+        currency=currency,
+    )
+
+
+def fetch_image(source: str, base_dir: Path, timeout: float) -> str:
+    """
+    Скачивает или копирует изображение товара в хранилище медиа файлов.
+
+    Имя файла вычисляется из хеша источника, поэтому повторный импорт
+    того же каталога не скачивает изображения заново.
+
+    Args:
+        source: URL (http/https) или путь к локальному файлу
+        base_dir: Каталог, относительно которого ищутся локальные файлы
+        timeout: Таймаут HTTP запроса в секундах
+
+    Returns:
+        Имя файла в хранилище
+    """
+    suffix = Path(urlparse(source).path).suffix.lower() or '.jpg'
+    digest = hashlib.sha1(source.encode()).hexdigest()
+    name = f'{Item.image.field.upload_to}{digest}{suffix}'
+
+    if default_storage.exists(name):
+        return name
+
+    if source.startswith(('http://', 'https://')):
+        response = requests.get(source, timeout=timeout)
+        response.raise_for_status()
+        return default_storage.save(name, ContentFile(response.content))
+
+    with open(base_dir / source, 'rb') as f:
+        return default_storage.save(name, File(f))
+
+
+class Command(BaseCommand):
+    """
+    Импортирует товары из CSV/JSONL файла пакетами.
+
+    Файл читается потоково, товары обновляются или создаются по sku
+    через bulk_create(update_conflicts=True), изображения загружаются
+    параллельно в пуле потоков. После каждого пакета позиция
+    сохраняется в checkpoint-файл, что позволяет продолжить
+    прерванный импорт.
+
+    Example:
+        python manage.py import_items catalog.jsonl --checkpoint .import
+    """
+
+    help = 'Массовый импорт товаров из CSV/JSONL файла'
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument('path', type=Path, help='Файл каталога')
+        parser.add_argument(
+            '--format',
+            choices=('csv', 'jsonl'),
+            help='Формат файла (по умолчанию определяется по расширению)'
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=8,
+            help='Количество потоков для загрузки изображений'
+        )
+        parser.add_argument(
+            '--image-timeout',
+            type=float,
+            default=10.0,
+            help='Таймаут загрузки одного изображения в секундах'
+        )
+        parser.add_argument(
+            '--checkpoint',
+            type=Path,
+            help='Файл для сохранения позиции импорта'
+        )
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        path: Path = options['path']
+        if not path.is_file():
+            raise CommandError(f'Файл {path} не найден')
+
+        fmt = options['format'] or (
+            'csv' if path.suffix.lower() == '.csv' else 'jsonl'
+        )
+        batch_size = options['batch_size']
+        checkpoint: Optional[Path] = options['checkpoint']
+
+        offset = self._load_checkpoint(checkpoint, path)
+        if offset:
+            self.stdout.write(f'Продолжение импорта со строки {offset}')
+
+        rows = islice(read_rows(path, fmt), offset, None)
+        processed = offset
+        imported = skipped = 0
+        started = time.monotonic()
+
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            while True:
+                batch = list(islice(rows, batch_size))
+                if not batch:
+                    break
+
+                items, images, errors = self._prepare_batch(
+                    batch, processed
+                )
+                for error in errors:
+                    self.stderr.write(error)
+                skipped += len(errors)
+
+                self._attach_images(
+                    pool, items, images, path.parent, options['image_timeout']
+                )
+                self._upsert(items)
+
+                imported += len(items)
+                processed += len(batch)
+                self._save_checkpoint(checkpoint, path, processed)
+
+                elapsed = max(time.monotonic() - started, 1e-6)
+                rate = (processed - offset) / elapsed
+                self.stdout.write(
+                    f'Обработано {processed} строк ({rate:.0f} строк/с)'
+                )
+
+        if checkpoint and checkpoint.exists():
+            checkpoint.unlink()
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Импортировано {imported}, пропущено {skipped} '
+            f'за {elapsed:.1f} с'
+        ))
+
+    def _prepare_batch(
+        self,
+        batch: List[Dict[str, Any]],
+        start: int
+    ) -> Tuple[Dict[str, Item], Dict[str, str], List[str]]:
+        """
+        Преобразует строки пакета в объекты Item.
+
+        Дубликаты sku внутри пакета схлопываются (побеждает последняя
+        строка), так как PostgreSQL не позволяет обновить одну и ту же
+        строку дважды в одном INSERT ... ON CONFLICT.
+
+        Args:
+            batch: Строки пакета
+            start: Номер первой строки пакета в файле
+
+        Returns:
+            Кортеж (товары по sku, источники изображений по sku, ошибки)
+        """
+        items: Dict[str, Item] = {}
+        images: Dict[str, str] = {}
+        errors: List[str] = []
+
+        for number, row in enumerate(batch, start=start + 1):
+            try:
+                item = build_item(row)
+            except (KeyError, TypeError, ValueError) as e:
+                errors.append(f'Строка {number} пропущена: {e}')
+                continue
+
+            items[item.sku] = item
+            image = str(row.get('image') or '').strip()
+            if image:
+                images[item.sku] = image
+            else:
+                images.pop(item.sku, None)
+
+        return items, images, errors
+
+    def _attach_images(
+        self,
+        pool: ThreadPoolExecutor,
+        items: Dict[str, Item],
+        images: Dict[str, str],
+        base_dir: Path,
+        timeout: float
+    ) -> None:
+        """
+        Параллельно загружает изображения пакета и привязывает их к товарам.
+
+        Товары, изображение которых загрузить не удалось, импортируются
+        без изменения текущего изображения.
+        """
+        futures: Dict[str, Future] = {}
+        for source in set(images.values()):
+            futures[source] = pool.submit(
+                fetch_image, source, base_dir, timeout
+            )
+
+        for sku, source in images.items():
+            try:
+                items[sku].image = futures[source].result()
+            except (OSError, requests.RequestException) as e:
+                self.stderr.write(
+                    f'Изображение {source} для {sku} не загружено: {e}'
+                )
+
+    def _upsert(self, items: Dict[str, Item]) -> None:
+        """
+        Создает или обновляет товары пакета одной транзакцией.
+
+        Товары с изображением и без него записываются отдельными
+        запросами, чтобы строка без изображения не затирала уже
+        загруженное ранее изображение.
+        """
+        with_image = [item for item in items.values() if item.image]
+        without_image = [item for item in items.values() if not item.image]
+
+        with transaction.atomic():
+            if with_image:
+                Item.objects.bulk_create(
+                    with_image,
+                    update_conflicts=True,
+                    unique_fields=['sku'],
+                    update_fields=[*UPDATE_FIELDS, 'image'],
+                )
+            if without_image:
+                Item.objects.bulk_create(
+                    without_image,
+                    update_conflicts=True,
+                    unique_fields=['sku'],
+                    update_fields=list(UPDATE_FIELDS),
+                )
+            # bulk_create не вызывает сигналы: кэши товаров в памяти
+            # процессов сбрасываются явно
+            publish('items.Item', Item.objects.filter(
+                sku__in=list(items)
+            ).values_list('id', flat=True))
+
+    def _load_checkpoint(self, checkpoint: Optional[Path], path: Path) -> int:
+        """Возвращает количество уже обработанных строк файла."""
+        if not checkpoint or not checkpoint.exists():
+            return 0
+
+        state = json.loads(checkpoint.read_text())
+        if state.get('source') != str(path.resolve()):
+            raise CommandError(
+                f'Checkpoint {checkpoint} относится к другому файлу: '
+                f'{state.get("source")}'
+            )
+        return int(state['rows'])
+
+    def _save_checkpoint(
+        self,
+        checkpoint: Optional[Path],
+        path: Path,
+        rows: int
+    ) -> None:
+        """Атомарно сохраняет количество обработанных строк файла."""
+        if not checkpoint:
+            return
+
+        tmp = checkpoint.with_name(checkpoint.name + '.tmp')
+        tmp.write_text(json.dumps({
+            'source': str(path.resolve()),
+            'rows': rows,
+        }))
+        os.replace(tmp, checkpoint)
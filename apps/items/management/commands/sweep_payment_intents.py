@@ -0,0 +1,125 @@
+"""Management-команда для отмены неиспользуемых Payment Intent."""
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from typing import Any, Tuple, Union
+
+import stripe
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandParser
+from django.db import transaction
+from django.utils import timezone
+
+from items.models import ItemPaymentIntent
+from items.tasks import cancel_payment_intent
+
+
+class Command(BaseCommand):
+    """
+    Отменяет Payment Intent, которые давно не использовались.
+
+    Intent сохраняются для пары (сессия, товар) при открытии страницы
+    оплаты. Если покупатель не вернулся к оплате за --hours часов,
+    intent отменяется в Stripe и удаляется из базы. Записи пакета
+    блокируются (занятые запросами покупателей пропускаются), запросы
+    к Stripe выполняются параллельно. С опцией --interval команда
+    работает как фоновый процесс.
+
+    Example:
+        python manage.py sweep_payment_intents --hours 24 --interval 600
+    """
+
+    help = 'Отмена неиспользуемых Payment Intent'
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument(
+            '--hours',
+            type=float,
+            default=settings.PAYMENT_INTENT_TTL_HOURS,
+            help='Отменять intent, не использовавшиеся N часов'
+        )
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=8,
+            help='Количество параллельных запросов к Stripe'
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            help='Повторять очистку каждые N секунд'
+        )
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            while True:
+                canceled, removed = self._sweep(pool, options)
+                self.stdout.write(
+                    f'Отменено intent: {canceled}, удалено записей: {removed}'
+                )
+
+                if not options['interval']:
+                    break
+                time.sleep(options['interval'])
+
+    def _sweep(
+        self,
+        pool: ThreadPoolExecutor,
+        options: Any
+    ) -> Tuple[int, int]:
+        """
+        Отменяет все устаревшие intent пакетами.
+
+        Записи, intent которых не удалось отменить из-за ошибки Stripe
+        (например, сетевой), остаются до следующего запуска.
+
+        Returns:
+            Кортеж (отменено в Stripe, удалено записей)
+        """
+        cutoff = timezone.now() - timedelta(hours=options['hours'])
+        canceled = removed = 0
+
+        while True:
+            with transaction.atomic():
+                records = list(
+                    ItemPaymentIntent.objects
+                    .select_for_update(skip_locked=True)
+                    .filter(datetime_updated__lt=cutoff)
+                    .order_by('id')[:options['batch_size']]
+                )
+                if not records:
+                    break
+
+                failed = []
+                for record, result in zip(
+                    records, pool.map(self._cancel, records)
+                ):
+                    if isinstance(result, stripe.StripeError):
+                        failed.append(record.id)
+                        self.stderr.write(
+                            f'Intent {record.intent_id} не отменен: {result}'
+                        )
+                    elif result:
+                        canceled += 1
+
+                removed += ItemPaymentIntent.objects.filter(
+                    id__in=[record.id for record in records]
+                ).exclude(id__in=failed).delete()[0]
+
+            if failed:
+                break
+
+        return canceled, removed
+
+    @staticmethod
+    def _cancel(
+        record: ItemPaymentIntent
+    ) -> Union[bool, stripe.StripeError]:
+        """Отменяет intent записи, ошибка Stripe возвращается как результат."""
+        if not record.intent_id:
+            return False
+        try:
+            return cancel_payment_intent(record.currency, record.intent_id)
+        except stripe.StripeError as e:
+            return e
@@ -0,0 +1,134 @@
+"""Management-команда для освобождения просроченных резервов товаров."""
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from typing import Any, Dict, List, Tuple, Union
+
+import stripe
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandParser
+from django.db import transaction
+from django.utils import timezone
+
+from items.models import StockReservation
+from items.stock import PAID, PENDING, check_payment, release_reservations
+
+
+class Command(BaseCommand):
+    """
+    Обрабатывает просроченные резервы товаров.
+
+    Для каждого объекта оплаты (Checkout Session или PaymentIntent)
+    просроченных резервов проверяется статус в Stripe: если оплата
+    прошла, резервы удаляются (товар продан); если платеж еще
+    обрабатывается, резервы продлеваются; иначе объект оплаты
+    отменяется в Stripe, а количество возвращается в остаток.
+    Резервы без объекта оплаты (Stripe не ответил при оформлении)
+    освобождаются сразу. Записи пакета блокируются (занятые другим
+    процессом пропускаются), запросы к Stripe выполняются
+    параллельно. С опцией --interval команда работает как фоновый
+    процесс.
+
+    Example:
+        python manage.py sweep_reservations --interval 60
+    """
+
+    help = 'Освобождение просроченных резервов товаров'
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=8,
+            help='Количество параллельных запросов к Stripe'
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            help='Повторять очистку каждые N секунд'
+        )
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            while True:
+                sold, released = self._sweep(pool, options['batch_size'])
+                self.stdout.write(
+                    f'Продано резервов: {sold}, освобождено: {released}'
+                )
+
+                if not options['interval']:
+                    break
+                time.sleep(options['interval'])
+
+    def _sweep(
+        self,
+        pool: ThreadPoolExecutor,
+        batch_size: int
+    ) -> Tuple[int, int]:
+        """
+        Обрабатывает все просроченные резервы пакетами.
+
+        Резервы, оплату которых не удалось проверить из-за ошибки
+        Stripe, остаются до следующего запуска.
+
+        Returns:
+            Кортеж (продано резервов, освобождено резервов)
+        """
+        sold = released = 0
+
+        while True:
+            with transaction.atomic():
+                reservations = list(
+                    StockReservation.objects
+                    .select_for_update(skip_locked=True)
+                    .filter(expires_at__lte=timezone.now())
+                    .order_by('expires_at')[:batch_size]
+                )
+                if not reservations:
+                    break
+
+                groups: Dict[Tuple[str, str], List[StockReservation]] = {}
+                for reservation in reservations:
+                    groups.setdefault(
+                        (reservation.currency, reservation.reference), []
+                    ).append(reservation)
+
+                failed = False
+                for (currency, reference), result in zip(
+                    groups, pool.map(self._check, groups)
+                ):
+                    group = groups[(currency, reference)]
+                    if isinstance(result, stripe.StripeError):
+                        failed = True
+                        self.stderr.write(
+                            f'Оплата {reference} не проверена: {result}'
+                        )
+                    elif result == PAID:
+                        sold += StockReservation.objects.filter(
+                            id__in=[reservation.id for reservation in group]
+                        ).delete()[0]
+                    elif result == PENDING:
+                        StockReservation.objects.filter(
+                            id__in=[reservation.id for reservation in group]
+                        ).update(expires_at=timezone.now() + timedelta(
+                            minutes=settings.STOCK_RESERVATION_MINUTES
+                        ))
+                    else:
+                        released += release_reservations(group)
+
+            if failed:
+                break
+
+        return sold, released
+
+    @staticmethod
+    def _check(key: Tuple[str, str]) -> Union[str, stripe.StripeError]:
+        """Проверяет оплату, ошибка Stripe возвращается как результат."""
+        currency, reference = key
+        if not reference:
+            return ''
+        try:
+            return check_payment(currency, reference)
+        except stripe.StripeError as e:
+            return e
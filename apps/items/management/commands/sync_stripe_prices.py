@@ -0,0 +1,133 @@
+"""Management-команда для синхронизации товаров со Stripe Product/Price."""
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, List
+
+import stripe
+from django.core.management.base import BaseCommand, CommandParser
+from django.db.models import Exists, OuterRef
+
+from items.models import Item, StripePrice
+from items.stripe_accounts import get_currencies
+from items.stripe_utils import (
+    get_stripe_account,
+    get_stripe_keys,
+    sync_item
+)
+
+
+class Command(BaseCommand):
+    """
+    Синхронизирует товары со Stripe Product/Price.
+
+    Обрабатываются только товары, для которых нет записи StripePrice
+    или которые изменились после последней синхронизации. Запросы к
+    Stripe выполняются параллельно, результаты сохраняются в базу
+    пакетами. С опцией --interval команда работает как фоновый
+    процесс и повторяет синхронизацию с указанным интервалом.
+
+    Example:
+        python manage.py sync_stripe_prices --interval 60
+    """
+
+    help = 'Синхронизация товаров со Stripe Product/Price'
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=8,
+            help='Количество параллельных запросов к Stripe'
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            help='Повторять синхронизацию каждые N секунд'
+        )
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        while True:
+            synced = sum(
+                self._sync_currency(currency, options)
+                for currency in get_currencies()
+            )
+            self.stdout.write(f'Синхронизировано товаров: {synced}')
+
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
+
+    def _sync_currency(self, currency: str, options: Any) -> int:
+        """
+        Синхронизирует устаревшие товары одной валюты.
+
+        Args:
+            currency: Валюта товаров
+            options: Опции команды
+
+        Returns:
+            Количество синхронизированных товаров
+        """
+        api_key, _ = get_stripe_keys(currency)
+        account = get_stripe_account(currency)
+
+        fresh = StripePrice.objects.filter(
+            item=OuterRef('pk'),
+            account=account,
+            currency=currency,
+            unit_amount=OuterRef('price'),
+            datetime_updated__gte=OuterRef('datetime_updated'),
+        )
+        stale_ids = list(
+            Item.objects
+            .filter(currency=currency)
+            .exclude(Exists(fresh))
+            .values_list('id', flat=True)
+        )
+
+        synced = 0
+        batch_size = options['batch_size']
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            for start in range(0, len(stale_ids), batch_size):
+                ids = stale_ids[start:start + batch_size]
+                items = Item.objects.filter(id__in=ids)
+                existing = {
+                    price.item_id: price
+                    for price in StripePrice.objects.filter(
+                        item_id__in=ids,
+                        account=account,
+                        currency=currency,
+                    )
+                }
+
+                futures = [
+                    (item, pool.submit(
+                        sync_item, api_key, account, item,
+                        existing.get(item.id)
+                    ))
+                    for item in items
+                ]
+                prices: List[StripePrice] = []
+                for item, future in futures:
+                    try:
+                        prices.append(future.result())
+                    except stripe.StripeError as e:
+                        self.stderr.write(
+                            f'Товар {item.id} не синхронизирован: {e}'
+                        )
+
+                StripePrice.objects.bulk_create(
+                    prices,
+                    update_conflicts=True,
+                    unique_fields=['item', 'account', 'currency'],
+                    update_fields=[
+                        'unit_amount',
+                        'product_id',
+                        'price_id',
+                        'datetime_updated',
+                    ],
+                )
+                synced += len(prices)
+
+        return synced
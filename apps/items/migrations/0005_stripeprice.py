@@ -0,0 +1,33 @@
+# Generated by Django 6.0.1 on 2026-10-19 01:14
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('items', '0004_item_sku'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StripePrice',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('datetime_created', models.DateTimeField(auto_now_add=True, verbose_name='дата и время создания')),
+                ('datetime_updated', models.DateTimeField(auto_now=True, verbose_name='дата и время редактирования')),
+                ('account', models.CharField(max_length=64, verbose_name='аккаунт Stripe')),
+                ('currency', models.CharField(max_length=3, verbose_name='валюта')),
+                ('unit_amount', models.IntegerField(verbose_name='цена в центах')),
+                ('product_id', models.CharField(max_length=255, verbose_name='Stripe Product ID')),
+                ('price_id', models.CharField(max_length=255, verbose_name='Stripe Price ID')),
+                ('item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stripe_prices', to='items.item', verbose_name='товар')),
+            ],
+            options={
+                'verbose_name': 'цена Stripe',
+                'verbose_name_plural': 'цены Stripe',
+                'constraints': [models.UniqueConstraint(fields=('item', 'account', 'currency'), name='unique_stripe_price')],
+            },
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 6.0.1 on 2026-10-19 02:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('items', '0005_stripeprice'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ItemPaymentIntent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('datetime_created', models.DateTimeField(auto_now_add=True, verbose_name='дата и время создания')),
+                ('datetime_updated', models.DateTimeField(auto_now=True, verbose_name='дата и время редактирования')),
+                ('session_key', models.CharField(max_length=40, verbose_name='ключ сессии')),
+                ('currency', models.CharField(max_length=3, verbose_name='валюта')),
+                ('amount', models.IntegerField(verbose_name='сумма в центах')),
+                ('intent_id', models.CharField(blank=True, max_length=255, verbose_name='Stripe PaymentIntent ID')),
+                ('client_secret', models.CharField(blank=True, max_length=255, verbose_name='client secret')),
+                ('item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='payment_intents', to='items.item', verbose_name='товар')),
+            ],
+            options={
+                'verbose_name': 'Payment Intent товара',
+                'verbose_name_plural': 'Payment Intent товаров',
+                'indexes': [models.Index(fields=['datetime_updated'], name='item_pi_updated_idx')],
+                'constraints': [models.UniqueConstraint(fields=('session_key', 'item'), name='unique_item_payment_intent')],
+            },
+        ),
+    ]
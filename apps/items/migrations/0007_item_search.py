@@ -0,0 +1,121 @@
+# Generated by Django 6.0.1 on 2026-10-19 02:50
+
+from django.db import migrations
+
+POSTGRESQL_FORWARD = [
+    """
+    ALTER TABLE items_item ADD COLUMN search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('russian', coalesce(name, '')), 'A')
+        || setweight(to_tsvector('russian', coalesce(description, '')), 'B')
+    ) STORED
+    """,
+    """
+    CREATE INDEX items_item_search_vector_idx
+    ON items_item USING GIN (search_vector)
+    """,
+]
+
+# Поиск с опечатками: если расширение pg_trgm недоступно на сервере,
+# поиск работает без него
+POSTGRESQL_TRIGRAM = [
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    """
+    CREATE INDEX items_item_name_trgm_idx
+    ON items_item USING GIN (name gin_trgm_ops)
+    """,
+]
+
+POSTGRESQL_BACKWARD = [
+    'DROP INDEX IF EXISTS items_item_name_trgm_idx',
+    'DROP INDEX IF EXISTS items_item_search_vector_idx',
+    'ALTER TABLE items_item DROP COLUMN IF EXISTS search_vector',
+]
+
+SQLITE_TRIGGERS = [
+    """
+    CREATE TRIGGER IF NOT EXISTS items_item_fts_insert
+    AFTER INSERT ON items_item BEGIN
+        INSERT INTO items_item_fts(rowid, name, description)
+        VALUES (new.id, new.name, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS items_item_fts_delete
+    AFTER DELETE ON items_item BEGIN
+        INSERT INTO items_item_fts(items_item_fts, rowid, name, description)
+        VALUES ('delete', old.id, old.name, old.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS items_item_fts_update
+    AFTER UPDATE OF name, description ON items_item BEGIN
+        INSERT INTO items_item_fts(items_item_fts, rowid, name, description)
+        VALUES ('delete', old.id, old.name, old.description);
+        INSERT INTO items_item_fts(rowid, name, description)
+        VALUES (new.id, new.name, new.description);
+    END
+    """,
+]
+
+SQLITE_REBUILD = "INSERT INTO items_item_fts(items_item_fts) VALUES ('rebuild')"
+
+SQLITE_FORWARD = [
+    """
+    CREATE VIRTUAL TABLE items_item_fts USING fts5(
+        name, description,
+        content='items_item', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    *SQLITE_TRIGGERS,
+    SQLITE_REBUILD,
+]
+
+SQLITE_BACKWARD = [
+    'DROP TRIGGER IF EXISTS items_item_fts_update',
+    'DROP TRIGGER IF EXISTS items_item_fts_delete',
+    'DROP TRIGGER IF EXISTS items_item_fts_insert',
+    'DROP TABLE IF EXISTS items_item_fts',
+]
+
+
+def run_vendor_sql(statements):
+    """Выполняет SQL для текущей базы (другие базы пропускаются)."""
+    def run(apps, schema_editor):
+        for statement in statements.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(statement)
+    return run
+
+
+def create_search_index(apps, schema_editor):
+    run_vendor_sql({
+        'postgresql': POSTGRESQL_FORWARD,
+        'sqlite': SQLITE_FORWARD,
+    })(apps, schema_editor)
+
+    if schema_editor.connection.vendor == 'postgresql':
+        with schema_editor.connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'"
+            )
+            if cursor.fetchone():
+                for statement in POSTGRESQL_TRIGRAM:
+                    schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('items', '0006_itempaymentintent'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            create_search_index,
+            run_vendor_sql({
+                'postgresql': POSTGRESQL_BACKWARD,
+                'sqlite': SQLITE_BACKWARD,
+            }),
+        ),
+    ]
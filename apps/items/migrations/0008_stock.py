@@ -0,0 +1,48 @@
+# Generated by Django 6.0.1 on 2026-10-19 02:55
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('items', '0007_item_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockReservation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('datetime_created', models.DateTimeField(auto_now_add=True, verbose_name='дата и время создания')),
+                ('datetime_updated', models.DateTimeField(auto_now=True, verbose_name='дата и время редактирования')),
+                ('slot', models.PositiveSmallIntegerField(verbose_name='слот')),
+                ('quantity', models.PositiveIntegerField(verbose_name='количество')),
+                ('key', models.CharField(db_index=True, max_length=100, verbose_name='владелец')),
+                ('currency', models.CharField(blank=True, max_length=3, verbose_name='валюта')),
+                ('reference', models.CharField(blank=True, db_index=True, max_length=255, verbose_name='Stripe ID')),
+                ('expires_at', models.DateTimeField(db_index=True, verbose_name='резерв до')),
+                ('item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_reservations', to='items.item', verbose_name='товар')),
+            ],
+            options={
+                'verbose_name': 'резерв товара',
+                'verbose_name_plural': 'резервы товаров',
+                'ordering': ('-id',),
+            },
+        ),
+        migrations.CreateModel(
+            name='ItemStock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('slot', models.PositiveSmallIntegerField(verbose_name='слот')),
+                ('quantity', models.PositiveIntegerField(default=0, verbose_name='количество')),
+                ('item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_slots', to='items.item', verbose_name='товар')),
+            ],
+            options={
+                'verbose_name': 'остаток товара',
+                'verbose_name_plural': 'остатки товаров',
+                'constraints': [models.UniqueConstraint(fields=('item', 'slot'), name='unique_item_stock_slot')],
+            },
+        ),
+    ]
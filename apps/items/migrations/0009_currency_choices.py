@@ -0,0 +1,67 @@
+# Generated by Django 6.0.1 on 2026-10-19 03:15
+
+import items.stripe_accounts
+from django.db import migrations, models
+
+# Триггеры поискового индекса из 0007_item_search
+SQLITE_TRIGGERS = [
+    """
+    CREATE TRIGGER IF NOT EXISTS items_item_fts_insert
+    AFTER INSERT ON items_item BEGIN
+        INSERT INTO items_item_fts(rowid, name, description)
+        VALUES (new.id, new.name, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS items_item_fts_delete
+    AFTER DELETE ON items_item BEGIN
+        INSERT INTO items_item_fts(items_item_fts, rowid, name, description)
+        VALUES ('delete', old.id, old.name, old.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS items_item_fts_update
+    AFTER UPDATE OF name, description ON items_item BEGIN
+        INSERT INTO items_item_fts(items_item_fts, rowid, name, description)
+        VALUES ('delete', old.id, old.name, old.description);
+        INSERT INTO items_item_fts(rowid, name, description)
+        VALUES (new.id, new.name, new.description);
+    END
+    """,
+]
+
+SQLITE_REBUILD = "INSERT INTO items_item_fts(items_item_fts) VALUES ('rebuild')"
+
+
+def restore_sqlite_search_index(apps, schema_editor):
+    """Создает заново триггеры FTS5 и перестраивает индекс в SQLite."""
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for statement in SQLITE_TRIGGERS:
+        schema_editor.execute(statement)
+    schema_editor.execute(SQLITE_REBUILD)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('items', '0008_stock'),
+    ]
+
+    # AlterField пересоздает items_item на SQLite вместе с триггерами
+    # поиска: они восстанавливаются после изменения (и после отката)
+    operations = [
+        migrations.RunPython(
+            migrations.RunPython.noop,
+            restore_sqlite_search_index,
+        ),
+        migrations.AlterField(
+            model_name='item',
+            name='currency',
+            field=models.CharField(choices=items.stripe_accounts.get_currency_choices, default=items.stripe_accounts.get_default_currency, max_length=3, verbose_name='валюта'),
+        ),
+        migrations.RunPython(
+            restore_sqlite_search_index,
+            migrations.RunPython.noop,
+        ),
+    ]
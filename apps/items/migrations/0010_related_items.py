@@ -0,0 +1,44 @@
+# Generated by Django 6.0.1 on 2026-10-19 03:25
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('items', '0009_currency_choices'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ItemPairCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('orders', models.IntegerField(default=0, verbose_name='заказов')),
+                ('item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='items.item', verbose_name='товар')),
+                ('other', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='items.item', verbose_name='купленный вместе товар')),
+            ],
+            options={
+                'verbose_name': 'совместная покупка',
+                'verbose_name_plural': 'совместные покупки',
+                'constraints': [models.UniqueConstraint(fields=('item', 'other'), name='unique_item_pair_count')],
+            },
+        ),
+        migrations.CreateModel(
+            name='RelatedItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rank', models.PositiveSmallIntegerField(verbose_name='позиция')),
+                ('orders', models.IntegerField(verbose_name='заказов')),
+                ('item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='related_items', to='items.item', verbose_name='товар')),
+                ('related', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='items.item', verbose_name='рекомендуемый товар')),
+            ],
+            options={
+                'verbose_name': 'рекомендуемый товар',
+                'verbose_name_plural': 'рекомендуемые товары',
+                'ordering': ('item', 'rank'),
+                'constraints': [models.UniqueConstraint(fields=('item', 'related'), name='unique_related_item')],
+            },
+        ),
+    ]
@@ -3,6 +3,8 @@ from django.db import models
 
 from abstracts.models import TimeStampModel
 
+from .stripe_accounts import get_currency_choices, get_default_currency
+
 
 class Item(TimeStampModel):
     """
@@ -12,10 +14,11 @@ class Item(TimeStampModel):
     описании, цене, валюте и изображении.
 
     Attributes:
+        sku: Артикул товара для синхронизации каталога (уникальный)
         name: Название товара
         description: Описание товара
         price: Цена товара в центах (для точности расчетов)
-        currency: Валюта товара (USD или KZT)
+        currency: Валюта товара (одна из валют STRIPE_ACCOUNTS)
         image: Изображение товара (опционально)
         datetime_created: Дата и время создания
         datetime_updated: Дата и время обновления
@@ -24,12 +27,13 @@ class Item(TimeStampModel):
         price_display: Возвращает цену сразу в долларах (не в центах)
     """
 
-    class CurrencyChoices(models.TextChoices):
-        """Выбор валюты для товара."""
-
-        USD = "usd", "USD"
-        KZT = "kzt", "KZT"
-
+    sku = models.CharField(
+        verbose_name='артикул',
+        max_length=64,
+        unique=True,
+        null=True,
+        blank=True
+    )
     name = models.CharField(
         verbose_name='название',
         max_length=255
@@ -39,8 +43,8 @@ class Item(TimeStampModel):
     currency = models.CharField(
         verbose_name="валюта",
         max_length=3,
-        choices=CurrencyChoices.choices,
-        default=CurrencyChoices.USD
+        choices=get_currency_choices,
+        default=get_default_currency
     )
     image = models.ImageField(
         verbose_name="изображение",
@@ -70,3 +74,324 @@ class Item(TimeStampModel):
         verbose_name = 'товар'
         verbose_name_plural = 'товары'
         ordering = ('-id',)
+
+
+class StripePrice(TimeStampModel):
+    """
+    Закэшированные Stripe Product и Price для товара.
+
+    Создаются командой sync_stripe_prices отдельно для каждого
+    Stripe аккаунта и валюты. Checkout передает в Stripe только
+    price_id вместо полного описания товара.
+
+    Attributes:
+        item: Товар
+        account: Идентификатор Stripe аккаунта (отпечаток секретного ключа)
+        currency: Валюта цены
+        unit_amount: Цена в центах, для которой создан Price
+        product_id: ID объекта Product в Stripe
+        price_id: ID объекта Price в Stripe
+        datetime_created: Дата и время создания
+        datetime_updated: Дата и время последней синхронизации
+    """
+
+    item = models.ForeignKey(
+        verbose_name='товар',
+        to=Item,
+        related_name='stripe_prices',
+        on_delete=models.CASCADE
+    )
+    account = models.CharField(
+        verbose_name='аккаунт Stripe',
+        max_length=64
+    )
+    currency = models.CharField(
+        verbose_name='валюта',
+        max_length=3
+    )
+    unit_amount = models.IntegerField(verbose_name='цена в центах')
+    product_id = models.CharField(
+        verbose_name='Stripe Product ID',
+        max_length=255
+    )
+    price_id = models.CharField(
+        verbose_name='Stripe Price ID',
+        max_length=255
+    )
+
+    def __str__(self) -> str:
+        return f'{self.item_id} {self.currency}: {self.price_id}'
+
+    class Meta:
+        """Метаданные модели."""
+
+        verbose_name = 'цена Stripe'
+        verbose_name_plural = 'цены Stripe'
+        constraints = [
+            models.UniqueConstraint(
+                fields=('item', 'account', 'currency'),
+                name='unique_stripe_price'
+            ),
+        ]
+
+
+class ItemPaymentIntent(TimeStampModel):
+    """
+    Открытый Stripe PaymentIntent для пары (сессия, товар).
+
+    Страница оплаты через Payment Intent повторно использует intent
+    вместо создания нового при каждой загрузке. Незавершенные intent
+    отменяются командой sweep_payment_intents.
+
+    Attributes:
+        session_key: Идентификатор сессии покупателя (get_session_id)
+        item: Товар
+        currency: Валюта intent
+        amount: Сумма intent в центах
+        intent_id: ID объекта PaymentIntent в Stripe
+        client_secret: client_secret для подтверждения оплаты в браузере
+        datetime_created: Дата и время создания
+        datetime_updated: Дата и время последнего использования
+    """
+
+    session_key = models.CharField(
+        verbose_name='ключ сессии',
+        max_length=40
+    )
+    item = models.ForeignKey(
+        verbose_name='товар',
+        to=Item,
+        related_name='payment_intents',
+        on_delete=models.CASCADE
+    )
+    currency = models.CharField(
+        verbose_name='валюта',
+        max_length=3
+    )
+    amount = models.IntegerField(verbose_name='сумма в центах')
+    intent_id = models.CharField(
+        verbose_name='Stripe PaymentIntent ID',
+        max_length=255,
+        blank=True
+    )
+    client_secret = models.CharField(
+        verbose_name='client secret',
+        max_length=255,
+        blank=True
+    )
+
+    def __str__(self) -> str:
+        return f'{self.item_id} {self.session_key}: {self.intent_id}'
+
+    class Meta:
+        """Метаданные модели."""
+
+        verbose_name = 'Payment Intent товара'
+        verbose_name_plural = 'Payment Intent товаров'
+        constraints = [
+            models.UniqueConstraint(
+                fields=('session_key', 'item'),
+                name='unique_item_payment_intent'
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=('datetime_updated',),
+                name='item_pi_updated_idx'
+            ),
+        ]
+
+
+class ItemStock(models.Model):
+    """
+    Остаток товара, доступный для продажи.
+
+    Остаток товара разделен на несколько строк (слотов), чтобы
+    одновременные покупки одного товара списывали остаток из разных
+    строк и не ждали блокировки одной строки. Доступный остаток
+    товара - сумма его слотов. Товар без слотов не ограничен
+    остатком.
+
+    Attributes:
+        item: Товар
+        slot: Номер слота
+        quantity: Доступное количество в слоте
+    """
+
+    item = models.ForeignKey(
+        verbose_name='товар',
+        to=Item,
+        related_name='stock_slots',
+        on_delete=models.CASCADE
+    )
+    slot = models.PositiveSmallIntegerField(verbose_name='слот')
+    quantity = models.PositiveIntegerField(
+        verbose_name='количество',
+        default=0
+    )
+
+    def __str__(self) -> str:
+        return f'{self.item_id} #{self.slot}: {self.quantity}'
+
+    class Meta:
+        """Метаданные модели."""
+
+        verbose_name = 'остаток товара'
+        verbose_name_plural = 'остатки товаров'
+        constraints = [
+            models.UniqueConstraint(
+                fields=('item', 'slot'),
+                name='unique_item_stock_slot'
+            ),
+        ]
+
+
+class StockReservation(TimeStampModel):
+    """
+    Резерв остатка товара на время оплаты.
+
+    Создается при оформлении оплаты: количество уже списано из слота
+    остатка. Просроченные резервы обрабатывает команда
+    sweep_reservations: если оплата прошла, резерв удаляется (товар
+    продан), иначе количество возвращается в слот.
+
+    Attributes:
+        item: Товар
+        slot: Слот остатка, из которого списано количество
+        quantity: Зарезервированное количество
+        key: Владелец резерва (заказ или сессия и товар)
+        currency: Валюта оплаты (определяет Stripe аккаунт)
+        reference: ID Checkout Session или PaymentIntent в Stripe
+        expires_at: Время окончания резерва
+        datetime_created: Дата и время создания
+        datetime_updated: Дата и время обновления
+    """
+
+    item = models.ForeignKey(
+        verbose_name='товар',
+        to=Item,
+        related_name='stock_reservations',
+        on_delete=models.CASCADE
+    )
+    slot = models.PositiveSmallIntegerField(verbose_name='слот')
+    quantity = models.PositiveIntegerField(verbose_name='количество')
+    key = models.CharField(
+        verbose_name='владелец',
+        max_length=100,
+        db_index=True
+    )
+    currency = models.CharField(
+        verbose_name='валюта',
+        max_length=3,
+        blank=True
+    )
+    reference = models.CharField(
+        verbose_name='Stripe ID',
+        max_length=255,
+        blank=True,
+        db_index=True
+    )
+    expires_at = models.DateTimeField(
+        verbose_name='резерв до',
+        db_index=True
+    )
+
+    def __str__(self) -> str:
+        return f'{self.item_id} x {self.quantity}: {self.key}'
+
+    class Meta:
+        """Метаданные модели."""
+
+        verbose_name = 'резерв товара'
+        verbose_name_plural = 'резервы товаров'
+        ordering = ('-id',)
+
+
+class ItemPairCount(models.Model):
+    """
+    Количество оплаченных заказов, в которых товары куплены вместе.
+
+    Хранится в обе стороны (item, other) и (other, item), чтобы
+    соседей товара читать по одному индексу. Заполняется командой
+    build_recommendations (см. orders.recommendations).
+
+    Attributes:
+        item: Товар
+        other: Товар, купленный вместе с ним
+        orders: Количество заказов с обоими товарами
+    """
+
+    item = models.ForeignKey(
+        verbose_name='товар',
+        to=Item,
+        related_name='+',
+        on_delete=models.CASCADE
+    )
+    other = models.ForeignKey(
+        verbose_name='купленный вместе товар',
+        to=Item,
+        related_name='+',
+        on_delete=models.CASCADE
+    )
+    orders = models.IntegerField(verbose_name='заказов', default=0)
+
+    def __str__(self) -> str:
+        return f'{self.item_id} + {self.other_id}: {self.orders}'
+
+    class Meta:
+        """Метаданные модели."""
+
+        verbose_name = 'совместная покупка'
+        verbose_name_plural = 'совместные покупки'
+        constraints = [
+            models.UniqueConstraint(
+                fields=('item', 'other'),
+                name='unique_item_pair_count'
+            ),
+        ]
+
+
+class RelatedItem(models.Model):
+    """
+    Товар из блока «Часто покупают вместе» на странице товара.
+
+    Для каждого товара хранятся RELATED_ITEMS_LIMIT соседей с
+    наибольшим количеством совместных заказов (rank 0 - первый).
+
+    Attributes:
+        item: Товар
+        related: Рекомендуемый товар
+        rank: Позиция в блоке
+        orders: Количество совместных заказов
+    """
+
+    item = models.ForeignKey(
+        verbose_name='товар',
+        to=Item,
+        related_name='related_items',
+        on_delete=models.CASCADE
+    )
+    related = models.ForeignKey(
+        verbose_name='рекомендуемый товар',
+        to=Item,
+        related_name='+',
+        on_delete=models.CASCADE
+    )
+    rank = models.PositiveSmallIntegerField(verbose_name='позиция')
+    orders = models.IntegerField(verbose_name='заказов')
+
+    def __str__(self) -> str:
+        return f'{self.item_id} -> {self.related_id} #{self.rank}'
+
+    class Meta:
+        """Метаданные модели."""
+
+        verbose_name = 'рекомендуемый товар'
+        verbose_name_plural = 'рекомендуемые товары'
+        ordering = ('item', 'rank')
+        constraints = [
+            models.UniqueConstraint(
+                fields=('item', 'related'),
+                name='unique_related_item'
+            ),
+        ]
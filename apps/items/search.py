@@ -0,0 +1,188 @@
+"""Полнотекстовый поиск по каталогу товаров."""
+import re
+from functools import lru_cache
+from typing import List, Optional, Tuple
+
+from django.conf import settings
+from django.db import connection
+from django.db.models.expressions import RawSQL
+
+# Поисковый индекс поддерживается самой базой (см. миграцию
+# 0007_item_search), поэтому он актуален и после bulk_create/update:
+# - PostgreSQL: генерируемая колонка search_vector (tsvector, GIN)
+#   и триграммный GIN индекс по названию (pg_trgm) для опечаток,
+#   если расширение установлено на сервере;
+# - SQLite: FTS5 таблица items_item_fts, синхронизируемая триггерами.
+#   Миграции, пересоздающие таблицу items_item на SQLite (AlterField
+#   и т.п.), удаляют триггеры: такие миграции должны создать их
+#   заново и перестроить индекс (см. 0009_currency_choices).
+PG_SEARCH_CONFIG = 'russian'
+SQLITE_FTS_TABLE = 'items_item_fts'
+
+TOKEN_RE = re.compile(r'\w+')
+
+Cursor = Tuple[float, int]
+
+
+def is_search_supported() -> bool:
+    """Проверяет, есть ли поисковый индекс в текущей базе."""
+    return connection.vendor in ('postgresql', 'sqlite')
+
+
+@lru_cache(maxsize=None)
+def _has_trigram_index() -> bool:
+    """Проверяет, создан ли триграммный индекс (pg_trgm) в PostgreSQL."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_indexes WHERE indexname = %s",
+            ['items_item_name_trgm_idx']
+        )
+        return cursor.fetchone() is not None
+
+
+def _fts5_query(query: str) -> str:
+    """
+    Преобразует пользовательский запрос в запрос FTS5.
+
+    Каждое слово ищется как префикс, слова объединяются через AND.
+    Спецсимволы синтаксиса FTS5 отбрасываются.
+    """
+    return ' '.join(
+        f'"{token}"*' for token in TOKEN_RE.findall(query.lower())
+    )
+
+
+def _pg_match_sql(query: str) -> Tuple[str, list]:
+    """Условие совпадения товара (алиас i) для PostgreSQL."""
+    sql = f"i.search_vector @@ websearch_to_tsquery('{PG_SEARCH_CONFIG}', %s)"
+    if not _has_trigram_index():
+        return sql, [query]
+    # Похожее название: word_similarity находит слова с опечатками
+    return f'({sql} OR %s <%% i.name)', [query, query]
+
+
+def _ranked_sql(query: str, candidates: int) -> Tuple[str, list]:
+    """
+    Возвращает SQL, выбирающий (id, rank) найденных товаров.
+
+    Чем больше rank, тем релевантнее товар. Вычисление релевантности
+    дороже поиска по индексу, поэтому для широких запросов ранжируются
+    только candidates самых новых совпадений.
+    """
+    if connection.vendor == 'postgresql':
+        match, params = _pg_match_sql(query)
+        rank = 'ts_rank(c.search_vector, q.query)'
+        rank_params = []
+        if _has_trigram_index():
+            rank += ' + word_similarity(%s, c.name)'
+            rank_params.append(query)
+        sql = (
+            f'SELECT c.id, ({rank})::float8 AS rank FROM ('
+            'SELECT i.id, i.name, i.search_vector FROM items_item i '
+            f'WHERE {match} ORDER BY i.id DESC LIMIT %s'
+            ') c, '
+            f"websearch_to_tsquery('{PG_SEARCH_CONFIG}', %s) AS q(query)"
+        )
+        return sql, [*rank_params, *params, candidates, query]
+
+    # bm25 тем меньше, чем релевантнее; название весомее описания.
+    # FTS5 перебирает совпадения по убыванию rowid и останавливается
+    # на LIMIT, не вычисляя bm25 для остальных
+    sql = (
+        f'SELECT rowid AS id, -bm25({SQLITE_FTS_TABLE}, 10.0, 1.0) '
+        f'AS rank FROM {SQLITE_FTS_TABLE} '
+        f'WHERE {SQLITE_FTS_TABLE} MATCH %s ORDER BY rowid DESC LIMIT %s'
+    )
+    return sql, [_fts5_query(query), candidates]
+
+
+def search_items(
+    query: str,
+    limit: int,
+    after: Optional[Cursor] = None
+) -> List[Cursor]:
+    """
+    Ищет товары по названию и описанию.
+
+    Результаты упорядочены по убыванию релевантности (при равной
+    релевантности - по убыванию ID). Пагинация по ключу: after
+    задает (rank, id) последнего товара предыдущей страницы.
+    Ранжируются не больше SEARCH_MAX_CANDIDATES самых новых
+    совпадений.
+
+    Args:
+        query: Поисковый запрос
+        limit: Размер страницы
+        after: Курсор последнего результата предыдущей страницы
+
+    Returns:
+        Список (rank, id) найденных товаров
+    """
+    query = query.strip()
+    if not is_search_supported() or not TOKEN_RE.search(query):
+        return []
+
+    sql, params = _ranked_sql(query, settings.SEARCH_MAX_CANDIDATES)
+    sql = f'SELECT s.rank, s.id FROM ({sql}) s'
+    if after is not None:
+        sql += ' WHERE s.rank < %s OR (s.rank = %s AND s.id < %s)'
+        params += [after[0], after[0], after[1]]
+    sql += ' ORDER BY s.rank DESC, s.id DESC LIMIT %s'
+    params.append(limit)
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [(rank, item_id) for rank, item_id in cursor.fetchall()]
+
+
+def matching_ids(query: str) -> Optional[RawSQL]:
+    """
+    Возвращает подзапрос ID найденных товаров для фильтра id__in.
+
+    В отличие от search_items, находит все совпадения без ранжирования.
+    Кроме полнотекстового поиска подзапрос находит товар, артикул
+    которого равен запросу. Условия объединены внутри подзапроса,
+    чтобы база выполняла id__in как соединение по индексу.
+
+    Args:
+        query: Поисковый запрос
+
+    Returns:
+        Выражение RawSQL или None, если поиск в текущей базе
+        не поддерживается или искать нечего
+    """
+    query = query.strip()
+    if not is_search_supported() or not TOKEN_RE.search(query):
+        return None
+
+    if connection.vendor == 'postgresql':
+        match, params = _pg_match_sql(query)
+        sql = f'SELECT i.id FROM items_item i WHERE {match}'
+    else:
+        sql = (
+            f'SELECT rowid FROM {SQLITE_FTS_TABLE} '
+            f'WHERE {SQLITE_FTS_TABLE} MATCH %s'
+        )
+        params = [_fts5_query(query)]
+
+    return RawSQL(
+        f'SELECT id FROM items_item WHERE sku = %s UNION {sql}',
+        [query, *params]
+    )
+
+
+def format_cursor(cursor: Cursor) -> str:
+    """Кодирует курсор (rank, id) для передачи в URL."""
+    rank, item_id = cursor
+    return f'{rank!r}_{item_id}'
+
+
+def parse_cursor(raw: str) -> Cursor:
+    """
+    Декодирует курсор, созданный format_cursor.
+
+    Raises:
+        ValueError: Если курсор некорректен
+    """
+    rank, _, item_id = raw.rpartition('_')
+    return float(rank), int(item_id)
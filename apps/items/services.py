@@ -0,0 +1,195 @@
+"""Сервисные функции для оплаты товаров."""
+from typing import List, Optional
+
+import stripe
+from django.db import transaction
+
+from abstracts.cache import MISSING, LocalCache
+
+from .gateways import get_gateway
+from .models import Item, ItemPaymentIntent, RelatedItem
+from .stock import (
+    attach_reservations,
+    expire_reservations,
+    extend_reservations,
+    release_reservations,
+    releasing_on_error,
+    reserve_stock
+)
+from .tasks import cancel_payment_intent
+
+_items = LocalCache('items.Item')
+_related = LocalCache('items.RelatedItem')
+
+
+def get_cached_item(item_id: int) -> Optional[Item]:
+    """
+    Возвращает товар из кэша в памяти процесса.
+
+    Страницы и оплата товара читают его без запроса к базе.
+    Изменение товара сбрасывает запись во всех процессах (см.
+    abstracts.cache). Возвращенный объект нельзя изменять.
+
+    Args:
+        item_id: ID товара
+
+    Returns:
+        Объект Item или None, если товар не найден
+    """
+    item = _items.get(item_id)
+    if item is MISSING:
+        item = Item.objects.filter(id=item_id).first()
+        _items.set(item_id, item)
+    return item
+
+
+def get_related_items(item_id: int) -> List[Item]:
+    """
+    Возвращает товары из блока «Часто покупают вместе».
+
+    Список ID кэшируется в памяти процесса до пересчета рекомендаций
+    товара (build_recommendations), сами товары читаются через
+    get_cached_item, поэтому их изменение видно сразу. Удаленные
+    товары пропускаются.
+
+    Args:
+        item_id: ID товара
+
+    Returns:
+        Рекомендуемые товары в порядке убывания совместных заказов
+    """
+    related_ids = _related.get(item_id)
+    if related_ids is MISSING:
+        related_ids = tuple(
+            RelatedItem.objects
+            .filter(item_id=item_id)
+            .order_by('rank')
+            .values_list('related_id', flat=True)
+        )
+        _related.set(item_id, related_ids, pk=item_id)
+    items = [get_cached_item(related_id) for related_id in related_ids]
+    return [item for item in items if item is not None]
+
+
+def get_item_payment_intent(
+    session_key: str,
+    item: Item,
+    refresh: bool = False
+) -> ItemPaymentIntent:
+    """
+    Возвращает PaymentIntent для оплаты товара в текущей сессии.
+
+    Открытый intent сессии используется повторно: если сумма и
+    валюта не изменились, Stripe не вызывается вовсе; если изменилась
+    цена, сумма обновляется через PaymentIntent.modify. Новый intent
+    создается, только если его нет, сменилась валюта или старый intent
+    больше нельзя изменить (оплачен или отменен).
+
+    Запись блокируется на время запроса к Stripe, поэтому
+    параллельные запросы одной сессии не создают лишних intent.
+    Открытый intent держит резерв товара: при повторном
+    использовании резерв продлевается, а если его уже освободила
+    команда sweep_reservations (и отменила intent), создается новый.
+    Товар резервируется до блокировки записи, чтобы строка остатка
+    не оставалась заблокированной на время запроса к Stripe.
+
+    Args:
+        session_key: Идентификатор сессии покупателя (get_session_id)
+        item: Товар
+        refresh: Не использовать сохраненный intent
+
+    Returns:
+        Сохраненная запись ItemPaymentIntent
+
+    Raises:
+        OutOfStock: Если товар закончился
+        StripeUnavailable: Если Stripe аккаунт недоступен
+        stripe.StripeError: Если Stripe не смог создать intent
+    """
+    with transaction.atomic():
+        record, _ = (
+            ItemPaymentIntent.objects
+            .select_for_update()
+            .get_or_create(
+                session_key=session_key,
+                item=item,
+                defaults={'currency': item.currency, 'amount': item.price}
+            )
+        )
+
+        if (
+            record.intent_id
+            and not refresh
+            and record.currency == item.currency
+            and extend_reservations(record.intent_id, item.id)
+        ):
+            if record.amount == item.price:
+                # Продлеваем жизнь intent, чтобы его не отменила очистка
+                record.save(update_fields=['datetime_updated'])
+                return record
+            try:
+                get_gateway().modify_payment_intent(
+                    item.currency,
+                    record.intent_id,
+                    amount=item.price
+                )
+            except stripe.InvalidRequestError:
+                pass
+            else:
+                record.amount = item.price
+                record.save(update_fields=['amount', 'datetime_updated'])
+                return record
+
+    replaced_intent_id = record.intent_id
+    reservations = reserve_stock(
+        {item.id: 1},
+        f'intent:{session_key}:{item.id}'
+    )
+    with releasing_on_error(reservations), transaction.atomic():
+        record = ItemPaymentIntent.objects.select_for_update().get(
+            pk=record.pk
+        )
+        if record.intent_id != replaced_intent_id:
+            # Intent уже заменил параллельный запрос той же сессии
+            release_reservations(reservations)
+            return record
+
+        if record.intent_id:
+            # Старый intent отменяется в фоне, покупатель не ждет Stripe
+            cancel_payment_intent.enqueue(
+                currency=record.currency,
+                intent_id=record.intent_id
+            )
+            expire_reservations(record.intent_id)
+
+        intent = get_gateway().create_payment_intent(
+            item.currency,
+            amount=item.price,
+            metadata={
+                'item_id': item.id,
+                'item_name': item.name,
+            },
+        )
+        record.currency = item.currency
+        record.amount = item.price
+        record.intent_id = intent.id
+        record.client_secret = intent.client_secret
+        record.save()
+
+    attach_reservations(reservations, item.currency, intent.id)
+    return record
+
+
+def forget_payment_intent(session_key: Optional[str], intent_id: str) -> None:
+    """
+    Удаляет завершенный intent из хранилища сессии.
+
+    Args:
+        session_key: Идентификатор сессии покупателя (get_session_id)
+        intent_id: ID оплаченного PaymentIntent
+    """
+    if session_key:
+        ItemPaymentIntent.objects.filter(
+            session_key=session_key,
+            intent_id=intent_id
+        ).delete()
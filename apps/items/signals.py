@@ -0,0 +1,17 @@
+"""Обработчики сигналов приложения items."""
+from typing import Any
+
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from .models import Item
+from .tasks import sync_item_price
+
+
+@receiver(post_save, sender=Item)
+def item_saved(sender: Any, instance: Item, **kwargs: Any) -> None:
+    """Ставит в очередь синхронизацию товара со Stripe."""
+    sync_item_price.enqueue(
+        dedup_key=f'sync_item_price:{instance.id}',
+        item_id=instance.id
+    )
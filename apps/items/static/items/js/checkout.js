@@ -0,0 +1,48 @@
+// Оплата через Stripe Checkout Session.
+//
+// Кнопка с атрибутами data-checkout-url (endpoint, возвращающий
+// {"id": session_id} или {"error": ...}) и data-public-key
+// (публичный ключ Stripe аккаунта) при нажатии создает сессию
+// и перенаправляет покупателя на страницу оплаты Stripe.
+
+function resetButton(button, label) {
+    button.disabled = false;
+    button.textContent = label;
+}
+
+async function checkout(button) {
+    const label = button.textContent;
+    button.disabled = true;
+    button.textContent = "Обработка...";
+
+    try {
+        const response = await fetch(button.dataset.checkoutUrl);
+        const data = await response.json();
+
+        if (data.error) {
+            alert(data.error);
+            resetButton(button, label);
+            return;
+        }
+
+        const stripe = Stripe(button.dataset.publicKey);
+        const result = await stripe.redirectToCheckout({ sessionId: data.id });
+        if (result.error) {
+            alert(result.error.message);
+            resetButton(button, label);
+        }
+    } catch (error) {
+        console.error("Error:", error);
+        alert("Произошла ошибка при создании платежа");
+        resetButton(button, label);
+    }
+}
+
+// Делегирование: кнопки оплаты корзины заменяются при изменении
+// количества товаров (orders/js/cart.js)
+document.addEventListener("click", (event) => {
+    const button = event.target.closest("[data-checkout-url]");
+    if (button) {
+        checkout(button);
+    }
+});
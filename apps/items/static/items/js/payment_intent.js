@@ -0,0 +1,127 @@
+// Оплата товара через Payment Intent (форма Stripe Elements на сайте).
+//
+// Параметры берутся из data-атрибутов формы #payment-form:
+// data-public-key, data-intent-url, data-success-url и data-pay-label.
+
+const form = document.getElementById("payment-form");
+const stripe = Stripe(form.dataset.publicKey);
+
+// Создаем элементы Stripe
+const elements = stripe.elements();
+const cardElement = elements.create("card", {
+    style: {
+        base: {
+            fontSize: "16px",
+            color: "#424770",
+            "::placeholder": {
+                color: "#aab7c4",
+            },
+        },
+        invalid: {
+            color: "#9e2146",
+        },
+    },
+});
+
+// Монтируем элемент карты
+cardElement.mount("#card-element");
+
+// Обработка ошибок валидации карты
+cardElement.on("change", (event) => {
+    const displayError = document.getElementById("card-errors");
+    displayError.textContent = event.error ? event.error.message : "";
+});
+
+const submitButton = document.getElementById("submit-button");
+const buttonText = document.getElementById("button-text");
+const spinner = document.getElementById("spinner");
+const paymentStatus = document.getElementById("payment-status");
+
+function showStatus(kind, title, message) {
+    const alertBox = document.createElement("div");
+    alertBox.className = `alert alert-${kind}`;
+    alertBox.setAttribute("role", "alert");
+
+    const strong = document.createElement("strong");
+    strong.textContent = title;
+    alertBox.append(strong, " ", message);
+
+    paymentStatus.replaceChildren(alertBox);
+}
+
+function resetForm() {
+    submitButton.disabled = false;
+    buttonText.textContent = form.dataset.payLabel;
+    spinner.classList.add("d-none");
+}
+
+async function fetchIntent(refresh) {
+    const url = refresh
+        ? `${form.dataset.intentUrl}?refresh=1`
+        : form.dataset.intentUrl;
+    const response = await fetch(url);
+    const data = await response.json();
+
+    if (data.error) {
+        throw new Error(data.error);
+    }
+    return data.client_secret;
+}
+
+function confirmPayment(clientSecret) {
+    return stripe.confirmCardPayment(clientSecret, {
+        payment_method: {
+            card: cardElement,
+            billing_details: {
+                name: document.getElementById("cardholder-name").value,
+                email: document.getElementById("email").value,
+            },
+        },
+    });
+}
+
+// Обработка отправки формы
+form.addEventListener("submit", async (event) => {
+    event.preventDefault();
+
+    // Блокируем кнопку и показываем спиннер
+    submitButton.disabled = true;
+    buttonText.textContent = "Обработка...";
+    spinner.classList.remove("d-none");
+    paymentStatus.replaceChildren();
+
+    try {
+        // 1. Получаем client_secret с сервера (intent сессии
+        //    используется повторно)
+        let result = await confirmPayment(await fetchIntent(false));
+
+        // 2. Сохраненный intent уже оплачен или отменен (например,
+        //    в другой вкладке) - запрашиваем новый и повторяем
+        if (result.error && result.error.code === "payment_intent_unexpected_state") {
+            result = await confirmPayment(await fetchIntent(true));
+        }
+
+        const { error, paymentIntent } = result;
+        if (error) {
+            showStatus("danger", "Ошибка оплаты:", error.message);
+            resetForm();
+        } else if (paymentIntent.status === "succeeded") {
+            showStatus(
+                "success",
+                "Оплата успешна!",
+                "Перенаправление на страницу успеха..."
+            );
+
+            // Перенаправляем на страницу успеха через 2 секунды
+            const successUrl = new URL(form.dataset.successUrl, window.location);
+            successUrl.searchParams.set("payment_intent", paymentIntent.id);
+            setTimeout(() => {
+                window.location.href = successUrl;
+            }, 2000);
+        }
+    } catch (error) {
+        // Ошибка при создании Payment Intent или подтверждении
+        showStatus("danger", "Произошла ошибка:", error.message);
+        resetForm();
+    }
+});
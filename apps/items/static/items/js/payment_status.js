@@ -0,0 +1,35 @@
+// Статус оплаты заказа на странице успешной оплаты.
+//
+// Элемент #payment-status с атрибутом data-events-url (поток событий
+// orders:order_events) получает событие payment при каждом изменении
+// оплаты заказа. После подтверждения оплаты поток закрывается.
+
+const container = document.getElementById("payment-status");
+
+function render(state) {
+    const title = container.querySelector("[data-status-title]");
+    const text = container.querySelector("[data-status-text]");
+
+    if (state.is_paid) {
+        title.className = "text-success";
+        title.textContent = "Оплата прошла успешно";
+        text.textContent = `Заказ #${state.order_id} оплачен. Спасибо за покупку!`;
+        return;
+    }
+
+    const paid = state.paid_currencies.map((currency) => currency.toUpperCase());
+    text.textContent = paid.length
+        ? `Заказ #${state.order_id}: получена оплата в ${paid.join(", ")}, ждем остальные валюты.`
+        : `Заказ #${state.order_id}: ждем подтверждения от Stripe.`;
+}
+
+if (container) {
+    const source = new EventSource(container.dataset.eventsUrl);
+    source.addEventListener("payment", (event) => {
+        const state = JSON.parse(event.data);
+        render(state);
+        if (state.is_paid) {
+            source.close();
+        }
+    });
+}
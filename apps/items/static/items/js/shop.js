@@ -0,0 +1,7 @@
+// Закрытие уведомлений по кнопке с data-bs-dismiss="alert"
+document.addEventListener("click", (event) => {
+    const button = event.target.closest('[data-bs-dismiss="alert"]');
+    if (button) {
+        button.closest(".alert").remove();
+    }
+});
@@ -0,0 +1,465 @@
+"""Учет остатков товаров и резервирование на время оплаты."""
+import random
+from contextlib import contextmanager
+from datetime import timedelta
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import stripe
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from .gateways import get_gateway
+from .models import ItemStock, StockReservation
+
+# Результаты проверки оплаты резерва в платежной системе
+PAID = 'paid'
+PENDING = 'pending'
+RELEASED = 'released'
+
+
+class OutOfStock(Exception):
+    """
+    Недостаточно товара для резервирования.
+
+    Attributes:
+        item_id: ID товара, которого не хватило
+    """
+
+    def __init__(self, item_id: int) -> None:
+        self.item_id = item_id
+        super().__init__(f'Недостаточно товара {item_id}')
+
+
+def get_available(item_ids: Iterable[int]) -> Dict[int, int]:
+    """
+    Возвращает доступный остаток товаров.
+
+    Args:
+        item_ids: ID товаров
+
+    Returns:
+        Словарь {ID товара: доступное количество}. Товаров без учета
+        остатка в словаре нет.
+    """
+    rows = (
+        ItemStock.objects
+        .filter(item_id__in=list(item_ids))
+        .values('item_id')
+        .annotate(available=Sum('quantity'))
+        .order_by()
+    )
+    return {row['item_id']: row['available'] for row in rows}
+
+
+def _decrement(item_id: int, slot: int, quantity: int) -> bool:
+    """Атомарно списывает количество из слота, если его хватает."""
+    return bool(
+        ItemStock.objects
+        .filter(item_id=item_id, slot=slot, quantity__gte=quantity)
+        .update(quantity=F('quantity') - quantity)
+    )
+
+
+def _try_decrement(item_id: int, slot: int, quantity: int) -> bool:
+    """
+    Списывает количество из слота в точке сохранения.
+
+    PostgreSQL блокирует строку, которую ждал UPDATE, до повторной
+    проверки условия и не снимает блокировку, если условие уже
+    не выполняется. Откат к точке сохранения снимает ее, поэтому
+    неудачная попытка не нарушает порядок блокировок в _take.
+    """
+    with transaction.atomic():
+        if _decrement(item_id, slot, quantity):
+            return True
+        transaction.set_rollback(True)
+        return False
+
+
+def _pick_slot(
+    item_id: int,
+    quantity: int,
+    hints: Dict[int, int]
+) -> Optional[int]:
+    """
+    Списывает количество целиком из одного случайного слота.
+
+    Одновременные покупки попадают в разные строки остатка. Если
+    база поддерживает SKIP LOCKED, сначала выбирается слот, который
+    никто не блокирует, и покупка не ждет блокировок. Если все
+    подходящие слоты заняты (или SKIP LOCKED не поддерживается),
+    перебираются слоты, в которых по прочитанным без блокировки
+    данным хватает товара.
+
+    Returns:
+        Номер слота или None, если подходящий слот не найден
+    """
+    if connection.features.has_select_for_update_skip_locked:
+        slot = (
+            ItemStock.objects
+            .select_for_update(skip_locked=True)
+            .filter(item_id=item_id, quantity__gte=quantity)
+            .order_by('?')
+            .values_list('slot', flat=True)
+            .first()
+        )
+        if slot is not None and _decrement(item_id, slot, quantity):
+            return slot
+
+    candidates = [slot for slot, value in hints.items() if value >= quantity]
+    random.shuffle(candidates)
+    for slot in candidates:
+        if _try_decrement(item_id, slot, quantity):
+            return slot
+    return None
+
+
+def _take(
+    item_id: int,
+    quantity: int,
+    hints: Dict[int, int]
+) -> List[Tuple[int, int]]:
+    """
+    Списывает количество товара из слотов остатка.
+
+    Вызывается внутри транзакции. Обычно количество списывается
+    из одного слота (_pick_slot). Если такого слота нет, остаток
+    раздроблен или почти исчерпан: слоты товара блокируются
+    по порядку номеров и количество собирается из нескольких слотов.
+
+    Args:
+        item_id: ID товара
+        quantity: Количество
+        hints: Количество в слотах товара {слот: количество}
+
+    Returns:
+        Список (слот, списанное количество)
+
+    Raises:
+        OutOfStock: Если товара не хватает
+    """
+    slot = _pick_slot(item_id, quantity, hints)
+    if slot is not None:
+        return [(slot, quantity)]
+
+    taken = []
+    remaining = quantity
+    slots = (
+        ItemStock.objects
+        .select_for_update()
+        .filter(item_id=item_id, quantity__gt=0)
+        .order_by('slot')
+        .values_list('slot', 'quantity')
+    )
+    for slot, value in slots:
+        part = min(value, remaining)
+        if _decrement(item_id, slot, part):
+            taken.append((slot, part))
+            remaining -= part
+            if not remaining:
+                return taken
+    raise OutOfStock(item_id)
+
+
+def _restore(item_id: int, slot: int, quantity: int) -> None:
+    """Возвращает количество в слот остатка."""
+    ItemStock.objects.filter(item_id=item_id, slot=slot).update(
+        quantity=F('quantity') + quantity
+    )
+
+
+def add_stock(item_id: int, delta: int) -> None:
+    """
+    Изменяет доступный остаток товара на delta.
+
+    Поступление распределяется поровну между STOCK_SLOTS слотами,
+    недостающие слоты создаются. Списание не уводит остаток ниже
+    нуля.
+
+    Args:
+        item_id: ID товара
+        delta: Изменение количества (может быть отрицательным)
+    """
+    with transaction.atomic():
+        ItemStock.objects.bulk_create(
+            [
+                ItemStock(item_id=item_id, slot=slot)
+                for slot in range(settings.STOCK_SLOTS)
+            ],
+            ignore_conflicts=True
+        )
+        if delta < 0:
+            remaining = -delta
+            slots = (
+                ItemStock.objects
+                .select_for_update()
+                .filter(item_id=item_id, quantity__gt=0)
+                .order_by('slot')
+                .values_list('slot', 'quantity')
+            )
+            for slot, value in slots:
+                part = min(value, remaining)
+                if _decrement(item_id, slot, part):
+                    remaining -= part
+                if not remaining:
+                    break
+            return
+
+        share, extra = divmod(delta, settings.STOCK_SLOTS)
+        for slot in range(settings.STOCK_SLOTS):
+            amount = share + (slot < extra)
+            if amount:
+                _restore(item_id, slot, amount)
+
+
+def reserve_stock(
+    lines: Dict[int, int],
+    key: str,
+    ttl: Optional[timedelta] = None
+) -> List[StockReservation]:
+    """
+    Резервирует товары на время оплаты.
+
+    Количество списывается из остатка условным UPDATE (quantity >=
+    n), поэтому остаток не уходит в минус при любом числе
+    одновременных покупок. Все товары резервируются в одной
+    транзакции: если хотя бы одного не хватает, ничего не
+    резервируется. Товары без учета остатка пропускаются.
+
+    Args:
+        lines: Количество по товарам {ID товара: количество}
+        key: Владелец резерва
+        ttl: Длительность резерва (по умолчанию
+            STOCK_RESERVATION_MINUTES)
+
+    Returns:
+        Созданные резервы
+
+    Raises:
+        OutOfStock: Если какого-то товара не хватает
+    """
+    now = timezone.now()
+    ttl = ttl or timedelta(minutes=settings.STOCK_RESERVATION_MINUTES)
+
+    hints: Dict[int, Dict[int, int]] = {}
+    for item_id, slot, quantity in (
+        ItemStock.objects
+        .filter(item_id__in=list(lines))
+        .values_list('item_id', 'slot', 'quantity')
+    ):
+        hints.setdefault(item_id, {})[slot] = quantity
+
+    if not hints:
+        return []
+
+    with transaction.atomic():
+        # Товары обрабатываются в одном порядке, чтобы одновременные
+        # заказы не блокировали слоты друг друга крест-накрест
+        reservations = []
+        for item_id in sorted(hints):
+            for slot, quantity in _take(
+                item_id, lines[item_id], hints[item_id]
+            ):
+                reservations.append(StockReservation(
+                    item_id=item_id,
+                    slot=slot,
+                    quantity=quantity,
+                    key=key,
+                    expires_at=now + ttl
+                ))
+
+        return StockReservation.objects.bulk_create(reservations)
+
+
+def attach_reservations(
+    reservations: Iterable[StockReservation],
+    currency: str,
+    reference: str
+) -> None:
+    """
+    Связывает резервы с созданным объектом оплаты в Stripe.
+
+    Args:
+        reservations: Резервы
+        currency: Валюта оплаты
+        reference: ID Checkout Session или PaymentIntent
+    """
+    ids = [reservation.id for reservation in reservations]
+    if ids:
+        StockReservation.objects.filter(id__in=ids).update(
+            currency=currency,
+            reference=reference
+        )
+
+
+def extend_reservations(reference: str, item_id: int) -> bool:
+    """
+    Продлевает действующие резервы объекта оплаты в Stripe.
+
+    Args:
+        reference: ID Checkout Session или PaymentIntent
+        item_id: ID товара
+
+    Returns:
+        True, если резерв продлен или товар не ограничен остатком,
+        False, если резерв уже просрочен или освобожден
+    """
+    now = timezone.now()
+    extended = StockReservation.objects.filter(
+        reference=reference,
+        expires_at__gt=now
+    ).update(
+        expires_at=now + timedelta(minutes=settings.STOCK_RESERVATION_MINUTES)
+    )
+    return bool(extended) or not ItemStock.objects.filter(
+        item_id=item_id
+    ).exists()
+
+
+def expire_reservations(reference: str) -> None:
+    """
+    Делает резервы объекта оплаты просроченными.
+
+    Вызывается, когда объект оплаты заменяется новым: команда
+    sweep_reservations проверит его оплату и вернет остаток.
+
+    Args:
+        reference: ID Checkout Session или PaymentIntent
+    """
+    now = timezone.now()
+    StockReservation.objects.filter(
+        reference=reference,
+        expires_at__gt=now
+    ).update(expires_at=now)
+
+
+def release_reservations(reservations: Iterable[StockReservation]) -> int:
+    """
+    Освобождает резервы: количество возвращается в остаток.
+
+    Резерв удаляется перед возвратом количества, поэтому при
+    одновременном освобождении одного резерва количество
+    возвращается один раз.
+
+    Args:
+        reservations: Резервы
+
+    Returns:
+        Количество освобожденных резервов
+    """
+    released = 0
+    for reservation in reservations:
+        with transaction.atomic():
+            deleted, _ = StockReservation.objects.filter(
+                id=reservation.id
+            ).delete()
+            if deleted:
+                _restore(
+                    reservation.item_id,
+                    reservation.slot,
+                    reservation.quantity
+                )
+                released += 1
+    return released
+
+
+@contextmanager
+def releasing_on_error(
+    reservations: Iterable[StockReservation]
+) -> Iterator[None]:
+    """
+    Освобождает резервы, если оформление оплаты не удалось.
+
+    Example:
+        >>> with releasing_on_error(reservations):
+        ...     session = gateway.create_checkout_session(...)
+    """
+    try:
+        yield
+    except BaseException:
+        release_reservations(reservations)
+        raise
+
+
+def check_payment(currency: str, reference: str) -> str:
+    """
+    Проверяет, оплачен ли объект оплаты резерва в платежной системе.
+
+    Неоплаченная Checkout Session истекает, неоплаченный
+    PaymentIntent отменяется, чтобы покупатель не смог оплатить
+    товар после возврата остатка. Если оплата прошла одновременно
+    с отменой, Stripe вернет ошибку и резерв будет проверен снова
+    при следующей очистке.
+
+    Args:
+        currency: Валюта (определяет Stripe аккаунт)
+        reference: ID Checkout Session или PaymentIntent
+
+    Returns:
+        PAID - оплата прошла, PENDING - платеж еще обрабатывается,
+        RELEASED - оплаты не будет
+
+    Raises:
+        stripe.StripeError: Если Stripe не ответил или отказал
+    """
+    gateway = get_gateway()
+    if reference.startswith('cs_'):
+        session = gateway.retrieve_checkout_session(currency, reference)
+        if session.status == 'complete':
+            return PAID
+        if session.status == 'open':
+            gateway.expire_checkout_session(currency, reference)
+        return RELEASED
+
+    intent = gateway.retrieve_payment_intent(currency, reference)
+    if intent.status == 'succeeded':
+        return PAID
+    if intent.status in ('processing', 'requires_capture'):
+        return PENDING
+    if intent.status != 'canceled':
+        gateway.cancel_payment_intent(currency, reference)
+    return RELEASED
+
+
+def release_previous_checkout(key: str, currencies: Iterable[str]) -> bool:
+    """
+    Освобождает резервы прежнего оформления оплаты перед новым.
+
+    Повторное нажатие «Оплатить» создает новый объект оплаты, а
+    резервы прежнего в тех же валютах не должны держать остаток до
+    очистки. Оплата прежнего объекта проверяется в Stripe
+    (check_payment: открытая сессия истекает), и количество сразу
+    возвращается в остаток. Если Stripe не ответил, резервы
+    делаются просроченными и их проверит sweep_reservations.
+    Резервы без объекта оплаты (оформление еще идет в другом
+    запросе) не трогаются.
+
+    Args:
+        key: Владелец резервов
+        currencies: Валюты нового оформления
+
+    Returns:
+        False, если прежняя оплата уже прошла или еще
+        обрабатывается (резервы сохраняются), иначе True
+    """
+    groups: Dict[Tuple[str, str], List[StockReservation]] = {}
+    for reservation in StockReservation.objects.filter(
+        key=key,
+        currency__in=list(currencies)
+    ).exclude(reference=''):
+        groups.setdefault(
+            (reservation.currency, reservation.reference), []
+        ).append(reservation)
+
+    for (currency, reference), group in groups.items():
+        try:
+            result = check_payment(currency, reference)
+        except stripe.StripeError:
+            expire_reservations(reference)
+            continue
+        if result != RELEASED:
+            return False
+        release_reservations(group)
+    return True
@@ -0,0 +1,213 @@
+"""Реестр Stripe аккаунтов по валютам."""
+import hashlib
+import json
+import re
+from typing import Any, Dict, List, NamedTuple, Tuple
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+CURRENCY_RE = re.compile(r'^[a-z]{3}$')
+SECRET_KEY_PREFIXES = ('sk_', 'rk_')
+PUBLIC_KEY_PREFIX = 'pk_'
+
+
+class StripeAccount(NamedTuple):
+    """
+    Stripe аккаунт валюты.
+
+    Attributes:
+        currency: Валюта (код ISO 4217 в нижнем регистре)
+        secret_key: Секретный ключ
+        public_key: Публичный ключ
+        checkout_options: Параметры checkout.Session.create валюты
+            (например, locale или payment_method_types)
+        webhook_secret: Секрет подписи webhook (whsec_...)
+        account_id: Короткий отпечаток секретного ключа. Одинаковые
+            ключи разных валют дают один аккаунт
+    """
+
+    currency: str
+    secret_key: str
+    public_key: str
+    checkout_options: Dict[str, Any]
+    webhook_secret: str
+    account_id: str
+
+
+class UnsupportedCurrency(ValueError):
+    """Для валюты не настроен Stripe аккаунт."""
+
+    def __init__(self, currency: str) -> None:
+        self.currency = currency
+        super().__init__(f'Валюта {currency!r} не настроена')
+
+
+_accounts: Dict[str, StripeAccount] = {}
+
+
+def _key_mode(key: str) -> str:
+    """Возвращает режим ключа ('test' или 'live') по его префиксу."""
+    return key.split('_')[1] if key.count('_') >= 2 else ''
+
+
+def _build_account(currency: str, config: Dict[str, Any]) -> StripeAccount:
+    """
+    Проверяет настройки аккаунта валюты и создает StripeAccount.
+
+    Пустые ключи допустимы (например, при сборке образа), но
+    заполненные ключи должны быть ключами Stripe одного режима.
+    Боевому ключу нужен секрет webhook, тестовый ключ без секрета
+    допустим: webhook такого аккаунта отклоняются.
+
+    Raises:
+        ImproperlyConfigured: Если настройки некорректны
+    """
+    if not CURRENCY_RE.match(currency):
+        raise ImproperlyConfigured(
+            f'STRIPE_ACCOUNTS: {currency!r} не является кодом валюты '
+            f'ISO 4217 в нижнем регистре'
+        )
+
+    secret_key = config.get('secret_key') or ''
+    public_key = config.get('public_key') or ''
+    if secret_key and not secret_key.startswith(SECRET_KEY_PREFIXES):
+        raise ImproperlyConfigured(
+            f'STRIPE_ACCOUNTS[{currency!r}]: секретный ключ должен '
+            f'начинаться с sk_ или rk_'
+        )
+    if public_key and not public_key.startswith(PUBLIC_KEY_PREFIX):
+        raise ImproperlyConfigured(
+            f'STRIPE_ACCOUNTS[{currency!r}]: публичный ключ должен '
+            f'начинаться с pk_'
+        )
+    if (
+        secret_key and public_key
+        and _key_mode(secret_key) != _key_mode(public_key)
+    ):
+        raise ImproperlyConfigured(
+            f'STRIPE_ACCOUNTS[{currency!r}]: секретный и публичный ключи '
+            f'из разных режимов (test и live)'
+        )
+
+    options = config.get('checkout_options') or {}
+    if isinstance(options, str):
+        try:
+            options = json.loads(options)
+        except ValueError as e:
+            raise ImproperlyConfigured(
+                f'STRIPE_ACCOUNTS[{currency!r}]: checkout_options '
+                f'не является JSON: {e}'
+            ) from e
+    if not isinstance(options, dict):
+        raise ImproperlyConfigured(
+            f'STRIPE_ACCOUNTS[{currency!r}]: checkout_options должен '
+            f'быть объектом'
+        )
+
+    webhook_secret = config.get('webhook_secret') or ''
+    if webhook_secret and not webhook_secret.startswith('whsec_'):
+        raise ImproperlyConfigured(
+            f'STRIPE_ACCOUNTS[{currency!r}]: секрет webhook должен '
+            f'начинаться с whsec_'
+        )
+    # Без секрета webhook отклоняются: в боевом режиме оплаты
+    # не дошли бы до магазина
+    if _key_mode(secret_key) == 'live' and not webhook_secret:
+        raise ImproperlyConfigured(
+            f'STRIPE_ACCOUNTS[{currency!r}]: для боевого ключа нужен '
+            f'секрет webhook (whsec_...)'
+        )
+
+    return StripeAccount(
+        currency=currency,
+        secret_key=secret_key,
+        public_key=public_key,
+        checkout_options=options,
+        webhook_secret=webhook_secret,
+        account_id=hashlib.sha256(secret_key.encode()).hexdigest()[:16]
+    )
+
+
+def load_stripe_accounts() -> Dict[str, StripeAccount]:
+    """
+    Загружает и проверяет реестр аккаунтов из STRIPE_ACCOUNTS.
+
+    Вызывается при запуске приложения items, поэтому ошибка
+    в настройках останавливает запуск, а не первую оплату.
+
+    Returns:
+        Словарь {валюта: StripeAccount}
+
+    Raises:
+        ImproperlyConfigured: Если настройки некорректны
+    """
+    accounts = {
+        currency: _build_account(currency, config)
+        for currency, config in settings.STRIPE_ACCOUNTS.items()
+    }
+    if not accounts:
+        raise ImproperlyConfigured(
+            'STRIPE_ACCOUNTS: не задано ни одной валюты'
+        )
+
+    _accounts.clear()
+    _accounts.update(accounts)
+    return _accounts
+
+
+@receiver(setting_changed)
+def _reset_accounts(setting: str, **kwargs: Any) -> None:
+    """Перечитывает реестр при изменении STRIPE_ACCOUNTS (тесты)."""
+    if setting == 'STRIPE_ACCOUNTS':
+        _accounts.clear()
+
+
+def get_account(currency: str) -> StripeAccount:
+    """
+    Возвращает Stripe аккаунт валюты.
+
+    Args:
+        currency: Валюта (регистр не важен)
+
+    Returns:
+        StripeAccount валюты
+
+    Raises:
+        UnsupportedCurrency: Если валюта не настроена
+    """
+    accounts = _accounts or load_stripe_accounts()
+    try:
+        return accounts[currency.lower()]
+    except KeyError:
+        raise UnsupportedCurrency(currency) from None
+
+
+def get_currencies() -> List[str]:
+    """Возвращает настроенные валюты, первая - валюта по умолчанию."""
+    return list(_accounts or load_stripe_accounts())
+
+
+def get_default_currency() -> str:
+    """Возвращает валюту по умолчанию (первую в STRIPE_ACCOUNTS)."""
+    return get_currencies()[0]
+
+
+def get_currency_choices() -> List[Tuple[str, str]]:
+    """Возвращает варианты выбора валюты для полей моделей и форм."""
+    return [(currency, currency.upper()) for currency in get_currencies()]
+
+
+def get_accounts() -> List[StripeAccount]:
+    """
+    Возвращает различные Stripe аккаунты.
+
+    Валюты с одинаковыми ключами обслуживает один аккаунт, он
+    возвращается один раз (для первой такой валюты).
+    """
+    unique: Dict[str, StripeAccount] = {}
+    for account in (_accounts or load_stripe_accounts()).values():
+        unique.setdefault(account.account_id, account)
+    return list(unique.values())
@@ -1,59 +1,388 @@
 """Утилиты для работы со Stripe API."""
-import stripe
-from typing import Tuple
+import math
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple, TypeVar
 
+import stripe
 from django.conf import settings
+from django.core.cache import cache
+from django.http import JsonResponse
+
+from .models import Item, StripePrice
+from .stripe_accounts import get_account
+
+T = TypeVar('T')
+
+# Ошибки, означающие недоступность Stripe (а не ошибку в запросе):
+# сетевые ошибки и таймауты, ответы 5xx и превышение лимита запросов
+CIRCUIT_ERRORS = (
+    stripe.APIConnectionError,
+    stripe.APIError,
+    stripe.RateLimitError,
+)
+
+
+class StripeUnavailable(stripe.StripeError):
+    """
+    Stripe аккаунт временно недоступен.
+
+    Возникает без запроса к Stripe, пока цепь аккаунта разомкнута,
+    и вместо сетевых ошибок и таймаутов Stripe.
+
+    Attributes:
+        account: Идентификатор Stripe аккаунта
+        retry_after: Через сколько секунд имеет смысл повторить запрос
+    """
+
+    def __init__(self, account: str, retry_after: float) -> None:
+        self.account = account
+        self.retry_after = max(1, math.ceil(retry_after))
+        super().__init__(
+            f'Stripe временно недоступен, повторите через '
+            f'{self.retry_after} с'
+        )
 
 
 def get_stripe_keys(currency: str) -> Tuple[str, str]:
     """
-    Возвращает Stripe ключи в зависимости от валюты.
+    Возвращает Stripe ключи аккаунта валюты из реестра аккаунтов.
 
     Args:
-        currency: Валюта ('usd' или 'kzt')
+        currency: Валюта (одна из STRIPE_ACCOUNTS)
 
     Returns:
-        Кортеж из (secret_key, public_key) для указанной валюты.
-        По умолчанию возвращает USD ключи.
+        Кортеж из (secret_key, public_key) для указанной валюты
+
+    Raises:
+        UnsupportedCurrency: Если валюта не настроена
 
     Example:
         >>> secret, public = get_stripe_keys('usd')
         >>> secret, public = get_stripe_keys('kzt')
     """
-    currency_lower = currency.lower()
+    account = get_account(currency)
+    return account.secret_key, account.public_key
+
+
+def configure_stripe() -> None:
+    """
+    Настраивает HTTP клиент Stripe SDK.
+
+    Задает короткие таймауты вместо стандартных 80 секунд, чтобы
+    зависший Stripe не занимал воркеры, отключает автоматические
+    повторы SDK (повторами управляет вызывающий код) и позволяет
+    направить запросы на локальный сервер (STRIPE_API_BASE).
+    """
+    stripe.default_http_client = stripe.new_default_http_client(
+        timeout=(settings.STRIPE_CONNECT_TIMEOUT, settings.STRIPE_READ_TIMEOUT)
+    )
+    stripe.max_network_retries = settings.STRIPE_MAX_NETWORK_RETRIES
+    if settings.STRIPE_API_BASE:
+        stripe.api_base = settings.STRIPE_API_BASE
+
+
+def get_stripe_account(currency: str) -> str:
+    """
+    Возвращает идентификатор Stripe аккаунта для указанной валюты.
+
+    Идентификатор вычисляется из секретного ключа, поэтому смена ключей
+    (например, test на live) автоматически требует новой синхронизации
+    Stripe Product/Price.
+
+    Args:
+        currency: Валюта (одна из STRIPE_ACCOUNTS)
+
+    Returns:
+        Короткий отпечаток секретного ключа
+    """
+    return get_account(currency).account_id
+
+
+def _circuit_key(account: str, name: str) -> str:
+    return f'stripe:circuit:{account}:{name}'
+
+
+def ensure_stripe_available(currency: str) -> None:
+    """
+    Проверяет, что цепь Stripe аккаунта валюты не разомкнута.
+
+    Позволяет отказать сразу, до подготовки данных для запроса.
+
+    Args:
+        currency: Валюта (одна из STRIPE_ACCOUNTS)
+
+    Raises:
+        StripeUnavailable: Если цепь аккаунта разомкнута
+    """
+    account = get_stripe_account(currency)
+    open_until = cache.get(_circuit_key(account, 'open_until'))
+    if open_until and time.time() < open_until:
+        raise StripeUnavailable(account, open_until - time.time())
+
+
+def _trip_circuit(account: str) -> float:
+    """Размыкает цепь аккаунта и возвращает время до пробного запроса."""
+    cooldown = settings.STRIPE_BREAKER_COOLDOWN
+    cache.set(_circuit_key(account, 'open_until'), time.time() + cooldown)
+    cache.delete_many([
+        _circuit_key(account, 'failures'),
+        _circuit_key(account, 'probe'),
+    ])
+    return cooldown
+
+
+@contextmanager
+def stripe_circuit(account: str) -> Iterator[None]:
+    """
+    Выполняет запрос к Stripe через предохранитель аккаунта.
+
+    Состояние хранится в Django кэше отдельно для каждого аккаунта:
+    - замкнута: запросы проходят, ошибки недоступности считаются
+      в окне STRIPE_BREAKER_WINDOW секунд;
+    - разомкнута: после STRIPE_BREAKER_THRESHOLD ошибок запросы
+      STRIPE_BREAKER_COOLDOWN секунд отклоняются без обращения к Stripe;
+    - полуоткрыта: по истечении паузы пропускается один пробный
+      запрос. Успех замыкает цепь, ошибка снова размыкает ее.
+
+    Ошибки запроса (например, неверные параметры) означают, что Stripe
+    отвечает, и не считаются сбоем.
+
+    Args:
+        account: Идентификатор Stripe аккаунта
+
+    Raises:
+        StripeUnavailable: Если цепь разомкнута или Stripe не ответил
+    """
+    open_key = _circuit_key(account, 'open_until')
+    probe_key = _circuit_key(account, 'probe')
+    failures_key = _circuit_key(account, 'failures')
 
-    if currency_lower == 'kzt':
-        return (
-            settings.STRIPE_SECRET_KEY_KZT,
-            settings.STRIPE_PUBLIC_KEY_KZT
+    probing = False
+    open_until = cache.get(open_key)
+    if open_until:
+        now = time.time()
+        if now < open_until:
+            raise StripeUnavailable(account, open_until - now)
+        # Полуоткрытое состояние: пробный запрос выполняет один процесс
+        probe_timeout = (
+            settings.STRIPE_CONNECT_TIMEOUT + settings.STRIPE_READ_TIMEOUT
         )
+        if not cache.add(probe_key, 1, math.ceil(probe_timeout) + 1):
+            raise StripeUnavailable(account, probe_timeout)
+        probing = True
+
+    try:
+        yield
+    except CIRCUIT_ERRORS as e:
+        if probing:
+            retry_after = _trip_circuit(account)
+        else:
+            cache.add(failures_key, 0, settings.STRIPE_BREAKER_WINDOW)
+            try:
+                failures = cache.incr(failures_key)
+            except ValueError:
+                failures = 1
+                cache.set(failures_key, 1, settings.STRIPE_BREAKER_WINDOW)
+            retry_after = 1
+            if failures >= settings.STRIPE_BREAKER_THRESHOLD:
+                retry_after = _trip_circuit(account)
+        raise StripeUnavailable(account, retry_after) from e
+    except stripe.StripeError:
+        if probing:
+            cache.delete_many([open_key, probe_key])
+        raise
     else:
-        # По умолчанию USD
-        return (
-            settings.STRIPE_SECRET_KEY,
-            settings.STRIPE_PUBLIC_KEY
-        )
+        if probing:
+            cache.delete_many([open_key, probe_key])
 
 
-def get_stripe_client(currency: str) -> stripe:
+def call_stripe(
+    currency: str,
+    method: Callable[..., T],
+    /,
+    *args: Any,
+    **kwargs: Any
+) -> T:
     """
-    Возвращает настроенный Stripe клиент для указанной валюты.
+    Вызывает метод Stripe SDK в аккаунте валюты через предохранитель.
 
-    Настраивает API ключ Stripe в зависимости от валюты.
-    Это позволяет использовать разные Stripe аккаунты
-    для разных валют.
+    Ключ передается в запрос, а не устанавливается глобально, поэтому
+    функцию можно вызывать параллельно из разных потоков. Первые два
+    аргумента только позиционные: параметр currency самого метода
+    (например, PaymentIntent.create) передается в **kwargs.
 
     Args:
-        currency: Валюта ('usd' или 'kzt')
+        currency: Валюта (одна из STRIPE_ACCOUNTS)
+        method: Метод SDK, например stripe.checkout.Session.create
+        *args: Позиционные аргументы метода
+        **kwargs: Параметры метода
 
     Returns:
-        Настроенный модуль stripe с установленным API ключом.
+        Результат метода
+
+    Raises:
+        StripeUnavailable: Если Stripe аккаунт недоступен
 
     Example:
-        >>> stripe_client = get_stripe_client('usd')
-        >>> session = stripe_client.checkout.Session.create(...)
+        >>> call_stripe('usd', stripe.PaymentIntent.cancel, 'pi_123')
+    """
+    account = get_account(currency)
+    with stripe_circuit(account.account_id):
+        return method(*args, api_key=account.secret_key, **kwargs)
+
+
+def stripe_unavailable_response(error: StripeUnavailable) -> JsonResponse:
+    """
+    Формирует ответ 503 для недоступного Stripe.
+
+    Args:
+        error: Исключение StripeUnavailable
+
+    Returns:
+        JSON ответ 503 с заголовком Retry-After
+    """
+    response = JsonResponse(
+        {'error': 'Payment provider is temporarily unavailable'},
+        status=503
+    )
+    response['Retry-After'] = str(error.retry_after)
+    return response
+
+
+def get_cached_price_ids(
+    prices: Dict[int, Tuple[str, int]]
+) -> Dict[int, str]:
+    """
+    Возвращает актуальные Stripe Price ID для товаров одним запросом.
+
+    Price считается актуальным, если создан в аккаунте валюты товара
+    и для той же цены.
+
+    Args:
+        prices: Словарь {item_id: (currency, unit_amount)}
+
+    Returns:
+        Словарь {item_id: price_id}. Товары без актуального
+        Price в словарь не попадают.
     """
-    secret_key, _ = get_stripe_keys(currency)
-    stripe.api_key = secret_key
-    return stripe
+    expected = {
+        item_id: (get_stripe_account(currency), currency, unit_amount)
+        for item_id, (currency, unit_amount) in prices.items()
+    }
+    cached = StripePrice.objects.filter(item_id__in=expected).values_list(
+        'item_id', 'account', 'currency', 'unit_amount', 'price_id'
+    )
+    return {
+        item_id: price_id
+        for item_id, account, currency, unit_amount, price_id in cached
+        if expected[item_id] == (account, currency, unit_amount)
+    }
+
+
+def build_line_item(
+    item_id: int,
+    name: str,
+    currency: str,
+    unit_amount: int,
+    quantity: int,
+    price_ids: Dict[int, str]
+) -> Dict[str, Any]:
+    """
+    Формирует line_item для Stripe Checkout Session.
+
+    Если для товара есть закэшированный Stripe Price, передается только
+    его ID. Иначе описание товара и цена передаются через price_data.
+
+    Args:
+        item_id: ID товара
+        name: Название товара
+        currency: Валюта
+        unit_amount: Цена в центах
+        quantity: Количество
+        price_ids: Результат get_cached_price_ids
+
+    Returns:
+        Словарь line_item для checkout.Session.create
+    """
+    if item_id in price_ids:
+        return {"price": price_ids[item_id], "quantity": quantity}
+
+    return {
+        "price_data": {
+            "currency": currency,
+            "product_data": {
+                "name": name,
+            },
+            "unit_amount": unit_amount,
+        },
+        "quantity": quantity,
+    }
+
+
+def sync_item(
+    api_key: str,
+    account: str,
+    item: Item,
+    existing: Optional[StripePrice]
+) -> StripePrice:
+    """
+    Создает или обновляет Stripe Product и Price для одного товара.
+
+    Price в Stripe неизменяем, поэтому при изменении цены создается
+    новый Price, а старый деактивируется.
+
+    Args:
+        api_key: Секретный ключ Stripe аккаунта
+        account: Идентификатор Stripe аккаунта
+        item: Товар
+        existing: Ранее сохраненная запись StripePrice (если есть)
+
+    Returns:
+        Несохраненный объект StripePrice с актуальными ID
+    """
+    version = int(item.datetime_updated.timestamp())
+
+    if existing:
+        product_id = existing.product_id
+        stripe.Product.modify(product_id, api_key=api_key, name=item.name)
+    else:
+        product = stripe.Product.create(
+            api_key=api_key,
+            idempotency_key=f'item-{item.id}-product-{account}',
+            name=item.name,
+            metadata={'item_id': item.id},
+        )
+        product_id = product.id
+
+    if (
+        existing
+        and existing.unit_amount == item.price
+        and existing.currency == item.currency
+    ):
+        price_id = existing.price_id
+    else:
+        price = stripe.Price.create(
+            api_key=api_key,
+            idempotency_key=f'item-{item.id}-price-{account}-{version}',
+            product=product_id,
+            currency=item.currency,
+            unit_amount=item.price,
+            metadata={'item_id': item.id},
+        )
+        price_id = price.id
+        if existing:
+            stripe.Price.modify(
+                existing.price_id,
+                api_key=api_key,
+                active=False
+            )
 
+    return StripePrice(
+        item=item,
+        account=account,
+        currency=item.currency,
+        unit_amount=item.price,
+        product_id=product_id,
+        price_id=price_id,
+    )
@@ -0,0 +1,79 @@
+"""Фоновые задачи приложения items."""
+import stripe
+
+from jobs.queue import task
+
+from .gateways import get_gateway
+from .models import Item, StripePrice
+from .stripe_utils import (
+    get_stripe_account,
+    get_stripe_keys,
+    stripe_circuit,
+    sync_item
+)
+
+
+@task
+def cancel_payment_intent(currency: str, intent_id: str) -> bool:
+    """
+    Отменяет PaymentIntent в Stripe аккаунте валюты.
+
+    Intent, который уже оплачен или отменен, отменить нельзя,
+    такая ошибка Stripe не считается сбоем.
+
+    Args:
+        currency: Валюта (определяет Stripe аккаунт)
+        intent_id: ID PaymentIntent
+
+    Returns:
+        True, если intent отменен этим вызовом
+    """
+    try:
+        get_gateway().cancel_payment_intent(currency, intent_id)
+    except stripe.InvalidRequestError:
+        return False
+    return True
+
+
+@task
+def sync_item_price(item_id: int) -> None:
+    """
+    Синхронизирует товар со Stripe Product/Price после изменения.
+
+    Если запись StripePrice уже соответствует товару (например,
+    ее обновила команда sync_stripe_prices), Stripe не вызывается.
+
+    Args:
+        item_id: ID товара
+    """
+    item = Item.objects.filter(id=item_id).first()
+    if item is None:
+        return
+
+    api_key, _ = get_stripe_keys(item.currency)
+    account = get_stripe_account(item.currency)
+    existing = StripePrice.objects.filter(
+        item=item,
+        account=account,
+        currency=item.currency
+    ).first()
+    if (
+        existing
+        and existing.unit_amount == item.price
+        and existing.datetime_updated >= item.datetime_updated
+    ):
+        return
+
+    with stripe_circuit(account):
+        price = sync_item(api_key, account, item, existing)
+
+    StripePrice.objects.update_or_create(
+        item=item,
+        account=account,
+        currency=item.currency,
+        defaults={
+            'unit_amount': price.unit_amount,
+            'product_id': price.product_id,
+            'price_id': price.price_id,
+        }
+    )
@@ -1,3 +1,217 @@
-from django.test import TestCase
+from typing import List
+from unittest import mock
 
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.http import HttpResponse
+from django.test import TransactionTestCase, override_settings
 
+from abstracts.cache import close_listener
+from items.gateways import FakeGateway, get_gateway
+from items.models import Item, StockReservation
+from items.search import search_items
+from items.stock import add_stock, get_available
+from items.stripe_accounts import (
+    UnsupportedCurrency,
+    get_account,
+    get_default_currency,
+    load_stripe_accounts
+)
+from items.stripe_utils import StripeUnavailable
+
+
+def tearDownModule() -> None:
+    # Соединение шины кэша не дает удалить тестовую базу PostgreSQL
+    close_listener()
+
+
+@override_settings(PAYMENT_GATEWAY='items.gateways.FakeGateway')
+class BuyItemTests(TransactionTestCase):
+    """Оплата товара через Checkout Session (шлюз FakeGateway)."""
+
+    def setUp(self) -> None:
+        get_gateway().reset()
+        cache.clear()
+        self.item = Item.objects.create(
+            name='Книга', description='', price=1500, currency='usd'
+        )
+
+    def buy(self) -> HttpResponse:
+        return self.client.get(f'/buy/{self.item.id}/')
+
+    def test_creates_session(self) -> None:
+        response = self.buy()
+
+        self.assertEqual(response.status_code, 200)
+        session = get_gateway().retrieve_checkout_session(
+            'usd', response.json()['id']
+        )
+        self.assertEqual(session.status, 'open')
+        self.assertEqual(session.amount_total, 1500)
+        self.assertTrue(session.success_url.endswith('/success/'))
+
+    def test_reserves_stock(self) -> None:
+        add_stock(self.item.id, 2)
+
+        response = self.buy()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(get_available([self.item.id]), {self.item.id: 1})
+        reservation = StockReservation.objects.get(item=self.item)
+        self.assertEqual(reservation.reference, response.json()['id'])
+        self.assertEqual(reservation.currency, 'usd')
+
+    def test_out_of_stock(self) -> None:
+        add_stock(self.item.id, 1)
+        self.assertEqual(self.buy().status_code, 200)
+
+        # Другой покупатель
+        response = self.client_class().get(f'/buy/{self.item.id}/')
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(StockReservation.objects.count(), 1)
+
+    def test_second_click_replaces_session(self) -> None:
+        add_stock(self.item.id, 1)
+        first = self.buy().json()['id']
+
+        response = self.buy()
+
+        self.assertEqual(response.status_code, 200)
+        reservation = StockReservation.objects.get()
+        self.assertEqual(reservation.reference, response.json()['id'])
+        self.assertEqual(
+            get_gateway().retrieve_checkout_session('usd', first).status,
+            'expired'
+        )
+
+    def test_second_purchase_after_payment(self) -> None:
+        add_stock(self.item.id, 2)
+        first = self.buy().json()['id']
+        get_gateway().complete(first)
+
+        self.assertEqual(self.buy().status_code, 200)
+
+        # Резерв оплаченной сессии не возвращается в остаток
+        self.assertEqual(StockReservation.objects.count(), 2)
+        self.assertEqual(get_available([self.item.id]), {self.item.id: 0})
+
+    def test_stripe_unavailable(self) -> None:
+        add_stock(self.item.id, 1)
+
+        with mock.patch.object(
+            FakeGateway,
+            'create_checkout_session',
+            side_effect=StripeUnavailable('acct', 30)
+        ):
+            response = self.buy()
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '30')
+        # Резерв возвращается в остаток
+        self.assertFalse(StockReservation.objects.exists())
+        self.assertEqual(get_available([self.item.id]), {self.item.id: 1})
+
+    def test_circuit_open(self) -> None:
+        with mock.patch.object(
+            FakeGateway,
+            'ensure_available',
+            side_effect=StripeUnavailable('acct', 5)
+        ), mock.patch.object(
+            FakeGateway, 'create_checkout_session'
+        ) as create:
+            response = self.buy()
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '5')
+        create.assert_not_called()
+
+    def test_not_found(self) -> None:
+        self.assertEqual(self.client.get('/buy/0/').status_code, 404)
+
+
+class StripeAccountsTests(TransactionTestCase):
+    """Проверка реестра Stripe аккаунтов (STRIPE_ACCOUNTS)."""
+
+    def load(self, **config: str) -> None:
+        with override_settings(STRIPE_ACCOUNTS={'usd': config}):
+            load_stripe_accounts()
+
+    def test_live_key_requires_webhook_secret(self) -> None:
+        with self.assertRaises(ImproperlyConfigured):
+            self.load(secret_key='sk_live_x', public_key='pk_live_x')
+
+        self.load(
+            secret_key='sk_live_x',
+            public_key='pk_live_x',
+            webhook_secret='whsec_x'
+        )
+        self.load(secret_key='sk_test_x', public_key='pk_test_x')
+
+    def test_invalid_config(self) -> None:
+        for config in (
+            {'secret_key': 'pk_test_x'},
+            {'public_key': 'sk_test_x'},
+            {'webhook_secret': 'secret'},
+            {'secret_key': 'sk_test_x', 'public_key': 'pk_live_x'},
+            {'secret_key': 'rk_live_x', 'public_key': 'pk_test_x'},
+            {'checkout_options': '{locale'},
+            {'checkout_options': '["card"]'},
+        ):
+            with self.subTest(config=config):
+                with self.assertRaises(ImproperlyConfigured):
+                    self.load(**config)
+
+    def test_invalid_currency(self) -> None:
+        for accounts in ({'USD': {}}, {'us': {}}, {}):
+            with self.subTest(accounts=accounts):
+                with override_settings(STRIPE_ACCOUNTS=accounts):
+                    with self.assertRaises(ImproperlyConfigured):
+                        load_stripe_accounts()
+
+    @override_settings(STRIPE_ACCOUNTS={
+        'usd': {'secret_key': 'sk_test_a', 'public_key': 'pk_test_a'},
+        'kzt': {
+            'secret_key': 'rk_test_b',
+            'public_key': 'pk_test_b',
+            'checkout_options': '{"locale": "ru"}',
+        },
+    })
+    def test_get_account(self) -> None:
+        account = get_account('KZT')
+
+        self.assertEqual(account.secret_key, 'rk_test_b')
+        self.assertEqual(account.checkout_options, {'locale': 'ru'})
+        self.assertNotEqual(
+            account.account_id, get_account('usd').account_id
+        )
+        self.assertEqual(get_default_currency(), 'usd')
+        with self.assertRaises(UnsupportedCurrency):
+            get_account('eur')
+
+
+class SearchIndexTests(TransactionTestCase):
+    """Актуальность поискового индекса после изменений товаров."""
+
+    def found(self, query: str) -> List[int]:
+        # Латиница: регистр кириллицы зависит от локали базы
+        return [item_id for _, item_id in search_items(query, 10)]
+
+    def test_create_update_delete(self) -> None:
+        item = Item.objects.create(
+            name='Ceramic mug', description='', price=500
+        )
+        self.assertEqual(self.found('mug'), [item.id])
+
+        item.name = 'Cup'
+        item.description = 'Porcelain cup'
+        item.save()
+        self.assertEqual(self.found('mug'), [])
+        self.assertEqual(self.found('porcelain'), [item.id])
+
+        Item.objects.filter(id=item.id).update(name='Thermos')
+        self.assertEqual(self.found('thermos'), [item.id])
+
+        item.delete()
+        self.assertEqual(self.found('thermos'), [])
+        self.assertEqual(self.found('porcelain'), [])
@@ -1,6 +1,7 @@
 """URL конфигурация для приложения items."""
 from django.urls import path
 
+from .api import item_detail, item_list, item_search
 from .views import (
     buy_item,
     item_page,
@@ -29,4 +30,7 @@ urlpatterns = [
         create_payment_intent,
         name="payment_intent"
     ),
+    path("api/items/", item_list, name="api_item_list"),
+    path("api/items/search/", item_search, name="api_item_search"),
+    path("api/items/<int:id>/", item_detail, name="api_item_detail"),
 ]
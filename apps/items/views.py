@@ -1,25 +1,145 @@
-from typing import Dict, Any
+import zlib
+from datetime import datetime
+from typing import Dict, Any, Optional
 
-from django.http import HttpRequest, HttpResponse, JsonResponse
-from django.shortcuts import get_object_or_404, render
+import stripe
+from django.conf import settings
+from django.http import Http404, HttpRequest, HttpResponse, JsonResponse
+from django.shortcuts import render
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
 
+from abstracts.sessions import get_session_id
+
+from .gateways import get_gateway
 from .models import Item
-from .stripe_utils import get_stripe_keys, get_stripe_client
+from .search import format_cursor, parse_cursor, search_items
+from .services import (
+    forget_payment_intent,
+    get_cached_item,
+    get_item_payment_intent,
+    get_related_items
+)
+from .stock import (
+    OutOfStock,
+    attach_reservations,
+    release_previous_checkout,
+    releasing_on_error,
+    reserve_stock
+)
+from .stripe_utils import (
+    StripeUnavailable,
+    build_line_item,
+    get_cached_price_ids,
+    get_stripe_keys,
+    stripe_unavailable_response
+)
+
+
+def get_item_or_404(id: int) -> Item:
+    """
+    Возвращает товар из кэша процесса.
+
+    Raises:
+        Http404: Если товар не найден
+    """
+    item = get_cached_item(id)
+    if item is None:
+        raise Http404('Товар не найден')
+    return item
+
+
+def get_item_updated(request: HttpRequest, id: int) -> Optional[datetime]:
+    """
+    Возвращает время последнего изменения страницы товара.
+
+    Страница зависит от товара и товаров блока «Часто покупают
+    вместе». Все они читаются из кэша процесса (get_cached_item,
+    get_related_items), поэтому ответ 304 не обращается к базе.
+
+    Args:
+        request: HTTP запрос
+        id: ID товара
+
+    Returns:
+        Наибольшее datetime_updated товара и рекомендуемых товаров
+        или None, если товар не найден
+    """
+    item = get_cached_item(id)
+    if item is None:
+        return None
+    return max(
+        [item.datetime_updated]
+        + [related.datetime_updated for related in get_related_items(id)]
+    )
+
+
+def item_etag(request: HttpRequest, id: int) -> Optional[str]:
+    """
+    Возвращает ETag страницы товара.
+
+    Учитывает время изменения и состав рекомендаций: замена
+    рекомендуемого товара более старым тоже меняет ETag.
+    """
+    updated = get_item_updated(request, id)
+    if updated is None:
+        return None
+    related = ','.join(str(item.id) for item in get_related_items(id))
+    return (
+        f'item-{id}-{int(updated.timestamp() * 1_000_000)}-'
+        f'{zlib.crc32(related.encode()):08x}'
+    )
+
+
+def item_last_modified(request: HttpRequest, id: int) -> Optional[datetime]:
+    """Возвращает Last-Modified страницы товара."""
+    return get_item_updated(request, id)
+
+
+# Страницы товара зависят только от строки Item и рекомендаций товара:
+# при совпадении ETag/Last-Modified возвращается 304 без рендеринга.
+# no-cache заставляет браузер каждый раз проверять актуальность.
+item_conditional = condition(
+    etag_func=item_etag,
+    last_modified_func=item_last_modified
+)
 
 
 def index_page(request: HttpRequest) -> HttpResponse:
     """
     Отображает главную страницу со списком всех товаров.
 
+    С параметром q показывает результаты поиска по релевантности,
+    следующая страница запрашивается параметром cursor.
+
     Args:
         request: HTTP запрос
 
     Returns:
         HTTP ответ с отрендеренным шаблоном index.html
     """
-    items = Item.objects.all()
+    query = request.GET.get("q", "").strip()
+    if not query:
+        return render(request, "index.html", {
+            "items": Item.objects.all()
+        })
+
+    try:
+        cursor = request.GET.get("cursor")
+        after = parse_cursor(cursor) if cursor else None
+    except ValueError:
+        after = None
+
+    found = search_items(query, settings.SEARCH_PAGE_SIZE, after)
+    items = Item.objects.in_bulk([item_id for _, item_id in found])
+    next_cursor = None
+    if len(found) == settings.SEARCH_PAGE_SIZE:
+        next_cursor = format_cursor(found[-1])
+
     return render(request, "index.html", {
-        "items": items
+        "items": [items[item_id] for _, item_id in found if item_id in items],
+        "query": query,
+        "next_cursor": next_cursor,
     })
 
 
@@ -29,6 +149,11 @@ def buy_item(request: HttpRequest, id: int) -> JsonResponse:
 
     Создает сессию оплаты в Stripe для указанного товара.
     Использует правильные Stripe ключи в зависимости от валюты товара.
+    Если товар синхронизирован со Stripe, передается только его price_id.
+    Пока Stripe аккаунт недоступен, сразу возвращается 503.
+    Товар резервируется на время оплаты (см. items.stock). Повторное
+    нажатие «Оплатить» заменяет прежнюю сессию этого товара: она
+    истекает, а ее резерв возвращается в остаток.
 
     Args:
         request: HTTP запрос
@@ -39,11 +164,10 @@ def buy_item(request: HttpRequest, id: int) -> JsonResponse:
 
     Raises:
         404: Если товар с указанным ID не найден
+        409: Если товар закончился
+        503: Если Stripe временно недоступен (с заголовком Retry-After)
     """
-    item = get_object_or_404(Item, id=id)
-
-    # Получаем правильный Stripe клиент для валюты товара
-    stripe_client = get_stripe_client(item.currency)
+    item = get_item_or_404(id)
 
     # Формируем динамические URL
     scheme = request.scheme
@@ -51,29 +175,48 @@ def buy_item(request: HttpRequest, id: int) -> JsonResponse:
     success_url = f"{scheme}://{host}/success/"
     cancel_url = f"{scheme}://{host}/cancel/"
 
-    session = stripe_client.checkout.Session.create(
-        mode="payment",
-        line_items=[{
-            "price_data": {
-                "currency": item.currency,
-                "product_data": {
-                    "name": item.name,
-                },
-                "unit_amount": item.price,
-            },
-            "quantity": 1,
-        }],
-        success_url=success_url,
-        cancel_url=cancel_url,
-    )
-
+    try:
+        gateway = get_gateway()
+        gateway.ensure_available(item.currency)
+        key = f'item:{item.id}:{get_session_id(request, create=True)}'
+        # Оплаченная прежняя сессия - отдельная покупка, ее резерв
+        # остается, а новая покупка резервирует еще одну единицу
+        release_previous_checkout(key, [item.currency])
+        reservations = reserve_stock({item.id: 1}, key)
+        with releasing_on_error(reservations):
+            price_ids = get_cached_price_ids(
+                {item.id: (item.currency, item.price)}
+            )
+            session = gateway.create_checkout_session(
+                item.currency,
+                mode="payment",
+                line_items=[build_line_item(
+                    item.id, item.name, item.currency, item.price, 1,
+                    price_ids
+                )],
+                success_url=success_url,
+                cancel_url=cancel_url,
+            )
+    except OutOfStock:
+        return JsonResponse({"error": "Item is out of stock"}, status=409)
+    except StripeUnavailable as e:
+        return stripe_unavailable_response(e)
+
+    attach_reservations(reservations, item.currency, session.id)
     return JsonResponse({"id": session.id})
 
 
+@cache_control(no_cache=True)
+@item_conditional
 def item_page(request: HttpRequest, id: int) -> HttpResponse:
     """
     Отображает страницу товара с кнопкой оплаты.
 
+    Поддерживает условные GET запросы (ETag/Last-Modified), карточка
+    товара кэшируется фрагментом шаблона до изменения товара. Блок
+    «Часто покупают вместе» строит build_recommendations, список
+    читается из кэша процесса.
+
     Args:
         request: HTTP запрос
         id: ID товара
@@ -84,12 +227,14 @@ def item_page(request: HttpRequest, id: int) -> HttpResponse:
     Raises:
         404: Если товар с указанным ID не найден
     """
-    item = get_object_or_404(Item, id=id)
+    item = get_item_or_404(id)
     # Получаем правильный публичный ключ для валюты товара
     _, public_key = get_stripe_keys(item.currency)
     return render(request, "item.html", {
         "item": item,
-        "stripe_public_key": public_key
+        "related_items": get_related_items(item.id),
+        "stripe_public_key": public_key,
+        "cache_timeout": settings.ITEM_PAGE_CACHE_TIMEOUT
     })
 
 
@@ -97,13 +242,26 @@ def success_page(request: HttpRequest) -> HttpResponse:
     """
     Отображает страницу успешной оплаты.
 
+    После оплаты заказа (query параметр order - подписанный токен
+    «ID:подпись») страница подписывается на поток событий
+    orders:order_events и показывает, подтвердил ли Stripe оплату.
+    Подпись проверяет поток событий.
+
     Args:
         request: HTTP запрос
 
     Returns:
         HTTP ответ с отрендеренным шаблоном success.html
     """
-    return render(request, "success.html")
+    intent_id = request.GET.get('payment_intent')
+    if intent_id:
+        forget_payment_intent(get_session_id(request), intent_id)
+    token = request.GET.get('order', '')
+    order_id, _, signature = token.partition(':')
+    return render(request, "success.html", {
+        "order_id": int(order_id) if order_id.isdigit() else None,
+        "order_token": token if signature else None
+    })
 
 
 def cancel_page(request: HttpRequest) -> HttpResponse:
@@ -119,6 +277,8 @@ def cancel_page(request: HttpRequest) -> HttpResponse:
     return render(request, "cancel.html")
 
 
+@cache_control(no_cache=True)
+@item_conditional
 def item_payment_intent_page(
     request: HttpRequest,
     id: int
@@ -128,6 +288,7 @@ def item_payment_intent_page(
 
     Позволяет пользователю оплатить товар без перенаправления
     на страницу Stripe. Оплата происходит прямо на сайте.
+    Кэширование такое же, как у item_page.
 
     Args:
         request: HTTP запрос
@@ -139,12 +300,13 @@ def item_payment_intent_page(
     Raises:
         404: Если товар с указанным ID не найден
     """
-    item = get_object_or_404(Item, id=id)
+    item = get_item_or_404(id)
     # Получаем правильный публичный ключ для валюты товара
     _, public_key = get_stripe_keys(item.currency)
     return render(request, "item_payment_intent.html", {
         "item": item,
-        "stripe_public_key": public_key
+        "stripe_public_key": public_key,
+        "cache_timeout": settings.ITEM_PAGE_CACHE_TIMEOUT
     })
 
 
@@ -153,12 +315,17 @@ def create_payment_intent(
     id: int
 ) -> JsonResponse:
     """
-    Создает Payment Intent для оплаты товара (бонусная задача).
+    Возвращает Payment Intent для оплаты товара (бонусная задача).
 
     Альтернатива Checkout Session для более гибкого управления
     процессом оплаты. Payment Intent позволяет контролировать
     процесс оплаты на стороне клиента.
 
+    Intent хранится для пары (сессия, товар) и используется повторно
+    при следующих загрузках страницы оплаты, при изменении цены его
+    сумма обновляется. Query параметр refresh=1 заменяет сохраненный
+    intent новым (например, если он уже оплачен в другой вкладке).
+
     Args:
         request: HTTP запрос
         id: ID товара для оплаты
@@ -169,26 +336,25 @@ def create_payment_intent(
     Raises:
         404: Если товар с указанным ID не найден
         400: Если произошла ошибка при создании Payment Intent
+        409: Если товар закончился
+        503: Если Stripe временно недоступен (с заголовком Retry-After)
     """
-    item = get_object_or_404(Item, id=id)
-
-    # Получаем правильный Stripe клиент для валюты товара
-    stripe_client = get_stripe_client(item.currency)
+    item = get_item_or_404(id)
 
     try:
-        # Создаем Payment Intent
-        intent = stripe_client.PaymentIntent.create(
-            amount=item.price,
-            currency=item.currency,
-            metadata={
-                'item_id': item.id,
-                'item_name': item.name,
-            },
+        record = get_item_payment_intent(
+            get_session_id(request, create=True),
+            item,
+            refresh=request.GET.get('refresh') == '1'
         )
-
-        return JsonResponse({
-            'client_secret': intent.client_secret,
-            'payment_intent_id': intent.id,
-        })
-    except Exception as e:
+    except OutOfStock:
+        return JsonResponse({'error': 'Item is out of stock'}, status=409)
+    except StripeUnavailable as e:
+        return stripe_unavailable_response(e)
+    except stripe.StripeError as e:
         return JsonResponse({'error': str(e)}, status=400)
+
+    return JsonResponse({
+        'client_secret': record.client_secret,
+        'payment_intent_id': record.intent_id,
+    })
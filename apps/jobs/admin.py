@@ -0,0 +1,78 @@
+from typing import Any
+
+from django.contrib import admin, messages
+from django.db import IntegrityError, transaction
+from django.db.models import QuerySet
+from django.utils import timezone
+
+from .models import Job
+
+
+@admin.action(description='Повторить выбранные задачи')
+def retry_jobs(
+    modeladmin: admin.ModelAdmin,
+    request: Any,
+    queryset: QuerySet
+) -> None:
+    """
+    Возвращает завершившиеся ошибкой задачи в очередь.
+
+    Задачи, для которых в очереди уже есть задача с тем же
+    ключом дедупликации, пропускаются.
+    """
+    retried = 0
+    for job in queryset.filter(status=Job.StatusChoices.FAILED):
+        try:
+            with transaction.atomic():
+                job.status = Job.StatusChoices.PENDING
+                job.attempts = 0
+                job.run_at = timezone.now()
+                job.save()
+        except IntegrityError:
+            continue
+        retried += 1
+
+    modeladmin.message_user(
+        request,
+        f'Возвращено в очередь задач: {retried}',
+        messages.SUCCESS
+    )
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    """
+    Админ-класс для просмотра очереди фоновых задач.
+
+    Задачи создаются кодом приложения, в админке их можно
+    только просматривать, удалять и повторять.
+    """
+
+    list_display = (
+        'id',
+        'name',
+        'status',
+        'attempts',
+        'max_attempts',
+        'run_at',
+        'datetime_updated'
+    )
+    list_filter = ('status', 'name')
+    search_fields = ('name', 'dedup_key')
+    readonly_fields = (
+        'name',
+        'kwargs',
+        'dedup_key',
+        'status',
+        'attempts',
+        'max_attempts',
+        'run_at',
+        'locked_until',
+        'last_error',
+        'datetime_created',
+        'datetime_updated'
+    )
+    actions = [retry_jobs]
+
+    def has_add_permission(self, request: Any) -> bool:
+        return False
@@ -0,0 +1,20 @@
+"""Конфигурация приложения jobs."""
+from django.apps import AppConfig
+from django.utils.module_loading import autodiscover_modules
+
+
+class JobsConfig(AppConfig):
+    """
+    Конфигурация приложения jobs.
+
+    Это приложение содержит очередь фоновых задач в базе данных
+    и воркер для их выполнения.
+    """
+
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'jobs'
+    verbose_name = 'Фоновые задачи'
+
+    def ready(self) -> None:
+        """Регистрирует задачи из модулей tasks.py всех приложений."""
+        autodiscover_modules('tasks')
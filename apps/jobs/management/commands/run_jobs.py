@@ -0,0 +1,96 @@
+"""Management-команда воркера очереди фоновых задач."""
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from typing import Any
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandParser
+from django.db import close_old_connections
+from django.utils import timezone
+
+from jobs.models import Job
+from jobs.queue import claim_jobs, run_job
+
+
+def run_in_thread(job: Job) -> bool:
+    """Выполняет задачу в потоке пула и закрывает его соединение с БД."""
+    try:
+        return run_job(job)
+    finally:
+        close_old_connections()
+
+
+class Command(BaseCommand):
+    """
+    Выполняет задачи из очереди фоновых задач.
+
+    Задачи захватываются пакетами и выполняются параллельно в пуле
+    потоков. Несколько воркеров могут работать одновременно: на
+    PostgreSQL они не блокируют друг друга (SKIP LOCKED). Задачи
+    воркера, который упал или завис, через --lease секунд
+    захватываются заново. Без --interval команда выполняет все
+    готовые задачи и завершается (подходит для cron), с --interval
+    работает как фоновый процесс и опрашивает очередь.
+
+    Example:
+        python manage.py run_jobs --interval 1 --workers 4
+    """
+
+    help = 'Выполнение фоновых задач из очереди'
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument('--batch-size', type=int, default=20)
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=4,
+            help='Количество параллельно выполняемых задач'
+        )
+        parser.add_argument(
+            '--lease',
+            type=float,
+            default=settings.JOBS_LEASE_SECONDS,
+            help='Через сколько секунд незавершенная задача '
+                 'считается зависшей'
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            help='Опрашивать очередь каждые N секунд'
+        )
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            while True:
+                done = failed = 0
+                while True:
+                    jobs = claim_jobs(options['batch_size'], options['lease'])
+                    if not jobs:
+                        break
+                    for success in pool.map(run_in_thread, jobs):
+                        if success:
+                            done += 1
+                        else:
+                            failed += 1
+
+                if done or failed or not options['interval']:
+                    self.stdout.write(
+                        f'Выполнено задач: {done}, с ошибкой: {failed}'
+                    )
+                self._purge()
+
+                if not options['interval']:
+                    break
+                time.sleep(options['interval'])
+
+    @staticmethod
+    def _purge() -> None:
+        """Удаляет давно выполненные задачи."""
+        Job.objects.filter(
+            status=Job.StatusChoices.DONE,
+            datetime_updated__lt=(
+                timezone.now()
+                - timedelta(hours=settings.JOBS_KEEP_DONE_HOURS)
+            )
+        ).delete()
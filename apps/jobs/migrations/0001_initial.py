@@ -0,0 +1,39 @@
+# Generated by Django 6.0.1 on 2026-10-19 02:35
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Job',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('datetime_created', models.DateTimeField(auto_now_add=True, verbose_name='дата и время создания')),
+                ('datetime_updated', models.DateTimeField(auto_now=True, verbose_name='дата и время редактирования')),
+                ('name', models.CharField(max_length=255, verbose_name='задача')),
+                ('kwargs', models.JSONField(blank=True, default=dict, verbose_name='аргументы')),
+                ('dedup_key', models.CharField(blank=True, max_length=255, null=True, verbose_name='ключ дедупликации')),
+                ('status', models.CharField(choices=[('pending', 'в очереди'), ('running', 'выполняется'), ('done', 'выполнена'), ('failed', 'ошибка')], default='pending', max_length=16, verbose_name='статус')),
+                ('attempts', models.PositiveIntegerField(default=0, verbose_name='попыток')),
+                ('max_attempts', models.PositiveIntegerField(default=5, verbose_name='максимум попыток')),
+                ('run_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='выполнить после')),
+                ('locked_until', models.DateTimeField(blank=True, null=True, verbose_name='закреплена до')),
+                ('last_error', models.TextField(blank=True, verbose_name='последняя ошибка')),
+            ],
+            options={
+                'verbose_name': 'фоновая задача',
+                'verbose_name_plural': 'фоновые задачи',
+                'ordering': ('-id',),
+                'indexes': [models.Index(fields=['status', 'run_at'], name='job_status_run_at_idx')],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('status', 'pending')), fields=('dedup_key',), name='unique_pending_job')],
+            },
+        ),
+    ]
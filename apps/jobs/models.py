@@ -0,0 +1,104 @@
+"""Модели очереди фоновых задач."""
+from django.db import models
+from django.utils import timezone
+
+from abstracts.models import TimeStampModel
+
+
+class Job(TimeStampModel):
+    """
+    Фоновая задача в очереди.
+
+    Задачи ставятся в очередь через Task.enqueue() и выполняются
+    командой run_jobs. Очередь хранится в основной базе, поэтому
+    задача, поставленная внутри транзакции, станет видна воркеру
+    только после ее фиксации.
+
+    Attributes:
+        name: Имя зарегистрированной задачи (модуль.функция)
+        kwargs: Аргументы вызова (JSON)
+        dedup_key: Ключ дедупликации: в очереди может ждать только
+            одна задача с таким ключом
+        status: Состояние задачи
+        attempts: Количество начатых попыток
+        max_attempts: Максимальное количество попыток
+        run_at: Время, раньше которого задачу не выполнять
+        locked_until: Время, до которого задача закреплена за воркером
+        last_error: Traceback последней ошибки
+        datetime_created: Дата и время постановки в очередь
+        datetime_updated: Дата и время последнего изменения
+    """
+
+    class StatusChoices(models.TextChoices):
+        """Состояние задачи."""
+
+        PENDING = 'pending', 'в очереди'
+        RUNNING = 'running', 'выполняется'
+        DONE = 'done', 'выполнена'
+        FAILED = 'failed', 'ошибка'
+
+    name = models.CharField(
+        verbose_name='задача',
+        max_length=255
+    )
+    kwargs = models.JSONField(
+        verbose_name='аргументы',
+        default=dict,
+        blank=True
+    )
+    dedup_key = models.CharField(
+        verbose_name='ключ дедупликации',
+        max_length=255,
+        null=True,
+        blank=True
+    )
+    status = models.CharField(
+        verbose_name='статус',
+        max_length=16,
+        choices=StatusChoices.choices,
+        default=StatusChoices.PENDING
+    )
+    attempts = models.PositiveIntegerField(
+        verbose_name='попыток',
+        default=0
+    )
+    max_attempts = models.PositiveIntegerField(
+        verbose_name='максимум попыток',
+        default=5
+    )
+    run_at = models.DateTimeField(
+        verbose_name='выполнить после',
+        default=timezone.now
+    )
+    locked_until = models.DateTimeField(
+        verbose_name='закреплена до',
+        null=True,
+        blank=True
+    )
+    last_error = models.TextField(
+        verbose_name='последняя ошибка',
+        blank=True
+    )
+
+    def __str__(self) -> str:
+        return f'{self.name} #{self.id} ({self.status})'
+
+    class Meta:
+        """Метаданные модели."""
+
+        verbose_name = 'фоновая задача'
+        verbose_name_plural = 'фоновые задачи'
+        ordering = ('-id',)
+        indexes = [
+            models.Index(
+                fields=('status', 'run_at'),
+                name='job_status_run_at_idx'
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=('dedup_key',),
+                condition=models.Q(status='pending'),
+                name='unique_pending_job'
+            ),
+        ]
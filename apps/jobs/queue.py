@@ -0,0 +1,255 @@
+"""Регистрация, постановка в очередь и выполнение фоновых задач."""
+import random
+import traceback
+from contextlib import nullcontext
+from datetime import timedelta
+from typing import Any, Callable, Dict, List, Optional
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Job
+
+TASKS: Dict[str, 'Task'] = {}
+
+
+class Task:
+    """
+    Зарегистрированная фоновая задача.
+
+    Оборачивает функцию: прямой вызов выполняет ее сразу,
+    enqueue() ставит вызов в очередь.
+
+    Attributes:
+        func: Функция задачи
+        name: Имя задачи в очереди (модуль.функция)
+        max_attempts: Максимальное количество попыток
+    """
+
+    def __init__(self, func: Callable[..., Any], max_attempts: int) -> None:
+        self.func = func
+        self.name = f'{func.__module__}.{func.__qualname__}'
+        self.max_attempts = max_attempts
+        self.__doc__ = func.__doc__
+
+    def __call__(self, *args: Any, **kwargs: Any) -> Any:
+        return self.func(*args, **kwargs)
+
+    def enqueue(
+        self,
+        *,
+        dedup_key: Optional[str] = None,
+        delay: float = 0,
+        **kwargs: Any
+    ) -> Job:
+        """
+        Ставит вызов задачи в очередь.
+
+        Если в очереди уже ждет задача с тем же dedup_key, новая
+        не создается. Задача, которая уже выполняется, дубликатом
+        не считается: изменения, сделанные после ее старта, она
+        может не увидеть.
+
+        Args:
+            dedup_key: Ключ дедупликации
+            delay: Задержка выполнения в секундах
+            **kwargs: Аргументы задачи (должны сериализоваться в JSON)
+
+        Returns:
+            Созданная или уже ожидающая задача
+        """
+        run_at = timezone.now() + timedelta(seconds=delay)
+        while True:
+            try:
+                with transaction.atomic():
+                    return Job.objects.create(
+                        name=self.name,
+                        kwargs=kwargs,
+                        dedup_key=dedup_key,
+                        max_attempts=self.max_attempts,
+                        run_at=run_at,
+                    )
+            except IntegrityError:
+                if dedup_key is None:
+                    raise
+            # Ожидающая задача могла быть захвачена воркером
+            # между INSERT и SELECT: тогда пробуем создать снова
+            job = Job.objects.filter(
+                dedup_key=dedup_key,
+                status=Job.StatusChoices.PENDING
+            ).first()
+            if job:
+                return job
+
+
+def task(
+    func: Optional[Callable[..., Any]] = None,
+    *,
+    max_attempts: int = 5
+) -> Any:
+    """
+    Регистрирует функцию как фоновую задачу.
+
+    Задачи объявляются в модулях tasks.py приложений, которые
+    воркер импортирует при запуске. Аргументы задачи передаются
+    только по имени.
+
+    Example:
+        >>> @task(max_attempts=3)
+        ... def send_receipt(order_id: int) -> None: ...
+        >>> send_receipt.enqueue(order_id=1)
+    """
+    def register(func: Callable[..., Any]) -> Task:
+        registered = Task(func, max_attempts)
+        TASKS[registered.name] = registered
+        return registered
+
+    if func is not None:
+        return register(func)
+    return register
+
+
+def retry_delay(attempts: int, error: BaseException) -> float:
+    """
+    Вычисляет задержку перед следующей попыткой.
+
+    Экспоненциальная задержка со случайным разбросом, чтобы задачи,
+    упавшие одновременно, не повторялись одновременно. Если ошибка
+    сообщает retry_after (например, StripeUnavailable), задержка
+    не меньше него.
+
+    Args:
+        attempts: Количество уже сделанных попыток
+        error: Ошибка последней попытки
+
+    Returns:
+        Задержка в секундах
+    """
+    delay = min(
+        settings.JOBS_RETRY_BASE_DELAY * 2 ** (attempts - 1),
+        settings.JOBS_RETRY_MAX_DELAY
+    )
+    delay = random.uniform(delay / 2, delay)
+    return max(delay, getattr(error, 'retry_after', 0))
+
+
+def claim_jobs(limit: int, lease: float) -> List[Job]:
+    """
+    Захватывает задачи, готовые к выполнению.
+
+    Кроме ожидающих задач захватываются и зависшие: воркер,
+    выполнявший их, не отчитался до истечения аренды (lease).
+    На PostgreSQL строки, заблокированные другими воркерами,
+    пропускаются (SKIP LOCKED). На SQLite блокировки строк нет,
+    поэтому захват подтверждается условным UPDATE, а транзакция
+    не открывается: чтение с последующей записью в ней приводит
+    к «database is locked» при параллельных воркерах.
+
+    Args:
+        limit: Максимальное количество задач
+        lease: На сколько секунд задача закрепляется за воркером
+
+    Returns:
+        Захваченные задачи
+    """
+    now = timezone.now()
+    locked_until = now + timedelta(seconds=lease)
+    claimed = []
+
+    if connection.features.has_select_for_update_skip_locked:
+        atomic = transaction.atomic()
+    else:
+        atomic = nullcontext()
+
+    with atomic:
+        candidates = list(
+            Job.objects
+            .select_for_update(skip_locked=True)
+            .filter(
+                Q(status=Job.StatusChoices.PENDING, run_at__lte=now)
+                | Q(status=Job.StatusChoices.RUNNING, locked_until__lt=now)
+            )
+            .order_by('run_at', 'id')[:limit]
+        )
+        for job in candidates:
+            updated = Job.objects.filter(
+                id=job.id,
+                status=job.status,
+                attempts=job.attempts
+            ).update(
+                status=Job.StatusChoices.RUNNING,
+                attempts=F('attempts') + 1,
+                locked_until=locked_until,
+                datetime_updated=now,
+            )
+            if updated:
+                job.status = Job.StatusChoices.RUNNING
+                job.attempts += 1
+                job.locked_until = locked_until
+                claimed.append(job)
+
+    return claimed
+
+
+def run_job(job: Job) -> bool:
+    """
+    Выполняет захваченную задачу и сохраняет результат.
+
+    При ошибке задача возвращается в очередь с задержкой, пока не
+    исчерпаны попытки, после чего получает статус failed. Результат
+    записывается, только если задача все еще закреплена за этим
+    воркером (аренда не истекла и ее не захватил другой воркер).
+
+    Args:
+        job: Задача, захваченная claim_jobs
+
+    Returns:
+        True, если задача выполнена успешно
+    """
+    mine = Job.objects.filter(
+        id=job.id,
+        status=Job.StatusChoices.RUNNING,
+        attempts=job.attempts
+    )
+    registered = TASKS.get(job.name)
+
+    try:
+        if registered is None:
+            raise LookupError(f'Задача {job.name} не зарегистрирована')
+        registered(**job.kwargs)
+    except Exception as e:
+        now = timezone.now()
+        error = traceback.format_exc()
+        if registered is None or job.attempts >= job.max_attempts:
+            mine.update(
+                status=Job.StatusChoices.FAILED,
+                locked_until=None,
+                last_error=error,
+                datetime_updated=now,
+            )
+            return False
+        try:
+            with transaction.atomic():
+                mine.update(
+                    status=Job.StatusChoices.PENDING,
+                    run_at=now + timedelta(
+                        seconds=retry_delay(job.attempts, e)
+                    ),
+                    locked_until=None,
+                    last_error=error,
+                    datetime_updated=now,
+                )
+        except IntegrityError:
+            # Пока задача выполнялась, в очередь встала такая же
+            # (тот же dedup_key): повтор выполнит она
+            mine.delete()
+        return False
+
+    mine.update(
+        status=Job.StatusChoices.DONE,
+        locked_until=None,
+        datetime_updated=timezone.now(),
+    )
+    return True
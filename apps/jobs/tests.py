@@ -0,0 +1,210 @@
+import threading
+from datetime import timedelta
+from typing import Iterable, List
+from unittest import mock, skipUnless
+
+from django.db import connection, transaction
+from django.db.models import F
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from jobs.models import Job
+from jobs.queue import claim_jobs, retry_delay, run_job, task
+
+calls: List[int] = []
+
+
+@task(max_attempts=2)
+def record_call(value: int) -> None:
+    """Запоминает вызов задачи."""
+    calls.append(value)
+
+
+@task(max_attempts=2)
+def fail(message: str) -> None:
+    """Падает с ошибкой."""
+    raise ValueError(message)
+
+
+class EnqueueTests(TestCase):
+    """Постановка задач в очередь (Task.enqueue)."""
+
+    def test_dedup_pending(self) -> None:
+        first = record_call.enqueue(dedup_key='item:1', value=1)
+
+        second = record_call.enqueue(dedup_key='item:1', value=2)
+
+        self.assertEqual(second.id, first.id)
+        self.assertEqual(Job.objects.get().kwargs, {'value': 1})
+
+    def test_running_job_is_not_duplicate(self) -> None:
+        first = record_call.enqueue(dedup_key='item:1', value=1)
+        claim_jobs(10, 60)
+
+        second = record_call.enqueue(dedup_key='item:1', value=2)
+
+        self.assertNotEqual(second.id, first.id)
+        self.assertEqual(second.status, Job.StatusChoices.PENDING)
+
+    def test_without_dedup_key(self) -> None:
+        record_call.enqueue(value=1)
+        record_call.enqueue(value=1)
+
+        self.assertEqual(Job.objects.count(), 2)
+
+
+class ClaimJobsTests(TestCase):
+    """Захват задач воркером (claim_jobs)."""
+
+    def test_claims_ready_jobs(self) -> None:
+        ready = record_call.enqueue(value=1)
+        record_call.enqueue(value=2, delay=60)
+
+        claimed = claim_jobs(10, 60)
+
+        self.assertEqual([job.id for job in claimed], [ready.id])
+        ready.refresh_from_db()
+        self.assertEqual(ready.status, Job.StatusChoices.RUNNING)
+        self.assertEqual(ready.attempts, 1)
+        self.assertGreater(ready.locked_until, timezone.now())
+        self.assertEqual(claim_jobs(10, 60), [])
+
+    def test_claimed_by_other_worker(self) -> None:
+        taken = record_call.enqueue(value=1)
+        free = record_call.enqueue(value=2)
+
+        def racing_list(rows: Iterable[Job]) -> List[Job]:
+            rows = list(rows)
+            # Другой воркер захватывает задачу между SELECT и UPDATE
+            Job.objects.filter(id=taken.id).update(
+                status=Job.StatusChoices.RUNNING,
+                attempts=F('attempts') + 1
+            )
+            return rows
+
+        # Захват подтверждается условным UPDATE (на SQLite строки
+        # не блокируются, и только он защищает от двойного захвата)
+        with mock.patch('jobs.queue.list', racing_list, create=True):
+            claimed = claim_jobs(10, 60)
+
+        self.assertEqual([job.id for job in claimed], [free.id])
+        taken.refresh_from_db()
+        self.assertEqual(taken.attempts, 1)
+
+    def test_expired_lease_reclaimed(self) -> None:
+        record_call.enqueue(value=1)
+        [stale] = claim_jobs(10, 60)
+        Job.objects.update(locked_until=timezone.now() - timedelta(seconds=1))
+
+        [job] = claim_jobs(10, 60)
+
+        self.assertEqual(job.id, stale.id)
+        self.assertEqual(job.attempts, 2)
+        # Воркер с истекшей арендой не записывает результат
+        self.assertTrue(run_job(stale))
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.StatusChoices.RUNNING)
+        self.assertTrue(run_job(job))
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.StatusChoices.DONE)
+
+
+@skipUnless(
+    connection.features.has_select_for_update_skip_locked,
+    'SKIP LOCKED не поддерживается базой'
+)
+class ClaimJobsSkipLockedTests(TransactionTestCase):
+    """Захват задач, заблокированных другим воркером (PostgreSQL)."""
+
+    def test_skips_locked_rows(self) -> None:
+        locked = record_call.enqueue(value=1)
+        free = record_call.enqueue(value=2)
+        ready = threading.Event()
+        release = threading.Event()
+
+        def hold() -> None:
+            try:
+                with transaction.atomic():
+                    Job.objects.select_for_update().get(id=locked.id)
+                    ready.set()
+                    release.wait(5)
+            finally:
+                connection.close()
+
+        worker = threading.Thread(target=hold)
+        worker.start()
+        try:
+            ready.wait(5)
+            claimed = claim_jobs(10, 60)
+        finally:
+            release.set()
+            worker.join()
+
+        self.assertEqual([job.id for job in claimed], [free.id])
+
+
+@override_settings(JOBS_RETRY_BASE_DELAY=10, JOBS_RETRY_MAX_DELAY=60)
+class RunJobTests(TestCase):
+    """Выполнение задач и повторы (run_job)."""
+
+    def setUp(self) -> None:
+        calls.clear()
+
+    def claim(self) -> Job:
+        [job] = claim_jobs(10, 60)
+        return job
+
+    def test_success(self) -> None:
+        record_call.enqueue(value=7)
+
+        self.assertTrue(run_job(self.claim()))
+
+        self.assertEqual(calls, [7])
+        job = Job.objects.get()
+        self.assertEqual(job.status, Job.StatusChoices.DONE)
+        self.assertIsNone(job.locked_until)
+
+    def test_retry_then_fail(self) -> None:
+        fail.enqueue(message='boom')
+
+        started = timezone.now()
+        self.assertFalse(run_job(self.claim()))
+
+        job = Job.objects.get()
+        self.assertEqual(job.status, Job.StatusChoices.PENDING)
+        self.assertIn('ValueError: boom', job.last_error)
+        # Первый повтор через 5-10 секунд
+        self.assertGreaterEqual(job.run_at, started + timedelta(seconds=5))
+        self.assertLessEqual(
+            job.run_at, timezone.now() + timedelta(seconds=10)
+        )
+        self.assertEqual(claim_jobs(10, 60), [])
+
+        Job.objects.update(run_at=timezone.now())
+        self.assertFalse(run_job(self.claim()))
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.StatusChoices.FAILED)
+        self.assertEqual(job.attempts, 2)
+
+    def test_unknown_task_fails(self) -> None:
+        Job.objects.create(name='jobs.tests.missing')
+
+        self.assertFalse(run_job(self.claim()))
+
+        job = Job.objects.get()
+        self.assertEqual(job.status, Job.StatusChoices.FAILED)
+        self.assertIn('не зарегистрирована', job.last_error)
+
+    def test_retry_delay(self) -> None:
+        error = ValueError()
+        for attempts, (low, high) in ((1, (5, 10)), (3, (20, 40))):
+            with self.subTest(attempts=attempts):
+                delay = retry_delay(attempts, error)
+                self.assertGreaterEqual(delay, low)
+                self.assertLessEqual(delay, high)
+        # Не больше JOBS_RETRY_MAX_DELAY
+        self.assertLessEqual(retry_delay(10, error), 60)
+        # Не меньше retry_after ошибки
+        error.retry_after = 120
+        self.assertEqual(retry_delay(1, error), 120)
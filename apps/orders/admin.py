@@ -1,9 +1,48 @@
-from typing import Any, Optional
+import csv
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 
 from django.contrib import admin
+from django.db.models import Max, QuerySet, Sum
+from django.http import HttpResponse, StreamingHttpResponse
 from django.utils.html import format_html
 
-from .models import Order, OrderItem, Discount, Tax
+from .models import (
+    ArchivedOrder,
+    ArchivedOrderItem,
+    ArchivedOrderPayment,
+    DailyDiscountSales,
+    DailyItemSales,
+    DailySales,
+    Discount,
+    Order,
+    OrderCheckoutSession,
+    OrderHistory,
+    OrderHistoryItem,
+    OrderHistoryPayment,
+    OrderItem,
+    OrderPayment,
+    SalesRollup,
+    Tax
+)
+from .sales import METRICS, record_sales, updating_sales
+
+
+def format_totals(totals: List[Dict[str, Any]], key: str) -> str:
+    """
+    Форматирует суммы заказа по валютам для отображения в админке.
+
+    Args:
+        totals: Результат Order.totals_by_currency
+        key: Какую сумму выводить ('subtotal' или 'total')
+
+    Returns:
+        Строка вида "10.00 USD / 5000.00 KZT" или "0.00" для пустого заказа
+    """
+    if not totals:
+        return "0.00"
+    return " / ".join(
+        f"{row[key] / 100:.2f} {row['currency'].upper()}" for row in totals
+    )
 
 
 class OrderItemInline(admin.TabularInline):
@@ -26,12 +65,12 @@ class OrderItemInline(admin.TabularInline):
             obj: Объект OrderItem
 
         Returns:
-            Строка с ценой и валютой или "-" если товар отсутствует
+            Строка с ценой и валютой или "-" для новой записи
         """
-        if obj.item:
+        if obj.pk:
             return (
-                f"{obj.item.price_display:.2f} "
-                f"{obj.item.currency.upper()}"
+                f"{obj.unit_amount_display:.2f} "
+                f"{obj.currency.upper()}"
             )
         return "-"
 
@@ -45,16 +84,42 @@ class OrderItemInline(admin.TabularInline):
             obj: Объект OrderItem
 
         Returns:
-            Строка с общей стоимостью и валютой или "-" если товар отсутствует
+            Строка с общей стоимостью и валютой или "-" для новой записи
         """
-        if obj.item:
-            total = obj.item.price * obj.quantity / 100
-            return f"{total:.2f} {obj.item.currency.upper()}"
+        if obj.pk:
+            total = obj.unit_amount * obj.quantity / 100
+            return f"{total:.2f} {obj.currency.upper()}"
         return "-"
 
     get_total.short_description = 'Итого'
 
 
+class OrderPaymentInline(admin.TabularInline):
+    """Inline админ для отображения оплат заказа в Stripe."""
+
+    model = OrderPayment
+    extra = 0
+    can_delete = False
+    fields = ('reference', 'currency', 'amount', 'datetime_created')
+    readonly_fields = fields
+
+    def has_add_permission(self, request: Any, obj: Any = None) -> bool:
+        return False
+
+
+class OrderCheckoutSessionInline(admin.TabularInline):
+    """Inline админ для отображения текущих сессий оплаты заказа."""
+
+    model = OrderCheckoutSession
+    extra = 0
+    can_delete = False
+    fields = ('session_id', 'currency', 'datetime_updated')
+    readonly_fields = fields
+
+    def has_add_permission(self, request: Any, obj: Any = None) -> bool:
+        return False
+
+
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
     """
@@ -75,22 +140,38 @@ class OrderAdmin(admin.ModelAdmin):
     list_filter = ('is_paid', 'datetime_created', 'discount', 'tax')
     search_fields = ('id',)
     readonly_fields = (
+        'discount_percent',
+        'tax_percent',
+        'datetime_paid',
         'datetime_created',
         'datetime_updated',
         'get_subtotal',
         'get_total'
     )
-    inlines = [OrderItemInline]
+    inlines = [
+        OrderItemInline,
+        OrderPaymentInline,
+        OrderCheckoutSessionInline
+    ]
     fieldsets = (
         ('Информация о заказе', {
-            'fields': ('is_paid', 'discount', 'tax')
+            'fields': ('is_paid', 'discount', 'discount_redeemed', 'tax')
         }),
         ('Расчеты', {
-            'fields': ('get_subtotal', 'get_total'),
+            'fields': (
+                'get_subtotal',
+                'get_total',
+                'discount_percent',
+                'tax_percent'
+            ),
             'classes': ('collapse',)
         }),
         ('Системная информация', {
-            'fields': ('datetime_created', 'datetime_updated'),
+            'fields': (
+                'datetime_paid',
+                'datetime_created',
+                'datetime_updated'
+            ),
             'classes': ('collapse',)
         }),
     )
@@ -117,13 +198,9 @@ class OrderAdmin(admin.ModelAdmin):
             obj: Объект Order
 
         Returns:
-            Строка с промежуточной суммой и валютой
+            Строка с промежуточными суммами по каждой валюте
         """
-        subtotal = obj.subtotal() / 100
-        if obj.items.exists():
-            currency = obj.items.first().item.currency.upper()
-            return f"{subtotal:.2f} {currency}"
-        return "0.00"
+        return format_totals(obj.totals_by_currency(), 'subtotal')
 
     get_subtotal.short_description = 'Промежуточная сумма'
 
@@ -135,16 +212,52 @@ class OrderAdmin(admin.ModelAdmin):
             obj: Объект Order
 
         Returns:
-            Строка с итоговой суммой и валютой
+            Строка с итоговыми суммами по каждой валюте
         """
-        total = obj.total_amount() / 100
-        if obj.items.exists():
-            currency = obj.items.first().item.currency.upper()
-            return f"{total:.2f} {currency}"
-        return "0.00"
+        return format_totals(obj.totals_by_currency(), 'total')
 
     get_total.short_description = 'Итоговая сумма'
 
+    def save_model(
+        self,
+        request: Any,
+        obj: Order,
+        form: Any,
+        change: bool
+    ) -> None:
+        """
+        Сохраняет заказ, вычитая прежний вклад оплаченного заказа
+        из агрегатов продаж (новый добавляется в save_related,
+        после сохранения товаров заказа).
+        """
+        if change:
+            record_sales(
+                Order.objects.filter(id=obj.id, is_paid=True)
+                .values_list('id', flat=True),
+                sign=-1
+            )
+        super().save_model(request, obj, form, change)
+
+    def save_related(
+        self,
+        request: Any,
+        form: Any,
+        formsets: Any,
+        change: bool
+    ) -> None:
+        """Сохраняет товары заказа и учитывает оплаченный заказ."""
+        super().save_related(request, form, formsets, change)
+        if form.instance.is_paid:
+            record_sales([form.instance.id])
+
+    def delete_model(self, request: Any, obj: Order) -> None:
+        with updating_sales([obj.id]):
+            super().delete_model(request, obj)
+
+    def delete_queryset(self, request: Any, queryset: QuerySet) -> None:
+        with updating_sales(list(queryset.values_list('id', flat=True))):
+            super().delete_queryset(request, queryset)
+
 
 @admin.register(OrderItem)
 class OrderItemAdmin(admin.ModelAdmin):
@@ -154,9 +267,10 @@ class OrderItemAdmin(admin.ModelAdmin):
     Позволяет просматривать и редактировать отдельные товары в заказах.
     """
 
-    list_display = ('id', 'order', 'item', 'quantity', 'get_total')
+    list_display = ('id', 'order', 'name', 'quantity', 'get_total')
     list_filter = ('order', 'item')
-    search_fields = ('order__id', 'item__name')
+    search_fields = ('order__id', 'name')
+    readonly_fields = ('name', 'currency', 'unit_amount')
 
     def get_total(self, obj: OrderItem) -> str:
         """
@@ -166,15 +280,35 @@ class OrderItemAdmin(admin.ModelAdmin):
             obj: Объект OrderItem
 
         Returns:
-            Строка с общей стоимостью и валютой или "-" если товар отсутствует
+            Строка с общей стоимостью и валютой или "-" для новой записи
         """
-        if obj.item:
-            total = obj.item.price * obj.quantity / 100
-            return f"{total:.2f} {obj.item.currency.upper()}"
+        if obj.pk:
+            total = obj.unit_amount * obj.quantity / 100
+            return f"{total:.2f} {obj.currency.upper()}"
         return "-"
 
     get_total.short_description = 'Итого'
 
+    def save_model(
+        self,
+        request: Any,
+        obj: OrderItem,
+        form: Any,
+        change: bool
+    ) -> None:
+        """Сохраняет товар, обновляя агрегаты продаж его заказа."""
+        order_ids = {obj.order_id, form.initial.get('order')} - {None}
+        with updating_sales(order_ids):
+            super().save_model(request, obj, form, change)
+
+    def delete_model(self, request: Any, obj: OrderItem) -> None:
+        with updating_sales([obj.order_id]):
+            super().delete_model(request, obj)
+
+    def delete_queryset(self, request: Any, queryset: QuerySet) -> None:
+        with updating_sales(set(queryset.values_list('order_id', flat=True))):
+            super().delete_queryset(request, queryset)
+
 
 @admin.register(Discount)
 class DiscountAdmin(admin.ModelAdmin):
@@ -189,21 +323,59 @@ class DiscountAdmin(admin.ModelAdmin):
         'name',
         'code',
         'percent',
+        'valid_until',
+        'redemptions_count',
+        'max_redemptions',
         'datetime_created'
     )
     list_filter = ('percent', 'datetime_created')
     search_fields = ('name', 'code')
-    readonly_fields = ('datetime_created', 'datetime_updated')
+    readonly_fields = (
+        'redemptions_count',
+        'datetime_created',
+        'datetime_updated'
+    )
     fieldsets = (
         ('Основная информация', {
             'fields': ('name', 'code', 'percent')
         }),
+        ('Ограничения', {
+            'fields': (
+                'valid_from',
+                'valid_until',
+                'max_redemptions',
+                'redemptions_count'
+            )
+        }),
         ('Системная информация', {
             'fields': ('datetime_created', 'datetime_updated'),
             'classes': ('collapse',)
         }),
     )
 
+    def save_model(
+        self,
+        request: Any,
+        obj: Discount,
+        form: Any,
+        change: bool
+    ) -> None:
+        """
+        Сохраняет скидку, не перезаписывая счетчик использований.
+
+        Счетчик меняется атомарными UPDATE во время оплаты, поэтому
+        при редактировании в админке он не сохраняется из формы.
+        """
+        if not change:
+            super().save_model(request, obj, form, change)
+            return
+
+        obj.save(update_fields=[
+            field.name
+            for field in obj._meta.concrete_fields
+            if not field.primary_key and field.name != 'redemptions_count'
+        ])
+
 
 @admin.register(Tax)
 class TaxAdmin(admin.ModelAdmin):
@@ -226,3 +398,300 @@ class TaxAdmin(admin.ModelAdmin):
             'classes': ('collapse',)
         }),
     )
+
+
+class ArchivedOrderItemInline(admin.TabularInline):
+    """Inline админ для отображения товаров архивного заказа."""
+
+    model = ArchivedOrderItem
+    extra = 0
+    can_delete = False
+    fields = ('item', 'name', 'currency', 'unit_amount', 'quantity')
+    readonly_fields = fields
+
+    def has_add_permission(self, request: Any, obj: Any = None) -> bool:
+        return False
+
+
+class ArchivedOrderPaymentInline(admin.TabularInline):
+    """Inline админ для отображения оплат архивного заказа."""
+
+    model = ArchivedOrderPayment
+    extra = 0
+    can_delete = False
+    fields = ('reference', 'currency', 'amount', 'datetime_paid')
+    readonly_fields = fields
+
+    def has_add_permission(self, request: Any, obj: Any = None) -> bool:
+        return False
+
+
+@admin.register(ArchivedOrder)
+class ArchivedOrderAdmin(admin.ModelAdmin):
+    """
+    Админ-класс для просмотра архивных заказов.
+
+    Архивные заказы доступны только для чтения.
+    """
+
+    list_display = (
+        'id',
+        'is_paid',
+        'discount',
+        'tax',
+        'datetime_created',
+        'datetime_archived'
+    )
+    list_filter = ('is_paid', 'datetime_created', 'datetime_archived')
+    search_fields = ('id',)
+    inlines = [ArchivedOrderItemInline, ArchivedOrderPaymentInline]
+
+    def has_add_permission(self, request: Any) -> bool:
+        return False
+
+    def has_change_permission(self, request: Any, obj: Any = None) -> bool:
+        return False
+
+
+class Echo:
+    """Псевдо-файл для потоковой записи CSV через csv.writer."""
+
+    def write(self, value: str) -> str:
+        return value
+
+
+def export_orders_csv(
+    modeladmin: admin.ModelAdmin,
+    request: Any,
+    queryset: QuerySet
+) -> StreamingHttpResponse:
+    """
+    Экспортирует товары выбранных заказов в CSV.
+
+    Файл формируется потоково, поэтому экспорт большого количества
+    заказов не загружает их в память целиком.
+    """
+    rows = (
+        OrderHistoryItem.objects
+        .filter(order__in=queryset)
+        .select_related('order')
+        .order_by('order_id', 'id')
+    )
+    writer = csv.writer(Echo())
+
+    def stream() -> Iterator[str]:
+        yield writer.writerow([
+            'order_id',
+            'is_paid',
+            'is_archived',
+            'datetime_created',
+            'item_id',
+            'item_name',
+            'currency',
+            'unit_amount',
+            'quantity',
+        ])
+        for row in rows.iterator(chunk_size=2000):
+            yield writer.writerow([
+                row.order_id,
+                row.order.is_paid,
+                row.order.is_archived,
+                row.order.datetime_created.isoformat(),
+                row.item_id,
+                row.name,
+                row.currency,
+                row.unit_amount,
+                row.quantity,
+            ])
+
+    response = StreamingHttpResponse(stream(), content_type='text/csv')
+    response['Content-Disposition'] = 'attachment; filename="orders.csv"'
+    return response
+
+
+export_orders_csv.short_description = 'Экспорт в CSV'
+
+
+class OrderHistoryItemInline(admin.TabularInline):
+    """Inline админ для отображения товаров заказа из истории."""
+
+    model = OrderHistoryItem
+    extra = 0
+    can_delete = False
+    fields = ('item', 'name', 'currency', 'unit_amount', 'quantity')
+    readonly_fields = fields
+
+    def has_add_permission(self, request: Any, obj: Any = None) -> bool:
+        return False
+
+
+class OrderHistoryPaymentInline(admin.TabularInline):
+    """Inline админ для отображения оплат заказа из истории."""
+
+    model = OrderHistoryPayment
+    extra = 0
+    can_delete = False
+    fields = ('reference', 'currency', 'amount', 'datetime_paid')
+    readonly_fields = fields
+
+    def has_add_permission(self, request: Any, obj: Any = None) -> bool:
+        return False
+
+
+@admin.register(OrderHistory)
+class OrderHistoryAdmin(admin.ModelAdmin):
+    """
+    Админ-класс для просмотра всех заказов, включая архивные.
+
+    Читает SQL представление, объединяющее основные и архивные
+    таблицы заказов. Доступен только для чтения и экспорта.
+    """
+
+    list_display = (
+        'id',
+        'is_paid',
+        'is_archived',
+        'discount',
+        'tax',
+        'datetime_created'
+    )
+    list_filter = ('is_paid', 'is_archived', 'datetime_created')
+    search_fields = ('id',)
+    inlines = [OrderHistoryItemInline, OrderHistoryPaymentInline]
+    actions = [export_orders_csv]
+
+    def has_add_permission(self, request: Any) -> bool:
+        return False
+
+    def has_change_permission(self, request: Any, obj: Any = None) -> bool:
+        return False
+
+    def has_delete_permission(self, request: Any, obj: Any = None) -> bool:
+        return False
+
+
+def format_cents(value: Optional[int]) -> str:
+    """Форматирует сумму в центах для отображения в админке."""
+    return f'{(value or 0) / 100:.2f}'
+
+
+class SalesRollupAdmin(admin.ModelAdmin):
+    """
+    Базовый админ-класс дневных агрегатов продаж.
+
+    Отчет читает только таблицу агрегатов: строки по дням и итоги
+    за выбранный период (фильтры и date_hierarchy) одним
+    агрегирующим запросом. Агрегаты доступны только для чтения,
+    их обновляет оплата заказов и команда rollup_sales.
+
+    Attributes:
+        summary_fields: Поля группировки итогов кроме валюты
+        summary_limit: Количество строк итогов
+    """
+
+    date_hierarchy = 'date'
+    list_filter = ('currency',)
+    list_per_page = 100
+    change_list_template = 'admin/orders/sales_change_list.html'
+    summary_fields: Tuple[str, ...] = ()
+    summary_limit = 50
+
+    def has_add_permission(self, request: Any) -> bool:
+        return False
+
+    def has_change_permission(self, request: Any, obj: Any = None) -> bool:
+        return False
+
+    def has_delete_permission(self, request: Any, obj: Any = None) -> bool:
+        return False
+
+    def changelist_view(
+        self,
+        request: Any,
+        extra_context: Optional[Dict[str, Any]] = None
+    ) -> HttpResponse:
+        """Добавляет к списку итоги за выбранный период."""
+        response = super().changelist_view(request, extra_context)
+        context = getattr(response, 'context_data', None)
+        if not context or 'cl' not in context:
+            return response
+
+        annotations = {name: Sum(name) for name in METRICS}
+        if self.summary_fields:
+            # Название могло меняться, показывается последнее по алфавиту
+            annotations['summary_name'] = Max('name')
+        rows = (
+            context['cl'].queryset
+            .order_by()
+            .values('currency', *self.summary_fields)
+            .annotate(**annotations)
+            .order_by('currency', '-net')[:self.summary_limit]
+        )
+        titles = ['Валюта'] + (['Название'] if self.summary_fields else [])
+        context['summary_columns'] = titles + [
+            SalesRollup._meta.get_field(name).verbose_name
+            for name in METRICS
+        ]
+        context['summary'] = [
+            [row['currency'].upper()]
+            + ([row['summary_name']] if self.summary_fields else [])
+            + [row['orders'], row['units']]
+            + [format_cents(row[name]) for name in METRICS[2:]]
+            for row in rows
+        ]
+        return response
+
+    def get_gross(self, obj: SalesRollup) -> str:
+        return format_cents(obj.gross)
+
+    get_gross.short_description = 'Сумма без скидки'
+
+    def get_discount_amount(self, obj: SalesRollup) -> str:
+        return format_cents(obj.discount_amount)
+
+    get_discount_amount.short_description = 'Скидка'
+
+    def get_tax_amount(self, obj: SalesRollup) -> str:
+        return format_cents(obj.tax_amount)
+
+    get_tax_amount.short_description = 'Налог'
+
+    def get_net(self, obj: SalesRollup) -> str:
+        return format_cents(obj.net)
+
+    get_net.short_description = 'Итого'
+
+
+ROLLUP_COLUMNS = (
+    'orders',
+    'units',
+    'get_gross',
+    'get_discount_amount',
+    'get_tax_amount',
+    'get_net',
+)
+
+
+@admin.register(DailySales)
+class DailySalesAdmin(SalesRollupAdmin):
+    """Продажи по дням и валютам."""
+
+    list_display = ('date', 'currency') + ROLLUP_COLUMNS
+
+
+@admin.register(DailyItemSales)
+class DailyItemSalesAdmin(SalesRollupAdmin):
+    """Продажи товаров по дням, итоги по товарам за период."""
+
+    list_display = ('date', 'currency', 'name') + ROLLUP_COLUMNS
+    search_fields = ('name',)
+    summary_fields = ('item_id',)
+
+
+@admin.register(DailyDiscountSales)
+class DailyDiscountSalesAdmin(SalesRollupAdmin):
+    """Продажи со скидками по дням, итоги по скидкам за период."""
+
+    list_display = ('date', 'currency', 'name') + ROLLUP_COLUMNS
+    search_fields = ('name',)
+    summary_fields = ('discount_id',)
@@ -12,3 +12,7 @@ class OrdersConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'orders'
     verbose_name = 'Заказы'
+
+    def ready(self) -> None:
+        """Подключает обработчики сигналов."""
+        from . import signals  # noqa: F401
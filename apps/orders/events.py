@@ -0,0 +1,151 @@
+"""Ожидание изменений заказов в асинхронных потоках событий (SSE)."""
+import asyncio
+from types import TracebackType
+from typing import Any, Awaitable, Callable, Dict, Optional, Set, Type
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from abstracts.cache import receive, subscribe
+
+# Ожидающие потоки по ID заказа
+_waiters: Dict[str, Set[asyncio.Event]] = {}
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_poller: Optional['asyncio.Task[None]'] = None
+# Выполняющиеся чтения заказов, общие для ожидающих потоков
+_loads: Dict[str, 'asyncio.Future[Any]'] = {}
+
+
+def _wake(pk: Optional[str]) -> None:
+    """Будит потоки, ожидающие заказ (None - все потоки)."""
+    # Начатое до изменения чтение могло не увидеть его
+    if pk is None:
+        _loads.clear()
+        events = [event for waiting in _waiters.values() for event in waiting]
+    else:
+        _loads.pop(pk, None)
+        events = list(_waiters.get(pk, ()))
+    for event in events:
+        event.set()
+
+
+def _order_changed(pk: Optional[str]) -> None:
+    """Передает событие шины в цикл событий (из любого потока)."""
+    loop = _loop
+    if loop is not None and not loop.is_closed():
+        loop.call_soon_threadsafe(_wake, pk)
+
+
+subscribe('orders.Order', _order_changed)
+
+
+async def _poll() -> None:
+    """
+    Забирает события шины, пока есть ожидающие потоки.
+
+    Один опрос на процесс, сколько бы клиентов ни ждало: в PostgreSQL
+    это чтение уже пришедших уведомлений LISTEN без запроса к базе,
+    в остальных базах - запрос к таблице событий раз
+    в CACHE_BUS_POLL_INTERVAL секунд.
+    """
+    global _poller
+
+    try:
+        while _waiters:
+            await sync_to_async(receive)()
+            await asyncio.sleep(settings.CACHE_BUS_POLL_INTERVAL)
+    finally:
+        _poller = None
+
+
+class OrderWatch:
+    """
+    Подписка асинхронного потока на изменения заказа.
+
+    Заказ считается измененным, когда об этом приходит событие шины
+    abstracts.cache (см. orders.services.record_payments) или когда
+    события могли быть пропущены. Подписку нужно открыть до чтения
+    состояния заказа, чтобы не пропустить изменение между чтением
+    и ожиданием.
+
+    Example:
+        >>> with OrderWatch(order_id) as watch:
+        ...     state = await read_state(order_id)
+        ...     if await watch.wait(15):
+        ...         state = await read_state(order_id)
+    """
+
+    def __init__(self, order_id: int) -> None:
+        self.key = str(order_id)
+        self._event = asyncio.Event()
+
+    def __enter__(self) -> 'OrderWatch':
+        global _loop, _poller
+
+        _loop = asyncio.get_running_loop()
+        _waiters.setdefault(self.key, set()).add(self._event)
+        if _poller is None:
+            _poller = asyncio.create_task(_poll())
+        return self
+
+    def __exit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc: Optional[BaseException],
+        traceback: Optional[TracebackType]
+    ) -> None:
+        waiting = _waiters.get(self.key)
+        if waiting is not None:
+            waiting.discard(self._event)
+            if not waiting:
+                del _waiters[self.key]
+
+    async def wait(self, timeout: float) -> bool:
+        """
+        Ждет изменения заказа.
+
+        Args:
+            timeout: Максимальное время ожидания в секундах
+
+        Returns:
+            True, если заказ мог измениться, False по таймауту
+        """
+        try:
+            await asyncio.wait_for(self._event.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        self._event.clear()
+        return True
+
+
+def load_shared(
+    order_id: int,
+    loader: Callable[[int], Any]
+) -> Awaitable[Any]:
+    """
+    Читает заказ один раз для всех потоков, ожидающих его.
+
+    Синхронные запросы к базе выполняются в одном потоке процесса
+    (sync_to_async), поэтому тысяча вкладок одного заказа, разбуженных
+    одним событием, делают одно чтение, а не тысячу. Чтение, начатое
+    до события об изменении заказа, новым потокам не достается.
+
+    Args:
+        order_id: ID заказа
+        loader: Синхронная функция чтения заказа
+
+    Returns:
+        Awaitable с результатом loader(order_id)
+    """
+    key = str(order_id)
+    future = _loads.get(key)
+    if future is None:
+        future = asyncio.ensure_future(sync_to_async(loader)(order_id))
+        _loads[key] = future
+
+        def forget(done: 'asyncio.Future[Any]') -> None:
+            if _loads.get(key) is done:
+                del _loads[key]
+
+        future.add_done_callback(forget)
+    return asyncio.shield(future)
@@ -0,0 +1,71 @@
+"""Management-команда для переноса старых оплаченных заказов в архив."""
+import time
+from datetime import timedelta
+from typing import Any
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandParser
+from django.utils import timezone
+
+from orders.models import Order
+from orders.services import archive_in_batches
+
+
+class Command(BaseCommand):
+    """
+    Переносит оплаченные заказы старше N дней в архивные таблицы.
+
+    Оплаченные заказы больше не изменяются, поэтому их можно убрать
+    из основных таблиц, чтобы запросы к корзинам и списки в админке
+    работали с небольшими таблицами. Заказы обрабатываются пакетами
+    по диапазонам первичного ключа с паузой между ними. Архив и
+    основные таблицы вместе доступны через OrderHistory.
+
+    Example:
+        python manage.py archive_paid_orders --days 90
+    """
+
+    help = 'Перенос старых оплаченных заказов в архивные таблицы'
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=settings.PAID_ORDER_ARCHIVE_DAYS,
+            help='Архивировать заказы, созданные более N дней назад'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Размер диапазона первичного ключа на одну транзакцию'
+        )
+        parser.add_argument(
+            '--sleep',
+            type=float,
+            default=0.1,
+            help='Пауза между пакетами в секундах'
+        )
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        started = time.monotonic()
+
+        def progress(orders: int, removed: int) -> None:
+            elapsed = max(time.monotonic() - started, 1e-6)
+            self.stdout.write(
+                f'Перенесено заказов: {orders}, строк: {removed} '
+                f'({removed / elapsed:.0f} строк/с)'
+            )
+
+        orders = archive_in_batches(
+            Order.objects.filter(is_paid=True, datetime_created__lt=cutoff),
+            batch_size=options['batch_size'],
+            sleep=options['sleep'],
+            progress=progress,
+        )
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово: перенесено заказов {orders} '
+            f'за {time.monotonic() - started:.1f} с'
+        ))
@@ -0,0 +1,101 @@
+"""Management-команда для построения рекомендаций товаров."""
+import time
+from datetime import timedelta
+from typing import Any
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandParser
+from django.utils import timezone
+
+from orders.recommendations import process_orders, reset_recommendations
+
+
+class Command(BaseCommand):
+    """
+    Строит блок «Часто покупают вместе» по оплаченным заказам.
+
+    Оплаты заказов (основных и архивных) читаются пакетами по
+    --chunk-size начиная с курсора - последней учтенной оплаты,
+    поэтому каждый запуск обрабатывает только новые оплаты, а заказ
+    учитывается, когда оплачен, как бы поздно это ни случилось. Для
+    заказов пакета в NumPy считаются пары товаров, купленных в одном
+    заказе, счетчики пар увеличиваются в ItemPairCount, а для
+    затронутых товаров пересчитываются --top соседей (RelatedItem).
+
+    Оплаты сохраняются параллельными транзакциями, и оплата с меньшим
+    ID может быть зафиксирована позже, поэтому учитываются только
+    оплаты старше --delay-minutes. После изменения истории заказов
+    рекомендации пересчитываются с --reset.
+
+    Example:
+        python manage.py build_recommendations
+        python manage.py build_recommendations --reset
+        python manage.py build_recommendations --interval 3600
+    """
+
+    help = 'Построение рекомендаций «Часто покупают вместе»'
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=5000,
+            help='Количество оплат в одной транзакции'
+        )
+        parser.add_argument(
+            '--delay-minutes',
+            type=float,
+            default=10,
+            help='Учитывать оплаты старше N минут'
+        )
+        parser.add_argument(
+            '--top',
+            type=int,
+            default=settings.RELATED_ITEMS_LIMIT,
+            help='Количество рекомендаций товара'
+        )
+        parser.add_argument(
+            '--reset',
+            action='store_true',
+            help='Удалить рекомендации и пересчитать все заказы'
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            help='Повторять обработку каждые N секунд'
+        )
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        if options['reset']:
+            reset_recommendations()
+
+        while True:
+            started = time.monotonic()
+            paid_before = timezone.now() - timedelta(
+                minutes=options['delay_minutes']
+            )
+            total_payments = total_pairs = total_items = 0
+            while True:
+                payments, pairs, items = process_orders(
+                    paid_before,
+                    options['chunk_size'],
+                    options['top']
+                )
+                if not payments:
+                    break
+                total_payments += payments
+                total_pairs += pairs
+                total_items += items
+                self.stdout.write(
+                    f'Оплат {payments}, пар товаров {pairs}, '
+                    f'обновлено товаров {items}'
+                )
+            self.stdout.write(self.style.SUCCESS(
+                f'Готово: оплат {total_payments}, пар {total_pairs}, '
+                f'обновлено товаров {total_items} '
+                f'за {time.monotonic() - started:.1f} с'
+            ))
+
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,83 @@
+"""Management-команда для удаления брошенных корзин."""
+import time
+from datetime import timedelta
+from importlib import import_module
+from typing import Any
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandParser
+from django.utils import timezone
+
+from orders.models import Order
+from orders.services import archive_in_batches
+
+
+class Command(BaseCommand):
+    """
+    Удаляет неоплаченные корзины, которые давно не изменялись.
+
+    Таблица заказов обходится диапазонами первичного ключа, каждый
+    диапазон обрабатывается короткой отдельной транзакцией с паузой
+    между ними, поэтому команду можно запускать на рабочей базе без
+    долгих блокировок. По умолчанию корзины перед удалением
+    копируются в архивные таблицы для аналитики. Затем одним
+    запросом удаляются истекшие сессии, если они хранятся на
+    сервере (для сессий в cookie это не требуется).
+
+    Example:
+        python manage.py reap_carts --days 30 --batch-size 1000 --sleep 0.1
+    """
+
+    help = 'Удаление (архивация) брошенных неоплаченных корзин'
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=settings.ABANDONED_CART_DAYS,
+            help='Удалять корзины, не изменявшиеся N дней'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Размер диапазона первичного ключа на одну транзакцию'
+        )
+        parser.add_argument(
+            '--sleep',
+            type=float,
+            default=0.1,
+            help='Пауза между пакетами в секундах'
+        )
+        parser.add_argument(
+            '--no-archive',
+            action='store_true',
+            help='Удалять без копирования в архивные таблицы'
+        )
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        started = time.monotonic()
+
+        def progress(orders: int, removed: int) -> None:
+            elapsed = max(time.monotonic() - started, 1e-6)
+            self.stdout.write(
+                f'Удалено корзин: {orders}, строк: {removed} '
+                f'({removed / elapsed:.0f} строк/с)'
+            )
+
+        orders = archive_in_batches(
+            Order.objects.filter(is_paid=False, datetime_updated__lt=cutoff),
+            batch_size=options['batch_size'],
+            sleep=options['sleep'],
+            archive=not options['no_archive'],
+            progress=progress,
+        )
+
+        engine = import_module(settings.SESSION_ENGINE)
+        engine.SessionStore.clear_expired()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово: удалено корзин {orders} '
+            f'за {time.monotonic() - started:.1f} с'
+        ))
@@ -0,0 +1,242 @@
+"""Management-команда для сверки оплат заказов со Stripe."""
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from typing import Any, Callable, Dict, Iterator, List, Tuple
+
+import stripe
+from django.core.management.base import BaseCommand, CommandParser
+from django.db import connection
+from django.utils import timezone
+
+from items.stripe_accounts import get_accounts
+from items.stripe_utils import call_stripe
+from orders.models import Order, PaymentSyncCursor
+from orders.services import intent_payment, record_payments, session_payment
+
+CHECKOUT_SESSION = 'checkout_session'
+PAYMENT_INTENT = 'payment_intent'
+
+# Страница списка Stripe максимального размера
+PAGE_SIZE = 100
+
+RESOURCES: Dict[str, Tuple[Callable[..., Any], Callable[..., Any]]] = {
+    CHECKOUT_SESSION: (stripe.checkout.Session.list, session_payment),
+    PAYMENT_INTENT: (stripe.PaymentIntent.list, intent_payment),
+}
+
+
+class Command(BaseCommand):
+    """
+    Сверяет оплату заказов с Checkout Session и PaymentIntent в Stripe.
+
+    Исправляет заказы, оплата которых не дошла до магазина (webhook
+    не настроен или потерян): оплаченные в Stripe объекты
+    сопоставляются с заказами по order_id в metadata, оплаты
+    сохраняются в OrderPayment, а заказы, оплаченные во всех своих
+    валютах, отмечаются одним UPDATE на пакет.
+
+    Списки каждого Stripe аккаунта из реестра (валюты с одинаковыми
+    ключами обслуживает один аккаунт) загружаются параллельно
+    с автопагинацией SDK.
+    Команда запоминает курсор: последний объект, до которого все
+    объекты уже в конечном статусе (оплачены, истекли, отменены).
+    Следующий запуск читает только более новые объекты от старых
+    к новым и сохраняет курсор после каждого пакета, поэтому
+    прерванную сверку можно продолжить. Без курсора читаются объекты
+    за последние --since дней.
+
+    Заказы за последние --since дней, отмеченные оплаченными без
+    найденной оплаты в Stripe, только выводятся: их нужно проверить
+    вручную.
+
+    Example:
+        python manage.py reconcile_payments --since 30
+        python manage.py reconcile_payments --interval 600
+    """
+
+    help = 'Сверка оплат заказов со Stripe'
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument(
+            '--since',
+            type=int,
+            default=30,
+            help='Без курсора читать объекты Stripe за последние N дней'
+        )
+        parser.add_argument(
+            '--reset',
+            action='store_true',
+            help='Удалить сохраненные курсоры перед сверкой'
+        )
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=4,
+            help='Количество параллельно загружаемых списков Stripe'
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            help='Повторять сверку каждые N секунд'
+        )
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        accounts = {
+            account.account_id: account.currency
+            for account in get_accounts()
+        }
+
+        if options['reset']:
+            PaymentSyncCursor.objects.filter(
+                account__in=list(accounts)
+            ).delete()
+
+        tasks = [
+            (account, currency, resource)
+            for account, currency in accounts.items()
+            for resource in RESOURCES
+        ]
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            while True:
+                results = pool.map(
+                    lambda task: self._reconcile(*task, options), tasks
+                )
+                for (account, currency, resource), result in zip(
+                    tasks, results
+                ):
+                    if isinstance(result, stripe.StripeError):
+                        self.stderr.write(
+                            f'{currency.upper()} {resource}: '
+                            f'ошибка Stripe: {result}'
+                        )
+                        continue
+                    scanned, found, marked = result
+                    self.stdout.write(
+                        f'{currency.upper()} {resource}: просмотрено '
+                        f'{scanned}, оплат {found}, '
+                        f'отмечено оплаченными {marked}'
+                    )
+                self._report_unconfirmed(options['since'])
+
+                if not options['interval']:
+                    break
+                time.sleep(options['interval'])
+
+    def _reconcile(
+        self,
+        account: str,
+        currency: str,
+        resource: str,
+        options: Dict[str, Any]
+    ) -> Any:
+        """
+        Сверяет один список Stripe аккаунта.
+
+        Выполняется в отдельном потоке со своим соединением с БД.
+        Ошибка Stripe возвращается как результат: курсор остается
+        на последнем сохраненном пакете.
+
+        Returns:
+            Кортеж (просмотрено объектов, найдено оплат, отмечено
+            заказов) или ошибка Stripe
+        """
+        try:
+            return self._sync(account, currency, resource, options)
+        except stripe.StripeError as e:
+            return e
+        finally:
+            connection.close()
+
+    def _sync(
+        self,
+        account: str,
+        currency: str,
+        resource: str,
+        options: Dict[str, Any]
+    ) -> Tuple[int, int, int]:
+        """Читает список Stripe пакетами и сохраняет найденные оплаты."""
+        list_method, parse = RESOURCES[resource]
+        cursor = PaymentSyncCursor.objects.filter(
+            account=account,
+            resource=resource
+        ).first()
+
+        if cursor:
+            # С ending_before SDK листает к более новым объектам,
+            # выдавая их от старых к новым
+            params = {'ending_before': cursor.last_id}
+        else:
+            since = timezone.now() - timedelta(days=options['since'])
+            params = {'created': {'gte': int(since.timestamp())}}
+        page = call_stripe(currency, list_method, limit=PAGE_SIZE, **params)
+        objects = page.auto_paging_iter()
+
+        scanned = found = marked = 0
+        # Без курсора объекты идут от новых к старым, и курсор можно
+        # вычислить только после полного прохода
+        settled: List[Tuple[str, bool]] = []
+        last_id = cursor.last_id if cursor else None
+        blocked = False
+
+        for batch in self._batches(objects, options['batch_size']):
+            payments = []
+            for obj in batch:
+                payment, is_settled = parse(obj)
+                if payment:
+                    payments.append(payment)
+                if cursor:
+                    blocked = blocked or not is_settled
+                    if not blocked:
+                        last_id = obj.id
+                else:
+                    settled.append((obj.id, is_settled))
+
+            scanned += len(batch)
+            found += len(payments)
+            marked += record_payments(payments)
+            if cursor and last_id != cursor.last_id:
+                cursor.last_id = last_id
+                cursor.save(update_fields=['last_id', 'datetime_updated'])
+
+        if not cursor:
+            for object_id, is_settled in reversed(settled):
+                if not is_settled:
+                    break
+                last_id = object_id
+            if last_id:
+                PaymentSyncCursor.objects.update_or_create(
+                    account=account,
+                    resource=resource,
+                    defaults={'last_id': last_id}
+                )
+
+        return scanned, found, marked
+
+    @staticmethod
+    def _batches(objects: Iterator[Any], size: int) -> Iterator[List[Any]]:
+        """Разбивает поток объектов на пакеты."""
+        batch = []
+        for obj in objects:
+            batch.append(obj)
+            if len(batch) >= size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def _report_unconfirmed(self, days: int) -> None:
+        """Выводит недавние оплаченные заказы без оплаты в Stripe."""
+        orders = Order.objects.filter(
+            is_paid=True,
+            payments__isnull=True,
+            datetime_created__gte=timezone.now() - timedelta(days=days)
+        )
+        order_ids = list(orders.values_list('id', flat=True)[:20])
+        if order_ids:
+            self.stdout.write(self.style.WARNING(
+                f'Оплачены без оплаты в Stripe: {orders.count()} '
+                '(проверьте вручную): '
+                + ', '.join(f'#{order_id}' for order_id in order_ids)
+            ))
@@ -0,0 +1,38 @@
+# Generated by Django 6.0.1 on 2026-10-19 01:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0006_alter_order_options_alter_orderitem_options_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='discount',
+            name='max_redemptions',
+            field=models.PositiveIntegerField(blank=True, help_text='пусто - без ограничений', null=True, verbose_name='лимит использований'),
+        ),
+        migrations.AddField(
+            model_name='discount',
+            name='redemptions_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='использований'),
+        ),
+        migrations.AddField(
+            model_name='discount',
+            name='valid_from',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='действует с'),
+        ),
+        migrations.AddField(
+            model_name='discount',
+            name='valid_until',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='действует до'),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='discount_redeemed',
+            field=models.BooleanField(default=False, verbose_name='промокод списан'),
+        ),
+    ]
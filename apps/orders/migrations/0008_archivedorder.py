@@ -0,0 +1,46 @@
+# Generated by Django 6.0.1 on 2026-10-19 01:19
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('items', '0005_stripeprice'),
+        ('orders', '0007_discount_limits'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedOrder',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('is_paid', models.BooleanField(verbose_name='статус оплаты')),
+                ('datetime_created', models.DateTimeField(verbose_name='дата и время создания')),
+                ('datetime_updated', models.DateTimeField(verbose_name='дата и время редактирования')),
+                ('datetime_archived', models.DateTimeField(auto_now_add=True, verbose_name='дата и время архивации')),
+                ('discount', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='orders.discount', verbose_name='скидка')),
+                ('tax', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='orders.tax', verbose_name='налог')),
+            ],
+            options={
+                'verbose_name': 'архивный заказ',
+                'verbose_name_plural': 'архивные заказы',
+                'ordering': ('-id',),
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedOrderItem',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('quantity', models.PositiveIntegerField(verbose_name='количество')),
+                ('item', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to='items.item', verbose_name='товар')),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='items', to='orders.archivedorder', verbose_name='заказ')),
+            ],
+            options={
+                'verbose_name': 'товар в архивном заказе',
+                'verbose_name_plural': 'товары в архивных заказах',
+                'ordering': ('-id',),
+            },
+        ),
+    ]
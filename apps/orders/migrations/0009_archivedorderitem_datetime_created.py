@@ -0,0 +1,26 @@
+# Generated by Django 6.0.1 on 2026-10-19 01:31
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0008_archivedorder'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivedorderitem',
+            name='datetime_created',
+            field=models.DateTimeField(default=django.utils.timezone.now, verbose_name='дата и время создания заказа'),
+            preserve_default=False,
+        ),
+        migrations.AlterField(
+            model_name='archivedorderitem',
+            name='order',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='items', to='orders.archivedorder', verbose_name='заказ'),
+        ),
+    ]
@@ -0,0 +1,93 @@
+# Generated by Django 6.0.1 on 2026-10-19 01:33
+
+from django.db import migrations
+
+ARCHIVE_TABLES = ('orders_archivedorder', 'orders_archivedorderitem')
+
+
+def partition_archive_tables(apps, schema_editor):
+    """
+    Пересоздает архивные таблицы как секционированные по datetime_created.
+
+    Только для PostgreSQL. Первичный ключ секционированной таблицы
+    должен включать ключ секционирования, поэтому он становится
+    (id, datetime_created). Для уже имеющихся строк создаются
+    помесячные секции, новые секции создает archive_orders.
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    for table in ARCHIVE_TABLES:
+        schema_editor.execute(f'ALTER TABLE {table} RENAME TO {table}_old')
+        schema_editor.execute(
+            f'ALTER TABLE {table}_old DROP CONSTRAINT {table}_pkey'
+        )
+        schema_editor.execute(
+            f'CREATE TABLE {table} (LIKE {table}_old INCLUDING DEFAULTS) '
+            f'PARTITION BY RANGE (datetime_created)'
+        )
+        schema_editor.execute(
+            f'ALTER TABLE {table} ADD PRIMARY KEY (id, datetime_created)'
+        )
+
+        with schema_editor.connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT DISTINCT date_trunc('month', datetime_created) "
+                f"FROM {table}_old"
+            )
+            months = [row[0] for row in cursor.fetchall()]
+
+        for month in months:
+            schema_editor.execute(
+                f'CREATE TABLE {table}_y{month:%Y}m{month:%m} '
+                f'PARTITION OF {table} FOR VALUES FROM (%s) TO (%s)',
+                [month, month.replace(
+                    year=month.year + month.month // 12,
+                    month=month.month % 12 + 1
+                )]
+            )
+
+        schema_editor.execute(f'INSERT INTO {table} SELECT * FROM {table}_old')
+        schema_editor.execute(f'DROP TABLE {table}_old')
+
+    schema_editor.execute(
+        'CREATE INDEX orders_archivedorderitem_order_id_idx '
+        'ON orders_archivedorderitem (order_id)'
+    )
+    schema_editor.execute(
+        'CREATE INDEX orders_archivedorderitem_item_id_idx '
+        'ON orders_archivedorderitem (item_id)'
+    )
+
+
+def unpartition_archive_tables(apps, schema_editor):
+    """Возвращает архивные таблицы к обычным (несекционированным)."""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    for table in ARCHIVE_TABLES:
+        schema_editor.execute(
+            f'CREATE TABLE {table}_plain (LIKE {table} INCLUDING DEFAULTS)'
+        )
+        schema_editor.execute(f'ALTER TABLE {table} DROP CONSTRAINT {table}_pkey')
+        schema_editor.execute(
+            f'ALTER TABLE {table}_plain '
+            f'ADD CONSTRAINT {table}_pkey PRIMARY KEY (id)'
+        )
+        schema_editor.execute(f'INSERT INTO {table}_plain SELECT * FROM {table}')
+        schema_editor.execute(f'DROP TABLE {table} CASCADE')
+        schema_editor.execute(f'ALTER TABLE {table}_plain RENAME TO {table}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0009_archivedorderitem_datetime_created'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            partition_archive_tables,
+            unpartition_archive_tables
+        ),
+    ]
@@ -0,0 +1,69 @@
+# Generated by Django 6.0.1 on 2026-10-19 01:21
+
+from django.db import migrations, models
+
+CREATE_VIEWS = [
+    """
+    CREATE VIEW orders_orderhistory AS
+    SELECT id, is_paid, discount_id, tax_id,
+           datetime_created, datetime_updated, FALSE AS is_archived
+    FROM orders_order
+    UNION ALL
+    SELECT id, is_paid, discount_id, tax_id,
+           datetime_created, datetime_updated, TRUE AS is_archived
+    FROM orders_archivedorder
+    """,
+    """
+    CREATE VIEW orders_orderhistoryitem AS
+    SELECT id, order_id, item_id, quantity FROM orders_orderitem
+    UNION ALL
+    SELECT id, order_id, item_id, quantity FROM orders_archivedorderitem
+    """,
+]
+
+DROP_VIEWS = [
+    'DROP VIEW IF EXISTS orders_orderhistoryitem',
+    'DROP VIEW IF EXISTS orders_orderhistory',
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0010_partition_archive_tables'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderHistory',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('is_paid', models.BooleanField(verbose_name='статус оплаты')),
+                ('datetime_created', models.DateTimeField(verbose_name='дата и время создания')),
+                ('datetime_updated', models.DateTimeField(verbose_name='дата и время редактирования')),
+                ('is_archived', models.BooleanField(verbose_name='в архиве')),
+            ],
+            options={
+                'verbose_name': 'заказ (история)',
+                'verbose_name_plural': 'история заказов',
+                'db_table': 'orders_orderhistory',
+                'ordering': ('-id',),
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='OrderHistoryItem',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('quantity', models.PositiveIntegerField(verbose_name='количество')),
+            ],
+            options={
+                'verbose_name': 'товар в заказе (история)',
+                'verbose_name_plural': 'товары в заказах (история)',
+                'db_table': 'orders_orderhistoryitem',
+                'ordering': ('-id',),
+                'managed': False,
+            },
+        ),
+        migrations.RunSQL(CREATE_VIEWS, DROP_VIEWS),
+    ]
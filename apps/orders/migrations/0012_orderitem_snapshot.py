@@ -0,0 +1,107 @@
+# Generated by Django 6.0.1 on 2026-10-19 02:05
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+# Представления зависят от таблиц товаров заказов, поэтому на время
+# изменения таблиц они удаляются (SQLite пересоздает таблицу целиком
+# и не дает переименовать ее, пока на нее ссылается представление).
+DROP_VIEWS = [
+    'DROP VIEW IF EXISTS orders_orderhistoryitem',
+    'DROP VIEW IF EXISTS orders_orderhistory',
+]
+
+CREATE_VIEWS = [
+    """
+    CREATE VIEW orders_orderhistory AS
+    SELECT id, is_paid, discount_id, tax_id,
+           datetime_created, datetime_updated, FALSE AS is_archived
+    FROM orders_order
+    UNION ALL
+    SELECT id, is_paid, discount_id, tax_id,
+           datetime_created, datetime_updated, TRUE AS is_archived
+    FROM orders_archivedorder
+    """,
+    """
+    CREATE VIEW orders_orderhistoryitem AS
+    SELECT id, order_id, item_id, name, currency, unit_amount, quantity
+    FROM orders_orderitem
+    UNION ALL
+    SELECT id, order_id, item_id, name, currency, unit_amount, quantity
+    FROM orders_archivedorderitem
+    """,
+]
+
+OLD_CREATE_VIEWS = [
+    CREATE_VIEWS[0],
+    """
+    CREATE VIEW orders_orderhistoryitem AS
+    SELECT id, order_id, item_id, quantity FROM orders_orderitem
+    UNION ALL
+    SELECT id, order_id, item_id, quantity FROM orders_archivedorderitem
+    """,
+]
+
+
+def backfill_snapshots(apps, schema_editor):
+    """Заполняет снимок товара для существующих записей текущими данными."""
+    Item = apps.get_model('items', 'Item')
+
+    for model_name in ('OrderItem', 'ArchivedOrderItem'):
+        model = apps.get_model('orders', model_name)
+        items = Item.objects.filter(pk=OuterRef('item_id'))
+        model.objects.filter(item__isnull=False).update(
+            name=Subquery(items.values('name')[:1]),
+            currency=Subquery(items.values('currency')[:1]),
+            unit_amount=Subquery(items.values('price')[:1]),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('items', '0005_stripeprice'),
+        ('orders', '0011_orderhistory'),
+    ]
+
+    operations = [
+        migrations.RunSQL(DROP_VIEWS, OLD_CREATE_VIEWS),
+        migrations.AddField(
+            model_name='orderitem',
+            name='name',
+            field=models.CharField(default='', max_length=255, verbose_name='название'),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='currency',
+            field=models.CharField(default='usd', max_length=3, verbose_name='валюта'),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='unit_amount',
+            field=models.IntegerField(default=0, verbose_name='цена в центах'),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='archivedorderitem',
+            name='name',
+            field=models.CharField(default='', max_length=255, verbose_name='название'),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='archivedorderitem',
+            name='currency',
+            field=models.CharField(default='usd', max_length=3, verbose_name='валюта'),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='archivedorderitem',
+            name='unit_amount',
+            field=models.IntegerField(default=0, verbose_name='цена в центах'),
+            preserve_default=False,
+        ),
+        migrations.RunPython(backfill_snapshots, migrations.RunPython.noop),
+        migrations.RunSQL(CREATE_VIEWS, DROP_VIEWS),
+    ]
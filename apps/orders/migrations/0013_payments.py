@@ -0,0 +1,47 @@
+# Generated by Django 6.0.1 on 2026-10-19 03:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0012_orderitem_snapshot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderPayment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('datetime_created', models.DateTimeField(auto_now_add=True, verbose_name='дата и время создания')),
+                ('datetime_updated', models.DateTimeField(auto_now=True, verbose_name='дата и время редактирования')),
+                ('currency', models.CharField(max_length=3, verbose_name='валюта')),
+                ('reference', models.CharField(max_length=255, unique=True, verbose_name='Stripe ID')),
+                ('amount', models.IntegerField(verbose_name='сумма в центах')),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='payments', to='orders.order', verbose_name='заказ')),
+            ],
+            options={
+                'verbose_name': 'оплата заказа',
+                'verbose_name_plural': 'оплаты заказов',
+                'ordering': ('-id',),
+            },
+        ),
+        migrations.CreateModel(
+            name='PaymentSyncCursor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('datetime_created', models.DateTimeField(auto_now_add=True, verbose_name='дата и время создания')),
+                ('datetime_updated', models.DateTimeField(auto_now=True, verbose_name='дата и время редактирования')),
+                ('account', models.CharField(max_length=64, verbose_name='аккаунт Stripe')),
+                ('resource', models.CharField(max_length=32, verbose_name='тип объектов')),
+                ('last_id', models.CharField(max_length=255, verbose_name='ID последнего объекта')),
+            ],
+            options={
+                'verbose_name': 'курсор сверки оплат',
+                'verbose_name_plural': 'курсоры сверки оплат',
+                'constraints': [models.UniqueConstraint(fields=('account', 'resource'), name='unique_payment_sync_cursor')],
+            },
+        ),
+    ]
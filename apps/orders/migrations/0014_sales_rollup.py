@@ -0,0 +1,82 @@
+# Generated by Django 6.0.1 on 2026-10-19 03:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('items', '0009_currency_choices'),
+        ('orders', '0013_payments'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='день')),
+                ('currency', models.CharField(max_length=3, verbose_name='валюта')),
+                ('orders', models.IntegerField(default=0, verbose_name='заказов')),
+                ('units', models.IntegerField(default=0, verbose_name='единиц товара')),
+                ('gross', models.BigIntegerField(default=0, verbose_name='сумма без скидки в центах')),
+                ('discount_amount', models.BigIntegerField(default=0, verbose_name='скидка в центах')),
+                ('tax_amount', models.BigIntegerField(default=0, verbose_name='налог в центах')),
+                ('net', models.BigIntegerField(default=0, verbose_name='итого в центах')),
+            ],
+            options={
+                'verbose_name': 'продажи за день',
+                'verbose_name_plural': 'продажи по дням',
+                'ordering': ('-date', 'currency'),
+                'abstract': False,
+                'constraints': [models.UniqueConstraint(fields=('date', 'currency'), name='unique_daily_sales')],
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyDiscountSales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='день')),
+                ('currency', models.CharField(max_length=3, verbose_name='валюта')),
+                ('orders', models.IntegerField(default=0, verbose_name='заказов')),
+                ('units', models.IntegerField(default=0, verbose_name='единиц товара')),
+                ('gross', models.BigIntegerField(default=0, verbose_name='сумма без скидки в центах')),
+                ('discount_amount', models.BigIntegerField(default=0, verbose_name='скидка в центах')),
+                ('tax_amount', models.BigIntegerField(default=0, verbose_name='налог в центах')),
+                ('net', models.BigIntegerField(default=0, verbose_name='итого в центах')),
+                ('name', models.CharField(max_length=255, verbose_name='название')),
+                ('discount', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='orders.discount', verbose_name='скидка')),
+            ],
+            options={
+                'verbose_name': 'продажи со скидкой за день',
+                'verbose_name_plural': 'продажи по скидкам',
+                'ordering': ('-date', 'currency'),
+                'abstract': False,
+                'constraints': [models.UniqueConstraint(fields=('date', 'currency', 'discount'), name='unique_daily_discount_sales')],
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyItemSales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='день')),
+                ('currency', models.CharField(max_length=3, verbose_name='валюта')),
+                ('orders', models.IntegerField(default=0, verbose_name='заказов')),
+                ('units', models.IntegerField(default=0, verbose_name='единиц товара')),
+                ('gross', models.BigIntegerField(default=0, verbose_name='сумма без скидки в центах')),
+                ('discount_amount', models.BigIntegerField(default=0, verbose_name='скидка в центах')),
+                ('tax_amount', models.BigIntegerField(default=0, verbose_name='налог в центах')),
+                ('net', models.BigIntegerField(default=0, verbose_name='итого в центах')),
+                ('name', models.CharField(max_length=255, verbose_name='название')),
+                ('item', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='items.item', verbose_name='товар')),
+            ],
+            options={
+                'verbose_name': 'продажи товара за день',
+                'verbose_name_plural': 'продажи по товарам',
+                'ordering': ('-date', 'currency'),
+                'abstract': False,
+                'constraints': [models.UniqueConstraint(fields=('date', 'currency', 'item'), name='unique_daily_item_sales')],
+            },
+        ),
+    ]
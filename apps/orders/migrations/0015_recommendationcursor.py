@@ -0,0 +1,26 @@
+# Generated by Django 6.0.1 on 2026-10-19 03:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0014_sales_rollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecommendationCursor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('datetime_created', models.DateTimeField(auto_now_add=True, verbose_name='дата и время создания')),
+                ('datetime_updated', models.DateTimeField(auto_now=True, verbose_name='дата и время редактирования')),
+                ('last_order_id', models.BigIntegerField(default=0, verbose_name='ID последнего заказа')),
+            ],
+            options={
+                'verbose_name': 'курсор рекомендаций',
+                'verbose_name_plural': 'курсоры рекомендаций',
+            },
+        ),
+    ]
@@ -0,0 +1,110 @@
+# Generated by Django 6.0.1 on 2026-10-19 03:27
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+TABLE = 'orders_archivedorderpayment'
+
+CREATE_VIEW = """
+    CREATE VIEW orders_orderhistorypayment AS
+    SELECT id, order_id, currency, reference, amount,
+           datetime_created AS datetime_paid
+    FROM orders_orderpayment
+    UNION ALL
+    SELECT id, order_id, currency, reference, amount, datetime_paid
+    FROM orders_archivedorderpayment
+"""
+
+DROP_VIEW = 'DROP VIEW IF EXISTS orders_orderhistorypayment'
+
+
+def partition_payments(apps, schema_editor):
+    """
+    Делает таблицу архивных оплат секционированной по datetime_created.
+
+    Только для PostgreSQL, так же как архивные заказы и товары
+    (0010_partition_archive_tables). Секции создаются для месяцев,
+    уже имеющихся в архиве заказов.
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    schema_editor.execute(f'ALTER TABLE {TABLE} RENAME TO {TABLE}_old')
+    schema_editor.execute(
+        f'CREATE TABLE {TABLE} (LIKE {TABLE}_old INCLUDING DEFAULTS) '
+        f'PARTITION BY RANGE (datetime_created)'
+    )
+    schema_editor.execute(f'DROP TABLE {TABLE}_old')
+    schema_editor.execute(
+        f'ALTER TABLE {TABLE} ADD PRIMARY KEY (id, datetime_created)'
+    )
+
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT DISTINCT date_trunc('month', datetime_created) "
+            "FROM orders_archivedorder"
+        )
+        months = [row[0] for row in cursor.fetchall()]
+
+    for month in months:
+        schema_editor.execute(
+            f'CREATE TABLE {TABLE}_y{month:%Y}m{month:%m} '
+            f'PARTITION OF {TABLE} FOR VALUES FROM (%s) TO (%s)',
+            [month, month.replace(
+                year=month.year + month.month // 12,
+                month=month.month % 12 + 1
+            )]
+        )
+
+    schema_editor.execute(
+        f'CREATE INDEX {TABLE}_order_id_idx ON {TABLE} (order_id)'
+    )
+    schema_editor.execute(
+        f'CREATE INDEX {TABLE}_reference_idx ON {TABLE} (reference)'
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0015_recommendationcursor'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderHistoryPayment',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('currency', models.CharField(max_length=3, verbose_name='валюта')),
+                ('reference', models.CharField(max_length=255, verbose_name='Stripe ID')),
+                ('amount', models.IntegerField(verbose_name='сумма в центах')),
+                ('datetime_paid', models.DateTimeField(verbose_name='дата и время оплаты')),
+            ],
+            options={
+                'verbose_name': 'оплата заказа (история)',
+                'verbose_name_plural': 'оплаты заказов (история)',
+                'db_table': 'orders_orderhistorypayment',
+                'ordering': ('-id',),
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedOrderPayment',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('currency', models.CharField(max_length=3, verbose_name='валюта')),
+                ('reference', models.CharField(db_index=True, max_length=255, verbose_name='Stripe ID')),
+                ('amount', models.IntegerField(verbose_name='сумма в центах')),
+                ('datetime_paid', models.DateTimeField(verbose_name='дата и время оплаты')),
+                ('datetime_created', models.DateTimeField(verbose_name='дата и время создания заказа')),
+                ('order', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='payments', to='orders.archivedorder', verbose_name='заказ')),
+            ],
+            options={
+                'verbose_name': 'оплата архивного заказа',
+                'verbose_name_plural': 'оплаты архивных заказов',
+                'ordering': ('-id',),
+            },
+        ),
+        migrations.RunPython(partition_payments, migrations.RunPython.noop),
+        migrations.RunSQL(CREATE_VIEW, DROP_VIEW),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 6.0.1 on 2026-10-19 03:28
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# SQLite пересоздает таблицу orders_orderitem и не дает переименовать
+# ее, пока на нее ссылается представление (см. 0012_orderitem_snapshot)
+DROP_VIEW = 'DROP VIEW IF EXISTS orders_orderhistoryitem'
+
+CREATE_VIEW = """
+    CREATE VIEW orders_orderhistoryitem AS
+    SELECT id, order_id, item_id, name, currency, unit_amount, quantity
+    FROM orders_orderitem
+    UNION ALL
+    SELECT id, order_id, item_id, name, currency, unit_amount, quantity
+    FROM orders_archivedorderitem
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('items', '0010_related_items'),
+        ('orders', '0016_archivedorderpayment'),
+    ]
+
+    operations = [
+        migrations.RunSQL(DROP_VIEW, CREATE_VIEW),
+        migrations.AlterField(
+            model_name='orderitem',
+            name='item',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to='items.item', verbose_name='товар'),
+        ),
+        migrations.RunSQL(CREATE_VIEW, DROP_VIEW),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 6.0.1 on 2026-10-19 03:31
+
+from django.db import migrations, models
+
+
+def convert_cursor(apps, schema_editor):
+    """
+    Переводит курсор с ID заказа на ID оплаты.
+
+    Учтенными считаются оплаты заказов до курсора, но курсор не
+    заходит дальше первой оплаты еще не учтенных заказов.
+    """
+    RecommendationCursor = apps.get_model('orders', 'RecommendationCursor')
+
+    with schema_editor.connection.cursor() as cursor:
+        for row in RecommendationCursor.objects.all():
+            cursor.execute(
+                'SELECT MAX(id) FROM orders_orderhistorypayment '
+                'WHERE order_id <= %s',
+                [row.last_order_id]
+            )
+            counted = cursor.fetchone()[0] or 0
+            cursor.execute(
+                'SELECT MIN(id) FROM orders_orderhistorypayment '
+                'WHERE order_id > %s',
+                [row.last_order_id]
+            )
+            pending = cursor.fetchone()[0]
+            if pending is not None:
+                counted = min(counted, pending - 1)
+            row.last_payment_id = counted
+            row.save(update_fields=['last_payment_id'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0017_orderitem_item_set_null'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recommendationcursor',
+            name='last_payment_id',
+            field=models.BigIntegerField(default=0, verbose_name='ID последней оплаты'),
+        ),
+        migrations.RunPython(convert_cursor, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='recommendationcursor',
+            name='last_order_id',
+        ),
+    ]
@@ -0,0 +1,87 @@
+# Generated by Django 6.0.1 on 2026-10-19 03:32
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+# Представление заказов получает проценты скидки и налога на момент
+# оплаты. На время изменения таблиц оно удаляется (SQLite может
+# пересоздать таблицу целиком).
+DROP_VIEW = 'DROP VIEW IF EXISTS orders_orderhistory'
+
+CREATE_VIEW = """
+    CREATE VIEW orders_orderhistory AS
+    SELECT id, is_paid, discount_id, tax_id, discount_percent, tax_percent,
+           datetime_created, datetime_updated, FALSE AS is_archived
+    FROM orders_order
+    UNION ALL
+    SELECT id, is_paid, discount_id, tax_id, discount_percent, tax_percent,
+           datetime_created, datetime_updated, TRUE AS is_archived
+    FROM orders_archivedorder
+"""
+
+OLD_CREATE_VIEW = """
+    CREATE VIEW orders_orderhistory AS
+    SELECT id, is_paid, discount_id, tax_id,
+           datetime_created, datetime_updated, FALSE AS is_archived
+    FROM orders_order
+    UNION ALL
+    SELECT id, is_paid, discount_id, tax_id,
+           datetime_created, datetime_updated, TRUE AS is_archived
+    FROM orders_archivedorder
+"""
+
+
+def backfill_rates(apps, schema_editor):
+    """
+    Заполняет снимок процентов оплаченных заказов текущими процентами.
+
+    Проценты на момент оплаты прежних заказов неизвестны, агрегаты
+    продаж по ним уже посчитаны с текущими.
+    """
+    Discount = apps.get_model('orders', 'Discount')
+    Tax = apps.get_model('orders', 'Tax')
+
+    for model_name in ('Order', 'ArchivedOrder'):
+        model = apps.get_model('orders', model_name)
+        model.objects.filter(is_paid=True).update(
+            discount_percent=Subquery(
+                Discount.objects.filter(id=OuterRef('discount_id'))
+                .values('percent')
+            ),
+            tax_percent=Subquery(
+                Tax.objects.filter(id=OuterRef('tax_id')).values('percent')
+            ),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0018_recommendationcursor_last_payment_id'),
+    ]
+
+    operations = [
+        migrations.RunSQL(DROP_VIEW, OLD_CREATE_VIEW),
+        migrations.AddField(
+            model_name='archivedorder',
+            name='discount_percent',
+            field=models.PositiveIntegerField(blank=True, null=True, verbose_name='процент скидки при оплате'),
+        ),
+        migrations.AddField(
+            model_name='archivedorder',
+            name='tax_percent',
+            field=models.PositiveIntegerField(blank=True, null=True, verbose_name='процент налога при оплате'),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='discount_percent',
+            field=models.PositiveIntegerField(blank=True, null=True, verbose_name='процент скидки при оплате'),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='tax_percent',
+            field=models.PositiveIntegerField(blank=True, null=True, verbose_name='процент налога при оплате'),
+        ),
+        migrations.RunPython(backfill_rates, migrations.RunPython.noop),
+        migrations.RunSQL(CREATE_VIEW, DROP_VIEW),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 6.0.1 on 2026-10-19 03:33
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0019_order_rates_snapshot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderCheckoutSession',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('datetime_created', models.DateTimeField(auto_now_add=True, verbose_name='дата и время создания')),
+                ('datetime_updated', models.DateTimeField(auto_now=True, verbose_name='дата и время редактирования')),
+                ('currency', models.CharField(max_length=3, verbose_name='валюта')),
+                ('session_id', models.CharField(max_length=255, unique=True, verbose_name='Stripe ID')),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='checkout_sessions', to='orders.order', verbose_name='заказ')),
+            ],
+            options={
+                'verbose_name': 'сессия оплаты заказа',
+                'verbose_name_plural': 'сессии оплаты заказов',
+                'constraints': [models.UniqueConstraint(fields=('order', 'currency'), name='unique_order_checkout_session')],
+            },
+        ),
+    ]
@@ -0,0 +1,76 @@
+# Generated by Django 6.0.1 on 2026-10-19 03:34
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+# Представление заказов получает время оплаты. На время изменения
+# таблиц оно удаляется (SQLite может пересоздать таблицу целиком).
+DROP_VIEW = 'DROP VIEW IF EXISTS orders_orderhistory'
+
+CREATE_VIEW = """
+    CREATE VIEW orders_orderhistory AS
+    SELECT id, is_paid, discount_id, tax_id, discount_percent, tax_percent,
+           datetime_paid, datetime_created, datetime_updated,
+           FALSE AS is_archived
+    FROM orders_order
+    UNION ALL
+    SELECT id, is_paid, discount_id, tax_id, discount_percent, tax_percent,
+           datetime_paid, datetime_created, datetime_updated,
+           TRUE AS is_archived
+    FROM orders_archivedorder
+"""
+
+OLD_CREATE_VIEW = """
+    CREATE VIEW orders_orderhistory AS
+    SELECT id, is_paid, discount_id, tax_id, discount_percent, tax_percent,
+           datetime_created, datetime_updated, FALSE AS is_archived
+    FROM orders_order
+    UNION ALL
+    SELECT id, is_paid, discount_id, tax_id, discount_percent, tax_percent,
+           datetime_created, datetime_updated, TRUE AS is_archived
+    FROM orders_archivedorder
+"""
+
+
+def backfill_paid(apps, schema_editor):
+    """
+    Заполняет время оплаты оплаченных заказов временем последней оплаты.
+
+    Заказы, отмеченные оплаченными без оплат (в админке), получают
+    время последнего изменения.
+    """
+    for model_name, payment_name, paid_field in (
+        ('Order', 'OrderPayment', 'datetime_created'),
+        ('ArchivedOrder', 'ArchivedOrderPayment', 'datetime_paid'),
+    ):
+        model = apps.get_model('orders', model_name)
+        payments = apps.get_model('orders', payment_name).objects.filter(
+            order_id=OuterRef('id')
+        ).order_by(f'-{paid_field}').values(paid_field)[:1]
+        model.objects.filter(is_paid=True).update(
+            datetime_paid=Coalesce(Subquery(payments), 'datetime_updated')
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0020_ordercheckoutsession'),
+    ]
+
+    operations = [
+        migrations.RunSQL(DROP_VIEW, OLD_CREATE_VIEW),
+        migrations.AddField(
+            model_name='archivedorder',
+            name='datetime_paid',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='дата и время оплаты'),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='datetime_paid',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='дата и время оплаты'),
+        ),
+        migrations.RunPython(backfill_paid, migrations.RunPython.noop),
+        migrations.RunSQL(CREATE_VIEW, DROP_VIEW),
+    ]
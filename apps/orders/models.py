@@ -1,8 +1,11 @@
 """Модели для работы с заказами, скидками и налогами."""
-from typing import TYPE_CHECKING
+from datetime import datetime
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
 
 from django.core.validators import MaxValueValidator
 from django.db import models
+from django.db.models import F, Q, Sum
+from django.utils import timezone
 
 from abstracts.models import TimeStampModel
 
@@ -20,13 +23,18 @@ class Order(TimeStampModel):
     Attributes:
         is_paid: Статус оплаты заказа
         discount: Примененная скидка (опционально)
+        discount_redeemed: Списано ли использование промокода для заказа
         tax: Примененный налог (опционально)
+        discount_percent: Процент скидки на момент оплаты
+        tax_percent: Процент налога на момент оплаты
+        datetime_paid: Дата и время оплаты
         datetime_created: Дата и время создания
         datetime_updated: Дата и время обновления
 
     Methods:
         subtotal: Возвращает промежуточную сумму без скидок и налогов
         total_amount: Возвращает итоговую сумму с учетом скидок и налогов
+        totals_by_currency: Возвращает суммы отдельно по каждой валюте
     """
 
     is_paid = models.BooleanField(
@@ -41,6 +49,10 @@ class Order(TimeStampModel):
         blank=True,
         on_delete=models.SET_NULL
     )
+    discount_redeemed = models.BooleanField(
+        verbose_name='промокод списан',
+        default=False
+    )
 
     tax = models.ForeignKey(
         verbose_name='налог',
@@ -50,6 +62,63 @@ class Order(TimeStampModel):
         on_delete=models.SET_NULL
     )
 
+    # Снимок процентов на момент оплаты: агрегаты продаж не должны
+    # меняться вместе с процентом скидки или налога
+    discount_percent = models.PositiveIntegerField(
+        verbose_name='процент скидки при оплате',
+        null=True,
+        blank=True
+    )
+    tax_percent = models.PositiveIntegerField(
+        verbose_name='процент налога при оплате',
+        null=True,
+        blank=True
+    )
+    # Агрегаты продаж относят заказ ко дню оплаты
+    datetime_paid = models.DateTimeField(
+        verbose_name='дата и время оплаты',
+        null=True,
+        blank=True
+    )
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        # Скидка и налог, для которых сделан снимок процентов (см. save).
+        # Отложенные поля (only, defer) здесь не читаются: каждое чтение
+        # создало бы новый объект со своими отложенными полями
+        self._snapshot_rates = None
+        if not {'is_paid', 'discount_id', 'tax_id'} & set(
+            self.get_deferred_fields()
+        ):
+            self._snapshot_rates = self._rates()
+
+    def _rates(self) -> Optional[Tuple[Optional[int], Optional[int]]]:
+        """Возвращает скидку и налог оплаченного заказа."""
+        if not self.is_paid:
+            return None
+        return self.discount_id, self.tax_id
+
+    def save(self, *args: Any, **kwargs: Any) -> None:
+        """
+        Сохраняет заказ.
+
+        Когда заказ отмечается оплаченным и когда у оплаченного заказа
+        меняются скидка или налог, их проценты копируются в снимок.
+        Заказу, отмеченному оплаченным, запоминается время оплаты.
+        """
+        if not self.is_paid:
+            self.datetime_paid = None
+        elif self.datetime_paid is None:
+            self.datetime_paid = timezone.now()
+        rates = self._rates()
+        if rates is not None and rates != self._snapshot_rates:
+            self.discount_percent = (
+                self.discount.percent if self.discount else None
+            )
+            self.tax_percent = self.tax.percent if self.tax else None
+        super().save(*args, **kwargs)
+        self._snapshot_rates = rates
+
     def subtotal(self) -> int:
         """
         Вычисляет промежуточную сумму заказа без учета скидок и налогов.
@@ -57,9 +126,9 @@ class Order(TimeStampModel):
         Returns:
             Промежуточная сумма в центах
         """
-        return sum(
-            i.item.price * i.quantity for i in self.items.all()
-        )
+        return self.items.aggregate(
+            subtotal=Sum(F('unit_amount') * F('quantity'))
+        )['subtotal'] or 0
 
     def total_amount(self) -> int:
         """
@@ -80,6 +149,45 @@ class Order(TimeStampModel):
 
         return int(total)
 
+    def totals_by_currency(self) -> List[Dict[str, Any]]:
+        """
+        Вычисляет суммы заказа отдельно по каждой валюте.
+
+        Товары группируются по валюте одним агрегирующим запросом
+        к таблице OrderItem (без join к товарам). Скидка и налог
+        применяются к каждой группе так же, как в total_amount.
+
+        Returns:
+            Список словарей, отсортированный по валюте, с ключами
+            currency, subtotal, discount_amount, tax_amount, total
+            (суммы в центах)
+        """
+        rows = (
+            self.items
+            .values('currency')
+            .annotate(subtotal=Sum(F('unit_amount') * F('quantity')))
+            .order_by('currency')
+        )
+
+        totals = []
+        for row in rows:
+            subtotal = row['subtotal']
+            discounted = subtotal
+            if self.discount:
+                discounted = subtotal * (100 - self.discount.percent) // 100
+            total = discounted
+            if self.tax:
+                total = discounted * (100 + self.tax.percent) // 100
+
+            totals.append({
+                'currency': row['currency'],
+                'subtotal': subtotal,
+                'discount_amount': subtotal - discounted,
+                'tax_amount': total - discounted,
+                'total': total,
+            })
+        return totals
+
     class Meta:
         """Метаданные модели."""
 
@@ -92,12 +200,23 @@ class OrderItem(models.Model):
     """
     Модель товара в заказе.
 
-    Связывает заказ с товаром и указывает количество.
+    Связывает заказ с товаром и указывает количество. Название, цена
+    и валюта товара копируются в момент добавления в корзину, поэтому
+    изменение товара в каталоге не меняет уже созданные заказы, а суммы
+    считаются по одной таблице. При удалении товара из каталога строки
+    заказов остаются со снимком (из неоплаченных корзин они удаляются,
+    см. orders.signals).
 
     Attributes:
         order: Заказ, к которому относится товар
-        item: Товар
+        item: Товар (обнуляется при удалении товара)
+        name: Название товара на момент добавления
+        currency: Валюта товара на момент добавления
+        unit_amount: Цена товара в центах на момент добавления
         quantity: Количество товара
+
+    Properties:
+        unit_amount_display: Возвращает цену в обычных единицах валюты
     """
 
     order = models.ForeignKey(
@@ -109,13 +228,57 @@ class OrderItem(models.Model):
     item = models.ForeignKey(
         verbose_name='товар',
         to='items.Item',
-        on_delete=models.CASCADE
+        null=True,
+        on_delete=models.SET_NULL
+    )
+    name = models.CharField(
+        verbose_name='название',
+        max_length=255
+    )
+    currency = models.CharField(
+        verbose_name='валюта',
+        max_length=3
     )
+    unit_amount = models.IntegerField(verbose_name='цена в центах')
     quantity = models.PositiveIntegerField(
         verbose_name='количество',
         default=1
     )
 
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        # Товар, для которого сделан снимок (см. save)
+        self._snapshot_item_id = self.item_id
+
+    @property
+    def unit_amount_display(self) -> float:
+        """
+        Возвращает цену товара в обычном формате.
+
+        Returns:
+            Цена товара на момент добавления (не в центах)
+        """
+        return self.unit_amount / 100
+
+    def save(self, *args: Any, **kwargs: Any) -> None:
+        """
+        Сохраняет товар заказа.
+
+        При создании записи без снимка товара и при замене товара
+        в записи название, цена и валюта копируются из текущего
+        состояния товара.
+        """
+        if self._state.adding:
+            refresh = not self.name
+        else:
+            refresh = self.item_id != self._snapshot_item_id
+        if refresh and self.item_id is not None:
+            self.name = self.item.name
+            self.currency = self.item.currency
+            self.unit_amount = self.item.price
+        super().save(*args, **kwargs)
+        self._snapshot_item_id = self.item_id
+
     def __str__(self) -> str:
         """
         Строковое представление товара в заказе.
@@ -125,7 +288,7 @@ class OrderItem(models.Model):
         """
         status = 'оплачен' if self.order.is_paid else 'не оплачен'
         return (
-            f"Заказ: {self.item.name} в количестве - "
+            f"Заказ: {self.name} в количестве - "
             f"{self.quantity} {status}"
         )
 
@@ -137,16 +300,211 @@ class OrderItem(models.Model):
         ordering = ('-id',)
 
 
+class OrderPayment(TimeStampModel):
+    """
+    Оплата заказа, подтвержденная Stripe.
+
+    Записи создает команда reconcile_payments по Checkout Session
+    и PaymentIntent из Stripe. Заказ оплачен, когда оплаты каждой
+    его валюты покрывают ее сумму.
+
+    Attributes:
+        order: Заказ
+        currency: Валюта оплаты
+        reference: ID PaymentIntent (или Checkout Session без intent)
+        amount: Сумма оплаты в центах
+        datetime_created: Дата и время создания
+        datetime_updated: Дата и время обновления
+    """
+
+    order = models.ForeignKey(
+        verbose_name='заказ',
+        to=Order,
+        related_name='payments',
+        on_delete=models.CASCADE
+    )
+    currency = models.CharField(
+        verbose_name='валюта',
+        max_length=3
+    )
+    reference = models.CharField(
+        verbose_name='Stripe ID',
+        max_length=255,
+        unique=True
+    )
+    amount = models.IntegerField(verbose_name='сумма в центах')
+
+    def __str__(self) -> str:
+        return f'Заказ #{self.order_id}: {self.reference}'
+
+    class Meta:
+        """Метаданные модели."""
+
+        verbose_name = 'оплата заказа'
+        verbose_name_plural = 'оплаты заказов'
+        ordering = ('-id',)
+
+
+class OrderCheckoutSession(TimeStampModel):
+    """
+    Текущая Checkout Session заказа в валюте.
+
+    Повторное оформление заказа заменяет сессии своих валют. Когда
+    сессия истекает, промокод заказа возвращается, только если она
+    текущая и других текущих сессий у заказа нет: прежние сессии
+    истекают, пока новая еще может быть оплачена со скидкой.
+
+    Attributes:
+        order: Заказ
+        currency: Валюта сессии
+        session_id: ID Checkout Session
+        datetime_created: Дата и время создания
+        datetime_updated: Дата и время обновления
+    """
+
+    order = models.ForeignKey(
+        verbose_name='заказ',
+        to=Order,
+        related_name='checkout_sessions',
+        on_delete=models.CASCADE
+    )
+    currency = models.CharField(
+        verbose_name='валюта',
+        max_length=3
+    )
+    session_id = models.CharField(
+        verbose_name='Stripe ID',
+        max_length=255,
+        unique=True
+    )
+
+    def __str__(self) -> str:
+        return f'Заказ #{self.order_id}: {self.session_id}'
+
+    class Meta:
+        """Метаданные модели."""
+
+        verbose_name = 'сессия оплаты заказа'
+        verbose_name_plural = 'сессии оплаты заказов'
+        constraints = [
+            models.UniqueConstraint(
+                fields=('order', 'currency'),
+                name='unique_order_checkout_session'
+            ),
+        ]
+
+
+class PaymentSyncCursor(TimeStampModel):
+    """
+    Позиция команды reconcile_payments в списке объектов Stripe.
+
+    Хранится для каждого Stripe аккаунта и типа объектов. Все
+    объекты до курсора включительно уже в конечном статусе, поэтому
+    следующий запуск продолжает с объектов, созданных после него.
+
+    Attributes:
+        account: Идентификатор Stripe аккаунта
+        resource: Тип объектов ('checkout_session' или 'payment_intent')
+        last_id: ID последнего обработанного объекта
+        datetime_created: Дата и время создания
+        datetime_updated: Дата и время обновления
+    """
+
+    account = models.CharField(
+        verbose_name='аккаунт Stripe',
+        max_length=64
+    )
+    resource = models.CharField(
+        verbose_name='тип объектов',
+        max_length=32
+    )
+    last_id = models.CharField(
+        verbose_name='ID последнего объекта',
+        max_length=255
+    )
+
+    def __str__(self) -> str:
+        return f'{self.account} {self.resource}: {self.last_id}'
+
+    class Meta:
+        """Метаданные модели."""
+
+        verbose_name = 'курсор сверки оплат'
+        verbose_name_plural = 'курсоры сверки оплат'
+        constraints = [
+            models.UniqueConstraint(
+                fields=('account', 'resource'),
+                name='unique_payment_sync_cursor'
+            ),
+        ]
+
+
+class RecommendationCursor(TimeStampModel):
+    """
+    Последняя оплата, учтенная в рекомендациях товаров.
+
+    Единственная строка: команда build_recommendations обрабатывает
+    только оплаты (OrderHistoryPayment) с ID больше курсора.
+
+    Attributes:
+        last_payment_id: ID последней обработанной оплаты
+        datetime_created: Дата и время создания
+        datetime_updated: Дата и время обновления
+    """
+
+    last_payment_id = models.BigIntegerField(
+        verbose_name='ID последней оплаты',
+        default=0
+    )
+
+    def __str__(self) -> str:
+        return f'Рекомендации: оплата #{self.last_payment_id}'
+
+    class Meta:
+        """Метаданные модели."""
+
+        verbose_name = 'курсор рекомендаций'
+        verbose_name_plural = 'курсоры рекомендаций'
+
+
+class DiscountQuerySet(models.QuerySet):
+    """QuerySet скидок с фильтром по сроку действия и лимиту."""
+
+    def active(self, now: Optional[datetime] = None) -> 'DiscountQuerySet':
+        """
+        Оставляет скидки, которые действуют и не исчерпаны.
+
+        Args:
+            now: Момент проверки (по умолчанию текущее время)
+
+        Returns:
+            Отфильтрованный QuerySet
+        """
+        now = now or timezone.now()
+        return self.filter(
+            Q(valid_from__isnull=True) | Q(valid_from__lte=now),
+            Q(valid_until__isnull=True) | Q(valid_until__gt=now),
+            Q(max_redemptions__isnull=True) |
+            Q(redemptions_count__lt=F('max_redemptions')),
+        )
+
+
 class Discount(TimeStampModel):
     """
     Модель скидки.
 
     Представляет скидку с промокодом и процентом скидки.
+    Скидка может быть ограничена сроком действия и количеством
+    использований.
 
     Attributes:
         name: Название скидки
         code: Промокод для активации скидки (уникальный)
         percent: Процент скидки (0-100)
+        valid_from: Начало действия (опционально)
+        valid_until: Окончание действия (опционально)
+        max_redemptions: Максимальное количество использований (опционально)
+        redemptions_count: Количество использований
         datetime_created: Дата и время создания
         datetime_updated: Дата и время обновления
     """
@@ -172,6 +530,51 @@ class Discount(TimeStampModel):
             )
         ]
     )
+    valid_from = models.DateTimeField(
+        verbose_name='действует с',
+        null=True,
+        blank=True
+    )
+    valid_until = models.DateTimeField(
+        verbose_name='действует до',
+        null=True,
+        blank=True
+    )
+    max_redemptions = models.PositiveIntegerField(
+        verbose_name='лимит использований',
+        help_text="пусто - без ограничений",
+        null=True,
+        blank=True
+    )
+    redemptions_count = models.PositiveIntegerField(
+        verbose_name='использований',
+        default=0
+    )
+
+    objects = DiscountQuerySet.as_manager()
+
+    def is_active(self, now: Optional[datetime] = None) -> bool:
+        """
+        Проверяет, действует ли скидка и не исчерпан ли ее лимит.
+
+        Проверка выполняется по данным объекта и служит только для
+        подсказки пользователю. Окончательно использование списывается
+        атомарно в redeem_order_discount.
+
+        Args:
+            now: Момент проверки (по умолчанию текущее время)
+
+        Returns:
+            True, если скидку можно применить
+        """
+        now = now or timezone.now()
+        if self.valid_from and now < self.valid_from:
+            return False
+        if self.valid_until and now >= self.valid_until:
+            return False
+        if self.max_redemptions is not None:
+            return self.redemptions_count < self.max_redemptions
+        return True
 
     def __str__(self) -> str:
         """
@@ -234,3 +637,507 @@ class Tax(TimeStampModel):
         verbose_name = 'налог'
         verbose_name_plural = 'налоги'
         ordering = ('-percent',)
+
+
+class ArchivedOrder(models.Model):
+    """
+    Архивная копия заказа.
+
+    Заказы переносятся в архив из основной таблицы (брошенные корзины
+    командой reap_carts, старые оплаченные заказы командой
+    archive_paid_orders) вместе с товарами и оплатами и хранятся
+    для аналитики. Первичный ключ
+    совпадает с ID исходного заказа. На PostgreSQL таблица
+    секционирована по datetime_created (секция на каждый месяц).
+
+    Attributes:
+        id: ID исходного заказа
+        is_paid: Статус оплаты заказа
+        discount: Примененная скидка (опционально)
+        tax: Примененный налог (опционально)
+        discount_percent: Процент скидки на момент оплаты
+        tax_percent: Процент налога на момент оплаты
+        datetime_paid: Дата и время оплаты
+        datetime_created: Дата и время создания исходного заказа
+        datetime_updated: Дата и время обновления исходного заказа
+        datetime_archived: Дата и время переноса в архив
+    """
+
+    id = models.BigIntegerField(primary_key=True)
+    is_paid = models.BooleanField(verbose_name='статус оплаты')
+    discount = models.ForeignKey(
+        verbose_name='скидка',
+        to=Discount,
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL
+    )
+    tax = models.ForeignKey(
+        verbose_name='налог',
+        to=Tax,
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL
+    )
+    discount_percent = models.PositiveIntegerField(
+        verbose_name='процент скидки при оплате',
+        null=True,
+        blank=True
+    )
+    tax_percent = models.PositiveIntegerField(
+        verbose_name='процент налога при оплате',
+        null=True,
+        blank=True
+    )
+    datetime_paid = models.DateTimeField(
+        verbose_name='дата и время оплаты',
+        null=True,
+        blank=True
+    )
+    datetime_created = models.DateTimeField(
+        verbose_name='дата и время создания'
+    )
+    datetime_updated = models.DateTimeField(
+        verbose_name='дата и время редактирования'
+    )
+    datetime_archived = models.DateTimeField(
+        verbose_name='дата и время архивации',
+        auto_now_add=True
+    )
+
+    def __str__(self) -> str:
+        return f'Архивный заказ #{self.id}'
+
+    class Meta:
+        """Метаданные модели."""
+
+        verbose_name = 'архивный заказ'
+        verbose_name_plural = 'архивные заказы'
+        ordering = ('-id',)
+
+
+class ArchivedOrderItem(models.Model):
+    """
+    Архивная копия товара в заказе.
+
+    Дата создания заказа дублируется в строке товара, чтобы на
+    PostgreSQL секционировать таблицу так же, как ArchivedOrder.
+    Внешний ключ на секционированную таблицу заказов не создается
+    в базе данных, связь поддерживается на уровне Django.
+
+    Attributes:
+        id: ID исходной записи OrderItem
+        order: Архивный заказ
+        item: Товар (обнуляется при удалении товара)
+        name: Название товара на момент добавления
+        currency: Валюта товара на момент добавления
+        unit_amount: Цена товара в центах на момент добавления
+        quantity: Количество товара
+        datetime_created: Дата и время создания исходного заказа
+    """
+
+    id = models.BigIntegerField(primary_key=True)
+    order = models.ForeignKey(
+        verbose_name='заказ',
+        to=ArchivedOrder,
+        related_name='items',
+        on_delete=models.CASCADE,
+        db_constraint=False
+    )
+    item = models.ForeignKey(
+        verbose_name='товар',
+        to='items.Item',
+        null=True,
+        on_delete=models.SET_NULL
+    )
+    name = models.CharField(
+        verbose_name='название',
+        max_length=255
+    )
+    currency = models.CharField(
+        verbose_name='валюта',
+        max_length=3
+    )
+    unit_amount = models.IntegerField(verbose_name='цена в центах')
+    quantity = models.PositiveIntegerField(verbose_name='количество')
+    datetime_created = models.DateTimeField(
+        verbose_name='дата и время создания заказа'
+    )
+
+    class Meta:
+        """Метаданные модели."""
+
+        verbose_name = 'товар в архивном заказе'
+        verbose_name_plural = 'товары в архивных заказах'
+        ordering = ('-id',)
+
+
+class ArchivedOrderPayment(models.Model):
+    """
+    Архивная копия оплаты заказа.
+
+    Оплаты переносятся в архив вместе с заказом, чтобы не терять
+    подтверждения Stripe. Дата создания заказа дублируется так же,
+    как в ArchivedOrderItem, для секционирования на PostgreSQL.
+
+    Attributes:
+        id: ID исходной записи OrderPayment
+        order: Архивный заказ
+        currency: Валюта оплаты
+        reference: ID PaymentIntent (или Checkout Session без intent)
+        amount: Сумма оплаты в центах
+        datetime_paid: Дата и время сохранения оплаты
+        datetime_created: Дата и время создания исходного заказа
+    """
+
+    id = models.BigIntegerField(primary_key=True)
+    order = models.ForeignKey(
+        verbose_name='заказ',
+        to=ArchivedOrder,
+        related_name='payments',
+        on_delete=models.CASCADE,
+        db_constraint=False
+    )
+    currency = models.CharField(
+        verbose_name='валюта',
+        max_length=3
+    )
+    reference = models.CharField(
+        verbose_name='Stripe ID',
+        max_length=255,
+        db_index=True
+    )
+    amount = models.IntegerField(verbose_name='сумма в центах')
+    datetime_paid = models.DateTimeField(
+        verbose_name='дата и время оплаты'
+    )
+    datetime_created = models.DateTimeField(
+        verbose_name='дата и время создания заказа'
+    )
+
+    def __str__(self) -> str:
+        return f'Архивный заказ #{self.order_id}: {self.reference}'
+
+    class Meta:
+        """Метаданные модели."""
+
+        verbose_name = 'оплата архивного заказа'
+        verbose_name_plural = 'оплаты архивных заказов'
+        ordering = ('-id',)
+
+
+class OrderHistory(models.Model):
+    """
+    Все заказы: основные и архивные.
+
+    Модель только для чтения поверх SQL представления, объединяющего
+    таблицы Order и ArchivedOrder. Используется админкой и экспортом,
+    чтобы работать с заказами независимо от того, перенесены ли они
+    в архив.
+
+    Attributes:
+        id: ID заказа
+        is_paid: Статус оплаты заказа
+        discount: Примененная скидка (опционально)
+        tax: Примененный налог (опционально)
+        discount_percent: Процент скидки на момент оплаты
+        tax_percent: Процент налога на момент оплаты
+        datetime_paid: Дата и время оплаты
+        datetime_created: Дата и время создания
+        datetime_updated: Дата и время обновления
+        is_archived: Находится ли заказ в архиве
+    """
+
+    id = models.BigIntegerField(primary_key=True)
+    is_paid = models.BooleanField(verbose_name='статус оплаты')
+    discount = models.ForeignKey(
+        verbose_name='скидка',
+        to=Discount,
+        null=True,
+        on_delete=models.DO_NOTHING
+    )
+    tax = models.ForeignKey(
+        verbose_name='налог',
+        to=Tax,
+        null=True,
+        on_delete=models.DO_NOTHING
+    )
+    discount_percent = models.PositiveIntegerField(
+        verbose_name='процент скидки при оплате',
+        null=True
+    )
+    tax_percent = models.PositiveIntegerField(
+        verbose_name='процент налога при оплате',
+        null=True
+    )
+    datetime_paid = models.DateTimeField(
+        verbose_name='дата и время оплаты',
+        null=True
+    )
+    datetime_created = models.DateTimeField(
+        verbose_name='дата и время создания'
+    )
+    datetime_updated = models.DateTimeField(
+        verbose_name='дата и время редактирования'
+    )
+    is_archived = models.BooleanField(verbose_name='в архиве')
+
+    def __str__(self) -> str:
+        return f'Заказ #{self.id}'
+
+    class Meta:
+        """Метаданные модели."""
+
+        managed = False
+        db_table = 'orders_orderhistory'
+        verbose_name = 'заказ (история)'
+        verbose_name_plural = 'история заказов'
+        ordering = ('-id',)
+
+
+class OrderHistoryItem(models.Model):
+    """
+    Товары всех заказов: основных и архивных.
+
+    Модель только для чтения поверх SQL представления, объединяющего
+    таблицы OrderItem и ArchivedOrderItem.
+
+    Attributes:
+        id: ID записи
+        order: Заказ
+        item: Товар
+        name: Название товара на момент добавления
+        currency: Валюта товара на момент добавления
+        unit_amount: Цена товара в центах на момент добавления
+        quantity: Количество товара
+    """
+
+    id = models.BigIntegerField(primary_key=True)
+    order = models.ForeignKey(
+        verbose_name='заказ',
+        to=OrderHistory,
+        related_name='items',
+        on_delete=models.DO_NOTHING
+    )
+    item = models.ForeignKey(
+        verbose_name='товар',
+        to='items.Item',
+        null=True,
+        on_delete=models.DO_NOTHING
+    )
+    name = models.CharField(
+        verbose_name='название',
+        max_length=255
+    )
+    currency = models.CharField(
+        verbose_name='валюта',
+        max_length=3
+    )
+    unit_amount = models.IntegerField(verbose_name='цена в центах')
+    quantity = models.PositiveIntegerField(verbose_name='количество')
+
+    class Meta:
+        """Метаданные модели."""
+
+        managed = False
+        db_table = 'orders_orderhistoryitem'
+        verbose_name = 'товар в заказе (история)'
+        verbose_name_plural = 'товары в заказах (история)'
+        ordering = ('-id',)
+
+
+class OrderHistoryPayment(models.Model):
+    """
+    Оплаты всех заказов: основных и архивных.
+
+    Модель только для чтения поверх SQL представления, объединяющего
+    таблицы OrderPayment и ArchivedOrderPayment.
+
+    Attributes:
+        id: ID записи
+        order: Заказ
+        currency: Валюта оплаты
+        reference: ID PaymentIntent (или Checkout Session без intent)
+        amount: Сумма оплаты в центах
+        datetime_paid: Дата и время сохранения оплаты
+    """
+
+    id = models.BigIntegerField(primary_key=True)
+    order = models.ForeignKey(
+        verbose_name='заказ',
+        to=OrderHistory,
+        related_name='payments',
+        on_delete=models.DO_NOTHING
+    )
+    currency = models.CharField(
+        verbose_name='валюта',
+        max_length=3
+    )
+    reference = models.CharField(
+        verbose_name='Stripe ID',
+        max_length=255
+    )
+    amount = models.IntegerField(verbose_name='сумма в центах')
+    datetime_paid = models.DateTimeField(
+        verbose_name='дата и время оплаты'
+    )
+
+    class Meta:
+        """Метаданные модели."""
+
+        managed = False
+        db_table = 'orders_orderhistorypayment'
+        verbose_name = 'оплата заказа (история)'
+        verbose_name_plural = 'оплаты заказов (история)'
+        ordering = ('-id',)
+
+
+class SalesRollup(models.Model):
+    """
+    Абстрактная модель дневного агрегата продаж.
+
+    Агрегаты обновляются при оплате заказа (см. orders.sales) и
+    пересчитываются командой rollup_sales, поэтому отчеты по продажам
+    не читают таблицы заказов. День - дата оплаты заказа в часовом
+    поясе TIME_ZONE, суммы - в центах валюты.
+
+    Attributes:
+        date: День
+        currency: Валюта
+        orders: Количество оплаченных заказов (заказ в нескольких
+            валютах учитывается в каждой)
+        units: Количество единиц товара
+        gross: Сумма без скидки и налога
+        discount_amount: Сумма скидки
+        tax_amount: Сумма налога
+        net: Итоговая сумма (gross - discount_amount + tax_amount)
+    """
+
+    date = models.DateField(verbose_name='день')
+    currency = models.CharField(
+        verbose_name='валюта',
+        max_length=3
+    )
+    orders = models.IntegerField(verbose_name='заказов', default=0)
+    units = models.IntegerField(verbose_name='единиц товара', default=0)
+    gross = models.BigIntegerField(
+        verbose_name='сумма без скидки в центах',
+        default=0
+    )
+    discount_amount = models.BigIntegerField(
+        verbose_name='скидка в центах',
+        default=0
+    )
+    tax_amount = models.BigIntegerField(
+        verbose_name='налог в центах',
+        default=0
+    )
+    net = models.BigIntegerField(verbose_name='итого в центах', default=0)
+
+    class Meta:
+        """Метаданные модели."""
+
+        abstract = True
+        ordering = ('-date', 'currency')
+
+
+class DailySales(SalesRollup):
+    """Продажи за день в валюте."""
+
+    def __str__(self) -> str:
+        return f'{self.date} {self.currency.upper()}'
+
+    class Meta(SalesRollup.Meta):
+        """Метаданные модели."""
+
+        verbose_name = 'продажи за день'
+        verbose_name_plural = 'продажи по дням'
+        constraints = [
+            models.UniqueConstraint(
+                fields=('date', 'currency'),
+                name='unique_daily_sales'
+            ),
+        ]
+
+
+class DailyItemSales(SalesRollup):
+    """
+    Продажи товара за день в валюте.
+
+    Скидка и налог заказа распределяются между его товарами
+    пропорционально их сумме, поэтому суммы товаров за день
+    совпадают с DailySales (кроме товаров, удаленных до пересчета
+    архивных заказов). Внешний ключ не создается в базе данных:
+    агрегаты удаленного товара сохраняются.
+
+    Attributes:
+        item: Товар
+        name: Название товара в последнем учтенном заказе
+    """
+
+    item = models.ForeignKey(
+        verbose_name='товар',
+        to='items.Item',
+        related_name='+',
+        on_delete=models.DO_NOTHING,
+        db_constraint=False
+    )
+    name = models.CharField(
+        verbose_name='название',
+        max_length=255
+    )
+
+    def __str__(self) -> str:
+        return f'{self.date} {self.currency.upper()} {self.name}'
+
+    class Meta(SalesRollup.Meta):
+        """Метаданные модели."""
+
+        verbose_name = 'продажи товара за день'
+        verbose_name_plural = 'продажи по товарам'
+        constraints = [
+            models.UniqueConstraint(
+                fields=('date', 'currency', 'item'),
+                name='unique_daily_item_sales'
+            ),
+        ]
+
+
+class DailyDiscountSales(SalesRollup):
+    """
+    Продажи со скидкой за день в валюте.
+
+    Учитываются только заказы со скидкой. Внешний ключ не создается
+    в базе данных: агрегаты удаленной скидки сохраняются.
+
+    Attributes:
+        discount: Скидка
+        name: Название и промокод скидки в последнем учтенном заказе
+    """
+
+    discount = models.ForeignKey(
+        verbose_name='скидка',
+        to=Discount,
+        related_name='+',
+        on_delete=models.DO_NOTHING,
+        db_constraint=False
+    )
+    name = models.CharField(
+        verbose_name='название',
+        max_length=255
+    )
+
+    def __str__(self) -> str:
+        return f'{self.date} {self.currency.upper()} {self.name}'
+
+    class Meta(SalesRollup.Meta):
+        """Метаданные модели."""
+
+        verbose_name = 'продажи со скидкой за день'
+        verbose_name_plural = 'продажи по скидкам'
+        constraints = [
+            models.UniqueConstraint(
+                fields=('date', 'currency', 'discount'),
+                name='unique_daily_discount_sales'
+            ),
+        ]
@@ -0,0 +1,294 @@
+"""Рекомендации «Часто покупают вместе» по оплаченным заказам."""
+from datetime import datetime
+from typing import Dict, List, Set, Tuple
+
+import numpy as np
+from django.db import transaction
+
+from abstracts.cache import publish
+from abstracts.upsert import bulk_increment
+from items.models import Item, ItemPairCount, RelatedItem
+
+from .models import (
+    OrderHistory,
+    OrderHistoryItem,
+    OrderHistoryPayment,
+    RecommendationCursor
+)
+
+# Заказы с большим количеством товаров (оптовые) не учитываются:
+# количество пар растет квадратично, а связь товаров в них слабая
+MAX_ORDER_ITEMS = 50
+
+# Товаров в одном запросе при пересчете соседей
+ITEMS_BATCH_SIZE = 500
+
+
+def _segments(keys: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Возвращает начала и длины групп одинаковых соседних значений."""
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    return starts, np.diff(np.r_[starts, len(keys)])
+
+
+def count_pairs(
+    order_ids: np.ndarray,
+    item_ids: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Считает, в скольких заказах каждая пара товаров куплена вместе.
+
+    Повторы товара в заказе схлопываются, заказы с одним товаром
+    и больше MAX_ORDER_ITEMS товаров пропускаются. Пары строятся
+    без циклов Python: каждый товар заказа повторяется по размеру
+    заказа и сопоставляется со всеми товарами того же заказа, затем
+    пары считаются через np.unique по номеру пары.
+
+    Args:
+        order_ids: ID заказов строк
+        item_ids: ID товаров строк
+
+    Returns:
+        Кортеж массивов (товар, другой товар, количество заказов),
+        каждая пара - в обе стороны
+    """
+    empty = np.empty(0, dtype=np.int64)
+    if not len(order_ids):
+        return empty, empty, empty
+
+    lines = np.unique(
+        np.column_stack([order_ids, item_ids]).astype(np.int64), axis=0
+    )
+    starts, sizes = _segments(lines[:, 0])
+    keep = (sizes > 1) & (sizes <= MAX_ORDER_ITEMS)
+    if not keep.any():
+        return empty, empty, empty
+    items = lines[np.repeat(keep, sizes), 1]
+    sizes = sizes[keep]
+
+    # Плотные номера товаров: номер пары left * n + right влезает в int64
+    catalog, items = np.unique(items, return_inverse=True)
+    n = len(catalog)
+
+    # Для каждого товара - размер и начало его заказа
+    line_sizes = np.repeat(sizes, sizes)
+    line_starts = np.repeat(np.cumsum(sizes) - sizes, sizes)
+
+    left = np.repeat(items, line_sizes)
+    offsets = np.arange(len(left)) - np.repeat(
+        np.cumsum(line_sizes) - line_sizes, line_sizes
+    )
+    right = items[np.repeat(line_starts, line_sizes) + offsets]
+    distinct = left != right
+
+    pairs, counts = np.unique(
+        left[distinct].astype(np.int64) * n + right[distinct],
+        return_counts=True
+    )
+    return catalog[pairs // n], catalog[pairs % n], counts
+
+
+def rank_related(
+    rows: np.ndarray,
+    limit: int
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Выбирает для каждого товара limit соседей с наибольшим счетом.
+
+    При равном счете выше сосед с меньшим ID, чтобы результат
+    не зависел от порядка строк.
+
+    Args:
+        rows: Массив строк (товар, другой товар, количество заказов)
+        limit: Количество соседей товара
+
+    Returns:
+        Кортеж (выбранные строки, позиции соседей)
+    """
+    rows = rows[np.lexsort((rows[:, 1], -rows[:, 2], rows[:, 0]))]
+    starts, sizes = _segments(rows[:, 0])
+    ranks = np.arange(len(rows)) - np.repeat(starts, sizes)
+    selected = ranks < limit
+    return rows[selected], ranks[selected]
+
+
+def _update_related(item_ids: List[int], limit: int) -> None:
+    """Пересчитывает соседей товаров по ItemPairCount."""
+    for start in range(0, len(item_ids), ITEMS_BATCH_SIZE):
+        batch = item_ids[start:start + ITEMS_BATCH_SIZE]
+        rows = np.array(
+            ItemPairCount.objects
+            .filter(item_id__in=batch, orders__gt=0)
+            .values_list('item_id', 'other_id', 'orders'),
+            dtype=np.int64
+        ).reshape(-1, 3)
+        RelatedItem.objects.filter(item_id__in=batch).delete()
+        if not len(rows):
+            continue
+        rows, ranks = rank_related(rows, limit)
+        RelatedItem.objects.bulk_create([
+            RelatedItem(
+                item_id=item_id,
+                related_id=related_id,
+                rank=rank,
+                orders=orders
+            )
+            for (item_id, related_id, orders), rank in zip(
+                rows.tolist(), ranks.tolist()
+            )
+        ])
+
+
+def _completed_orders(
+    order_ids: List[int],
+    first: int,
+    last: int
+) -> List[int]:
+    """
+    Выбирает заказы, оплата которых завершена оплатой с ID от first
+    до last.
+
+    Заказ в нескольких валютах оплачивается несколькими оплатами.
+    Завершающая - первая оплата, после которой оплачена каждая валюта
+    товаров заказа, поэтому заказ попадает ровно в один пакет оплат,
+    даже если после нее пришла повторная оплата.
+    """
+    orders = list(
+        OrderHistory.objects.filter(id__in=order_ids, is_paid=True)
+        .values_list('id', flat=True)
+    )
+    needed: Dict[int, Set[str]] = {order_id: set() for order_id in orders}
+    for order_id, currency in OrderHistoryItem.objects.filter(
+        order_id__in=orders
+    ).values_list('order_id', 'currency'):
+        needed[order_id].add(currency)
+
+    completed = []
+    paid: Dict[int, Set[str]] = {order_id: set() for order_id in orders}
+    for payment_id, order_id, currency in (
+        OrderHistoryPayment.objects
+        .filter(order_id__in=orders, id__lte=last)
+        .order_by('id')
+        .values_list('id', 'order_id', 'currency')
+    ):
+        if paid[order_id] >= needed[order_id]:
+            continue
+        paid[order_id].add(currency)
+        if paid[order_id] >= needed[order_id] and payment_id >= first:
+            completed.append(order_id)
+    return sorted(completed)
+
+
+def _load_lines(order_ids: List[int]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Читает товары заказов.
+
+    Строки читаются потоком из основных и архивных таблиц
+    (OrderHistoryItem) сразу в массивы NumPy. Удаленные товары
+    пропускаются.
+    """
+    lines = np.fromiter(
+        (
+            value
+            for start in range(0, len(order_ids), ITEMS_BATCH_SIZE)
+            for line in OrderHistoryItem.objects.filter(
+                order_id__in=order_ids[start:start + ITEMS_BATCH_SIZE],
+                item__isnull=False
+            ).values_list('order_id', 'item_id').iterator(chunk_size=5000)
+            for value in line
+        ),
+        dtype=np.int64
+    ).reshape(-1, 2)
+    return lines[:, 0], lines[:, 1]
+
+
+def process_orders(
+    paid_before: datetime,
+    chunk_size: int,
+    limit: int
+) -> Tuple[int, int, int]:
+    """
+    Учитывает в рекомендациях следующий пакет оплат после курсора.
+
+    Пакет - до chunk_size оплат (основных и архивных) с ID больше
+    курсора подряд до первой оплаты, сохраненной не раньше
+    paid_before: оплату с меньшим ID параллельная транзакция могла
+    еще не зафиксировать. Учитываются заказы, оплату
+    которых завершила оплата пакета, поэтому заказ, оплаченный
+    через неделю после создания, тоже попадает в рекомендации.
+    Счетчики пар увеличиваются одним INSERT ... ON CONFLICT DO UPDATE
+    на пакет строк, соседи пересчитываются только для затронутых
+    товаров, курсор сдвигается в той же транзакции. Кэш рекомендаций
+    затронутых товаров сбрасывается во всех процессах.
+
+    Args:
+        paid_before: Учитывать оплаты, сохраненные до этого времени
+        chunk_size: Количество оплат в пакете
+        limit: Количество соседей товара
+
+    Returns:
+        Кортеж (просмотрено оплат, увеличено пар, затронуто
+        товаров); (0, 0, 0), если новых оплат нет
+    """
+    with transaction.atomic():
+        # Блокировка курсора не дает двум запускам учесть заказы дважды
+        cursor, _ = (
+            RecommendationCursor.objects
+            .select_for_update()
+            .get_or_create(id=1)
+        )
+        payments = []
+        for payment_id, order_id, datetime_paid in (
+            OrderHistoryPayment.objects
+            .filter(id__gt=cursor.last_payment_id)
+            .order_by('id')
+            .values_list('id', 'order_id', 'datetime_paid')[:chunk_size]
+        ):
+            if datetime_paid >= paid_before:
+                break
+            payments.append((payment_id, order_id))
+        if not payments:
+            return 0, 0, 0
+
+        order_ids = _completed_orders(
+            sorted({order_id for _, order_id in payments}),
+            payments[0][0],
+            payments[-1][0]
+        )
+        orders, items = _load_lines(order_ids)
+        # Товар мог быть удален после чтения строк заказов
+        item_ids = np.unique(items).tolist()
+        existing = np.array([
+            item_id
+            for start in range(0, len(item_ids), ITEMS_BATCH_SIZE)
+            for item_id in Item.objects.filter(
+                id__in=item_ids[start:start + ITEMS_BATCH_SIZE]
+            ).values_list('id', flat=True)
+        ], dtype=np.int64)
+        present = np.isin(items, existing)
+        left, right, counts = count_pairs(orders[present], items[present])
+
+        bulk_increment(
+            ItemPairCount,
+            ('item', 'other'),
+            ('orders',),
+            zip(left.tolist(), right.tolist(), counts.tolist())
+        )
+        touched = np.unique(left).tolist()
+        _update_related(touched, limit)
+
+        cursor.last_payment_id = payments[-1][0]
+        cursor.save(update_fields=['last_payment_id', 'datetime_updated'])
+        publish('items.RelatedItem', touched)
+    return len(payments), len(counts), len(touched)
+
+
+def reset_recommendations() -> None:
+    """Удаляет счетчики, рекомендации и курсор для пересчета с нуля."""
+    with transaction.atomic():
+        item_ids = list(
+            RelatedItem.objects.values_list('item_id', flat=True).distinct()
+        )
+        RelatedItem.objects.all().delete()
+        ItemPairCount.objects.all().delete()
+        RecommendationCursor.objects.all().delete()
+        publish('items.RelatedItem', item_ids)
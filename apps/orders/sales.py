@@ -0,0 +1,309 @@
+"""Дневные агрегаты продаж: обновление при оплате заказов и пересчет."""
+from contextlib import contextmanager
+from datetime import date
+from typing import Any, Dict, Iterable, Iterator, List, Tuple, Type
+
+from django.db import connection, transaction
+from django.db.models import F, QuerySet
+from django.utils import timezone
+
+from abstracts.upsert import bulk_increment
+
+from .models import (
+    DailyDiscountSales,
+    DailyItemSales,
+    DailySales,
+    Order,
+    OrderHistory,
+    OrderHistoryItem,
+    OrderItem,
+    SalesRollup
+)
+
+# Агрегаты в порядке обновления (одинаковый порядок блокировок)
+ROLLUPS: Tuple[Type[SalesRollup], ...] = (
+    DailySales,
+    DailyItemSales,
+    DailyDiscountSales,
+)
+METRICS = ('orders', 'units', 'gross', 'discount_amount', 'tax_amount', 'net')
+
+Rows = Dict[Type[SalesRollup], Dict[Tuple[Any, ...], Dict[str, Any]]]
+
+
+def _allocate(amount: int, weights: List[int]) -> List[int]:
+    """
+    Распределяет сумму пропорционально весам без потери копеек.
+
+    Остаток от округления достается строке с наибольшим весом.
+    """
+    total = sum(weights)
+    if not amount or not total:
+        return [0] * len(weights)
+    shares = [amount * weight // total for weight in weights]
+    shares[weights.index(max(weights))] += amount - sum(shares)
+    return shares
+
+
+def _add(
+    rows: Dict[Tuple[Any, ...], Dict[str, Any]],
+    key: Tuple[Any, ...],
+    values: Dict[str, int],
+    **extra: Any
+) -> None:
+    """Прибавляет значения к строке агрегата."""
+    row = rows.setdefault(key, dict.fromkeys(METRICS, 0))
+    for name, value in values.items():
+        row[name] += value
+    row.update(extra)
+
+
+def compute_sales(
+    orders: Dict[int, Dict[str, Any]],
+    lines: Iterable[Dict[str, Any]],
+    sign: int = 1
+) -> Rows:
+    """
+    Вычисляет вклад заказов в дневные агрегаты.
+
+    Суммы валюты заказа считаются так же, как в
+    Order.totals_by_currency: сначала скидка, затем налог к сумме
+    после скидки, с округлением вниз.
+
+    Args:
+        orders: Заказы {ID: значения}, значения содержат
+            datetime_paid, discount_id, discount_name,
+            discount_percent и tax_percent
+        lines: Товары заказов (order_id, item_id, name, currency,
+            unit_amount, quantity)
+        sign: 1 - прибавить заказы, -1 - вычесть
+
+    Returns:
+        Строки агрегатов {модель: {ключ: значения}}
+    """
+    groups: Dict[Tuple[int, str], List[Dict[str, Any]]] = {}
+    for line in lines:
+        groups.setdefault(
+            (line['order_id'], line['currency']), []
+        ).append(line)
+
+    rows: Rows = {model: {} for model in ROLLUPS}
+    for (order_id, currency), group in groups.items():
+        order = orders[order_id]
+        day = timezone.localdate(order['datetime_paid'])
+
+        amounts = [line['unit_amount'] * line['quantity'] for line in group]
+        subtotal = sum(amounts)
+        discounted = subtotal
+        if order['discount_percent'] is not None:
+            discounted = subtotal * (100 - order['discount_percent']) // 100
+        total = discounted
+        if order['tax_percent'] is not None:
+            total = discounted * (100 + order['tax_percent']) // 100
+
+        values = {
+            'orders': sign,
+            'units': sign * sum(line['quantity'] for line in group),
+            'gross': sign * subtotal,
+            'discount_amount': sign * (subtotal - discounted),
+            'tax_amount': sign * (total - discounted),
+            'net': sign * total,
+        }
+        _add(rows[DailySales], (day, currency), values)
+        if order['discount_id'] is not None:
+            _add(
+                rows[DailyDiscountSales],
+                (day, currency, order['discount_id']),
+                values,
+                name=order['discount_name']
+            )
+
+        items: Dict[int, Dict[str, Any]] = {}
+        for line, amount, discount, tax in zip(
+            group,
+            amounts,
+            _allocate(subtotal - discounted, amounts),
+            _allocate(total - discounted, amounts)
+        ):
+            # Товар архивного заказа мог быть удален
+            if line['item_id'] is None:
+                continue
+            item = items.setdefault(line['item_id'], {
+                'orders': sign,
+                'units': 0,
+                'gross': 0,
+                'discount_amount': 0,
+                'tax_amount': 0,
+                'net': 0,
+                'name': line['name'],
+            })
+            item['units'] += sign * line['quantity']
+            item['gross'] += sign * amount
+            item['discount_amount'] += sign * discount
+            item['tax_amount'] += sign * tax
+            item['net'] += sign * (amount - discount + tax)
+        for item_id, values in items.items():
+            name = values.pop('name')
+            _add(
+                rows[DailyItemSales],
+                (day, currency, item_id),
+                values,
+                name=name
+            )
+    return rows
+
+
+def _load_orders(queryset: QuerySet) -> Dict[int, Dict[str, Any]]:
+    """
+    Читает заказы со скидкой и налогом для compute_sales.
+
+    Проценты берутся из снимка на момент оплаты, а не из текущих
+    скидки и налога: их изменение не меняет прошлые продажи.
+    """
+    orders = {}
+    for order in queryset.values(
+        'id',
+        'datetime_paid',
+        'discount_id',
+        'discount_percent',
+        'tax_percent',
+        discount_title=F('discount__name'),
+        discount_code=F('discount__code'),
+    ):
+        title, code = order.pop('discount_title'), order.pop('discount_code')
+        order['discount_name'] = f'{title} ({code})' if code else title
+        orders[order['id']] = order
+    return orders
+
+
+def _upsert(model: Type[SalesRollup], rows: Dict[Tuple, Dict]) -> None:
+    """Прибавляет строки к агрегату (одновременные оплаты не теряются)."""
+    if not rows:
+        return
+    keys = model._meta.constraints[0].fields
+    replace = sorted(next(iter(rows.values())).keys() - set(METRICS))
+    bulk_increment(
+        model,
+        keys,
+        METRICS,
+        [
+            (*key, *(values[name] for name in (*replace, *METRICS)))
+            for key, values in rows.items()
+        ],
+        replace=replace
+    )
+
+
+def record_sales(order_ids: Iterable[int], sign: int = 1) -> int:
+    """
+    Добавляет оплаченные заказы в дневные агрегаты.
+
+    Вызывается в транзакции, которая отмечает заказы оплаченными,
+    для заказов, отмеченных именно ей: заказ не должен учитываться
+    дважды. С sign=-1 вклад заказов вычитается (перед изменением
+    или удалением оплаченного заказа).
+
+    Args:
+        order_ids: ID заказов
+        sign: 1 - прибавить заказы, -1 - вычесть
+
+    Returns:
+        Количество учтенных заказов
+    """
+    order_ids = list(order_ids)
+    if not order_ids:
+        return 0
+
+    orders = _load_orders(Order.objects.filter(id__in=order_ids))
+    lines = OrderItem.objects.filter(order_id__in=orders).values(
+        'order_id', 'item_id', 'name', 'currency', 'unit_amount', 'quantity'
+    )
+    with transaction.atomic():
+        for model, rows in compute_sales(orders, lines, sign).items():
+            _upsert(model, rows)
+            if sign < 0:
+                # Строки без заказов удаляются, как при пересчете
+                model.objects.filter(
+                    date__in={key[0] for key in rows},
+                    orders=0
+                ).delete()
+    return len(orders)
+
+
+@contextmanager
+def updating_sales(order_ids: Iterable[int]) -> Iterator[None]:
+    """
+    Обновляет агрегаты при изменении или удалении заказов.
+
+    Вклад оплаченных заказов вычитается до изменения и прибавляется
+    после него (если заказ остался и оплачен).
+
+    Example:
+        >>> with updating_sales([order.id]):
+        ...     order.save()
+    """
+    order_ids = list(order_ids)
+    with transaction.atomic():
+        record_sales(
+            Order.objects.filter(id__in=order_ids, is_paid=True)
+            .values_list('id', flat=True),
+            sign=-1
+        )
+        yield
+        record_sales(
+            Order.objects.filter(id__in=order_ids, is_paid=True)
+            .values_list('id', flat=True)
+        )
+
+
+def rebuild_sales(date_from: date, date_to: date) -> int:
+    """
+    Пересчитывает агрегаты за дни с date_from по date_to включительно.
+
+    Агрегаты строятся заново по оплаченным заказам из основных
+    и архивных таблиц (OrderHistory) с процентами скидок и налогов
+    на момент оплаты. На PostgreSQL таблицы агрегатов блокируются от
+    записи на время пересчета, поэтому оплата, учтенная в это
+    время, не теряется и не учитывается дважды.
+
+    Args:
+        date_from: Первый день
+        date_to: Последний день
+
+    Returns:
+        Количество учтенных заказов
+    """
+    days = (date_from, date_to)
+    with transaction.atomic():
+        if connection.vendor == 'postgresql':
+            tables = ', '.join(
+                connection.ops.quote_name(model._meta.db_table)
+                for model in ROLLUPS
+            )
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f'LOCK TABLE {tables} IN SHARE ROW EXCLUSIVE MODE'
+                )
+        # В SQLite удаление до чтения заказов захватывает блокировку
+        # записи, и параллельная оплата ждет конца пересчета
+        for model in ROLLUPS:
+            model.objects.filter(date__range=days).delete()
+
+        orders = _load_orders(OrderHistory.objects.filter(
+            is_paid=True,
+            datetime_paid__date__range=days
+        ))
+        lines = OrderHistoryItem.objects.filter(
+            order__is_paid=True,
+            order__datetime_paid__date__range=days
+        ).values(
+            'order_id',
+            'item_id',
+            'name',
+            'currency',
+            'unit_amount',
+            'quantity'
+        )
+        for model, rows in compute_sales(orders, lines).items():
+            _upsert(model, rows)
+    return len(orders)
@@ -1,13 +1,73 @@
-from typing import TYPE_CHECKING
+import time
+from collections import Counter
+from datetime import datetime
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple
+)
 
+import stripe
+from django.conf import settings
+from django.core.cache import cache
+from django.core.signing import BadSignature, Signer
+from django.db import connection, transaction
+from django.db.models import (
+    Exists,
+    F,
+    Max,
+    Min,
+    OuterRef,
+    QuerySet,
+    Subquery,
+    Sum
+)
 from django.http import HttpRequest
+from django.utils import timezone
 
-from .models import Order
+from abstracts.cache import MISSING, LocalCache, publish
+from abstracts.sessions import get_session_id
+
+from .models import (
+    ArchivedOrder,
+    ArchivedOrderItem,
+    ArchivedOrderPayment,
+    Discount,
+    Order,
+    OrderCheckoutSession,
+    OrderHistory,
+    OrderHistoryItem,
+    OrderHistoryPayment,
+    OrderItem,
+    OrderPayment,
+    Tax
+)
+from .sales import record_sales
+from .stripe_utils import checkout_amount
 
 if TYPE_CHECKING:
     pass
 
 
+ARCHIVE_TABLES = (
+    'orders_archivedorder',
+    'orders_archivedorderitem',
+    'orders_archivedorderpayment',
+)
+_archive_partitions = set()
+
+_discounts = LocalCache('orders.Discount')
+
+# Соль подписи ссылки на поток событий оплаты заказа
+ORDER_TOKEN_SALT = 'orders.order_events'
+
+
 def get_or_create_cart(request: HttpRequest) -> Order:
     """
     Получает или создает корзину для текущей сессии пользователя.
@@ -25,10 +85,713 @@ def get_or_create_cart(request: HttpRequest) -> Order:
 
     if order_id:
         try:
-            return Order.objects.get(id=order_id, is_paid=False)
+            return Order.objects.select_related('discount', 'tax').get(
+                id=order_id,
+                is_paid=False
+            )
         except Order.DoesNotExist:
             pass
 
     order = Order.objects.create()
     request.session["cart_id"] = order.id
     return order
+
+
+def get_discount_by_code(code: str) -> Optional[Discount]:
+    """
+    Ищет скидку по промокоду через кэш в памяти процесса.
+
+    Найденные скидки кэшируются на DISCOUNT_CACHE_TIMEOUT секунд,
+    ненайденные коды - на DISCOUNT_NEGATIVE_CACHE_TIMEOUT секунд,
+    поэтому перебор промокодов не доходит до базы данных. Изменение
+    или удаление любой скидки сбрасывает ее запись и все ненайденные
+    коды во всех процессах (см. abstracts.cache).
+
+    Args:
+        code: Промокод
+
+    Returns:
+        Объект Discount или None, если промокод не найден
+    """
+    discount = _discounts.get(code)
+    if discount is not MISSING:
+        return discount
+
+    discount = Discount.objects.filter(code=code).first()
+    _discounts.set(
+        code,
+        discount,
+        settings.DISCOUNT_CACHE_TIMEOUT if discount
+        else settings.DISCOUNT_NEGATIVE_CACHE_TIMEOUT
+    )
+    return discount
+
+
+def take_attempt(key: str, limit: int, window: int) -> bool:
+    """
+    Засчитывает попытку в счетчике окна фиксированной длины.
+
+    Счетчик окна хранится в кэше и увеличивается атомарно (cache.add
+    и cache.incr), поэтому одновременные запросы не могут получить
+    больше limit попыток за окно.
+
+    Args:
+        key: Ключ счетчика в кэше
+        limit: Количество попыток за окно
+        window: Длина окна в секундах
+
+    Returns:
+        True, если попытка разрешена, иначе False
+    """
+    key = f'{key}:{int(time.time()) // window}'
+    cache.add(key, 0, window)
+    try:
+        attempts = cache.incr(key)
+    except ValueError:
+        # Окно истекло между add и incr
+        attempts = 1
+        cache.set(key, 1, window)
+    return attempts <= limit
+
+
+def discount_rate_limited(request: HttpRequest) -> bool:
+    """
+    Проверяет ограничение частоты ввода промокодов.
+
+    Отдельные счетчики попыток ведутся для IP адреса и для сессии
+    клиента.
+
+    Args:
+        request: HTTP запрос
+
+    Returns:
+        True, если лимит исчерпан и запрос нужно отклонить
+    """
+    keys = [f'ratelimit:discount:ip:{request.META.get("REMOTE_ADDR")}']
+    session_id = get_session_id(request)
+    if session_id:
+        keys.append(f'ratelimit:discount:session:{session_id}')
+
+    allowed = [
+        take_attempt(
+            key,
+            settings.DISCOUNT_RATE_LIMIT_ATTEMPTS,
+            settings.DISCOUNT_RATE_LIMIT_WINDOW
+        )
+        for key in keys
+    ]
+    return not all(allowed)
+
+
+def redeem_order_discount(order: Order) -> bool:
+    """
+    Списывает одно использование промокода заказа.
+
+    Использование списывается одним условным UPDATE без блокировки
+    строки на время запроса к Stripe, поэтому одновременные оплаты
+    с одним промокодом не превышают лимит и не ждут друг друга.
+    Повторный вызов для того же заказа ничего не списывает.
+
+    Args:
+        order: Заказ со скидкой
+
+    Returns:
+        True, если промокод можно использовать для заказа,
+        False, если срок действия истек или лимит исчерпан
+    """
+    if not order.discount_id:
+        return True
+
+    claimed = Order.objects.filter(
+        pk=order.pk,
+        discount_redeemed=False
+    ).update(discount_redeemed=True)
+    if not claimed:
+        return True
+
+    redeemed = Discount.objects.active().filter(
+        pk=order.discount_id
+    ).update(redemptions_count=F('redemptions_count') + 1)
+    if not redeemed:
+        Order.objects.filter(pk=order.pk).update(discount_redeemed=False)
+        return False
+    publish('orders.Discount', [order.discount_id])
+
+    order.discount_redeemed = True
+    return True
+
+
+def release_order_discount(order: Order) -> None:
+    """
+    Возвращает списанное использование промокода заказа.
+
+    Вызывается, когда скидка снимается с заказа или заменяется другой.
+
+    Args:
+        order: Заказ
+    """
+    if not order.discount_redeemed:
+        return
+
+    released = Order.objects.filter(
+        pk=order.pk,
+        discount_redeemed=True
+    ).update(discount_redeemed=False)
+    if released:
+        Discount.objects.filter(
+            pk=order.discount_id,
+            redemptions_count__gt=0
+        ).update(redemptions_count=F('redemptions_count') - 1)
+        publish('orders.Discount', [order.discount_id])
+
+    order.discount_redeemed = False
+
+
+def record_checkout_sessions(order: Order, sessions: Dict[str, str]) -> None:
+    """
+    Запоминает Checkout Session оформления как текущие сессии заказа.
+
+    Сессии прежнего оформления в тех же валютах заменяются.
+
+    Args:
+        order: Заказ
+        sessions: ID сессий по валютам {валюта: ID сессии}
+    """
+    for currency, session_id in sessions.items():
+        OrderCheckoutSession.objects.update_or_create(
+            order=order,
+            currency=currency,
+            defaults={'session_id': session_id}
+        )
+
+
+def forget_checkout_sessions(order: Order, currencies: Iterable[str]) -> None:
+    """
+    Забывает текущие Checkout Session заказа в указанных валютах.
+
+    Вызывается, когда прежние сессии истекают перед новым
+    оформлением: их webhook checkout.session.expired не должен
+    возвращать промокод, списанный для нового оформления.
+
+    Args:
+        order: Заказ
+        currencies: Валюты нового оформления
+    """
+    OrderCheckoutSession.objects.filter(
+        order=order,
+        currency__in=list(currencies)
+    ).delete()
+
+
+def release_unused_discount(order: Order) -> None:
+    """
+    Возвращает промокод заказа, у которого нет текущих сессий оплаты.
+
+    Args:
+        order: Заказ
+    """
+    if not OrderCheckoutSession.objects.filter(order=order).exists():
+        release_order_discount(order)
+
+
+def release_expired_checkout(session: stripe.checkout.Session) -> bool:
+    """
+    Возвращает промокод заказа, Checkout Session которого истекла.
+
+    Сессия истекает сама или отменяется при освобождении резервов
+    (sweep_reservations), после чего Stripe присылает webhook
+    checkout.session.expired. Использование возвращается, только
+    если истекла текущая сессия заказа (OrderCheckoutSession) и
+    других текущих сессий нет, а заказ не оплачен ни в одной валюте.
+    Сессии, замененные новым оформлением, промокод не возвращают.
+
+    Args:
+        session: Истекшая Checkout Session
+
+    Returns:
+        True, если использование промокода возвращено
+    """
+    metadata = session.get('metadata') or {}
+    if not str(metadata.get('order_id', '')).isdigit():
+        return False
+
+    with transaction.atomic():
+        # Блокировка заказа упорядочивает истечение сессий разных валют
+        order = Order.objects.select_for_update().filter(
+            id=int(metadata['order_id']),
+            is_paid=False,
+            discount_redeemed=True
+        ).exclude(
+            Exists(OrderPayment.objects.filter(order_id=OuterRef('pk')))
+        ).first()
+        if order is None:
+            return False
+
+        current, _ = OrderCheckoutSession.objects.filter(
+            order=order,
+            session_id=session.id
+        ).delete()
+        if not current or order.checkout_sessions.exists():
+            return False
+
+        release_order_discount(order)
+    return True
+
+
+def archive_orders(order_ids: List[int], archive: bool = True) -> int:
+    """
+    Переносит заказы в архив и удаляет их из основных таблиц.
+
+    Выполняется одной транзакцией. Оплаты заказов переносятся в архив
+    вместе с товарами. Использования промокодов, списанные для
+    неоплаченных заказов, возвращаются.
+
+    Args:
+        order_ids: ID заказов
+        archive: Копировать ли заказы в архивные таблицы перед удалением
+
+    Returns:
+        Количество удаленных строк (заказы, товары и оплаты заказов)
+    """
+    with transaction.atomic():
+        orders = list(Order.objects.filter(id__in=order_ids).values(
+            'id',
+            'is_paid',
+            'discount_id',
+            'discount_redeemed',
+            'tax_id',
+            'discount_percent',
+            'tax_percent',
+            'datetime_paid',
+            'datetime_created',
+            'datetime_updated',
+        ))
+        order_items = list(OrderItem.objects.filter(
+            order_id__in=order_ids
+        ).values(
+            'id',
+            'order_id',
+            'item_id',
+            'name',
+            'currency',
+            'unit_amount',
+            'quantity',
+        ))
+        payments = list(OrderPayment.objects.filter(
+            order_id__in=order_ids
+        ).values(
+            'id',
+            'order_id',
+            'currency',
+            'reference',
+            'amount',
+            'datetime_created',
+        ))
+        created = {order['id']: order['datetime_created'] for order in orders}
+
+        if archive:
+            ensure_archive_partitions(created.values())
+            ArchivedOrder.objects.bulk_create(
+                [
+                    ArchivedOrder(
+                        id=order['id'],
+                        is_paid=order['is_paid'],
+                        discount_id=order['discount_id'],
+                        tax_id=order['tax_id'],
+                        discount_percent=order['discount_percent'],
+                        tax_percent=order['tax_percent'],
+                        datetime_paid=order['datetime_paid'],
+                        datetime_created=order['datetime_created'],
+                        datetime_updated=order['datetime_updated'],
+                    )
+                    for order in orders
+                ],
+                ignore_conflicts=True
+            )
+            ArchivedOrderItem.objects.bulk_create(
+                [
+                    ArchivedOrderItem(
+                        **values,
+                        datetime_created=created[values['order_id']]
+                    )
+                    for values in order_items
+                ],
+                ignore_conflicts=True
+            )
+            ArchivedOrderPayment.objects.bulk_create(
+                [
+                    ArchivedOrderPayment(
+                        id=payment['id'],
+                        order_id=payment['order_id'],
+                        currency=payment['currency'],
+                        reference=payment['reference'],
+                        amount=payment['amount'],
+                        datetime_paid=payment['datetime_created'],
+                        datetime_created=created[payment['order_id']]
+                    )
+                    for payment in payments
+                ],
+                ignore_conflicts=True
+            )
+
+        redeemed = Counter(
+            order['discount_id']
+            for order in orders
+            if order['discount_redeemed'] and not order['is_paid']
+        )
+        for discount_id, count in redeemed.items():
+            Discount.objects.filter(
+                pk=discount_id,
+                redemptions_count__gte=count
+            ).update(redemptions_count=F('redemptions_count') - count)
+        publish('orders.Discount', redeemed)
+
+        removed, _ = OrderItem.objects.filter(
+            order_id__in=order_ids
+        ).delete()
+        deleted, _ = OrderPayment.objects.filter(
+            order_id__in=order_ids
+        ).delete()
+        removed += deleted
+        deleted, _ = Order.objects.filter(id__in=order_ids).delete()
+        removed += deleted
+
+    return removed
+
+
+def ensure_archive_partitions(dates: Iterable[datetime]) -> None:
+    """
+    Создает помесячные секции архивных таблиц для указанных дат.
+
+    Только для PostgreSQL, где архивные таблицы секционированы по
+    datetime_created. На остальных базах ничего не делает.
+
+    Args:
+        dates: Даты создания архивируемых заказов
+    """
+    if connection.vendor != 'postgresql':
+        return
+
+    months = {(date.year, date.month) for date in dates}
+    months -= _archive_partitions
+    if not months:
+        return
+
+    with connection.cursor() as cursor:
+        for year, month in sorted(months):
+            start = datetime(year, month, 1)
+            end = datetime(year + month // 12, month % 12 + 1, 1)
+            for table in ARCHIVE_TABLES:
+                cursor.execute(
+                    f'CREATE TABLE IF NOT EXISTS {table}_y{year}m{month:02d} '
+                    f'PARTITION OF {table} FOR VALUES FROM (%s) TO (%s)',
+                    [start, end]
+                )
+    _archive_partitions.update(months)
+
+
+def archive_in_batches(
+    queryset: QuerySet,
+    batch_size: int,
+    sleep: float,
+    archive: bool = True,
+    progress: Optional[Callable[[int, int], None]] = None
+) -> int:
+    """
+    Архивирует заказы из queryset пакетами по диапазонам первичного ключа.
+
+    Каждый диапазон обрабатывается отдельной короткой транзакцией,
+    между диапазонами делается пауза, поэтому обработка не держит
+    долгих блокировок на рабочей базе.
+
+    Args:
+        queryset: Заказы для архивации
+        batch_size: Размер диапазона первичного ключа
+        sleep: Пауза между пакетами в секундах
+        archive: Копировать ли заказы в архив перед удалением
+        progress: Вызывается после каждого пакета с количеством
+            обработанных заказов и удаленных строк
+
+    Returns:
+        Количество обработанных заказов
+    """
+    bounds = queryset.aggregate(low=Min('id'), high=Max('id'))
+    if bounds['low'] is None:
+        return 0
+
+    orders = removed = 0
+    for low in range(bounds['low'], bounds['high'] + 1, batch_size):
+        order_ids = list(queryset.filter(
+            id__gte=low,
+            id__lt=low + batch_size
+        ).values_list('id', flat=True))
+        if not order_ids:
+            continue
+
+        removed += archive_orders(order_ids, archive=archive)
+        orders += len(order_ids)
+        if progress:
+            progress(orders, removed)
+        time.sleep(sleep)
+
+    return orders
+
+
+class Payment(NamedTuple):
+    """Оплата заказа, найденная в Stripe."""
+
+    order_id: int
+    currency: str
+    reference: str
+    amount: int
+
+
+def session_payment(
+    session: stripe.checkout.Session
+) -> Tuple[Optional[Payment], bool]:
+    """
+    Разбирает Checkout Session.
+
+    Returns:
+        Кортеж (оплата заказа или None, находится ли сессия
+        в конечном статусе)
+    """
+    settled = session.get('status') != 'open'
+    metadata = session.get('metadata') or {}
+    if not (
+        session.get('status') == 'complete'
+        and session.get('payment_status') in ('paid', 'no_payment_required')
+        and str(metadata.get('order_id', '')).isdigit()
+    ):
+        return None, settled
+
+    payment_intent = session.get('payment_intent')
+    if isinstance(payment_intent, dict):
+        payment_intent = payment_intent.get('id')
+    return Payment(
+        order_id=int(metadata['order_id']),
+        currency=session.get('currency') or metadata.get('currency', ''),
+        reference=payment_intent or session.id,
+        amount=session.get('amount_total') or 0
+    ), settled
+
+
+def intent_payment(
+    intent: stripe.PaymentIntent
+) -> Tuple[Optional[Payment], bool]:
+    """
+    Разбирает PaymentIntent.
+
+    PaymentIntent без order_id в metadata (покупка отдельного товара)
+    не относится к заказам и считается обработанным.
+
+    Returns:
+        Кортеж (оплата заказа или None, находится ли платеж
+        в конечном статусе)
+    """
+    metadata = intent.get('metadata') or {}
+    if not str(metadata.get('order_id', '')).isdigit():
+        return None, True
+
+    status = intent.get('status')
+    if status != 'succeeded':
+        return None, status == 'canceled'
+    return Payment(
+        order_id=int(metadata['order_id']),
+        currency=intent.get('currency') or metadata.get('currency', ''),
+        reference=intent.id,
+        amount=intent.get('amount_received') or intent.get('amount') or 0
+    ), True
+
+
+# События webhook Stripe, подтверждающие оплату, и их разбор
+WEBHOOK_PAYMENTS = {
+    'checkout.session.completed': session_payment,
+    'checkout.session.async_payment_succeeded': session_payment,
+    'payment_intent.succeeded': intent_payment,
+}
+
+
+def _fully_paid(order_ids: List[int]) -> List[int]:
+    """
+    Выбирает заказы, оплаты которых покрывают сумму каждой валюты.
+
+    Сумма валюты считается по текущим товарам, скидке и налогу заказа
+    так же, как line_items Checkout Session (checkout_amount).
+    Корзину можно изменить после оформления оплаты, и оплата прежней
+    сессии не должна оплачивать добавленные товары.
+    """
+    orders = Order.objects.select_related('discount', 'tax').in_bulk(
+        order_ids
+    )
+    lines: Dict[Tuple[int, str], List[OrderItem]] = {}
+    for order_item in OrderItem.objects.filter(order_id__in=order_ids):
+        lines.setdefault(
+            (order_item.order_id, order_item.currency), []
+        ).append(order_item)
+    paid = {
+        (row['order_id'], row['currency']): row['total']
+        for row in OrderPayment.objects.filter(order_id__in=order_ids)
+        .values('order_id', 'currency')
+        .annotate(total=Sum('amount'))
+    }
+    underpaid = {
+        order_id
+        for (order_id, currency), order_items in lines.items()
+        if paid.get((order_id, currency), 0)
+        < checkout_amount(orders[order_id], order_items)
+    }
+    return [order_id for order_id in order_ids if order_id not in underpaid]
+
+
+def record_payments(payments: Iterable[Payment]) -> int:
+    """
+    Сохраняет оплаты заказов и отмечает оплаченные заказы.
+
+    Оплаты сохраняются одним INSERT (уже сохраненные и оплаты
+    удаленных заказов пропускаются), заказы отмечаются одним UPDATE.
+    Заказ в нескольких валютах оплачивается несколькими Checkout
+    Session, поэтому он отмечается оплаченным, только когда оплаты
+    каждой валюты его товаров покрывают ее сумму (корзину могли
+    изменить после оформления оплаты). Отмеченные заказы
+    добавляются в дневные агрегаты продаж (orders.sales), об
+    изменении заказов после фиксации узнают все процессы (шина
+    abstracts.cache).
+
+    Args:
+        payments: Оплаты
+
+    Returns:
+        Количество заказов, отмеченных оплаченными
+    """
+    payments = {payment.reference: payment for payment in payments}
+    order_ids = set(Order.objects.filter(
+        id__in={payment.order_id for payment in payments.values()}
+    ).values_list('id', flat=True))
+    if not order_ids:
+        return 0
+
+    with transaction.atomic():
+        OrderPayment.objects.bulk_create(
+            [
+                OrderPayment(
+                    order_id=payment.order_id,
+                    currency=payment.currency.lower(),
+                    reference=payment.reference,
+                    amount=payment.amount
+                )
+                for payment in payments.values()
+                if payment.order_id in order_ids
+            ],
+            ignore_conflicts=True
+        )
+
+        unpaid_currency = OrderItem.objects.filter(
+            order_id=OuterRef('pk')
+        ).exclude(
+            Exists(OrderPayment.objects.filter(
+                order_id=OuterRef('order_id'),
+                currency=OuterRef('currency')
+            ))
+        )
+        # Строки заказов блокируются, чтобы заказ, который отмечает
+        # параллельная сверка, не попал в агрегаты продаж дважды
+        # (в SQLite запись уже заблокирована INSERT выше)
+        paid_ids = list(Order.objects.select_for_update().filter(
+            id__in=order_ids,
+            is_paid=False
+        ).filter(
+            Exists(OrderPayment.objects.filter(order_id=OuterRef('pk')))
+        ).exclude(
+            Exists(unpaid_currency)
+        ).values_list('id', flat=True))
+        paid_ids = _fully_paid(paid_ids)
+        # Агрегаты продаж считаются по процентам и дню оплаты
+        Order.objects.filter(id__in=paid_ids).update(
+            is_paid=True,
+            datetime_paid=timezone.now(),
+            discount_percent=Subquery(
+                Discount.objects.filter(id=OuterRef('discount_id'))
+                .values('percent')
+            ),
+            tax_percent=Subquery(
+                Tax.objects.filter(id=OuterRef('tax_id')).values('percent')
+            )
+        )
+        record_sales(paid_ids)
+        # Поток событий оплаты (order_events) ждет изменений заказов
+        publish('orders.Order', order_ids)
+        return len(paid_ids)
+
+
+def sign_order_id(order_id: int) -> str:
+    """
+    Возвращает токен заказа для страницы успешной оплаты.
+
+    Токен - ID заказа с подписью (SECRET_KEY) в формате «ID:подпись».
+    По нему поток событий order_events отдает состояние оплаты только
+    покупателю, которому buy_order выдал ссылку на оплату.
+
+    Args:
+        order_id: ID заказа
+
+    Returns:
+        Подписанный токен
+    """
+    return Signer(salt=ORDER_TOKEN_SALT).sign(str(order_id))
+
+
+def check_order_token(order_id: int, token: str) -> bool:
+    """
+    Проверяет, что токен выдан sign_order_id для заказа.
+
+    Args:
+        order_id: ID заказа
+        token: Токен из ссылки
+
+    Returns:
+        True, если подпись верна и токен выдан для этого заказа
+    """
+    try:
+        return Signer(salt=ORDER_TOKEN_SALT).unsign(token) == str(order_id)
+    except BadSignature:
+        return False
+
+
+def get_payment_state(order_id: int) -> Optional[Dict[str, Any]]:
+    """
+    Возвращает состояние оплаты заказа для потока событий.
+
+    Заказ ищется и среди архивных (OrderHistory). Заказ в нескольких
+    валютах оплачивается по частям, поэтому кроме статуса
+    возвращаются валюты, оплата которых уже получена.
+
+    Args:
+        order_id: ID заказа
+
+    Returns:
+        Словарь с order_id, is_paid, currencies и paid_currencies
+        или None, если заказ не найден
+    """
+    order = OrderHistory.objects.filter(id=order_id).values('is_paid').first()
+    if order is None:
+        return None
+
+    currencies = sorted(set(
+        OrderHistoryItem.objects
+        .filter(order_id=order_id)
+        .values_list('currency', flat=True)
+    ))
+    paid_currencies = currencies
+    if not order['is_paid']:
+        paid_currencies = sorted(set(
+            OrderHistoryPayment.objects
+            .filter(order_id=order_id)
+            .values_list('currency', flat=True)
+        ))
+    return {
+        'order_id': order_id,
+        'is_paid': order['is_paid'],
+        'currencies': currencies,
+        'paid_currencies': paid_currencies,
+    }
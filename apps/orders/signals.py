@@ -0,0 +1,20 @@
+"""Обработчики сигналов приложения orders."""
+from typing import Any
+
+from django.db.models.signals import pre_delete
+from django.dispatch import receiver
+
+from items.models import Item
+
+from .models import OrderItem
+
+
+@receiver(pre_delete, sender=Item)
+def item_deleted(sender: Any, instance: Item, **kwargs: Any) -> None:
+    """
+    Удаляет товар из неоплаченных корзин перед удалением из каталога.
+
+    Удаленный товар нельзя оплатить. В оплаченных заказах строка
+    остается со снимком товара (item обнуляется).
+    """
+    OrderItem.objects.filter(item=instance, order__is_paid=False).delete()
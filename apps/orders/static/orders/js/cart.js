@@ -0,0 +1,52 @@
+// Изменение количества товаров в корзине без перезагрузки страницы.
+//
+// Ссылки с атрибутом data-cart-action (−, +, ✕) запрашивают тот же
+// адрес с заголовком X-Requested-With: сервер возвращает HTML фрагмент
+// (строка товара, суммы, кнопки оплаты и сообщения), элементы которого
+// заменяют элементы страницы с теми же id. Строка, которой нет во
+// фрагменте, удалена из корзины. Без JavaScript ссылки работают как
+// раньше: через редирект на страницу корзины.
+
+async function update(link) {
+    const line = link.closest("li[id]");
+    const response = await fetch(link.href, {
+        headers: { "X-Requested-With": "XMLHttpRequest" },
+    });
+    if (!response.ok && response.status !== 409) {
+        throw new Error(`HTTP ${response.status}`);
+    }
+
+    const template = document.createElement("template");
+    template.innerHTML = await response.text();
+    const fragment = template.content;
+
+    if (line && !fragment.getElementById(line.id)) {
+        line.remove();
+    }
+    for (const element of Array.from(fragment.children)) {
+        document.getElementById(element.id)?.replaceWith(element);
+    }
+}
+
+document.addEventListener("click", async (event) => {
+    const link = event.target.closest("a[data-cart-action]");
+    if (!link) {
+        return;
+    }
+    event.preventDefault();
+
+    const group = link.closest(".btn-group");
+    if (group.dataset.pending) {
+        return;
+    }
+    group.dataset.pending = "1";
+    try {
+        await update(link);
+    } catch (error) {
+        console.error("Error:", error);
+        // Обычный переход: сервер перенаправит на корзину
+        window.location.href = link.href;
+    } finally {
+        delete group.dataset.pending;
+    }
+});
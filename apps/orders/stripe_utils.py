@@ -1,58 +1,130 @@
-import stripe
-from typing import Tuple
+"""Формирование line_items Checkout Session для заказов."""
+from typing import Any, Dict, List, Sequence
 
-from django.conf import settings
+from items.stripe_utils import build_line_item, get_cached_price_ids
+from .models import Order, OrderItem
 
 
-def get_stripe_keys(currency: str) -> Tuple[str, str]:
+def build_order_line_items(
+    order: Order,
+    order_items: Sequence[OrderItem]
+) -> List[Dict[str, Any]]:
     """
-    Возвращает Stripe ключи в зависимости от валюты.
+    Формирует line_items Checkout Session для товаров заказа.
+
+    Цены и названия берутся из снимка в OrderItem, а не из текущего
+    состояния товара. Скидка и налог заказа распределяются
+    пропорционально между товарами. Все товары должны быть в одной
+    валюте.
 
     Args:
-        currency: Валюта ('usd' или 'kzt')
+        order: Заказ (скидка и налог)
+        order_items: Товары заказа одной валюты
 
     Returns:
-        Кортеж из (secret_key, public_key) для указанной валюты.
-        По умолчанию возвращает USD ключи.
-
-    Example:
-        >>> secret, public = get_stripe_keys('usd')
-        >>> secret, public = get_stripe_keys('kzt')
+        Список line_items для checkout.Session.create
     """
-    currency_lower = currency.lower()
+    # Без скидки и налога можно передать закэшированные Stripe Price
+    # вместо price_data, если цена в снимке совпадает с ценой Price
+    price_ids: Dict[int, str] = {}
+    if not order.discount and not order.tax:
+        price_ids = get_cached_price_ids({
+            oi.item_id: (oi.currency, oi.unit_amount) for oi in order_items
+        })
+    return _order_line_items(order, order_items, price_ids)
 
-    if currency_lower == 'kzt':
-        return (
-            settings.STRIPE_SECRET_KEY_KZT,
-            settings.STRIPE_PUBLIC_KEY_KZT
-        )
-    else:
-        # По умолчанию USD
-        return (
-            settings.STRIPE_SECRET_KEY,
-            settings.STRIPE_PUBLIC_KEY
-        )
 
-
-def get_stripe_client(currency: str) -> stripe:
+def checkout_amount(order: Order, order_items: Sequence[OrderItem]) -> int:
     """
-    Возвращает настроенный Stripe клиент для указанной валюты.
+    Вычисляет сумму Checkout Session для товаров заказа.
 
-    Настраивает API ключ Stripe в зависимости от валюты.
-    Это позволяет использовать разные Stripe аккаунты
-    для разных валют.
+    Сумма считается по тем же line_items, что передаются в Stripe
+    (скидка и налог округляются вниз в цене каждой единицы), поэтому
+    совпадает с amount_total оплаченной сессии. Запросов к базе нет.
 
     Args:
-        currency: Валюта ('usd' или 'kzt')
+        order: Заказ (скидка и налог)
+        order_items: Товары заказа одной валюты
 
     Returns:
-        Настроенный модуль stripe с установленным API ключом.
-
-    Example:
-        >>> stripe_client = get_stripe_client('usd')
-        >>> session = stripe_client.checkout.Session.create(...)
+        Сумма в центах
     """
-    secret_key, _ = get_stripe_keys(currency)
-    stripe.api_key = secret_key
-    return stripe
+    return sum(
+        item["price_data"]["unit_amount"] * item["quantity"]
+        for item in _order_line_items(order, order_items, {})
+    )
+
+
+def _order_line_items(
+    order: Order,
+    order_items: Sequence[OrderItem],
+    price_ids: Dict[int, str]
+) -> List[Dict[str, Any]]:
+    """Формирует line_items по результату get_cached_price_ids."""
+    # Формируем line_items с оригинальными ценами
+    # Скидка и налог будут применены через Stripe API
+    line_items = [
+        build_line_item(
+            oi.item_id,
+            oi.name,
+            oi.currency,
+            oi.unit_amount,
+            oi.quantity,
+            price_ids
+        )
+        for oi in order_items
+    ]
+
+    # Добавляем скидку через discounts, если она есть
+    # Для правильного отображения в Stripe Checkout используем discounts
+    # Для упрощения, применяем скидку через расчет line_items
+    if order.discount:
+        # Пересчитываем line_items с учетом скидки
+        subtotal = sum(oi.unit_amount * oi.quantity for oi in order_items)
+        discounted_total = subtotal * (100 - order.discount.percent) // 100
+
+        # Распределяем скидку пропорционально между товарами
+        if subtotal > 0:
+            discount_multiplier = discounted_total / subtotal
+            line_items = []
+            for oi in order_items:
+                discounted_price = int(oi.unit_amount * discount_multiplier)
+                line_items.append({
+                    "price_data": {
+                        "currency": oi.currency,
+                        "product_data": {
+                            "name": oi.name,
+                        },
+                        "unit_amount": discounted_price,
+                    },
+                    "quantity": oi.quantity,
+                })
+
+    # Добавляем налог через automatic_tax, если он есть
+    # Для правильного отображения в Stripe Checkout используем automatic_tax
+    # Для упрощения, применяем налог через расчет line_items
+    if order.tax:
+        # Пересчитываем line_items с учетом налога
+        current_total = sum(
+            item["price_data"]["unit_amount"] * item["quantity"]
+            for item in line_items
+        )
+        taxed_total = current_total * (100 + order.tax.percent) // 100
+
+        # Распределяем налог пропорционально между товарами
+        if current_total > 0:
+            tax_multiplier = taxed_total / current_total
+            line_items = [
+                {
+                    "price_data": {
+                        **item["price_data"],
+                        "unit_amount": int(
+                            item["price_data"]["unit_amount"] * tax_multiplier
+                        ),
+                    },
+                    "quantity": item["quantity"],
+                }
+                for item in line_items
+            ]
 
+    return line_items
@@ -1,3 +1,1118 @@
-from django.test import TestCase
+import hashlib
+import hmac
+import json
+import threading
+import time
+from datetime import date, timedelta
+from http.server import ThreadingHTTPServer
+from io import StringIO
+from typing import Any, Dict, Optional
+from unittest import mock
+from urllib.parse import urlencode
 
+import stripe
+from django.core.cache import cache
+from django.core.management import call_command
+from django.http import HttpResponse
+from django.test import TransactionTestCase, override_settings
+from django.utils import timezone
 
+from abstracts.cache import close_listener
+from items.gateways import FakeGateway, get_gateway
+from items.management.commands.fake_stripe import FakeStripe, make_handler
+from items.models import Item, ItemPairCount, StockReservation
+from items.stock import add_stock, get_available
+from items.stripe_accounts import get_account
+from items.stripe_utils import (
+    StripeUnavailable,
+    _circuit_key,
+    call_stripe,
+    ensure_stripe_available
+)
+from orders.management.commands import reconcile_payments
+from orders.models import (
+    DailySales,
+    Discount,
+    Order,
+    OrderCheckoutSession,
+    OrderItem,
+    OrderPayment,
+    PaymentSyncCursor,
+    RecommendationCursor,
+    Tax
+)
+from orders.recommendations import process_orders
+from orders.sales import rebuild_sales
+from orders.services import (
+    Payment,
+    archive_orders,
+    record_checkout_sessions,
+    record_payments,
+    sign_order_id
+)
+from orders.stripe_utils import build_order_line_items, checkout_amount
+
+
+def tearDownModule() -> None:
+    # Соединение шины кэша не дает удалить тестовую базу PostgreSQL
+    close_listener()
+
+
+class FakeStripeServerMixin:
+    """
+    Запускает имитатор Stripe API (fake_stripe) на время тестов класса.
+
+    Stripe SDK направляется на имитатор, объекты создаются прямо
+    в его хранилище (self.fake).
+    """
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        cls.fake = FakeStripe(stall=0, status=200)
+        cls.server = ThreadingHTTPServer(
+            ('127.0.0.1', 0), make_handler(cls.fake)
+        )
+        cls.server.daemon_threads = True
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        host, port = cls.server.server_address
+        cls.api_base = mock.patch.object(
+            stripe, 'api_base', f'http://{host}:{port}'
+        )
+        cls.api_base.start()
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.api_base.stop()
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.fake.accounts.clear()
+        self.fake.status = 200
+        # Состояние предохранителя Stripe хранится в кэше
+        cache.clear()
+
+    def create_session(
+        self,
+        order: Order,
+        currency: str,
+        amount: int,
+        status: str = 'complete'
+    ) -> str:
+        """Создает Checkout Session заказа в имитаторе."""
+        _, obj = self.fake.handle(
+            'POST',
+            '/v1/checkout/sessions',
+            {
+                'currency': currency,
+                'amount_total': amount,
+                'metadata': {
+                    'order_id': str(order.id),
+                    'currency': currency,
+                },
+            },
+            get_account(currency).secret_key
+        )
+        obj['status'] = status
+        if status == 'complete':
+            obj['payment_status'] = 'paid'
+            obj['payment_intent'] = f'pi_{obj["id"]}'
+        return obj['id']
+
+
+class ReconcilePaymentsTests(FakeStripeServerMixin, TransactionTestCase):
+    """Сверка оплат заказов с Checkout Session имитатора Stripe."""
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.usd_item = Item.objects.create(
+            name='Книга', description='', price=1000, currency='usd'
+        )
+        self.kzt_item = Item.objects.create(
+            name='Чай', description='', price=50000, currency='kzt'
+        )
+
+    def create_order(self, *items: Item) -> Order:
+        order = Order.objects.create()
+        for item in items:
+            OrderItem.objects.create(order=order, item=item)
+        return order
+
+    def reconcile(self, **options: Any) -> str:
+        # Один поток: тестовая база SQLite в памяти не допускает
+        # одновременной записи из нескольких соединений
+        out = StringIO()
+        call_command(
+            'reconcile_payments',
+            workers=1,
+            stdout=out,
+            stderr=StringIO(),
+            **options
+        )
+        return out.getvalue()
+
+    def cursor(self) -> Optional[PaymentSyncCursor]:
+        return PaymentSyncCursor.objects.filter(
+            account=get_account('usd').account_id,
+            resource=reconcile_payments.CHECKOUT_SESSION
+        ).first()
+
+    def test_first_run_without_cursor(self) -> None:
+        paid = self.create_order(self.usd_item)
+        pending = self.create_order(self.usd_item)
+        later = self.create_order(self.usd_item)
+        first = self.create_session(paid, 'usd', 1000)
+        self.create_session(pending, 'usd', 1000, status='open')
+        self.create_session(later, 'usd', 1000)
+
+        self.reconcile()
+
+        paid.refresh_from_db()
+        pending.refresh_from_db()
+        later.refresh_from_db()
+        self.assertTrue(paid.is_paid)
+        self.assertFalse(pending.is_paid)
+        self.assertTrue(later.is_paid)
+        # Курсор останавливается перед открытой сессией
+        self.assertEqual(self.cursor().last_id, first)
+
+    def test_resume_from_cursor(self) -> None:
+        order = self.create_order(self.usd_item)
+        last = self.create_session(order, 'usd', 1000)
+        self.reconcile()
+        self.assertEqual(self.cursor().last_id, last)
+
+        new_orders = [self.create_order(self.usd_item) for _ in range(3)]
+        sessions = [
+            self.create_session(new_order, 'usd', 1000)
+            for new_order in new_orders
+        ]
+
+        with mock.patch.object(
+            reconcile_payments,
+            'record_payments',
+            wraps=reconcile_payments.record_payments
+        ) as record:
+            self.reconcile(batch_size=2)
+
+        recorded = [
+            payment.order_id
+            for call in record.call_args_list
+            for payment in call.args[0]
+        ]
+        # Читаются только объекты после курсора, от старых к новым
+        self.assertEqual(recorded, [new_order.id for new_order in new_orders])
+        self.assertEqual(self.cursor().last_id, sessions[-1])
+        self.assertEqual(
+            Order.objects.filter(is_paid=True).count(), 4
+        )
+
+    def test_stripe_error_keeps_cursor(self) -> None:
+        order = self.create_order(self.usd_item)
+        start = self.create_session(order, 'usd', 1000)
+        self.reconcile()
+
+        count = reconcile_payments.PAGE_SIZE + 5
+        new_orders = [
+            self.create_order(self.usd_item) for _ in range(count)
+        ]
+        sessions = [
+            self.create_session(new_order, 'usd', 1000)
+            for new_order in new_orders
+        ]
+
+        record_payments = reconcile_payments.record_payments
+
+        def fail_next_page(payments: Any) -> int:
+            # После первого пакета имитатор начинает отвечать ошибкой
+            self.fake.status = 500
+            return record_payments(payments)
+
+        page = reconcile_payments.PAGE_SIZE
+        with mock.patch.object(
+            reconcile_payments, 'record_payments', fail_next_page
+        ):
+            out = StringIO()
+            err = StringIO()
+            call_command(
+                'reconcile_payments',
+                batch_size=page,
+                workers=1,
+                stdout=out,
+                stderr=err
+            )
+
+        self.assertIn('ошибка Stripe', err.getvalue())
+        # Курсор сохранен после последнего обработанного пакета
+        self.assertNotEqual(self.cursor().last_id, start)
+        self.assertEqual(self.cursor().last_id, sessions[page - 1])
+        self.assertEqual(
+            Order.objects.filter(is_paid=True).count(), page + 1
+        )
+
+        self.fake.status = 200
+        cache.clear()
+        self.reconcile()
+        self.assertEqual(self.cursor().last_id, sessions[-1])
+        self.assertEqual(
+            Order.objects.filter(is_paid=True).count(), count + 1
+        )
+
+    def test_multi_currency_orders(self) -> None:
+        both_paid = self.create_order(self.usd_item, self.kzt_item)
+        half_paid = self.create_order(self.usd_item, self.kzt_item)
+        self.create_session(both_paid, 'usd', 1000)
+        self.create_session(both_paid, 'kzt', 50000)
+        self.create_session(half_paid, 'usd', 1000)
+
+        self.reconcile()
+
+        both_paid.refresh_from_db()
+        half_paid.refresh_from_db()
+        self.assertTrue(both_paid.is_paid)
+        self.assertFalse(half_paid.is_paid)
+        payments: Dict[int, set] = {}
+        for payment in OrderPayment.objects.all():
+            payments.setdefault(payment.order_id, set()).add(
+                payment.currency
+            )
+        self.assertEqual(payments, {
+            both_paid.id: {'usd', 'kzt'},
+            half_paid.id: {'usd'},
+        })
+
+        # Повторная сверка не дублирует оплаты
+        self.create_session(half_paid, 'kzt', 50000)
+        self.reconcile()
+        half_paid.refresh_from_db()
+        self.assertTrue(half_paid.is_paid)
+        self.assertEqual(OrderPayment.objects.count(), 4)
+
+
+@override_settings(STRIPE_BREAKER_THRESHOLD=2, STRIPE_BREAKER_COOLDOWN=30)
+class StripeCircuitTests(FakeStripeServerMixin, TransactionTestCase):
+    """Предохранитель Stripe аккаунта при сбоях имитатора Stripe."""
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.fake.stall = 0
+        self.account = get_account('usd').account_id
+        self.item = Item.objects.create(
+            name='Книга', description='', price=1000, currency='usd'
+        )
+
+    def call(self) -> Any:
+        return call_stripe('usd', stripe.checkout.Session.list, limit=1)
+
+    def trip(self) -> None:
+        """Размыкает цепь ответами 500."""
+        self.fake.status = 500
+        for _ in range(2):
+            with self.assertRaises(StripeUnavailable):
+                self.call()
+        self.fake.status = 200
+
+    def end_cooldown(self) -> None:
+        cache.set(
+            _circuit_key(self.account, 'open_until'), time.time() - 1
+        )
+
+    def test_opens_after_threshold(self) -> None:
+        self.fake.status = 500
+        with self.assertRaises(StripeUnavailable) as error:
+            self.call()
+        self.assertEqual(error.exception.retry_after, 1)
+        # Одна ошибка цепь не размыкает
+        ensure_stripe_available('usd')
+
+        with self.assertRaises(StripeUnavailable) as error:
+            self.call()
+
+        self.assertEqual(error.exception.retry_after, 30)
+        with self.assertRaises(StripeUnavailable):
+            ensure_stripe_available('usd')
+
+    def test_stall_counts_as_failure(self) -> None:
+        self.fake.stall = 0.5
+        client = stripe.new_default_http_client(timeout=0.1)
+
+        # Имитатор отвечает уже закрытому соединению: ошибку записи
+        # ответа не выводим
+        with mock.patch.object(
+            stripe, 'default_http_client', client
+        ), mock.patch.object(self.server, 'handle_error'):
+            for _ in range(2):
+                with self.assertRaises(StripeUnavailable):
+                    self.call()
+            time.sleep(self.fake.stall)
+
+        with self.assertRaises(StripeUnavailable):
+            ensure_stripe_available('usd')
+
+    def test_fails_fast_while_open(self) -> None:
+        self.trip()
+
+        with mock.patch.object(
+            self.fake, 'handle', wraps=self.fake.handle
+        ) as handle, self.assertRaises(StripeUnavailable) as error:
+            self.call()
+
+        handle.assert_not_called()
+        self.assertGreater(error.exception.retry_after, 1)
+
+    def test_half_open_probe(self) -> None:
+        self.trip()
+        self.end_cooldown()
+        # Пока пробный запрос выполняется, остальные отклоняются
+        cache.add(_circuit_key(self.account, 'probe'), 1)
+        with self.assertRaises(StripeUnavailable):
+            self.call()
+        cache.delete(_circuit_key(self.account, 'probe'))
+
+        self.call()
+
+        ensure_stripe_available('usd')
+        self.call()
+
+    def test_failed_probe_reopens(self) -> None:
+        self.trip()
+        self.end_cooldown()
+        self.fake.status = 500
+
+        with self.assertRaises(StripeUnavailable) as error:
+            self.call()
+
+        self.assertEqual(error.exception.retry_after, 30)
+        with self.assertRaises(StripeUnavailable):
+            ensure_stripe_available('usd')
+
+    def test_views_unavailable_while_open(self) -> None:
+        self.client.get(f'/orders/add-to-cart/{self.item.id}/')
+        cart_id = self.client.session['cart_id']
+        self.trip()
+
+        for url in (f'/buy/{self.item.id}/', f'/orders/buy-order/{cart_id}/'):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 503)
+                self.assertGreater(int(response['Retry-After']), 1)
+        self.assertFalse(StockReservation.objects.exists())
+
+
+@override_settings(PAYMENT_GATEWAY='items.gateways.FakeGateway')
+class BuyOrderTests(TransactionTestCase):
+    """Оплата корзины через Checkout Session (шлюз FakeGateway)."""
+
+    def setUp(self) -> None:
+        self.gateway = get_gateway()
+        self.gateway.reset()
+        cache.clear()
+        self.usd_item = Item.objects.create(
+            name='Книга', description='', price=1000, currency='usd'
+        )
+        self.kzt_item = Item.objects.create(
+            name='Чай', description='', price=50000, currency='kzt'
+        )
+
+    def add_to_cart(self, item: Item, quantity: int = 1) -> int:
+        for _ in range(quantity):
+            self.client.get(f'/orders/add-to-cart/{item.id}/')
+        return self.client.session['cart_id']
+
+    def buy(self, cart_id: int, currency: str = '') -> HttpResponse:
+        query = f'?currency={currency}' if currency else ''
+        return self.client.get(f'/orders/buy-order/{cart_id}/{query}')
+
+    def test_single_currency(self) -> None:
+        cart_id = self.add_to_cart(self.usd_item, 2)
+
+        response = self.buy(cart_id)
+
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(len(data['sessions']), 1)
+        session = self.gateway.retrieve_checkout_session('usd', data['id'])
+        self.assertEqual(session.amount_total, 2000)
+        self.assertEqual(session.metadata['order_id'], str(cart_id))
+        self.assertIn(
+            f'order={sign_order_id(cart_id)}', session.success_url
+        )
+
+    def test_multiple_currencies(self) -> None:
+        self.add_to_cart(self.usd_item)
+        cart_id = self.add_to_cart(self.kzt_item)
+        add_stock(self.usd_item.id, 5)
+        add_stock(self.kzt_item.id, 5)
+
+        response = self.buy(cart_id)
+
+        self.assertEqual(response.status_code, 200)
+        sessions = {
+            session['currency']: session['id']
+            for session in response.json()['sessions']
+        }
+        self.assertEqual(set(sessions), {'usd', 'kzt'})
+        for currency, item in (
+            ('usd', self.usd_item),
+            ('kzt', self.kzt_item),
+        ):
+            session = self.gateway.retrieve_checkout_session(
+                currency, sessions[currency]
+            )
+            self.assertEqual(session.amount_total, item.price)
+            reservation = StockReservation.objects.get(item=item)
+            self.assertEqual(reservation.reference, sessions[currency])
+            self.assertEqual(reservation.currency, currency)
+        self.assertEqual(
+            dict(OrderCheckoutSession.objects.filter(
+                order_id=cart_id
+            ).values_list('currency', 'session_id')),
+            sessions
+        )
+
+    def test_one_currency_of_several(self) -> None:
+        self.add_to_cart(self.usd_item)
+        cart_id = self.add_to_cart(self.kzt_item)
+
+        response = self.buy(cart_id, 'kzt')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [session['currency'] for session in response.json()['sessions']],
+            ['kzt']
+        )
+        self.assertEqual(self.buy(cart_id, 'eur').status_code, 400)
+
+    def test_out_of_stock(self) -> None:
+        add_stock(self.usd_item.id, 1)
+        add_stock(self.kzt_item.id, 5)
+        self.add_to_cart(self.kzt_item)
+        cart_id = self.add_to_cart(self.usd_item)
+        OrderItem.objects.filter(item=self.usd_item).update(quantity=2)
+
+        response = self.buy(cart_id)
+
+        self.assertEqual(response.status_code, 409)
+        self.assertIn('Книга', response.json()['error'])
+        # Ничего не резервируется
+        self.assertFalse(StockReservation.objects.exists())
+        self.assertEqual(
+            get_available([self.kzt_item.id]), {self.kzt_item.id: 5}
+        )
+
+    def test_stripe_unavailable(self) -> None:
+        add_stock(self.usd_item.id, 1)
+        discount = Discount.objects.create(
+            name='Скидка', code='SALE', percent=10, max_redemptions=1
+        )
+        cart_id = self.add_to_cart(self.usd_item)
+        Order.objects.filter(id=cart_id).update(discount=discount)
+
+        with mock.patch.object(
+            FakeGateway,
+            'create_checkout_session',
+            side_effect=StripeUnavailable('acct', 30)
+        ):
+            response = self.buy(cart_id)
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '30')
+        # Резервы и использование промокода возвращаются
+        self.assertFalse(StockReservation.objects.exists())
+        discount.refresh_from_db()
+        self.assertEqual(discount.redemptions_count, 0)
+        self.assertFalse(Order.objects.get(id=cart_id).discount_redeemed)
+
+    def test_other_session_cart(self) -> None:
+        cart_id = self.add_to_cart(self.usd_item)
+        # Новый покупатель без корзины
+        self.client.cookies.clear()
+
+        self.assertEqual(self.buy(cart_id).status_code, 404)
+
+    def test_repeated_checkout_replaces_previous(self) -> None:
+        add_stock(self.usd_item.id, 2)
+        cart_id = self.add_to_cart(self.usd_item)
+
+        first = self.buy(cart_id).json()['id']
+        second = self.buy(cart_id).json()['id']
+
+        self.assertEqual(
+            self.gateway.retrieve_checkout_session('usd', first).status,
+            'expired'
+        )
+        reservation = StockReservation.objects.get(item=self.usd_item)
+        self.assertEqual(reservation.reference, second)
+        self.assertEqual(
+            get_available([self.usd_item.id]), {self.usd_item.id: 1}
+        )
+
+        self.gateway.complete(second)
+        self.assertEqual(self.buy(cart_id).status_code, 409)
+
+
+@override_settings(PAYMENT_GATEWAY='items.gateways.FakeGateway')
+class StripeWebhookTests(TransactionTestCase):
+    """Webhook Stripe с подписью шлюза FakeGateway."""
+
+    def setUp(self) -> None:
+        self.gateway = get_gateway()
+        self.gateway.reset()
+        cache.clear()
+        item = Item.objects.create(
+            name='Книга', description='', price=1000, currency='usd'
+        )
+        self.discount = Discount.objects.create(
+            name='Скидка', code='SALE', percent=10
+        )
+        self.order = Order.objects.create(
+            discount=self.discount, discount_redeemed=True
+        )
+        Discount.objects.filter(id=self.discount.id).update(
+            redemptions_count=1
+        )
+        OrderItem.objects.create(order=self.order, item=item)
+        self.session = self.checkout()
+
+    def checkout(self) -> stripe.checkout.Session:
+        """Оформляет оплату заказа, как buy_order."""
+        session = self.gateway.create_checkout_session(
+            'usd',
+            mode='payment',
+            line_items=build_order_line_items(
+                self.order, list(self.order.items.all())
+            ),
+            metadata={'order_id': self.order.id, 'currency': 'usd'},
+        )
+        record_checkout_sessions(self.order, {'usd': session.id})
+        return session
+
+    def send(
+        self,
+        event_type: str,
+        obj: Dict[str, Any],
+        currency: str = 'usd',
+        signature: str = ''
+    ) -> HttpResponse:
+        payload = json.dumps({
+            'id': 'evt_test',
+            'object': 'event',
+            'type': event_type,
+            'data': {'object': obj},
+        }).encode()
+        return self.client.post(
+            f'/orders/webhook/{currency}/',
+            payload,
+            content_type='application/json',
+            HTTP_STRIPE_SIGNATURE=signature or self.gateway.sign_webhook(
+                payload, int(time.time())
+            )
+        )
+
+    def test_session_completed(self) -> None:
+        obj = self.gateway.complete(self.session.id)
+
+        response = self.send('checkout.session.completed', obj)
+
+        self.assertEqual(response.status_code, 200)
+        self.order.refresh_from_db()
+        self.assertTrue(self.order.is_paid)
+        payment = OrderPayment.objects.get(order=self.order)
+        self.assertEqual(payment.reference, obj['payment_intent'])
+        # Повторная доставка события ничего не меняет
+        self.assertEqual(
+            self.send('checkout.session.completed', obj).status_code, 200
+        )
+        self.assertEqual(OrderPayment.objects.count(), 1)
+
+    def test_session_expired_releases_discount(self) -> None:
+        obj = dict(self.gateway.expire_checkout_session(
+            'usd', self.session.id
+        ))
+
+        response = self.send('checkout.session.expired', obj)
+
+        self.assertEqual(response.status_code, 200)
+        self.order.refresh_from_db()
+        self.discount.refresh_from_db()
+        self.assertFalse(self.order.discount_redeemed)
+        self.assertEqual(self.discount.redemptions_count, 0)
+
+    def test_replaced_session_expired(self) -> None:
+        session = self.checkout()
+        obj = dict(self.gateway.expire_checkout_session(
+            'usd', self.session.id
+        ))
+
+        self.assertEqual(
+            self.send('checkout.session.expired', obj).status_code, 200
+        )
+
+        # Новая сессия еще может быть оплачена со скидкой
+        self.order.refresh_from_db()
+        self.assertTrue(self.order.discount_redeemed)
+        obj = dict(self.gateway.expire_checkout_session('usd', session.id))
+        self.send('checkout.session.expired', obj)
+        self.order.refresh_from_db()
+        self.assertFalse(self.order.discount_redeemed)
+
+    def test_invalid_signature(self) -> None:
+        obj = self.gateway.complete(self.session.id)
+
+        response = self.send(
+            'checkout.session.completed', obj, signature='t=1,v1=bad'
+        )
+
+        self.assertEqual(response.status_code, 400)
+        self.order.refresh_from_db()
+        self.assertFalse(self.order.is_paid)
+
+    def test_unknown_currency(self) -> None:
+        obj = self.gateway.complete(self.session.id)
+
+        response = self.send('checkout.session.completed', obj, 'eur')
+
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(
+    DISCOUNT_RATE_LIMIT_ATTEMPTS=2,
+    DISCOUNT_RATE_LIMIT_WINDOW=60
+)
+class DiscountRateLimitTests(TransactionTestCase):
+    """Ограничение частоты ввода промокодов."""
+
+    def setUp(self) -> None:
+        cache.clear()
+
+    def apply(self) -> str:
+        response = self.client.post(
+            '/orders/apply-discount/', {'discount_code': 'NOPE'},
+            follow=True
+        )
+        return [str(m) for m in response.context['messages']][-1]
+
+    def test_limit_per_window(self) -> None:
+        with mock.patch('orders.services.time.time', return_value=600.0):
+            results = [self.apply() for _ in range(3)]
+
+        self.assertEqual(results[:2], ['Код скидки не найден'] * 2)
+        self.assertEqual(results[2], 'Слишком много попыток, попробуйте позже')
+
+    def test_next_window(self) -> None:
+        with mock.patch('orders.services.time.time', return_value=600.0):
+            self.apply()
+            self.apply()
+        with mock.patch('orders.services.time.time', return_value=660.0):
+            result = self.apply()
+
+        self.assertEqual(result, 'Код скидки не найден')
+
+
+class RecommendationsTests(TransactionTestCase):
+    """Учет оплаченных заказов в рекомендациях (build_recommendations)."""
+
+    def setUp(self) -> None:
+        self.book = Item.objects.create(
+            name='Книга', description='', price=1000, currency='usd'
+        )
+        self.pen = Item.objects.create(
+            name='Ручка', description='', price=100, currency='usd'
+        )
+        self.tea = Item.objects.create(
+            name='Чай', description='', price=50000, currency='kzt'
+        )
+
+    def create_order(self, *items: Item) -> Order:
+        order = Order.objects.create()
+        for item in items:
+            OrderItem.objects.create(order=order, item=item, quantity=1)
+        return order
+
+    def pay(self, order: Order, currency: str, reference: str) -> None:
+        amount = sum(
+            order_item.unit_amount
+            for order_item in order.items.filter(currency=currency)
+        )
+        record_payments([Payment(order.id, currency, reference, amount)])
+
+    def process(self) -> int:
+        payments, _, _ = process_orders(
+            timezone.now() + timedelta(minutes=1), 100, 5
+        )
+        return payments
+
+    def pairs(self) -> int:
+        return ItemPairCount.objects.get(
+            item=self.book, other=self.pen
+        ).orders
+
+    def test_order_paid_long_after_creation(self) -> None:
+        order = self.create_order(self.book, self.pen)
+        Order.objects.filter(id=order.id).update(
+            datetime_created=timezone.now() - timedelta(days=7)
+        )
+        # Заказы, созданные позже, уже учтены
+        later = self.create_order(self.book, self.pen)
+        self.pay(later, 'usd', 'pi_later')
+        self.assertEqual(self.process(), 1)
+
+        self.pay(order, 'usd', 'pi_order')
+
+        self.assertEqual(self.process(), 1)
+        self.assertEqual(self.pairs(), 2)
+        self.assertEqual(
+            RecommendationCursor.objects.get().last_payment_id,
+            OrderPayment.objects.get(reference='pi_order').id
+        )
+
+    def test_multi_currency_order_counted_once(self) -> None:
+        order = self.create_order(self.book, self.pen, self.tea)
+
+        self.pay(order, 'usd', 'pi_usd')
+        self.assertEqual(self.process(), 1)
+        self.assertFalse(ItemPairCount.objects.exists())
+
+        self.pay(order, 'kzt', 'pi_kzt')
+        # Повторная оплата уже оплаченного заказа
+        self.pay(order, 'usd', 'pi_usd_again')
+        self.assertEqual(self.process(), 2)
+
+        self.assertEqual(self.pairs(), 1)
+        self.assertEqual(self.process(), 0)
+
+    def test_recent_payments_wait_for_delay(self) -> None:
+        order = self.create_order(self.book, self.pen)
+        self.pay(order, 'usd', 'pi_order')
+
+        payments, _, _ = process_orders(
+            timezone.now() - timedelta(minutes=10), 100, 5
+        )
+
+        self.assertEqual(payments, 0)
+        self.assertFalse(ItemPairCount.objects.exists())
+
+
+class RecordPaymentsTests(TransactionTestCase):
+    """Отметка оплаты заказа по сумме оплат (record_payments)."""
+
+    def setUp(self) -> None:
+        self.book = Item.objects.create(
+            name='Книга', description='', price=1000, currency='usd'
+        )
+        self.tax = Tax.objects.create(name='НДС', percent=20)
+        self.order = Order.objects.create(tax=self.tax)
+        OrderItem.objects.create(order=self.order, item=self.book)
+
+    def pay(self, reference: str, amount: int) -> bool:
+        record_payments([Payment(self.order.id, 'usd', reference, amount)])
+        self.order.refresh_from_db()
+        return self.order.is_paid
+
+    def test_underpaid(self) -> None:
+        self.assertFalse(self.pay('pi_1', 1))
+        # Оплаты одной валюты суммируются
+        self.assertTrue(self.pay('pi_2', 1199))
+
+    def test_items_added_after_checkout(self) -> None:
+        amount = checkout_amount(self.order, list(self.order.items.all()))
+        self.assertEqual(amount, 1200)
+        OrderItem.objects.create(
+            order=self.order,
+            item=Item.objects.create(
+                name='Ручка', description='', price=100, currency='usd'
+            )
+        )
+
+        self.assertFalse(self.pay('pi_1', amount))
+
+
+class SalesRatesTests(TransactionTestCase):
+    """Проценты скидки и налога в агрегатах продаж."""
+
+    def setUp(self) -> None:
+        item = Item.objects.create(
+            name='Книга', description='', price=1000, currency='usd'
+        )
+        self.discount = Discount.objects.create(
+            name='Скидка', code='SALE', percent=10
+        )
+        self.tax = Tax.objects.create(name='НДС', percent=20)
+        self.order = Order.objects.create(
+            discount=self.discount, tax=self.tax
+        )
+        OrderItem.objects.create(order=self.order, item=item, quantity=2)
+        record_payments([Payment(self.order.id, 'usd', 'pi_1', 2160)])
+
+    def assert_sales(self) -> None:
+        sales = DailySales.objects.get()
+        self.assertEqual(sales.gross, 2000)
+        self.assertEqual(sales.discount_amount, 200)
+        self.assertEqual(sales.tax_amount, 360)
+        self.assertEqual(sales.net, 2160)
+
+    def test_snapshot_on_payment(self) -> None:
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.discount_percent, 10)
+        self.assertEqual(self.order.tax_percent, 20)
+        self.assert_sales()
+
+    def test_rates_changed_after_payment(self) -> None:
+        self.discount.percent = 50
+        self.discount.save()
+        self.tax.percent = 0
+        self.tax.save()
+
+        rebuild_sales(date(2000, 1, 1), date(2100, 1, 1))
+
+        self.assert_sales()
+
+    def test_archived_order(self) -> None:
+        archive_orders([self.order.id])
+        self.discount.percent = 50
+        self.discount.save()
+
+        rebuild_sales(date(2000, 1, 1), date(2100, 1, 1))
+
+        self.assert_sales()
+
+    def test_day_of_payment(self) -> None:
+        order = Order.objects.create()
+        OrderItem.objects.create(
+            order=order, item=Item.objects.get(), quantity=1
+        )
+        Order.objects.filter(id=order.id).update(
+            datetime_created=timezone.now() - timedelta(days=3)
+        )
+
+        record_payments([Payment(order.id, 'usd', 'pi_2', 1000)])
+
+        today = timezone.localdate()
+        self.assertEqual(DailySales.objects.get().date, today)
+        self.assertEqual(DailySales.objects.get().orders, 2)
+        # Пересчет относит заказ к тому же дню
+        archive_orders([order.id])
+        rebuild_sales(today, today)
+        self.assertEqual(DailySales.objects.get().orders, 2)
+
+    def test_snapshot_on_save(self) -> None:
+        order = Order.objects.create(discount=self.discount)
+        self.discount.percent = 30
+        self.discount.save()
+
+        order.is_paid = True
+        order.save()
+        self.discount.percent = 40
+        self.discount.save()
+        order.refresh_from_db()
+        order.save()
+
+        order.refresh_from_db()
+        self.assertEqual(order.discount_percent, 30)
+        self.assertIsNone(order.tax_percent)
+
+
+class OrderEventsTests(TransactionTestCase):
+    """Доступ к потоку событий оплаты заказа."""
+
+    def setUp(self) -> None:
+        self.order = Order.objects.create()
+        self.other = Order.objects.create()
+
+    def events(self, order_id: int, token: str) -> HttpResponse:
+        return self.client.get(
+            f'/orders/order/{order_id}/events/', {'token': token}
+        )
+
+    def test_signed_token(self) -> None:
+        response = self.events(self.order.id, sign_order_id(self.order.id))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(
+            f'"order_id": {self.order.id}', response.content.decode()
+        )
+
+    def test_missing_token(self) -> None:
+        response = self.client.get(f'/orders/order/{self.order.id}/events/')
+
+        self.assertEqual(response.status_code, 404)
+
+    def test_forged_token(self) -> None:
+        response = self.events(self.order.id, f'{self.order.id}:forged')
+
+        self.assertEqual(response.status_code, 404)
+
+    def test_token_of_other_order(self) -> None:
+        response = self.events(self.order.id, sign_order_id(self.other.id))
+
+        self.assertEqual(response.status_code, 404)
+
+    def test_success_page(self) -> None:
+        token = sign_order_id(self.order.id)
+
+        response = self.client.get('/success/', {'order': token})
+
+        self.assertContains(
+            response,
+            f'/orders/order/{self.order.id}/events/?'
+            f'{urlencode({"token": token})}'
+        )
+
+
+@override_settings(STRIPE_ACCOUNTS={
+    'usd': {
+        'secret_key': 'sk_test_x',
+        'public_key': 'pk_test_x',
+        'webhook_secret': '',
+    },
+})
+class StripeWebhookSecretTests(TransactionTestCase):
+    """Webhook шлюза Stripe без настроенного секрета подписи."""
+
+    def test_forged_event_rejected(self) -> None:
+        item = Item.objects.create(
+            name='Книга', description='', price=100000, currency='usd'
+        )
+        order = Order.objects.create()
+        OrderItem.objects.create(order=order, item=item)
+        payload = json.dumps({
+            'id': 'evt_forged',
+            'object': 'event',
+            'type': 'checkout.session.completed',
+            'data': {'object': {
+                'id': 'cs_forged',
+                'object': 'checkout.session',
+                'currency': 'usd',
+                'amount_total': 1,
+                'payment_status': 'paid',
+                'payment_intent': 'pi_forged',
+                'metadata': {'order_id': str(order.id), 'currency': 'usd'},
+            }},
+        })
+        # Подпись HMAC с пустым ключом может посчитать кто угодно
+        timestamp = int(time.time())
+        signature = hmac.new(
+            b'', f'{timestamp}.{payload}'.encode(), hashlib.sha256
+        ).hexdigest()
+
+        response = self.client.post(
+            '/orders/webhook/usd/',
+            payload,
+            content_type='application/json',
+            HTTP_STRIPE_SIGNATURE=f't={timestamp},v1={signature}'
+        )
+
+        self.assertEqual(response.status_code, 400)
+        order.refresh_from_db()
+        self.assertFalse(order.is_paid)
+        self.assertFalse(OrderPayment.objects.exists())
+
+
+class CartUpdateTests(TransactionTestCase):
+    """Ответы на изменение корзины (cart_update_response)."""
+
+    JSON = {'HTTP_ACCEPT': 'application/json'}
+    FRAGMENT = {'HTTP_X_REQUESTED_WITH': 'XMLHttpRequest'}
+
+    def setUp(self) -> None:
+        cache.clear()
+        self.item = Item.objects.create(
+            name='Книга', description='', price=1000, currency='usd'
+        )
+
+    def request(self, action: str, **headers: str) -> HttpResponse:
+        return self.client.get(f'/orders/{action}/{self.item.id}/', **headers)
+
+    def test_json(self) -> None:
+        self.request('add-to-cart', **self.JSON)
+
+        response = self.request('add-to-cart', **self.JSON)
+
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertIsNone(data['error'])
+        self.assertEqual(data['line']['quantity'], 2)
+        self.assertEqual(data['line']['unit_amount'], 1000)
+        self.assertEqual(data['totals'][0]['total'], 2000)
+        data = self.request('decrease', **self.JSON).json()
+        self.assertEqual(data['line']['quantity'], 1)
+        self.assertEqual(data['totals'][0]['total'], 1000)
+
+    def test_json_last_line_removed(self) -> None:
+        self.request('add-to-cart', **self.JSON)
+
+        data = self.request('remove', **self.JSON).json()
+
+        self.assertIsNone(data['line'])
+        self.assertEqual(data['totals'], [])
+
+    def test_json_preferred_over_html(self) -> None:
+        for accept, as_json in (
+            ('application/json, text/html;q=0.9', True),
+            ('text/html, application/json;q=0.9', False),
+            ('*/*', False),
+        ):
+            with self.subTest(accept=accept):
+                response = self.request(
+                    'add-to-cart', HTTP_ACCEPT=accept, **self.FRAGMENT
+                )
+                self.assertEqual(
+                    response['Content-Type'].startswith('application/json'),
+                    as_json
+                )
+
+    def test_fragment(self) -> None:
+        self.request('add-to-cart')
+
+        response = self.request('add-to-cart', **self.FRAGMENT)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, f'id="cart-line-{self.item.id}"')
+        self.assertContains(response, '× 2')
+        self.assertContains(response, 'id="cart-totals"')
+        self.assertNotContains(response, '<html')
+
+    def test_fragment_last_line_removed(self) -> None:
+        self.request('add-to-cart')
+
+        response = self.request('decrease', **self.FRAGMENT)
+
+        self.assertContains(response, 'Корзина пуста')
+        self.assertNotContains(response, 'cart-line-')
+
+    def test_redirect(self) -> None:
+        response = self.request('add-to-cart', HTTP_REFERER='/item/1/')
+        self.assertRedirects(
+            response, '/item/1/', fetch_redirect_response=False
+        )
+
+        for action in ('decrease', 'remove'):
+            with self.subTest(action=action):
+                self.request('add-to-cart')
+                self.assertRedirects(
+                    self.request(action),
+                    '/orders/cart/',
+                    fetch_redirect_response=False
+                )
+
+    def test_out_of_stock(self) -> None:
+        add_stock(self.item.id, 1)
+        self.request('add-to-cart')
+
+        response = self.request('add-to-cart', **self.JSON)
+        self.assertEqual(response.status_code, 409)
+        self.assertIn('больше нет в наличии', response.json()['error'])
+        self.assertEqual(response.json()['line']['quantity'], 1)
+
+        response = self.request('add-to-cart', **self.FRAGMENT)
+        self.assertEqual(response.status_code, 409)
+        self.assertContains(response, 'больше нет в наличии', status_code=409)
+
+        response = self.request(
+            'add-to-cart', HTTP_REFERER='/orders/cart/', follow=True
+        )
+        self.assertRedirects(response, '/orders/cart/')
+        self.assertContains(response, 'больше нет в наличии')
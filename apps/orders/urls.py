@@ -8,13 +8,16 @@ from .views import (
     cart_page,
     remove_from_cart,
     apply_discount,
-    remove_discount
+    remove_discount,
+    order_events,
+    stripe_webhook
 )
 
 app_name = 'orders'
 
 urlpatterns = [
     path("order/<int:id>/", order_page, name="order_page"),
+    path("order/<int:id>/events/", order_events, name="order_events"),
     path("buy-order/<int:id>/", buy_order, name="buy_order"),
     path("add-to-cart/<int:item_id>/", add_to_cart, name="add_to_cart"),
     path("remove/<int:item_id>/", remove_from_cart, name="remove_from_cart"),
@@ -22,4 +25,5 @@ urlpatterns = [
     path("cart/", cart_page, name="cart"),
     path("apply-discount/", apply_discount, name="apply_discount"),
     path("remove-discount/", remove_discount, name="remove_discount"),
+    path("webhook/<str:currency>/", stripe_webhook, name="stripe_webhook"),
 ]
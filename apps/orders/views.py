@@ -1,18 +1,95 @@
-from typing import Dict, Any
-
-from django.http import HttpRequest, HttpResponse, HttpResponseRedirect, JsonResponse
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, AsyncIterator, List
+
+import stripe
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import (
+    Http404,
+    HttpRequest,
+    HttpResponse,
+    HttpResponseRedirect,
+    JsonResponse,
+    StreamingHttpResponse
+)
 from django.shortcuts import get_object_or_404, render, redirect
 from django.contrib import messages
+from django.db.models import F
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+
+from .events import OrderWatch, load_shared
+from .services import (
+    WEBHOOK_PAYMENTS,
+    check_order_token,
+    discount_rate_limited,
+    forget_checkout_sessions,
+    get_discount_by_code,
+    get_or_create_cart,
+    get_payment_state,
+    record_checkout_sessions,
+    record_payments,
+    redeem_order_discount,
+    release_expired_checkout,
+    release_order_discount,
+    release_unused_discount,
+    sign_order_id
+)
+from .models import Order, OrderItem
+from items.gateways import get_gateway
+from items.services import get_cached_item
+from items.stock import (
+    OutOfStock,
+    attach_reservations,
+    get_available,
+    release_previous_checkout,
+    release_reservations,
+    releasing_on_error,
+    reserve_stock
+)
+from items.stripe_accounts import UnsupportedCurrency
+from items.stripe_utils import (
+    StripeUnavailable,
+    get_stripe_keys,
+    stripe_unavailable_response
+)
+from .stripe_utils import build_order_line_items
+
+
+def get_currency_groups(order: Order) -> List[Dict[str, Any]]:
+    """
+    Возвращает суммы заказа по валютам в формате для шаблонов.
+
+    Args:
+        order: Заказ
 
-from .services import get_or_create_cart
-from .models import Order, OrderItem, Discount
-from items.models import Item
-from .stripe_utils import get_stripe_keys, get_stripe_client
+    Returns:
+        Список групп с суммами в обычных единицах валюты
+        и публичным Stripe ключом аккаунта валюты
+    """
+    groups = []
+    for totals in order.totals_by_currency():
+        _, public_key = get_stripe_keys(totals['currency'])
+        groups.append({
+            'currency': totals['currency'],
+            'currency_display': totals['currency'].upper(),
+            'stripe_public_key': public_key,
+            'subtotal': totals['subtotal'] / 100,
+            'discount_amount': totals['discount_amount'] / 100,
+            'tax_amount': totals['tax_amount'] / 100,
+            'total': totals['total'] / 100,
+        })
+    return groups
 
 
 def order_page(request: HttpRequest, id: int) -> HttpResponse:
     """
-    Отображает страницу заказа с кнопкой оплаты.
+    Отображает страницу заказа с кнопками оплаты.
+
+    Для каждой валюты заказа показывается отдельная сумма
+    и отдельная кнопка оплаты.
 
     Args:
         request: HTTP запрос
@@ -24,20 +101,14 @@ def order_page(request: HttpRequest, id: int) -> HttpResponse:
     Raises:
         404: Если заказ с указанным ID не найден
     """
-    order = get_object_or_404(Order, id=id)
-
-    # Определяем валюту заказа (берем из первого товара)
-    # Предполагаем, что все товары в заказе в одной валюте
-    currency = 'usd'  # по умолчанию
-    if order.items.exists():
-        currency = order.items.first().item.currency
-
-    # Получаем правильный публичный ключ для валюты
-    _, public_key = get_stripe_keys(currency)
+    order = get_object_or_404(
+        Order.objects.select_related('discount', 'tax'),
+        id=id
+    )
 
     return render(request, "order.html", {
         "order": order,
-        "stripe_public_key": public_key
+        "groups": get_currency_groups(order)
     })
 
 
@@ -45,161 +116,422 @@ def buy_order(request: HttpRequest, id: int) -> JsonResponse:
     """
     Создает Stripe Checkout Session для оплаты заказа.
 
-    Создает сессию оплаты в Stripe для указанного заказа.
+    Товары заказа группируются по валюте, и для каждой валюты
+    создается отдельная сессия в Stripe аккаунте этой валюты.
+    Сессии для разных валют создаются параллельно.
     Применяет скидку и налог к товарам в заказе.
-    Использует правильные Stripe ключи в зависимости от валюты.
+
+    Query параметр currency позволяет создать сессию только
+    для одной валюты заказа. Товары заказа резервируются на время
+    оплаты (см. items.stock), резервы и сессии прежнего оформления
+    в тех же валютах освобождаются. Оплатить можно только корзину
+    текущей сессии.
 
     Args:
         request: HTTP запрос
         id: ID заказа для оплаты
 
     Returns:
-        JSON ответ с session.id для редиректа на Stripe Checkout
+        JSON ответ со списком сессий (currency, id, public_key) и
+        id первой сессии для редиректа на Stripe Checkout
 
     Raises:
-        404: Если заказ с указанным ID не найден
-        400: Если заказ пуст
+        404: Если заказ не найден или не является корзиной сессии
+        400: Если заказ пуст, в нем нет товаров в указанной валюте,
+             промокод больше не действует или Stripe отклонил запрос
+             (промокод и резервы возвращаются)
+        409: Если какого-то товара не хватает или прежняя оплата
+             в этих валютах уже прошла
+        503: Если Stripe временно недоступен (с заголовком Retry-After)
     """
-    order = get_object_or_404(Order, id=id)
+    # Оплатить можно только корзину своей сессии
+    if request.session.get('cart_id') != id:
+        raise Http404('Заказ не найден')
+    order = get_object_or_404(
+        Order.objects.select_related('discount', 'tax'),
+        id=id
+    )
+    order_items = list(order.items.all())
 
-    if not order.items.exists():
+    if not order_items:
         return JsonResponse({"error": "Order is empty"}, status=400)
 
-    # Определяем валюту заказа (берем из первого товара)
-    # Предполагаем, что все товары в заказе в одной валюте
-    currency = order.items.first().item.currency
-
-    # Получаем правильный Stripe клиент для валюты
-    stripe_client = get_stripe_client(currency)
-
-    # Формируем line_items с оригинальными ценами
-    # Скидка и налог будут применены через Stripe API
-    line_items = []
-    for oi in order.items.all():
-        line_items.append({
-            "price_data": {
-                "currency": oi.item.currency,
-                "product_data": {
-                    "name": oi.item.name,
-                },
-                "unit_amount": oi.item.price,
-            },
-            "quantity": oi.quantity,
-        })
+    groups: Dict[str, List[OrderItem]] = {}
+    for oi in order_items:
+        groups.setdefault(oi.currency, []).append(oi)
+
+    currency = request.GET.get('currency', '').lower()
+    if currency:
+        if currency not in groups:
+            return JsonResponse(
+                {"error": f"Order has no items in {currency.upper()}"},
+                status=400
+            )
+        groups = {currency: groups[currency]}
+
+    # Недоступный Stripe не должен списывать промокод и задерживать ответ
+    gateway = get_gateway()
+    try:
+        for currency in groups:
+            gateway.ensure_available(currency)
+    except StripeUnavailable as e:
+        return stripe_unavailable_response(e)
+
+    # Повторное оформление заменяет прежнее: его сессии истекают,
+    # а резервы возвращаются в остаток до нового резервирования
+    key = f'order:{order.id}'
+    if not release_previous_checkout(key, groups):
+        return JsonResponse(
+            {"error": "Order payment is already in progress"},
+            status=409
+        )
+    # Webhook истекших прежних сессий не вернет промокод, который
+    # спишется для нового оформления
+    forget_checkout_sessions(order, groups)
+
+    # Товары резервируются до списания промокода и запросов к Stripe
+    lines: Dict[int, int] = {}
+    for currency in groups:
+        for oi in groups[currency]:
+            lines[oi.item_id] = lines.get(oi.item_id, 0) + oi.quantity
+    try:
+        reservations = reserve_stock(lines, key)
+    except OutOfStock as e:
+        # Прежние сессии истекли, а новых не будет
+        release_unused_discount(order)
+        name = next(
+            oi.name for oi in order_items if oi.item_id == e.item_id
+        )
+        return JsonResponse(
+            {"error": f"Not enough stock for {name}"},
+            status=409
+        )
+
+    if not redeem_order_discount(order):
+        release_reservations(reservations)
+        return JsonResponse(
+            {"error": "Discount code is expired or exhausted"},
+            status=400
+        )
 
     # Формируем динамические URL
     scheme = request.scheme
     host = request.get_host()
-    success_url = f"{scheme}://{host}/success/"
+    # Ссылка на поток событий оплаты подписана: чужой заказ по ID
+    # не открыть
+    success_url = (
+        f"{scheme}://{host}/success/?order={sign_order_id(order.id)}"
+    )
     cancel_url = f"{scheme}://{host}/orders/cart/"
 
-    # Настройка параметров для Stripe Session
-    session_params: Dict[str, Any] = {
-        "mode": "payment",
-        "line_items": line_items,
-        "success_url": success_url,
-        "cancel_url": cancel_url,
-    }
-
-    # Добавляем скидку через discounts, если она есть
-    # Для правильного отображения в Stripe Checkout используем discounts
-    # Для упрощения, применяем скидку через расчет line_items
-    if order.discount:
-        # Пересчитываем line_items с учетом скидки
-        subtotal = sum(
-            oi.item.price * oi.quantity for oi in order.items.all()
+    def create_session(currency: str) -> Dict[str, str]:
+        # Metadata копируется в PaymentIntent, чтобы reconcile_payments
+        # сопоставил с заказом и сам платеж
+        metadata = {"order_id": order.id, "currency": currency}
+        session = gateway.create_checkout_session(
+            currency,
+            mode="payment",
+            line_items=line_items[currency],
+            success_url=success_url,
+            cancel_url=cancel_url,
+            metadata=metadata,
+            payment_intent_data={"metadata": metadata},
         )
-        discounted_total = subtotal * (100 - order.discount.percent) // 100
-
-        # Распределяем скидку пропорционально между товарами
-        if subtotal > 0:
-            discount_multiplier = discounted_total / subtotal
-            line_items = []
-            for oi in order.items.all():
-                discounted_price = int(oi.item.price * discount_multiplier)
-                line_items.append({
-                    "price_data": {
-                        "currency": oi.item.currency,
-                        "product_data": {
-                            "name": oi.item.name,
-                        },
-                        "unit_amount": discounted_price,
-                    },
-                    "quantity": oi.quantity,
-                })
-            session_params["line_items"] = line_items
-
-    # Добавляем налог через automatic_tax, если он есть
-    # Для правильного отображения в Stripe Checkout используем automatic_tax
-    # Для упрощения, применяем налог через расчет line_items
-    if order.tax:
-        # Пересчитываем line_items с учетом налога
-        current_total = sum(
-            item["price_data"]["unit_amount"] * item["quantity"]
-            for item in session_params["line_items"]
+        _, public_key = get_stripe_keys(currency)
+        return {
+            "currency": currency,
+            "id": session.id,
+            "public_key": public_key,
+        }
+
+    currencies = sorted(groups)
+    try:
+        with releasing_on_error(reservations):
+            # Позиции читают базу, поэтому собираются в потоке запроса:
+            # потоки пула обращаются только к Stripe и не открывают
+            # соединений с базой, которые никто не закроет
+            line_items = {
+                currency: build_order_line_items(order, groups[currency])
+                for currency in currencies
+            }
+            if len(currencies) == 1:
+                sessions = [create_session(currencies[0])]
+            else:
+                with ThreadPoolExecutor(max_workers=len(currencies)) as pool:
+                    sessions = list(pool.map(create_session, currencies))
+    except stripe.StripeError as e:
+        # Оплаты не будет: списанное использование промокода
+        # возвращается, если не осталось сессий других валют
+        release_unused_discount(order)
+        if isinstance(e, StripeUnavailable):
+            return stripe_unavailable_response(e)
+        return JsonResponse({"error": str(e)}, status=400)
+
+    for session in sessions:
+        item_ids = {oi.item_id for oi in groups[session["currency"]]}
+        attach_reservations(
+            [r for r in reservations if r.item_id in item_ids],
+            session["currency"],
+            session["id"]
         )
-        taxed_total = current_total * (100 + order.tax.percent) // 100
-
-        # Распределяем налог пропорционально между товарами
-        if current_total > 0:
-            tax_multiplier = taxed_total / current_total
-            line_items = []
-            for item in session_params["line_items"]:
-                original_price = item["price_data"]["unit_amount"]
-                taxed_price = int(original_price * tax_multiplier)
-                line_items.append({
-                    "price_data": {
-                        "currency": item["price_data"]["currency"],
-                        "product_data": {
-                            "name": item["price_data"]["product_data"]["name"],
-                        },
-                        "unit_amount": taxed_price,
-                    },
-                    "quantity": item["quantity"],
-                })
-            session_params["line_items"] = line_items
-
-    session = stripe_client.checkout.Session.create(**session_params)
-
-    return JsonResponse({"id": session.id})
+    record_checkout_sessions(
+        order, {session["currency"]: session["id"] for session in sessions}
+    )
+
+    return JsonResponse({"id": sessions[0]["id"], "sessions": sessions})
+
+
+@csrf_exempt
+@require_POST
+def stripe_webhook(request: HttpRequest, currency: str) -> HttpResponse:
+    """
+    Принимает webhook Stripe аккаунта валюты.
+
+    Подпись проверяется секретом webhook аккаунта (см. шлюз
+    PAYMENT_GATEWAY). Оплаченные Checkout Session и PaymentIntent
+    заказов сохраняются так же, как при сверке reconcile_payments,
+    и сразу отправляются покупателям, ожидающим на странице
+    успешной оплаты (order_events). По истекшей Checkout Session
+    возвращается промокод неоплаченного заказа. Остальные события
+    подтверждаются без обработки.
+
+    Args:
+        request: HTTP запрос от Stripe
+        currency: Валюта Stripe аккаунта
+
+    Returns:
+        Пустой ответ 200
+
+    Raises:
+        400: Если подпись или тело запроса неверны
+        404: Если валюта не настроена
+    """
+    try:
+        event = get_gateway().verify_webhook(
+            currency,
+            request.body,
+            request.headers.get('Stripe-Signature', '')
+        )
+    except UnsupportedCurrency:
+        raise Http404('Валюта не настроена')
+    except (ValueError, stripe.SignatureVerificationError):
+        return HttpResponse(status=400)
+
+    if event.type == 'checkout.session.expired':
+        release_expired_checkout(event.data.object)
+        return HttpResponse()
+
+    parse = WEBHOOK_PAYMENTS.get(event.type)
+    if parse:
+        payment, _ = parse(event.data.object)
+        if payment:
+            record_payments([payment])
+    return HttpResponse()
+
+
+def format_event(state: Dict[str, Any], retry: int = 0) -> str:
+    """Форматирует состояние оплаты как событие text/event-stream."""
+    prefix = f'retry: {retry}\n' if retry else ''
+    return f'{prefix}event: payment\ndata: {json.dumps(state)}\n\n'
+
+
+async def payment_events(order_id: int) -> AsyncIterator[str]:
+    """
+    Отправляет состояние оплаты заказа при каждом его изменении.
+
+    Поток ждет события шины без запросов к базе (см. orders.events)
+    и завершается после оплаты заказа или через ORDER_EVENTS_TIMEOUT
+    секунд (браузер переподключится сам). Раз в
+    ORDER_EVENTS_KEEPALIVE секунд отправляется комментарий, чтобы
+    прокси не закрыли соединение.
+    """
+    deadline = time.monotonic() + settings.ORDER_EVENTS_TIMEOUT
+    with OrderWatch(order_id) as watch:
+        state = await load_shared(order_id, get_payment_state)
+        yield format_event(state)
+        while state and not state['is_paid']:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            changed = await watch.wait(
+                min(remaining, settings.ORDER_EVENTS_KEEPALIVE)
+            )
+            if not changed:
+                yield ': keepalive\n\n'
+                continue
+            current = await load_shared(order_id, get_payment_state)
+            if current != state:
+                state = current
+                yield format_event(state)
+
+
+async def order_events(request: HttpRequest, id: int) -> HttpResponse:
+    """
+    Поток событий (Server-Sent Events) об оплате заказа.
+
+    Страница успешной оплаты подписывается на него через EventSource
+    и показывает, подтверждена ли оплата. Доступ только по токену
+    заказа (query параметр token, см. sign_order_id), который
+    покупатель получает в ссылке возврата из Stripe. Событие payment содержит
+    статус заказа и оплаченные валюты и приходит сразу и при каждом
+    изменении, пока заказ не оплачен.
+
+    Под ASGI ожидающий клиент - это корутина без потока и без
+    опроса базы, поэтому один процесс держит тысячи соединений.
+    Под WSGI поток занимал бы поток сервера, поэтому отправляется
+    только текущее состояние с полем retry: браузер переподключается
+    раз в несколько секунд (опрос).
+
+    Args:
+        request: HTTP запрос
+        id: ID заказа
+
+    Returns:
+        Ответ text/event-stream
+
+    Raises:
+        404: Если заказ не найден или токен не выдан для него
+    """
+    if not check_order_token(id, request.GET.get('token', '')):
+        raise Http404('Заказ не найден')
+
+    state = await load_shared(id, get_payment_state)
+    if state is None:
+        raise Http404('Заказ не найден')
+
+    headers = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    if state['is_paid'] or not isinstance(request, ASGIRequest):
+        return HttpResponse(
+            format_event(state, retry=3000),
+            content_type='text/event-stream',
+            headers=headers
+        )
+    return StreamingHttpResponse(
+        payment_events(id),
+        content_type='text/event-stream',
+        headers=headers
+    )
+
+
+def cart_update_response(
+    request: HttpRequest,
+    cart: Order,
+    item_id: int,
+    redirect_to: str,
+    error: str = ''
+) -> HttpResponse:
+    """
+    Возвращает ответ на изменение количества товара в корзине.
+
+    Формат ответа выбирается по запросу:
+
+    - Accept: application/json - JSON со строкой товара (null, если
+      товар удален) и суммами по валютам в центах;
+    - X-Requested-With: XMLHttpRequest - HTML фрагмент cart_update.html
+      (строка товара, суммы, кнопки оплаты и сообщения) для замены
+      элементов страницы корзины;
+    - иначе (ссылка без JavaScript) - редирект на redirect_to.
+
+    Частичный ответ читает только строку товара и суммы корзины,
+    без отрисовки всей страницы.
+
+    Args:
+        request: HTTP запрос
+        cart: Корзина
+        item_id: ID измененного товара
+        redirect_to: Адрес редиректа для обычного запроса
+        error: Сообщение об ошибке (ответ 409)
+
+    Returns:
+        JSON, HTML фрагмент или редирект
+    """
+    # get_preferred_type учитывает q-значения Accept (Django 5.2+)
+    as_json = request.get_preferred_type(
+        ['text/html', 'application/json']
+    ) == 'application/json'
+    fragment = request.headers.get('X-Requested-With') == 'XMLHttpRequest'
+    if error and not as_json:
+        messages.error(request, error)
+    if not (as_json or fragment):
+        return redirect(redirect_to)
+
+    line = OrderItem.objects.filter(order=cart, item_id=item_id).first()
+    status = 409 if error else 200
+    if as_json:
+        return JsonResponse({
+            'error': error or None,
+            'line': line and {
+                'item_id': line.item_id,
+                'name': line.name,
+                'currency': line.currency,
+                'unit_amount': line.unit_amount,
+                'quantity': line.quantity,
+            },
+            'totals': cart.totals_by_currency(),
+        }, status=status)
+    return render(request, "cart_update.html", {
+        "order": cart,
+        "line": line,
+        "groups": get_currency_groups(cart),
+    }, status=status)
 
 
 def add_to_cart(
     request: HttpRequest,
     item_id: int
-) -> HttpResponseRedirect:
+) -> HttpResponse:
     """
     Добавляет товар в корзину.
 
     Если товар уже есть в корзине, увеличивает его количество на 1.
-    Иначе создает новую запись в корзине.
+    Иначе создает новую запись в корзине. Количество в корзине не
+    может превышать доступный остаток товара (окончательно остаток
+    проверяется при резервировании в buy_order).
 
     Args:
         request: HTTP запрос
         item_id: ID товара для добавления
 
     Returns:
-        Редирект на предыдущую страницу или главную
+        Редирект на предыдущую страницу или главную, для запросов
+        из скрипта - JSON или фрагмент корзины (cart_update_response)
+
+    Raises:
+        404: Если товар не найден
+        409: Если товара больше нет в наличии (для запросов из скрипта)
     """
     cart = get_or_create_cart(request)
-    item = Item.objects.get(id=item_id)
+    item = get_cached_item(item_id)
+    if item is None:
+        raise Http404('Товар не найден')
+    referer = request.META.get("HTTP_REFERER", "/")
 
-    order_item, created = OrderItem.objects.get_or_create(
+    in_cart = OrderItem.objects.filter(
         order=cart,
         item=item
-    )
+    ).values_list('quantity', flat=True).first() or 0
+    available = get_available([item.id]).get(item.id)
+    if available is not None and in_cart >= available:
+        return cart_update_response(
+            request, cart, item.id, referer,
+            error=f'Товара "{item.name}" больше нет в наличии'
+        )
 
-    if not created:
-        order_item.quantity += 1
-        order_item.save()
+    if in_cart:
+        OrderItem.objects.filter(
+            order=cart,
+            item=item
+        ).update(quantity=F('quantity') + 1)
+    else:
+        OrderItem.objects.get_or_create(order=cart, item=item)
 
-    return redirect(request.META.get("HTTP_REFERER", "/"))
+    return cart_update_response(request, cart, item.id, referer)
 
 
 def remove_from_cart(
     request: HttpRequest,
     item_id: int
-) -> HttpResponseRedirect:
+) -> HttpResponse:
     """
     Удаляет товар из корзины.
 
@@ -208,25 +540,26 @@ def remove_from_cart(
         item_id: ID товара для удаления
 
     Returns:
-        Редирект на страницу корзины
+        Редирект на страницу корзины, для запросов из скрипта -
+        JSON или фрагмент корзины (cart_update_response)
 
     Raises:
         404: Если товар не найден в корзине
     """
     cart = get_or_create_cart(request)
-    order_item = get_object_or_404(
-        OrderItem,
+    deleted, _ = OrderItem.objects.filter(
         order=cart,
         item_id=item_id
-    )
-    order_item.delete()
-    return redirect("/orders/cart/")
+    ).delete()
+    if not deleted:
+        raise Http404('Товар не найден в корзине')
+    return cart_update_response(request, cart, item_id, "/orders/cart/")
 
 
 def decrease_item(
     request: HttpRequest,
     item_id: int
-) -> HttpResponseRedirect:
+) -> HttpResponse:
     """
     Уменьшает количество товара в корзине на 1.
 
@@ -237,7 +570,8 @@ def decrease_item(
         item_id: ID товара
 
     Returns:
-        Редирект на страницу корзины
+        Редирект на страницу корзины, для запросов из скрипта -
+        JSON или фрагмент корзины (cart_update_response)
 
     Raises:
         404: Если товар не найден в корзине
@@ -255,15 +589,17 @@ def decrease_item(
     else:
         order_item.delete()
 
-    return redirect("/orders/cart/")
+    return cart_update_response(request, cart, item_id, "/orders/cart/")
 
 
 def cart_page(request: HttpRequest) -> HttpResponse:
     """
     Отображает страницу корзины с товарами и формой для скидки.
 
-    Вычисляет промежуточную сумму, сумму скидки, налог и итоговую сумму.
-    Передает все необходимые данные для отображения и оплаты.
+    Вычисляет промежуточную сумму, сумму скидки, налог и итоговую сумму
+    отдельно для каждой валюты корзины. Передает все необходимые данные
+    для отображения и оплаты. Кнопки изменения количества обновляют
+    страницу на месте (orders/js/cart.js, cart_update_response).
 
     Args:
         request: HTTP запрос
@@ -273,34 +609,10 @@ def cart_page(request: HttpRequest) -> HttpResponse:
     """
     cart = get_or_create_cart(request)
 
-    # Определяем валюту заказа (берем из первого товара)
-    currency = 'usd'  # по умолчанию
-    if cart.items.exists():
-        currency = cart.items.first().item.currency
-
-    # Получаем правильный публичный ключ для валюты
-    _, public_key = get_stripe_keys(currency)
-
-    # Вычисляем суммы для отображения
-    subtotal = cart.subtotal() / 100 if cart.items.exists() else 0
-    discount_amount = 0
-    if cart.discount and cart.items.exists():
-        discount_amount = subtotal * cart.discount.percent / 100
-    tax_amount = 0
-    if cart.tax and cart.items.exists():
-        # Налог применяется к сумме после скидки
-        amount_after_discount = subtotal - discount_amount
-        tax_amount = amount_after_discount * cart.tax.percent / 100
-    total = (cart.total_amount() / 100) if cart.items.exists() else 0
-
     return render(request, "cart.html", {
         "order": cart,
-        "stripe_public_key": public_key,
-        "subtotal": subtotal,
-        "discount_amount": discount_amount,
-        "tax_amount": tax_amount,
-        "total": total,
-        "currency": currency.upper()
+        "lines": list(cart.items.all()),
+        "groups": get_currency_groups(cart)
     })
 
 
@@ -308,8 +620,9 @@ def apply_discount(request: HttpRequest) -> HttpResponseRedirect:
     """
     Применяет скидку к корзине по коду.
 
-    Ищет скидку по коду и применяет ее к текущей корзине.
-    Показывает сообщение об успехе или ошибке.
+    Ищет скидку по коду (через кэш промокодов) и применяет ее
+    к текущей корзине. Частота попыток ограничена для каждой сессии
+    и IP адреса. Показывает сообщение об успехе или ошибке.
 
     Args:
         request: HTTP запрос с POST данными, содержащими discount_code
@@ -324,16 +637,27 @@ def apply_discount(request: HttpRequest) -> HttpResponseRedirect:
             messages.error(request, 'Пожалуйста, введите код скидки')
             return redirect('/orders/cart/')
 
-        try:
-            discount = Discount.objects.get(code=discount_code)
+        if discount_rate_limited(request):
+            messages.error(
+                request,
+                'Слишком много попыток, попробуйте позже'
+            )
+            return redirect('/orders/cart/')
+
+        discount = get_discount_by_code(discount_code)
+        if discount and not discount.is_active():
+            messages.error(request, 'Срок действия кода скидки истек')
+        elif discount:
             cart = get_or_create_cart(request)
+            if cart.discount_id != discount.id:
+                release_order_discount(cart)
             cart.discount = discount
             cart.save()
             messages.success(
                 request,
                 f'Скидка "{discount.name}" применена!'
             )
-        except Discount.DoesNotExist:
+        else:
             messages.error(request, 'Код скидки не найден')
 
         return redirect('/orders/cart/')
@@ -354,6 +678,7 @@ def remove_discount(request: HttpRequest) -> HttpResponseRedirect:
     cart = get_or_create_cart(request)
     if cart.discount:
         discount_name = cart.discount.name
+        release_order_discount(cart)
         cart.discount = None
         cart.save()
         messages.info(request, f'Скидка "{discount_name}" удалена')
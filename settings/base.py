@@ -15,18 +15,69 @@ sys.path.append(os.path.join(BASE_DIR, 'apps'))
 
 SECRET_KEY = config('SECRET_KEY', cast=str)
 
-# Stripe - USD keys (default)
+# Stripe - ключи аккаунта по умолчанию
 STRIPE_SECRET_KEY = config('STRIPE_SECRET_KEY', cast=str)
 STRIPE_PUBLIC_KEY = config('STRIPE_PUBLIC_KEY', cast=str)
+STRIPE_WEBHOOK_SECRET = config('STRIPE_WEBHOOK_SECRET', default='')
+
+# Валюты магазина (первая - валюта по умолчанию) и их Stripe аккаунты.
+# Для валюты XXX ключи берутся из STRIPE_SECRET_KEY_XXX и
+# STRIPE_PUBLIC_KEY_XXX, секрет webhook - из STRIPE_WEBHOOK_SECRET_XXX
+# (без них - значения по умолчанию), параметры Checkout Session -
+# из JSON STRIPE_CHECKOUT_OPTIONS_XXX. Реестр аккаунтов проверяется
+# при запуске (см. items.stripe_accounts)
+STRIPE_CURRENCIES = config(
+    'STRIPE_CURRENCIES',
+    default='usd,kzt',
+    cast=lambda v: [s.strip().lower() for s in v.split(',') if s.strip()]
+)
+STRIPE_ACCOUNTS = {
+    currency: {
+        'secret_key': (
+            config(f'STRIPE_SECRET_KEY_{currency.upper()}', default='') or
+            STRIPE_SECRET_KEY
+        ),
+        'public_key': (
+            config(f'STRIPE_PUBLIC_KEY_{currency.upper()}', default='') or
+            STRIPE_PUBLIC_KEY
+        ),
+        'checkout_options': config(
+            f'STRIPE_CHECKOUT_OPTIONS_{currency.upper()}', default='{}'
+        ),
+        'webhook_secret': (
+            config(f'STRIPE_WEBHOOK_SECRET_{currency.upper()}', default='')
+            or STRIPE_WEBHOOK_SECRET
+        ),
+    }
+    for currency in STRIPE_CURRENCIES
+}
+
+# Платежный шлюз views и сервисов оплаты (см. items.gateways):
+# items.gateways.StripeGateway или детерминированный шлюз в памяти
+# процесса items.gateways.FakeGateway для тестов без сети
+PAYMENT_GATEWAY = config(
+    'PAYMENT_GATEWAY', default='items.gateways.StripeGateway', cast=str
+)
 
-# Stripe optional
-STRIPE_SECRET_KEY_KZT = (
-    config('STRIPE_SECRET_KEY_KZT', default='', cast=str) or
-    STRIPE_SECRET_KEY
+# Stripe HTTP клиент: короткие таймауты (секунды) и адрес API
+# (например, http://127.0.0.1:12111 для команды fake_stripe)
+STRIPE_API_BASE = config('STRIPE_API_BASE', default='', cast=str)
+STRIPE_CONNECT_TIMEOUT = config(
+    'STRIPE_CONNECT_TIMEOUT', default=2.0, cast=float
 )
-STRIPE_PUBLIC_KEY_KZT = (
-    config('STRIPE_PUBLIC_KEY_KZT', default='', cast=str) or
-    STRIPE_PUBLIC_KEY
+STRIPE_READ_TIMEOUT = config('STRIPE_READ_TIMEOUT', default=5.0, cast=float)
+STRIPE_MAX_NETWORK_RETRIES = config(
+    'STRIPE_MAX_NETWORK_RETRIES', default=0, cast=int
+)
+
+# Предохранитель Stripe: после THRESHOLD сбоев за WINDOW секунд запросы
+# к аккаунту отклоняются сразу в течение COOLDOWN секунд
+STRIPE_BREAKER_THRESHOLD = config(
+    'STRIPE_BREAKER_THRESHOLD', default=5, cast=int
+)
+STRIPE_BREAKER_WINDOW = config('STRIPE_BREAKER_WINDOW', default=30, cast=int)
+STRIPE_BREAKER_COOLDOWN = config(
+    'STRIPE_BREAKER_COOLDOWN', default=30, cast=int
 )
 
 
@@ -53,7 +104,8 @@ DJANGO_APPS = [
 PROJECT_APPS = [
     'abstracts.apps.AbstractsConfig',
     'items.apps.ItemsConfig',
-    'orders.apps.OrdersConfig'
+    'orders.apps.OrdersConfig',
+    'jobs.apps.JobsConfig'
 ]
 
 INSTALLED_APPS = DJANGO_APPS + PROJECT_APPS
@@ -168,8 +220,128 @@ MEDIA_URL = "/media/"
 MEDIA_ROOT = BASE_DIR / "media"
 
 
+# Кэш (в продакшене можно заменить на общий Redis/Memcached)
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+# Кэш товаров, промокодов и налогов в памяти каждого процесса:
+# количество записей и время жизни (секунды). Изменения рассылаются
+# процессам через PostgreSQL LISTEN/NOTIFY, на других базах процессы
+# опрашивают таблицу событий раз в CACHE_BUS_POLL_INTERVAL секунд,
+# события хранятся CACHE_BUS_RETENTION секунд
+LOCAL_CACHE_SIZE = config('LOCAL_CACHE_SIZE', default=1024, cast=int)
+LOCAL_CACHE_TIMEOUT = config('LOCAL_CACHE_TIMEOUT', default=300, cast=float)
+CACHE_BUS_POLL_INTERVAL = config(
+    'CACHE_BUS_POLL_INTERVAL', default=0.5, cast=float
+)
+CACHE_BUS_RETENTION = config('CACHE_BUS_RETENTION', default=300, cast=float)
+
+# Время жизни фрагментов страниц товара (ключ меняется при изменении товара)
+ITEM_PAGE_CACHE_TIMEOUT = config(
+    'ITEM_PAGE_CACHE_TIMEOUT', default=86400, cast=int
+)
+
+# Неиспользуемые Payment Intent старше этого срока отменяет
+# sweep_payment_intents
+PAYMENT_INTENT_TTL_HOURS = config(
+    'PAYMENT_INTENT_TTL_HOURS', default=24, cast=float
+)
+
+# Остатки товаров: на сколько строк (слотов) делится остаток товара,
+# чтобы одновременные покупки не ждали блокировки одной строки,
+# и на сколько минут товар резервируется при оформлении оплаты
+STOCK_SLOTS = config('STOCK_SLOTS', default=8, cast=int)
+STOCK_RESERVATION_MINUTES = config(
+    'STOCK_RESERVATION_MINUTES', default=30, cast=int
+)
+
+# JSON API каталога: размер страницы по умолчанию и максимальный
+CATALOG_API_PAGE_SIZE = config('CATALOG_API_PAGE_SIZE', default=50, cast=int)
+CATALOG_API_MAX_LIMIT = config('CATALOG_API_MAX_LIMIT', default=200, cast=int)
+
+# Поиск: результатов на странице магазина и сколько самых новых
+# совпадений ранжируется по релевантности (ограничивает время
+# широких запросов)
+SEARCH_PAGE_SIZE = config('SEARCH_PAGE_SIZE', default=24, cast=int)
+SEARCH_MAX_CANDIDATES = config(
+    'SEARCH_MAX_CANDIDATES', default=5000, cast=int
+)
+
+# Поток событий оплаты заказа (SSE): сколько секунд держится одно
+# соединение (затем браузер переподключается) и как часто отправляется
+# keepalive, чтобы прокси не закрыли соединение
+ORDER_EVENTS_TIMEOUT = config('ORDER_EVENTS_TIMEOUT', default=300, cast=int)
+ORDER_EVENTS_KEEPALIVE = config(
+    'ORDER_EVENTS_KEEPALIVE', default=15, cast=int
+)
+
+# Количество товаров в блоке «Часто покупают вместе» на странице товара
+# (строит команда build_recommendations)
+RELATED_ITEMS_LIMIT = config('RELATED_ITEMS_LIMIT', default=8, cast=int)
+
+# Неоплаченные корзины старше этого срока удаляются командой reap_carts
+ABANDONED_CART_DAYS = config('ABANDONED_CART_DAYS', default=30, cast=int)
+
+# Сессии (в них хранится корзина) по умолчанию лежат в подписанной
+# cookie: чтение и запись сессии не обращаются к базе. Cookie живет
+# столько же, сколько неоплаченная корзина. Для серверного хранения
+# подойдет django.contrib.sessions.backends.cache с общим Redis
+SESSION_ENGINE = config(
+    'SESSION_ENGINE',
+    default='django.contrib.sessions.backends.signed_cookies',
+    cast=str
+)
+SESSION_COOKIE_AGE = config(
+    'SESSION_COOKIE_AGE', default=ABANDONED_CART_DAYS * 86400, cast=int
+)
+
+# Оплаченные заказы старше этого срока переносит в архив archive_paid_orders
+PAID_ORDER_ARCHIVE_DAYS = config(
+    'PAID_ORDER_ARCHIVE_DAYS', default=90, cast=int
+)
+
+# Кэш промокодов в памяти процесса: найденные коды и (коротко)
+# ненайденные коды
+DISCOUNT_CACHE_TIMEOUT = config(
+    'DISCOUNT_CACHE_TIMEOUT', default=3600, cast=int
+)
+DISCOUNT_NEGATIVE_CACHE_TIMEOUT = config(
+    'DISCOUNT_NEGATIVE_CACHE_TIMEOUT', default=60, cast=int
+)
+
+# Ограничение частоты ввода промокодов: попыток на сессию и на IP
+# адрес за окно (секунды)
+DISCOUNT_RATE_LIMIT_ATTEMPTS = config(
+    'DISCOUNT_RATE_LIMIT_ATTEMPTS', default=5, cast=int
+)
+DISCOUNT_RATE_LIMIT_WINDOW = config(
+    'DISCOUNT_RATE_LIMIT_WINDOW', default=60, cast=int
+)
+
+# Очередь фоновых задач (run_jobs): задержка повторов растет
+# экспоненциально от базовой до максимальной, незавершенная задача
+# через JOBS_LEASE_SECONDS считается зависшей
+JOBS_RETRY_BASE_DELAY = config('JOBS_RETRY_BASE_DELAY', default=10, cast=float)
+JOBS_RETRY_MAX_DELAY = config('JOBS_RETRY_MAX_DELAY', default=3600, cast=float)
+JOBS_LEASE_SECONDS = config('JOBS_LEASE_SECONDS', default=300, cast=float)
+JOBS_KEEP_DONE_HOURS = config('JOBS_KEEP_DONE_HOURS', default=24, cast=float)
+
+
+# Статические файлы раздает WhiteNoise. В продакшене collectstatic
+# сохраняет файлы с хешем содержимого в имени и заранее сжимает их
+# (gzip и brotli), а WhiteNoise отдает их с Cache-Control на год
 if not DEBUG:
     MIDDLEWARE.insert(1, 'whitenoise.middleware.WhiteNoiseMiddleware')
-    STATICFILES_STORAGE = (
-        'whitenoise.storage.CompressedManifestStaticFilesStorage'
-    )
+    STORAGES = {
+        'default': {
+            'BACKEND': 'django.core.files.storage.FileSystemStorage',
+        },
+        'staticfiles': {
+            'BACKEND': (
+                'whitenoise.storage.CompressedManifestStaticFilesStorage'
+            ),
+        },
+    }